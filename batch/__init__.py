@@ -0,0 +1,7 @@
+from utilities.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "load_scenario": "batch.batch",
+    "run_scenario": "batch.batch",
+    "estimate_cost": "batch.batch",
+})
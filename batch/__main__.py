@@ -0,0 +1,36 @@
+import argparse
+import sys
+from batch.batch import load_scenario, estimate_cost, run_scenario
+
+parser = argparse.ArgumentParser(
+    description="Run scenario files headless, writing results as CSV part "
+                "files.")
+parser.add_argument("scenarios", nargs="+", metavar="SCENARIO",
+                    help="scenario files (.json or .toml)")
+parser.add_argument("--output", default="results",
+                    help="the directory results are written under")
+parser.add_argument("--workers", type=int, default=1)
+parser.add_argument("--restart", action="store_true",
+                    help="recompute every task instead of resuming")
+parser.add_argument("--dry-run", action="store_true",
+                    help="plan the tasks and estimate their cost only")
+args = parser.parse_args()
+for file_name in args.scenarios:
+    scenario = load_scenario(file_name)
+    if args.dry_run:
+        estimate = estimate_cost(
+            scenario, None if args.restart else args.output, args.workers)
+        print(f"{scenario['name']}: {estimate.pending_tasks} of "
+              f"{estimate.tasks} tasks pending ({estimate.pending_rows} of "
+              f"{estimate.rows} rows), about {estimate.seconds:.1f} s with "
+              f"{args.workers} worker(s)")
+        continue
+
+    def progress(task, rows):
+        print(f"  {task.task_id}: {rows} rows", file=sys.stderr)
+
+    report = run_scenario(scenario, args.output, args.workers,
+                          resume=not args.restart, progress=progress)
+    print(f"{scenario['name']}: {report.completed_tasks} tasks run, "
+          f"{report.skipped_tasks} resumed, {report.rows} rows in "
+          f"{report.elapsed:.1f} s -> {report.directory}")
@@ -0,0 +1,451 @@
+"""Headless batch runs of scenario files.
+
+A scenario is a declarative (JSON or TOML) file describing a universe (see
+universe.specification), the parameter sweeps to run over it, and the
+outputs to produce:
+
+    {
+        "name": "Habitable zone",
+        "universe": {"bodies": [...], "orbits": [...]},
+        "outputs": ["bodies", "orbits", "sweeps", "positions"],
+        "sweeps": [
+            {"body": "Earth",
+             "grid": {"semimajor_axis": {"start": 1.0e+08, "stop": 3.0e+08,
+                                         "num": 1000},
+                      "eccentricity": [0.0, 0.1, 0.2]},
+             "quantities": ["period", "temperature"]}
+        ],
+        "positions": {"times": {"start": 0, "stop": 365.25, "num": 366}},
+        "chunk_size": 10000
+    }
+
+Outputs:
+    bodies: the statistics of every body (see celestial_bodies.report)
+    orbits: the properties of every orbit
+    sweeps: the quantities (see service.sweep_quantities) of a body's orbit
+    over the cartesian product of its grid of semimajor_axis (kilometers)
+    and/or eccentricity values
+    positions: the position (kilometers) of every body at each time (days)
+
+Grid values are a list, or {"start", "stop", "num"} for evenly spaced
+values (add "scale": "log" for logarithmically spaced values).
+
+The work is split into tasks of at most chunk_size grid points (or times),
+run in worker processes. Every task writes its own CSV part file (named
+after the task) as soon as it finishes, atomically, so that an interrupted
+run resumes by skipping the tasks whose part files exist (a restart removes
+them, and the manifest, first). A dry run plans the tasks and estimates
+the cost of the pending ones by timing a small sample of each output.
+"""
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence
+import numpy as np
+from universe.specification import universe_from_specification, \
+    specification_digest
+
+scenario_outputs = ("bodies", "orbits", "sweeps", "positions")
+sweep_parameters = ("semimajor_axis", "eccentricity")
+_default_chunk_size = 10000
+# Rows evaluated per output when estimating the cost of a dry run
+_probe_rows = 256
+
+# Universes built by this (worker) process, keyed by scenario digest
+_worker_universes = {}
+
+
+class ScenarioError(ValueError):
+    """Exception raised for an invalid scenario, or an output directory
+    that holds the results of a different scenario."""
+    pass
+
+
+class Task(NamedTuple):
+    """A unit of work: rows start to stop of one output (of the sweep with
+    the given index)."""
+    task_id: str
+    output: str
+    index: int
+    start: int
+    stop: int
+
+    @property
+    def rows(self) -> int:
+        return self.stop - self.start
+
+
+class CostEstimate(NamedTuple):
+    """The planned work of a scenario (see estimate_cost)."""
+    tasks: int
+    pending_tasks: int
+    rows: int
+    pending_rows: int
+    seconds: float
+
+
+class BatchReport(NamedTuple):
+    """The outcome of run_scenario."""
+    directory: str
+    completed_tasks: int
+    skipped_tasks: int
+    rows: int
+    elapsed: float
+
+
+def load_scenario(path: str) -> Dict[str, Any]:
+    """Loads a scenario from a JSON or TOML (.toml) file.
+
+    :param str path: the path of the scenario file
+    :return: the scenario
+    :rtype: Dict[str, Any]
+    """
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise ImportError("Reading TOML scenarios requires Python 3.11 "
+                              "or later (tomllib).") from None
+        with open(path, "rb") as f:
+            scenario = tomllib.load(f)
+    else:
+        with open(path) as f:
+            scenario = json.load(f)
+    scenario.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return scenario
+
+
+def grid_values(spec) -> np.ndarray:
+    """Returns the values of a grid axis given as a list, or as
+    {"start", "stop", "num"} (with "scale": "linear" or "log").
+
+    :param spec: the values or their range
+    :return: the values
+    :rtype: np.ndarray
+    """
+    if isinstance(spec, dict):
+        try:
+            start, stop, num = spec["start"], spec["stop"], int(spec["num"])
+        except KeyError as e:
+            raise ScenarioError(f"A grid range requires start, stop and num "
+                                f"(missing {e}).") from None
+        scale = spec.get("scale", "linear")
+        if scale == "linear":
+            return np.linspace(start, stop, num)
+        if scale == "log":
+            return np.geomspace(start, stop, num)
+        raise ScenarioError(f"Unknown grid scale {scale}; choose from "
+                            f"linear, log")
+    return np.asarray(spec, dtype=float).ravel()
+
+
+def _sweep_axes(sweep: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Returns the values of each parameter of a sweep's grid."""
+    grid = sweep.get("grid", {})
+    unknown = set(grid) - set(sweep_parameters)
+    if len(unknown) > 0 or len(grid) == 0:
+        raise ScenarioError(f"A sweep grid requires parameters from "
+                            f"{', '.join(sweep_parameters)}, not "
+                            f"{', '.join(sorted(grid)) or 'none'}.")
+    return {parameter: grid_values(values)
+            for parameter, values in grid.items()}
+
+
+def validate_scenario(scenario: Dict[str, Any]) -> None:
+    """Checks that a scenario is complete and consistent (and that its
+    universe can be built).
+
+    :param Dict[str, Any] scenario: the scenario
+    :return: None
+    :raises: ScenarioError
+    """
+    from service.service import sweep_quantities
+    if "universe" not in scenario:
+        raise ScenarioError("A scenario requires a universe.")
+    outputs = _outputs(scenario)
+    unknown = set(outputs) - set(scenario_outputs)
+    if len(unknown) > 0:
+        raise ScenarioError(f"Unknown outputs {', '.join(sorted(unknown))}; "
+                            f"choose from {', '.join(scenario_outputs)}")
+    universe = universe_from_specification(scenario["universe"])
+    if "sweeps" in outputs:
+        for sweep in scenario.get("sweeps", []):
+            _orbit_of(universe, sweep.get("body"))
+            _sweep_axes(sweep)
+            unknown = set(sweep.get("quantities", ())) - \
+                set(sweep_quantities)
+            if len(unknown) > 0:
+                raise ScenarioError(f"Unknown quantities "
+                                    f"{', '.join(sorted(unknown))}; choose "
+                                    f"from {', '.join(sweep_quantities)}")
+    if "positions" in outputs and "times" not in \
+            scenario.get("positions", {}):
+        raise ScenarioError("The positions output requires times.")
+    if _chunk_size(scenario) < 1:
+        raise ScenarioError(f"chunk_size ({_chunk_size(scenario)}) must be "
+                            f">= 1.")
+
+
+def _outputs(scenario: Dict[str, Any]) -> List[str]:
+    """Returns the outputs of a scenario: those listed, or by default those
+    the scenario describes."""
+    if "outputs" in scenario:
+        return list(scenario["outputs"])
+    return ["bodies", "orbits"] + \
+        [output for output in ("sweeps", "positions") if output in scenario]
+
+
+def _chunk_size(scenario: Dict[str, Any]) -> int:
+    return int(scenario.get("chunk_size", _default_chunk_size))
+
+
+def plan_tasks(scenario: Dict[str, Any]) -> List[Task]:
+    """Splits the outputs of a scenario into tasks of at most chunk_size
+    rows (grid points or times).
+
+    :param Dict[str, Any] scenario: the scenario
+    :return: the tasks
+    :rtype: List[Task]
+    """
+    chunk_size = _chunk_size(scenario)
+    tasks = []
+    outputs = _outputs(scenario)
+    for output in ("bodies", "orbits"):
+        if output in outputs:
+            tasks.append(Task(output, output, 0, 0, 1))
+    ranges = []
+    if "sweeps" in outputs:
+        for index, sweep in enumerate(scenario.get("sweeps", [])):
+            size = int(np.prod([len(values) for values in
+                                _sweep_axes(sweep).values()]))
+            ranges.append(("sweep", index, size))
+    if "positions" in outputs:
+        ranges.append(("positions", 0,
+                       len(grid_values(scenario["positions"]["times"]))))
+    for output, index, size in ranges:
+        for chunk, start in enumerate(range(0, size, chunk_size)):
+            tasks.append(Task(f"{output}-{index:03d}-{chunk:05d}",
+                              "sweeps" if output == "sweep" else output,
+                              index, start, min(start + chunk_size, size)))
+    return tasks
+
+
+def _orbit_of(universe, body: str):
+    for orbit in universe.orbits:
+        if orbit.orbiting_body.name == body:
+            return orbit
+    raise ScenarioError(f"{body} does not orbit another body in "
+                        f"{universe.name}")
+
+
+def _universe_for(digest: str, scenario: Dict[str, Any]):
+    """Returns the universe of a scenario, building it on first use in this
+    process."""
+    if digest not in _worker_universes:
+        _worker_universes[digest] = universe_from_specification(
+            scenario["universe"])
+    return _worker_universes[digest]
+
+
+def compute_task(universe, scenario: Dict[str, Any],
+                 task: Task) -> Dict[str, Sequence]:
+    """Computes the rows of a task.
+
+    :param Universe universe: the scenario's universe
+    :param Dict[str, Any] scenario: the scenario
+    :param Task task: the task
+    :return: the columns of the rows
+    :rtype: Dict[str, Sequence]
+    """
+    from service.service import orbit_statistics, orbit_quantities, \
+        sweep_quantities
+    if task.output == "bodies":
+        from celestial_bodies.report import BodyReport
+        return BodyReport.from_bodies(universe.celestial_bodies.values()) \
+            .columns
+    if task.output == "orbits":
+        rows = [orbit_statistics(orbit) for orbit in universe.orbits]
+        return {key: [row[key] for row in rows]
+                for key in (rows[0] if rows else {})}
+    if task.output == "sweeps":
+        sweep = scenario["sweeps"][task.index]
+        orbit = _orbit_of(universe, sweep["body"])
+        axes = _sweep_axes(sweep)
+        # Grid points are addressed by index, so a task never materializes
+        # more of the grid than its own rows
+        points = np.unravel_index(np.arange(task.start, task.stop),
+                                  [len(values) for values in axes.values()])
+        columns = {parameter: values[idx] for (parameter, values), idx
+                   in zip(axes.items(), points)}
+        columns.update(orbit_quantities(
+            orbit, columns.get("semimajor_axis", orbit.semimajor_axis),
+            columns.get("eccentricity", orbit.eccentricity),
+            sweep.get("quantities", sweep_quantities)))
+        return columns
+    # positions: every orbit is propagated to every time of the task at
+    # once, then positions are summed up the graph of orbits
+    times = grid_values(scenario["positions"]["times"])[task.start:task.stop]
+    bodies, parents, orbits = universe.flatten_orbital_graph()
+    positions = np.zeros((len(bodies), len(times), 3))
+    for idx, (parent, orbit) in enumerate(zip(parents, orbits)):
+        if parent >= 0:
+            positions[idx, :, :2] = orbit.position_at(times)
+            positions[idx] += positions[parent]
+    return {
+        "time": np.repeat(times, len(bodies)),
+        "body": [body.name for body in bodies] * len(times),
+        "x": positions[:, :, 0].T.ravel(),
+        "y": positions[:, :, 1].T.ravel(),
+        "z": positions[:, :, 2].T.ravel(),
+    }
+
+
+def _write_part(path: str, columns: Dict[str, Sequence]) -> int:
+    """Writes columns as a CSV file, atomically (a part file either exists
+    complete or not at all), returning the number of rows."""
+    names = list(columns)
+    values = [np.asarray(columns[name]).tolist() for name in names]
+    temporary = path + ".tmp"
+    with open(temporary, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(zip(*values))
+    os.replace(temporary, path)
+    return len(values[0]) if values else 0
+
+
+def run_task(digest: str, scenario: Dict[str, Any], task: Task,
+             directory: str) -> int:
+    """Computes a task and writes its part file (worker task).
+
+    :return: the number of rows written
+    :rtype: int
+    """
+    universe = _universe_for(digest, scenario)
+    return _write_part(os.path.join(directory, f"{task.task_id}.csv"),
+                       compute_task(universe, scenario, task))
+
+
+def scenario_directory(scenario: Dict[str, Any], output: str) -> str:
+    """Returns the directory of a scenario's results under an output
+    directory.
+
+    :param Dict[str, Any] scenario: the scenario
+    :param str output: the output directory
+    :return: the scenario's directory
+    :rtype: str
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", scenario["name"]).strip("_")
+    return os.path.join(output, name or "scenario")
+
+
+def _pending(tasks: List[Task], directory: str) -> List[Task]:
+    return [task for task in tasks if not os.path.exists(
+        os.path.join(directory, f"{task.task_id}.csv"))]
+
+
+# Part files (and their temporary files) of any task of any scenario
+_part_file = re.compile(r"(bodies|orbits|(sweep|positions)-\d{3}-\d{5})"
+                        r"\.csv(\.tmp)?")
+
+
+def _remove_results(directory: str) -> None:
+    """Removes the part files and the manifest of a previous run."""
+    for name in os.listdir(directory):
+        if name == "scenario.json" or _part_file.fullmatch(name):
+            os.remove(os.path.join(directory, name))
+
+
+def estimate_cost(scenario: Dict[str, Any], output: str = None,
+                  workers: int = 1) -> CostEstimate:
+    """Plans a scenario and estimates the time its pending tasks take, by
+    timing up to a few hundred rows of each output.
+
+    :param Dict[str, Any] scenario: the scenario
+    :param str output: the output directory (tasks whose part files exist
+    there are not pending); if None, every task is pending
+    :param int workers: the number of worker processes
+    :return: the estimate
+    :rtype: CostEstimate
+    """
+    validate_scenario(scenario)
+    tasks = plan_tasks(scenario)
+    pending = tasks if output is None else \
+        _pending(tasks, scenario_directory(scenario, output))
+    universe = universe_from_specification(scenario["universe"])
+    seconds = 0.0
+    for kind in {task.output for task in pending}:
+        probe = next(task for task in pending if task.output == kind)
+        probe = probe._replace(stop=probe.start + min(probe.rows,
+                                                      _probe_rows))
+        start = time.perf_counter()
+        compute_task(universe, scenario, probe)
+        per_row = (time.perf_counter() - start) / probe.rows
+        seconds += per_row * sum(task.rows for task in pending
+                                 if task.output == kind)
+    return CostEstimate(len(tasks), len(pending),
+                        sum(task.rows for task in tasks),
+                        sum(task.rows for task in pending),
+                        seconds / max(workers, 1))
+
+
+def run_scenario(scenario: Dict[str, Any], output: str, workers: int = 1,
+                 resume: bool = True,
+                 progress: Callable[[Task, int], None] = None) \
+        -> BatchReport:
+    """Runs a scenario, writing each task's part file under
+    scenario_directory(scenario, output) as soon as the task finishes.
+
+    :param Dict[str, Any] scenario: the scenario
+    :param str output: the output directory
+    :param int workers: the number of worker processes (1 runs in this
+    process)
+    :param bool resume: if True, skip tasks whose part files exist (from an
+    interrupted run); if False, remove the part files and manifest of any
+    previous run and recompute every task
+    :param progress: called with each finished task and its row count
+    :return: the report of the run
+    :rtype: BatchReport
+    :raises: ScenarioError if the directory holds another scenario's
+    results
+    """
+    if workers < 1:
+        raise ValueError(f"workers ({workers}) must be >= 1.")
+    validate_scenario(scenario)
+    digest = specification_digest(scenario)
+    directory = scenario_directory(scenario, output)
+    os.makedirs(directory, exist_ok=True)
+    manifest = os.path.join(directory, "scenario.json")
+    if not resume:
+        _remove_results(directory)
+    elif os.path.exists(manifest):
+        with open(manifest) as f:
+            if json.load(f).get("digest") != digest:
+                raise ScenarioError(f"{directory} holds the results of a "
+                                    f"different scenario.")
+    with open(manifest, "w") as f:
+        json.dump({"digest": digest, "scenario": scenario}, f, indent=2)
+    tasks = plan_tasks(scenario)
+    pending = _pending(tasks, directory) if resume else tasks
+    start = time.perf_counter()
+    rows = 0
+    if workers == 1 or len(pending) <= 1:
+        for task in pending:
+            count = run_task(digest, scenario, task, directory)
+            rows += count
+            if progress is not None:
+                progress(task, count)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_task, digest, scenario, task,
+                                       directory): task for task in pending}
+            for future in as_completed(futures):
+                count = future.result()
+                rows += count
+                if progress is not None:
+                    progress(futures[future], count)
+    return BatchReport(directory, len(pending), len(tasks) - len(pending),
+                       rows, time.perf_counter() - start)
@@ -0,0 +1,159 @@
+import csv
+import os
+import subprocess
+import sys
+import pytest
+from batch.batch import *
+from facts.fact_sheets import planetary_facts, sun_facts
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+earth = planetary_facts["Earth"]
+scenario = {
+    "name": "Earth sweep",
+    "universe": {
+        "bodies": [
+            {"type": "SolarBody", "name": "Sun", "mass": sun_facts["mass"],
+             "radius": sun_facts["radius"],
+             "temperature": sun_facts["mean temperature"]},
+            {"type": "PlanetaryBody", "name": "Earth", "mass": earth["mass"],
+             "radius": earth["radius"]},
+            {"type": "PlanetaryBody", "name": "Moon", "mass": 7.3e+22,
+             "radius": 1737.5},
+        ],
+        "orbits": [
+            {"primary": "Sun", "orbiting": "Earth",
+             "semimajor_axis": earth["distance from sun"],
+             "eccentricity": earth["orbital eccentricity"]},
+            {"primary": "Earth", "orbiting": "Moon",
+             "semimajor_axis": 3.84e+05, "eccentricity": 0.055},
+        ],
+    },
+    "sweeps": [{"body": "Earth",
+                "grid": {"semimajor_axis": {"start": 1e+08, "stop": 3e+08,
+                                            "num": 50},
+                         "eccentricity": [0.0, 0.1, 0.2]},
+                "quantities": ["period", "perihelion"]}],
+    "positions": {"times": {"start": 0, "stop": 365.25, "num": 25}},
+    "chunk_size": 40,
+}
+
+
+def read_parts(directory):
+    return {name: list(csv.DictReader(open(os.path.join(directory, name))))
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".csv")}
+
+
+def test_plan_tasks():
+    tasks = plan_tasks(scenario)
+    assert [task.task_id for task in tasks] == [
+        "bodies", "orbits", "sweep-000-00000", "sweep-000-00001",
+        "sweep-000-00002", "sweep-000-00003", "positions-000-00000"]
+    assert sum(task.rows for task in tasks if task.output == "sweeps") == 150
+    assert [task.task_id for task in plan_tasks(
+        dict(scenario, outputs=["positions"]))] == ["positions-000-00000"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_scenario(tmp_path, workers):
+    report = run_scenario(scenario, str(tmp_path), workers=workers)
+    assert report.completed_tasks == 7 and report.skipped_tasks == 0
+    parts = read_parts(report.directory)
+    sweep = [row for name, rows in parts.items() if name.startswith("sweep")
+             for row in rows]
+    assert len(sweep) == 150
+    # The grid is the cartesian product, eccentricity varying fastest
+    assert [float(row["eccentricity"]) for row in sweep[:4]] == \
+        [0.0, 0.1, 0.2, 0.0]
+    assert float(sweep[0]["perihelion"]) == pytest.approx(1e+08)
+    positions = parts["positions-000-00000.csv"]
+    assert len(positions) == 25 * 3
+    moon = [row for row in positions if row["body"] == "Moon"][0]
+    assert float(moon["x"]) == pytest.approx(
+        earth["distance from sun"] * (1 - earth["orbital eccentricity"]) +
+        3.84e+05 * (1 - 0.055))
+    assert [row["name"] for row in parts["bodies.csv"]] == \
+        ["Sun", "Earth", "Moon"]
+
+
+def test_resume_and_dry_run(tmp_path):
+    output = str(tmp_path)
+    estimate = estimate_cost(scenario, output)
+    assert estimate.pending_tasks == estimate.tasks == 7
+    assert estimate.seconds > 0
+    report = run_scenario(scenario, output)
+    os.remove(os.path.join(report.directory, "sweep-000-00002.csv"))
+    assert estimate_cost(scenario, output).pending_tasks == 1
+    finished = []
+    report = run_scenario(scenario, output,
+                          progress=lambda task, rows: finished.append(
+                              task.task_id))
+    assert finished == ["sweep-000-00002"] and report.skipped_tasks == 6
+    with pytest.raises(ScenarioError):
+        run_scenario(dict(scenario, chunk_size=10), output)
+    with open(os.path.join(report.directory, "notes.txt"), "w") as f:
+        f.write("kept")
+    report = run_scenario(dict(scenario, chunk_size=100), output,
+                          resume=False)
+    assert report.skipped_tasks == 0
+    # The parts of the previous run are removed, other files are kept
+    assert sorted(os.listdir(report.directory)) == [
+        "bodies.csv", "notes.txt", "orbits.csv", "positions-000-00000.csv",
+        "scenario.json", "sweep-000-00000.csv", "sweep-000-00001.csv"]
+    assert len(read_parts(report.directory)["sweep-000-00000.csv"]) == 100
+
+
+def test_invalid_scenarios():
+    with pytest.raises(ScenarioError):
+        validate_scenario(dict(scenario, outputs=["plots"]))
+    with pytest.raises(ScenarioError):
+        validate_scenario(dict(scenario, sweeps=[
+            {"body": "Sun", "grid": {"eccentricity": [0.1]}}]))
+    with pytest.raises(ScenarioError):
+        validate_scenario(dict(scenario, sweeps=[
+            {"body": "Earth", "grid": {"mass": [1.0]}}]))
+    with pytest.raises(ScenarioError):
+        grid_values({"start": 1, "stop": 2})
+
+
+def test_command_line(tmp_path):
+    path = tmp_path / "scenario.toml"
+    path.write_text(f"""name = "TOML"
+chunk_size = 5
+outputs = ["sweeps"]
+
+[[universe.bodies]]
+type = "SolarBody"
+name = "Sun"
+mass = {sun_facts["mass"]}
+radius = {sun_facts["radius"]}
+temperature = {sun_facts["mean temperature"]}
+
+[[universe.bodies]]
+type = "PlanetaryBody"
+name = "Earth"
+mass = {earth["mass"]}
+radius = {earth["radius"]}
+
+[[universe.orbits]]
+primary = "Sun"
+orbiting = "Earth"
+semimajor_axis = {earth["distance from sun"]}
+eccentricity = {earth["orbital eccentricity"]}
+
+[[sweeps]]
+body = "Earth"
+quantities = ["period"]
+grid.eccentricity = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+""")
+    assert load_scenario(str(path))["sweeps"][0]["body"] == "Earth"
+    command = [sys.executable, "-m", "batch", str(path), "--output",
+               str(tmp_path / "results"), "--workers", "2"]
+    dry_run = subprocess.run(command + ["--dry-run"], cwd=root,
+                             capture_output=True, text=True, check=True)
+    assert dry_run.stdout.startswith("TOML: 2 of 2 tasks pending")
+    run = subprocess.run(command, cwd=root, capture_output=True, text=True,
+                         check=True)
+    assert "2 tasks run, 0 resumed, 6 rows" in run.stdout
+    assert len(os.listdir(tmp_path / "results" / "TOML")) == 3
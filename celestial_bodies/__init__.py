@@ -0,0 +1,10 @@
+from utilities.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "CelestialBody": "celestial_bodies.celestial_bodies",
+    "BlackHole": "celestial_bodies.celestial_bodies",
+    "Barycenter": "celestial_bodies.celestial_bodies",
+    "SolarBody": "celestial_bodies.celestial_bodies",
+    "PlanetaryBody": "celestial_bodies.celestial_bodies",
+    "BodyReport": "celestial_bodies.report",
+})
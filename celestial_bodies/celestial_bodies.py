@@ -1,5 +1,6 @@
 import math
 import re
+from facts.numerical_constants import meters_in_a_kilometer
 from gravity import gravity
 from luminosity import luminosity
 from utilities import basic_math
@@ -29,7 +30,7 @@ class CelestialBody:
 
         :param float mass: the mass of the celestial body in kilograms
         :param float radius: the radius of the celestial body (assumed to be
-        roughly spherical) in meters
+        roughly spherical) in kilometers
         :param str name: the name of the celestial body (if None is supplied,
         will default to "Unnamed" celestial body
         """
@@ -132,7 +133,7 @@ class CelestialBody:
         :rtype: float
         """
         return basic_math.calculate_density(self.mass, self.volume *
-                                            math.pow(1000, 3))
+                                            math.pow(meters_in_a_kilometer, 3))
 
     @property
     def gravitational_acceleration(self):
@@ -173,7 +174,46 @@ class BlackHole(CelestialBody):
         :return: radius of event horizon of the black hole in kilometers
         :rtype: float
         """
-        return gravity.calculate_schwarzschild_radius(self.mass) / 1000
+        return gravity.calculate_schwarzschild_radius(self.mass) / \
+            meters_in_a_kilometer
+
+
+class Barycenter(CelestialBody):
+    """subclasses CelestialBody : is a CelestialBody
+
+    The center of mass of bodies orbiting each other (e.g., the two stars
+    of a binary, or an inner binary and the third star of a triple). It
+    stands in as the shared primary body of the orbital graph: its members
+    orbit it on BarycentricOrbits, while bodies orbiting all the members at
+    once (e.g., circumbinary planets) orbit it on ordinary Orbits.
+
+    A barycenter has the combined mass of its members, but no size or
+    matter of its own.
+    """
+
+    def __init__(self, mass: float, name: str = None):
+        """
+        :param float mass: the combined mass of the members in kilograms
+        :param str name: the name of the barycenter (e.g., "Alpha Centauri
+        AB")
+        """
+        super().__init__(mass, 0.0, name)
+        self.members = []
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.mass})"
+
+    @property
+    def volume(self) -> float:
+        return 0.0
+
+    @property
+    def density(self) -> float:
+        return math.nan
+
+    @property
+    def gravitational_acceleration(self) -> float:
+        return math.nan
 
 
 class SolarBody(CelestialBody):
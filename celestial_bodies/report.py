@@ -0,0 +1,278 @@
+"""Columnar reports of the statistics of many celestial bodies.
+
+CelestialBody.__str__ and PlanetaryBody.calculate_weight_on_surface compute
+the statistics of one body (and one object mass) at a time, through
+validated scalar functions. A BodyReport computes the same statistics for
+every body at once, as columns of numpy arrays evaluated by the array
+kernels, and exports them as CSV, JSON or Markdown.
+
+Columns (in the units of CelestialBody.default_unit):
+    name, type, mass, radius, volume, density, gravitational_acceleration
+    temperature, luminosity, classification, chromaticity: solar bodies
+    only (NaN or "" for other bodies)
+    weight_<mass>kg: the weight (in kilograms) of an object of the given
+    mass on the surface of each planetary body (NaN for other bodies)
+"""
+import io
+import json
+import math
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, \
+    Sequence, TextIO, Union
+import numpy as np
+from celestial_bodies.celestial_bodies import CelestialBody, SolarBody, \
+    PlanetaryBody, Barycenter
+from facts.numerical_constants import gravity_on_earth, \
+    meters_in_a_kilometer
+from kernels import kernels
+from luminosity.luminosity import classify_harvard_spectral_classifications
+
+report_formats = ("csv", "json", "markdown")
+
+
+class BodyReport:
+    """A table of statistics with one row per celestial body.
+
+    Example:
+        report = BodyReport.from_bodies(universe.celestial_bodies.values(),
+                                        object_masses=(1, 70, 1000))
+        report.export("bodies.md", "markdown")
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray],
+                 units: Dict[str, str] = None) -> None:
+        """
+        :param Dict[str, np.ndarray] columns: the columns of the table, in
+        order, each with one value per body
+        :param Dict[str, str] units: the unit of each column that has one
+        """
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Every column must have the same length.")
+        self.columns = columns
+        self.units = units or {}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self)} bodies, " \
+            f"{len(self.columns)} columns)"
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    @classmethod
+    def from_columns(cls, names: Sequence[str], body_types: Sequence[str],
+                     mass, radius, temperature=None,
+                     object_masses: Sequence[float] = (70,),
+                     backend: str = "numpy") -> "BodyReport":
+        """Computes the report of bodies given as arrays.
+
+        :param Sequence[str] names: the name of each body
+        :param Sequence[str] body_types: the class name of each body (e.g.,
+        "PlanetaryBody")
+        :param mass: masses in kilograms
+        :param radius: radii in kilometers
+        :param temperature: temperatures in Kelvin (used for solar bodies
+        only); defaults to NaN
+        :param Sequence[float] object_masses: the masses (in kilograms) of
+        the objects whose weight is reported on each planetary body
+        :param str backend: the kernel backend (see kernels)
+        :return: the report
+        :rtype: BodyReport
+        """
+        backend = kernels.get_backend(backend)
+        names = np.asarray(names, dtype=str)
+        body_types = np.asarray(body_types, dtype=str)
+        mass = np.asarray(mass, dtype=float)
+        radius = np.asarray(radius, dtype=float)
+        if temperature is None:
+            temperature = np.full(len(mass), np.nan)
+        temperature = np.asarray(temperature, dtype=float)
+        volume = radius ** 3 * math.pi * (4 / 3)
+        # Barycenters have no size, and so no density or surface gravity
+        barycenter = body_types == Barycenter.__name__
+        with np.errstate(divide="ignore", invalid="ignore"):
+            density = mass / (volume * meters_in_a_kilometer ** 3)
+            acceleration = np.asarray(backend.gravitational_acceleration(
+                mass, radius), dtype=float)
+        density = np.where(barycenter, np.nan, density)
+        acceleration = np.where(barycenter, np.nan, acceleration)
+        solar = body_types == SolarBody.__name__
+        planetary = body_types == PlanetaryBody.__name__
+        temperature = np.where(solar, temperature, np.nan)
+        luminosity = np.full(len(mass), np.nan)
+        luminosity[solar] = backend.stefan_boltzmann_luminosity(
+            radius[solar], temperature[solar])
+        classification, chromaticity = \
+            classify_harvard_spectral_classifications(temperature)
+        columns = {
+            "name": names,
+            "type": body_types,
+            "mass": mass,
+            "radius": radius,
+            "volume": volume,
+            "density": density,
+            "gravitational_acceleration": acceleration,
+            "temperature": temperature,
+            "luminosity": luminosity,
+            "classification": classification,
+            "chromaticity": chromaticity,
+        }
+        units = {field: CelestialBody.default_unit[unit] for field, unit in (
+            ("mass", "mass"), ("radius", "distance"), ("volume", "volume"),
+            ("density", "density"),
+            ("gravitational_acceleration", "gravitational_acceleration"),
+            ("luminosity", "luminosity"))}
+        units["temperature"] = "Kelvin"
+        # Weight on the surface, in kilograms on Earth: m g / g_earth
+        weights = np.where(planetary, acceleration / gravity_on_earth,
+                           np.nan)[:, None] * np.asarray(
+            object_masses, dtype=float)[None, :]
+        for idx, object_mass in enumerate(object_masses):
+            column = f"weight_{object_mass:g}kg"
+            columns[column] = weights[:, idx]
+            units[column] = "kilograms"
+        return cls(columns, units)
+
+    @classmethod
+    def from_bodies(cls, bodies: Iterable[CelestialBody],
+                    object_masses: Sequence[float] = (70,),
+                    backend: str = "numpy") -> "BodyReport":
+        """Computes the report of celestial bodies.
+
+        :param Iterable[CelestialBody] bodies: the bodies
+        :param Sequence[float] object_masses: the masses (in kilograms) of
+        the objects whose weight is reported on each planetary body
+        :param str backend: the kernel backend (see kernels)
+        :return: the report
+        :rtype: BodyReport
+        """
+        bodies = list(bodies)
+        return cls.from_columns(
+            [body.name for body in bodies],
+            [body.__class__.__name__ for body in bodies],
+            [body.mass for body in bodies], [body.radius for body in bodies],
+            [getattr(body, "temperature", np.nan) for body in bodies],
+            object_masses, backend)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Returns the rows of the table, with NaN as None.
+
+        :return: one dictionary per body
+        :rtype: List[Dict[str, Any]]
+        """
+        names = list(self.columns)
+        values = [_plain(self.columns[name]) for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def to_csv(self, precision: int = None) -> str:
+        """Returns the table as CSV, with an empty field for NaN.
+
+        :param int precision: the significant digits of numbers; if None,
+        numbers are written exactly
+        :return: the CSV text
+        :rtype: str
+        """
+        number_format = repr if precision is None else \
+            f"{{:.{precision}g}}".format
+        cells = [_format_column(values, number_format, ',"\n\r', _quote_csv)
+                 for values in self.columns.values()]
+        header = ",".join(self.columns)
+        return "\n".join([header] + list(map(",".join, zip(*cells)))) + \
+            "\n"
+
+    def to_json(self) -> str:
+        """Returns the table as JSON: the units and a list of rows.
+
+        :return: the JSON text
+        :rtype: str
+        """
+        return json.dumps({"units": self.units, "bodies": self.records()})
+
+    def to_markdown(self, precision: int = 4) -> str:
+        """Returns the table as a Markdown table, with units in the header.
+
+        :param int precision: the significant digits of numbers
+        :return: the Markdown text
+        :rtype: str
+        """
+        header = [f"{name} ({self.units[name]})" if name in self.units
+                  else name for name in self.columns]
+        cells = [_format_column(values, f"{{:.{precision}g}}".format, "|",
+                                _escape_markdown)
+                 for values in self.columns.values()]
+        lines = ["| " + " | ".join(header) + " |",
+                 "|" + "|".join(["---"] * len(header)) + "|"]
+        lines.extend("| " + " | ".join(row) + " |" for row in zip(*cells))
+        return "\n".join(lines) + "\n"
+
+    def export(self, target: Union[str, TextIO, BinaryIO] = None,
+               report_format: str = "csv") -> Union[str, None]:
+        """Exports the table to a file (or returns it as text).
+
+        :param target: a path or file object; if None, the text is returned
+        :param str report_format: "csv", "json" or "markdown"
+        :return: the text if no target was given
+        :rtype: Union[str, None]
+        """
+        if report_format not in report_formats:
+            raise ValueError(f"Unknown report format {report_format}; "
+                             f"choose from {', '.join(report_formats)}")
+        text = getattr(self, f"to_{report_format}")()
+        if target is None:
+            return text
+        if isinstance(target, str):
+            with open(target, "w", newline="") as f:
+                f.write(text)
+        elif isinstance(target, io.TextIOBase):
+            target.write(text)
+        else:
+            target.write(text.encode("utf-8"))
+
+
+def _plain(values: np.ndarray) -> list:
+    """Converts a column to Python values, with NaN as None."""
+    plain = values.tolist()
+    if values.dtype.kind == "f":
+        missing = np.flatnonzero(np.isnan(values))
+        for idx in missing:
+            plain[idx] = None
+    return plain
+
+
+def _quote_csv(text: str) -> str:
+    """Quotes a CSV field."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _escape_markdown(text: str) -> str:
+    """Escapes the cell delimiter of a Markdown table."""
+    return text.replace("|", "\\|")
+
+
+def _format_column(values: np.ndarray, number_format: Callable[[float], str],
+                   special: str, escape: Callable[[str], str]) -> List[str]:
+    """Formats a column as text, with "" for NaN, escaping text that
+    contains any of the special characters. Whole columns are formatted at
+    once (rather than row by row) to keep exports of large tables fast.
+
+    :param np.ndarray values: the column
+    :param Callable[[float], str] number_format: formats a number
+    :param str special: characters that require text to be escaped
+    :param Callable[[str], str] escape: escapes text
+    :return: the formatted column
+    :rtype: List[str]
+    """
+    if values.dtype.kind != "f":
+        text = values.astype(str)
+        cells = np.array(text.tolist(), dtype=object)
+        needs_escape = np.zeros(len(text), dtype=bool)
+        for character in special:
+            needs_escape |= np.char.find(text, character) >= 0
+        cells[needs_escape] = [escape(cell) for cell in cells[needs_escape]]
+        return cells.tolist()
+    cells = np.full(len(values), "", dtype=object)
+    present = ~np.isnan(values)
+    cells[present] = list(map(number_format, values[present].tolist()))
+    return cells.tolist()
@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+import math
+import pytest
+from celestial_bodies.celestial_bodies import *
+from celestial_bodies.report import *
+from facts.fact_sheets import planetary_facts, sun_facts
+
+bodies = [SolarBody(sun_facts["mass"], sun_facts["radius"],
+                    sun_facts["mean temperature"], name="Sun"),
+          BlackHole(1e31, name="Black Hole")] + \
+    [PlanetaryBody(facts["mass"], facts["radius"], name=name)
+     for name, facts in planetary_facts.items()]
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_matches_scalar_statistics(backend):
+    report = BodyReport.from_bodies(bodies, object_masses=(1, 70),
+                                    backend=backend)
+    assert len(report) == len(bodies)
+    for idx, body in enumerate(bodies):
+        assert report["name"][idx] == body.name
+        assert math.isclose(report["volume"][idx], body.volume)
+        assert math.isclose(report["density"][idx], body.density)
+        assert math.isclose(report["gravitational_acceleration"][idx],
+                            body.gravitational_acceleration)
+        if isinstance(body, PlanetaryBody):
+            assert math.isclose(report["weight_70kg"][idx],
+                                body.calculate_weight_on_surface(70))
+        else:
+            assert math.isnan(report["weight_70kg"][idx])
+    assert math.isclose(report["luminosity"][0], bodies[0].luminosity)
+    assert report["classification"][0] == \
+        bodies[0].harvard_spectral_classification
+    assert report["chromaticity"][1] == ""
+
+
+def test_export_formats(tmp_path):
+    report = BodyReport.from_bodies(bodies)
+    rows = list(csv.DictReader(io.StringIO(report.export())))
+    assert rows[0]["name"] == "Sun" and rows[1]["temperature"] == ""
+    assert float(rows[0]["mass"]) == sun_facts["mass"]
+    document = json.loads(report.export(report_format="json"))
+    assert document["bodies"][1]["luminosity"] is None
+    assert document["units"]["density"] == "kilograms per cubic meter"
+    markdown = report.to_markdown(precision=3)
+    lines = markdown.splitlines()
+    assert len(lines) == len(bodies) + 2
+    assert lines[0].startswith("| name | type | mass (kilograms)")
+    path = tmp_path / "report.md"
+    report.export(str(path), "markdown")
+    assert path.read_text() == report.to_markdown()
+    with pytest.raises(ValueError):
+        report.export(report_format="xlsx")
+
+
+def test_text_is_escaped():
+    report = BodyReport.from_bodies([
+        PlanetaryBody(1e24, 1000, name='Planet "X", the | tenth')])
+    row = next(csv.DictReader(io.StringIO(report.to_csv())))
+    assert row["name"] == 'Planet "X", the | tenth'
+    assert "the \\| tenth" in report.to_markdown()
@@ -0,0 +1,95 @@
+"""Fixtures shared by the tests of every package."""
+import copy
+import numpy as np
+import pytest
+from celestial_bodies.celestial_bodies import SolarBody, PlanetaryBody
+from facts.fact_sheets import planetary_facts, sun_facts
+from facts.numerical_constants import gravitational_constant
+from orbital_dynamics.orbit import Orbit
+from universe.universe import Universe
+
+_specification = {
+    "name": "Solar System",
+    "bodies": [
+        {"type": "SolarBody", "name": "Sun", "mass": sun_facts["mass"],
+         "radius": sun_facts["radius"],
+         "temperature": sun_facts["mean temperature"]},
+        {"type": "PlanetaryBody", "name": "Earth",
+         "mass": planetary_facts["Earth"]["mass"],
+         "radius": planetary_facts["Earth"]["radius"]},
+    ],
+    "orbits": [
+        {"primary": "Sun", "orbiting": "Earth",
+         "semimajor_axis": planetary_facts["Earth"]["distance from sun"],
+         "eccentricity": planetary_facts["Earth"]["orbital eccentricity"]},
+    ],
+}
+
+
+def _build_universe(planet_names, moon=False):
+    universe = Universe("Test")
+    sun = SolarBody(sun_facts["mass"], sun_facts["radius"],
+                    sun_facts["mean temperature"], name="Sun")
+    universe.add_celestial_body(sun)
+    for name in planet_names:
+        facts = planetary_facts[name]
+        planet = PlanetaryBody(facts["mass"], facts["radius"], name=name)
+        universe.add_celestial_body(planet)
+        universe.add_orbit(Orbit(sun, planet, facts["distance from sun"],
+                                 facts["orbital eccentricity"]))
+    if moon:
+        facts = planetary_facts["Moon"]
+        luna = PlanetaryBody(facts["mass"], facts["radius"], name="Moon")
+        universe.add_celestial_body(luna)
+        universe.add_orbit(Orbit(universe.celestial_bodies["Earth"], luna,
+                                 3.84e+05, 0.055))
+    return universe
+
+
+def _total_energy(propagator):
+    positions, velocities = propagator.barycentric_state()
+    masses = propagator.masses
+    kinetic = 0.5 * (masses * (velocities ** 2).sum(axis=1)).sum() * 1e6
+    potential = 0.0
+    for i in range(len(masses)):
+        for j in range(i + 1, len(masses)):
+            distance = np.linalg.norm(positions[i] - positions[j]) * 1000
+            potential -= gravitational_constant * masses[i] * masses[j] / \
+                distance
+    return kinetic + potential
+
+
+@pytest.fixture
+def build_universe():
+    """Returns a function building a Universe of the Sun and the named
+    planets on their orbits from the fact sheets (and, with moon=True, the
+    Moon around the Earth)."""
+    return _build_universe
+
+
+@pytest.fixture
+def two_systems(build_universe):
+    """Returns a Universe of two unrelated trees: the Sun and the Earth, and
+    a second star with a planet of its own."""
+    universe = build_universe(["Earth"])
+    star = SolarBody(sun_facts["mass"], sun_facts["radius"],
+                     sun_facts["mean temperature"], name="Alpha")
+    planet = PlanetaryBody(planetary_facts["Mars"]["mass"],
+                           planetary_facts["Mars"]["radius"], name="Beta")
+    universe.add_celestial_body(star)
+    universe.add_celestial_body(planet)
+    universe.add_orbit(Orbit(star, planet, 2e+08, 0.1))
+    return universe
+
+
+@pytest.fixture
+def total_energy():
+    """Returns a function computing the total energy (Joules) of the
+    barycentric state of a propagator, pair by pair."""
+    return _total_energy
+
+
+@pytest.fixture
+def specification():
+    """Returns the specification of a universe of the Sun and the Earth."""
+    return copy.deepcopy(_specification)
@@ -6,3 +6,9 @@ solar_mass = 1.989e+30
 astronomical_unit = 1.496e+8
 pounds_in_a_kilogram = 2.20462
 gravity_on_earth = 9.8
+solar_radius = 695700
+solar_temperature = 5778
+earth_mass = 5.97e+24
+earth_radius = 6378.0
+meters_in_a_kilometer = 1000
+seconds_in_a_day = 86400
@@ -0,0 +1,7 @@
+from utilities.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "DirectSumResult": "gravity.direct_sum",
+    "calculate_accelerations": "gravity.direct_sum",
+    "calculate_potential_energy": "gravity.direct_sum",
+})
@@ -0,0 +1,277 @@
+"""Exact all-pairs (direct-sum) gravitational accelerations.
+
+This is the reference solver: it makes no approximation beyond optional
+Plummer softening, and approximate solvers should be validated against it
+(see relative_acceleration_error).
+
+The bodies are processed in cache-sized tiles. Each pair of tiles (I, J)
+with I <= J is evaluated once, and Newton's third law is used to apply the
+result to both tiles, so every pair separation and inverse cube is computed
+exactly once. Rows of tiles are dealt out round-robin to a thread or
+process pool, each worker accumulating into a private buffer which is
+summed at the end. Process workers read the bodies from, and accumulate
+into, shared memory (see utilities.shared_arrays), so neither the bodies
+nor the buffers are pickled. The pull at each separation is computed by
+the gravitational_acceleration kernel of the active (or given) backend
+(see kernels).
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import NamedTuple, List, Tuple
+import numpy as np
+from facts.numerical_constants import gravitational_constant, \
+    meters_in_a_kilometer
+from kernels import kernels
+from utilities.shared_arrays import SharedArrays, call_attached
+
+
+class DirectSumResult(NamedTuple):
+    """Accelerations computed by calculate_accelerations, with the
+    achieved throughput."""
+    accelerations: np.ndarray
+    pair_interactions: int
+    elapsed: float
+
+    @property
+    def pairs_per_second(self) -> float:
+        """Returns the number of pair interactions evaluated per second.
+
+        :return: pair interactions per second
+        :rtype: float
+        """
+        if self.elapsed <= 0:
+            return float("inf")
+        return self.pair_interactions / self.elapsed
+
+
+def _validate_bodies(positions, masses) -> Tuple[np.ndarray, np.ndarray]:
+    """Validates and converts body arrays.
+
+    :return: positions as an (n, d) float array and masses as an (n,) float
+    array
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    :raises: TypeError, ValueError
+    """
+    try:
+        positions = np.asarray(positions, dtype=float)
+        masses = np.asarray(masses, dtype=float)
+    except (TypeError, ValueError):
+        raise TypeError(f"positions and masses must be arrays of Real "
+                        f"numbers.") from None
+    if positions.ndim != 2 or positions.shape[1] not in (2, 3):
+        raise ValueError(f"positions must have shape (n, 2) or (n, 3), not "
+                         f"{positions.shape}.")
+    if masses.shape != (positions.shape[0],):
+        raise ValueError(f"masses must have shape ({positions.shape[0]},), "
+                         f"not {masses.shape}.")
+    if np.any(masses <= 0):
+        raise ValueError(f"masses must be greater than 0.")
+    return positions, masses
+
+
+def _check_separations(positions: np.ndarray, softening: float) -> None:
+    """Raises a ValueError naming two bodies at the same position if there
+    is no softening to keep their separation finite (sorting the positions
+    finds them without evaluating every pair)."""
+    if softening > 0 or len(positions) < 2:
+        return
+    order = np.lexsort(positions.T[::-1])
+    ordered = positions[order]
+    coincident = np.flatnonzero(np.all(ordered[1:] == ordered[:-1], axis=1))
+    if len(coincident) > 0:
+        first, second = sorted(order[coincident[0]:coincident[0] + 2])
+        raise ValueError(f"Bodies {first} and {second} are at the same "
+                         f"position; use a positive softening.")
+
+
+def _tile_bounds(n_bodies: int, tile_size: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + tile_size, n_bodies))
+            for start in range(0, n_bodies, tile_size)]
+
+
+def _accumulate_tile_rows(positions: np.ndarray, masses: np.ndarray,
+                          softening: float, tile_size: int,
+                          rows: List[int], backend: str = None,
+                          accumulated: np.ndarray = None) -> np.ndarray:
+    """Accumulates G m_j (r_j - r_i) / |r_j - r_i|^3 for every tile pair
+    (I, J) with I in rows and J >= I, with the pull of a unit mass at each
+    separation from the gravitational_acceleration kernel of the backend.
+
+    :param str backend: the name of the kernel backend
+    :param np.ndarray accumulated: the (n, d) buffer to accumulate into;
+    defaults to a new buffer of zeros
+    :return: (n, d) array of partial sums in meters / second squared
+    :rtype: np.ndarray
+    """
+    bounds = _tile_bounds(len(masses), tile_size)
+    if accumulated is None:
+        accumulated = np.zeros_like(positions)
+    softening_squared = softening * softening
+    acceleration = kernels.get_backend(backend).array_kernel(
+        "gravitational_acceleration")
+    for row in rows:
+        i0, i1 = bounds[row]
+        positions_i = positions[i0:i1]
+        masses_i = masses[i0:i1]
+        for j0, j1 in bounds[row:]:
+            # dx[a, b] points from body a (tile I) to body b (tile J)
+            dx = positions[None, j0:j1] - positions_i[:, None]
+            distance_squared = np.einsum("abk,abk->ab", dx, dx) + \
+                softening_squared
+            if j0 == i0:
+                np.fill_diagonal(distance_squared, np.inf)
+            distance = np.sqrt(distance_squared)
+            # G / |r|^2 (meters / second squared per kilogram) along the
+            # unit vector dx / |r|
+            pull = acceleration(1.0, distance) / distance
+            accumulated[i0:i1] += np.einsum(
+                "ab,abk->ak", pull * masses[None, j0:j1], dx)
+            if j0 != i0:
+                # Newton's third law: equal and opposite on tile J
+                accumulated[j0:j1] -= np.einsum(
+                    "ab,abk->bk", pull * masses_i[:, None], dx)
+    return accumulated
+
+
+def _accumulate_shared_tile_rows(arrays, worker: int, softening: float,
+                                 tile_size: int, rows: List[int],
+                                 backend: str) -> None:
+    """Accumulates tile rows (see _accumulate_tile_rows) of shared bodies
+    into the worker's shared buffer."""
+    _accumulate_tile_rows(arrays["positions"], arrays["masses"], softening,
+                          tile_size, rows, backend,
+                          arrays["accumulated"][worker])
+
+
+def calculate_accelerations(positions, masses, softening: float = 0.0,
+                            tile_size: int = 64, workers: int = 1,
+                            executor: str = "thread",
+                            backend: str = None) -> DirectSumResult:
+    """Calculates the exact gravitational acceleration of every body due to
+    every other body.
+
+    Formula: a_i = G * sum_j m_j (r_j - r_i) / (|r_j - r_i|^2 + eps^2)^3/2
+
+    :param positions: (n, 2) or (n, 3) array of positions in kilometers
+    :param masses: (n,) array of masses in kilograms
+    :param float softening: Plummer softening length (eps) in kilometers,
+    which keeps near-zero separations finite (without it, bodies must not
+    share a position)
+    :param int tile_size: the number of bodies per tile; the default keeps
+    a tile pair's temporaries (tile_size^2 x d doubles) within L2 cache
+    :param int workers: the number of workers; 1 evaluates in the calling
+    thread, None uses every CPU
+    :param str executor: "thread" or "process"
+    :param str backend: the kernel backend (see kernels.get_backend);
+    defaults to the active backend
+    :return: accelerations in meters / second squared, and the number of
+    pair interactions per second achieved
+    :rtype: DirectSumResult
+    :raises: ValueError if two bodies share a position without softening
+    """
+    positions, masses = _validate_bodies(positions, masses)
+    if softening < 0:
+        raise ValueError(f"softening ({softening}) must be >= 0.")
+    _check_separations(positions, softening)
+    if tile_size < 1:
+        raise ValueError(f"tile_size ({tile_size}) must be at least 1.")
+    if executor not in ("thread", "process"):
+        raise ValueError(f"executor ({executor}) must be 'thread' or "
+                         f"'process'.")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # Resolved here, so that workers use the caller's active backend
+    backend = kernels.get_backend(backend).name
+    n_tiles = len(_tile_bounds(len(masses), tile_size))
+    workers = max(1, min(workers, n_tiles))
+    start = time.perf_counter()
+    if workers == 1:
+        accelerations = _accumulate_tile_rows(
+            positions, masses, softening, tile_size, list(range(n_tiles)),
+            backend)
+    else:
+        # Round-robin rows so that every worker gets long and short rows
+        assignments = [list(range(k, n_tiles, workers))
+                       for k in range(workers)]
+        if executor == "thread":
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_accumulate_tile_rows, positions,
+                                       masses, softening, tile_size, rows,
+                                       backend)
+                           for rows in assignments]
+                accelerations = sum(future.result() for future in futures)
+        else:
+            with SharedArrays({"positions": positions, "masses": masses},
+                              {"accumulated": ((workers,) + positions.shape,
+                                               float)}) as shared, \
+                    ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(call_attached, shared.handle,
+                                       _accumulate_shared_tile_rows, worker,
+                                       softening, tile_size, rows, backend)
+                           for worker, rows in enumerate(assignments)]
+                for future in futures:
+                    future.result()
+                accelerations = shared["accumulated"].sum(axis=0)
+    elapsed = time.perf_counter() - start
+    n_bodies = len(masses)
+    return DirectSumResult(accelerations, n_bodies * (n_bodies - 1) // 2,
+                           elapsed)
+
+
+def calculate_potential_energy(positions, masses, softening: float = 0.0,
+                               tile_size: int = 64) -> float:
+    """Calculates the exact gravitational potential energy of a system of
+    bodies, tile by tile (each pair is evaluated once).
+
+    Formula: U = -G * sum_i<j m_i m_j / (|r_j - r_i|^2 + eps^2)^1/2
+
+    :param positions: (n, 2) or (n, 3) array of positions in kilometers
+    :param masses: (n,) array of masses in kilograms
+    :param float softening: Plummer softening length (eps) in kilometers
+    (without it, bodies must not share a position)
+    :param int tile_size: the number of bodies per tile
+    :return: potential energy in Joules
+    :rtype: float
+    :raises: ValueError if two bodies share a position without softening
+    """
+    positions, masses = _validate_bodies(positions, masses)
+    if softening < 0:
+        raise ValueError(f"softening ({softening}) must be >= 0.")
+    _check_separations(positions, softening)
+    if tile_size < 1:
+        raise ValueError(f"tile_size ({tile_size}) must be at least 1.")
+    bounds = _tile_bounds(len(masses), tile_size)
+    softening_squared = softening * softening
+    total = 0.0
+    for row, (i0, i1) in enumerate(bounds):
+        for j0, j1 in bounds[row:]:
+            dx = positions[None, j0:j1] - positions[i0:i1, None]
+            distance_squared = np.einsum("abk,abk->ab", dx, dx) + \
+                softening_squared
+            if j0 == i0:
+                # Count each pair within the tile once
+                distance_squared[np.tril_indices(i1 - i0)] = np.inf
+            total += masses[i0:i1] @ (distance_squared ** -0.5) @ \
+                masses[j0:j1]
+    # kg^2 / km -> Joules
+    return -gravitational_constant * total / meters_in_a_kilometer
+
+
+def relative_acceleration_error(reference, candidate) -> np.ndarray:
+    """Returns the per-body relative error of candidate accelerations (e.g.,
+    from an approximate solver) against reference accelerations from
+    calculate_accelerations.
+
+    :param reference: (n, d) array of reference accelerations
+    :param candidate: (n, d) array of candidate accelerations
+    :return: (n,) array of |a_candidate - a_reference| / |a_reference|
+    :rtype: np.ndarray
+    """
+    reference = np.asarray(reference, dtype=float)
+    candidate = np.asarray(candidate, dtype=float)
+    if reference.shape != candidate.shape:
+        raise ValueError(f"reference {reference.shape} and candidate "
+                         f"{candidate.shape} must have the same shape.")
+    return np.linalg.norm(candidate - reference, axis=1) / \
+        np.linalg.norm(reference, axis=1)
@@ -1,7 +1,7 @@
 import math
 from numbers import Real
 from facts.numerical_constants import gravitational_constant, \
-    speed_of_light
+    speed_of_light, meters_in_a_kilometer
 
 
 def calculate_gravitational_force_between_two_objects(
@@ -28,7 +28,7 @@ def calculate_gravitational_force_between_two_objects(
     if distance <= 0:
         raise ValueError(f"distance ({distance}) must be greater than 0.")
     return (gravitational_constant * mass_one * mass_two) \
-           / math.pow(distance * 1000, 2)
+           / math.pow(distance * meters_in_a_kilometer, 2)
 
 
 def calculate_gravitational_acceleration(mass: float, radius: float) -> float:
@@ -48,7 +48,8 @@ def calculate_gravitational_acceleration(mass: float, radius: float) -> float:
         raise TypeError(f"radius ({radius}) must be a Real number.")
     if radius <= 0:
         raise ValueError(f"radius ({radius}) must be greater than 0.")
-    return (gravitational_constant * mass) / math.pow(radius * 1000, 2)
+    return (gravitational_constant * mass) / math.pow(
+        radius * meters_in_a_kilometer, 2)
 
 
 def calculate_schwarzschild_radius(mass: float) -> float:
@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+from gravity.direct_sum import *
+from gravity.gravity import calculate_gravitational_force_between_two_objects
+
+
+def naive_accelerations(positions, masses, softening=0.0):
+    accelerations = np.zeros_like(positions)
+    for i in range(len(masses)):
+        for j in range(len(masses)):
+            if i != j:
+                dx = positions[j] - positions[i]
+                r2 = dx @ dx + softening ** 2
+                accelerations[i] += masses[j] * dx / r2 ** 1.5
+    return accelerations * 6.673e-11 / 1e6
+
+
+@pytest.fixture
+def bodies():
+    rng = np.random.default_rng(42)
+    return rng.normal(size=(103, 3)) * 1e6, rng.uniform(1e20, 1e24, 103)
+
+
+@pytest.mark.parametrize("tile_size,workers,executor", [
+    (64, 1, "thread"),
+    (7, 1, "thread"),
+    (16, 3, "thread"),
+    (32, 2, "process"),
+])
+def test_calculate_accelerations(bodies, tile_size, workers, executor):
+    positions, masses = bodies
+    result = calculate_accelerations(positions, masses, tile_size=tile_size,
+                                     workers=workers, executor=executor)
+    assert np.allclose(result.accelerations,
+                       naive_accelerations(positions, masses), rtol=1e-10)
+    assert result.pair_interactions == 103 * 102 // 2
+    assert result.pairs_per_second > 0
+
+
+def test_softening(bodies):
+    positions, masses = bodies
+    result = calculate_accelerations(positions, masses, softening=1e5,
+                                     tile_size=10)
+    assert np.allclose(result.accelerations,
+                       naive_accelerations(positions, masses, 1e5),
+                       rtol=1e-10)
+
+
+def test_two_body_matches_law_of_gravitation():
+    positions = np.array([[0.0, 0.0, 0.0], [6.38e+03, 0.0, 0.0]])
+    masses = np.array([5.98e+24, 100.0])
+    accelerations = calculate_accelerations(positions, masses).accelerations
+    force = calculate_gravitational_force_between_two_objects(
+        5.98e+24, 100.0, 6.38e+03)
+    assert np.isclose(-accelerations[1, 0] * 100.0, force)
+    # Momentum is conserved
+    assert np.allclose((accelerations * masses[:, None]).sum(axis=0), 0,
+                       atol=force * 1e-12)
+
+
+@pytest.mark.parametrize("positions,masses", [
+    (np.zeros((3, 4)), np.ones(3)),
+    (np.zeros((3, 3)), np.ones(2)),
+    (np.zeros((3, 3)), -np.ones(3)),
+])
+def test_value_error_calculate_accelerations(positions, masses):
+    with pytest.raises(ValueError):
+        calculate_accelerations(positions, masses)
+
+
+def test_coincident_bodies():
+    positions = np.array([[1.0, 2.0, 3.0], [0.0, 0.0, 0.0], [1.0, 2.0, 3.0]])
+    masses = np.ones(3)
+    with pytest.raises(ValueError, match="Bodies 0 and 2"):
+        calculate_accelerations(positions, masses)
+    with pytest.raises(ValueError, match="Bodies 0 and 2"):
+        calculate_potential_energy(positions, masses)
+    accelerations = calculate_accelerations(positions, masses,
+                                            softening=1.0).accelerations
+    assert np.all(np.isfinite(accelerations))
+    assert np.isfinite(calculate_potential_energy(positions, masses,
+                                                  softening=1.0))
+
+
+def test_relative_acceleration_error():
+    reference = np.array([[1.0, 0.0], [0.0, 2.0]])
+    candidate = np.array([[1.1, 0.0], [0.0, 2.0]])
+    assert np.allclose(relative_acceleration_error(reference, candidate),
+                       [0.1, 0.0])
+
+
+@pytest.mark.parametrize("tile_size", [1, 7, 64])
+def test_calculate_potential_energy(bodies, tile_size):
+    positions, masses = bodies
+    expected = 0.0
+    for i in range(len(masses)):
+        for j in range(i + 1, len(masses)):
+            distance = np.sqrt(((positions[i] - positions[j]) ** 2).sum() +
+                               0.5 ** 2) * 1000
+            expected -= 6.673e-11 * masses[i] * masses[j] / distance
+    assert calculate_potential_energy(positions, masses, softening=0.5,
+                                      tile_size=tile_size) == \
+        pytest.approx(expected)
@@ -0,0 +1,11 @@
+from utilities.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "available_backends": "kernels.kernels",
+    "get_backend": "kernels.kernels",
+    "set_backend": "kernels.kernels",
+    "select_fastest_backend": "kernels.kernels",
+    "kernel_arguments": "kernels.kernels",
+    "Table": "kernels.tabulation",
+    "tabulate_kernel": "kernels.tabulation",
+})
@@ -0,0 +1,396 @@
+"""Array kernels for the core physics formulas, dispatched to a pluggable
+backend.
+
+The scalar functions in gravity, luminosity and orbital_dynamics validate
+every argument and operate on one Python float at a time. The kernels here
+compute the same formulas (in the same units) over whole arrays, and skip
+per-element validation: callers are expected to validate inputs once, at
+the boundary.
+
+Three backends are provided:
+    python: pure-Python loops over sequences (always available)
+    numpy: vectorized numpy expressions
+    numba: JIT-compiled ufuncs (only if Numba is installed)
+
+The active backend can be chosen at runtime with set_backend(), through the
+CELESTIAL_BACKEND environment variable, or by benchmarking every available
+backend on the host with select_fastest_backend().
+"""
+import importlib.util
+import inspect
+import math
+import os
+import timeit
+from numbers import Real
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from facts.numerical_constants import gravitational_constant, \
+    speed_of_light, stefan_boltzmann_constant, meters_in_a_kilometer, \
+    seconds_in_a_day
+from utilities.random_streams import as_generator
+
+KERNEL_NAMES = (
+    "gravitational_force",
+    "gravitational_acceleration",
+    "schwarzschild_radius",
+    "stefan_boltzmann_luminosity",
+    "orbital_period",
+    "perihelion",
+    "aphelion",
+    "planetary_surface_temperature",
+)
+
+
+class Backend:
+    """A named set of kernels, accessible as attributes (e.g.,
+    backend.orbital_period(a, m1, m2))."""
+
+    def __init__(self, name: str, kernels: Dict[str, Callable]) -> None:
+        """
+        :param str name: the name of the backend
+        :param Dict[str, Callable] kernels: one callable per name in
+        KERNEL_NAMES
+        """
+        missing = set(KERNEL_NAMES) - set(kernels)
+        if len(missing) > 0:
+            raise ValueError(f"Backend {name} is missing kernels: "
+                             f"{', '.join(sorted(missing))}")
+        self.name = name
+        self.kernels = kernels
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name})"
+
+    def array_kernel(self, name: str) -> Callable:
+        """Returns a kernel which accepts (and returns) arrays of any shape,
+        e.g., for the force and propagation loops; kernels of the python
+        backend, which only accept flat sequences, are called on the
+        flattened arguments.
+
+        :param str name: the name of the kernel
+        :return: the kernel
+        :rtype: Callable
+        """
+        kernel = getattr(self, name)
+        if self.name != "python":
+            return kernel
+
+        def flattened(*args):
+            shape = np.broadcast_shapes(*[np.shape(arg) for arg in args])
+            flat = [np.broadcast_to(arg, shape).ravel().tolist()
+                    for arg in args]
+            return np.asarray(kernel(*flat), dtype=float).reshape(shape)
+        flattened.__name__ = name
+        return flattened
+
+    def __getattr__(self, item):
+        try:
+            return self.__dict__["kernels"][item]
+        except KeyError:
+            raise AttributeError(f"{self.__class__.__name__} has no kernel "
+                                 f"named {item}") from None
+
+
+# Scalar formulas, shared by the python and numba backends. Distances are in
+# kilometers, as in the validated scalar functions.
+def _gravitational_force(mass_one, mass_two, distance):
+    distance = distance * meters_in_a_kilometer
+    return (gravitational_constant * mass_one * mass_two) / \
+        (distance * distance)
+
+
+def _gravitational_acceleration(mass, radius):
+    radius = radius * meters_in_a_kilometer
+    return (gravitational_constant * mass) / (radius * radius)
+
+
+def _schwarzschild_radius(mass):
+    return (2 * gravitational_constant * mass) / (speed_of_light *
+                                                  speed_of_light)
+
+
+def _stefan_boltzmann_luminosity(radius, temperature):
+    radius = radius * meters_in_a_kilometer
+    return 4 * math.pi * radius * radius * \
+        stefan_boltzmann_constant * temperature ** 4
+
+
+def _orbital_period(semimajor_axis, primary_body_mass, orbiting_body_mass):
+    return math.sqrt(
+        (4 * math.pi * math.pi)
+        / (gravitational_constant * (primary_body_mass + orbiting_body_mass))
+        * (semimajor_axis * meters_in_a_kilometer) ** 3) / seconds_in_a_day
+
+
+def _perihelion(semimajor_axis, eccentricity):
+    return semimajor_axis * (1 - eccentricity)
+
+
+def _aphelion(semimajor_axis, eccentricity):
+    return semimajor_axis * (1 + eccentricity)
+
+
+def _planetary_surface_temperature(semimajor_axis, solar_radius,
+                                   solar_temperature):
+    return math.sqrt(solar_radius / (2 * semimajor_axis)) * solar_temperature
+
+
+_SCALAR_KERNELS = {
+    "gravitational_force": _gravitational_force,
+    "gravitational_acceleration": _gravitational_acceleration,
+    "schwarzschild_radius": _schwarzschild_radius,
+    "stefan_boltzmann_luminosity": _stefan_boltzmann_luminosity,
+    "orbital_period": _orbital_period,
+    "perihelion": _perihelion,
+    "aphelion": _aphelion,
+    "planetary_surface_temperature": _planetary_surface_temperature,
+}
+
+
+def kernel_arguments(name: str) -> Tuple[str, ...]:
+    """Returns the names of the arguments of a kernel, in order (the same
+    for every backend).
+
+    :param str name: the name of the kernel (one of KERNEL_NAMES)
+    :return: the names of the arguments
+    :rtype: Tuple[str, ...]
+    :raises: KeyError for an unknown kernel
+    """
+    if name not in _SCALAR_KERNELS:
+        raise KeyError(f"Unknown kernel {name}; choose from "
+                       f"{', '.join(KERNEL_NAMES)}")
+    return tuple(inspect.signature(_SCALAR_KERNELS[name]).parameters)
+
+
+def _elementwise(formula: Callable) -> Callable:
+    """Lifts a scalar formula to a pure-Python kernel over sequences.
+    Scalar arguments are broadcast against the sequences.
+
+    :param Callable formula: the scalar formula
+    :return: a kernel returning a list (or a float if every argument is a
+    scalar)
+    :rtype: Callable
+    """
+    def kernel(*args):
+        if all(isinstance(arg, Real) for arg in args):
+            return formula(*args)
+        length = max(len(arg) for arg in args if not isinstance(arg, Real))
+        columns = [[arg] * length if isinstance(arg, Real) else arg
+                   for arg in args]
+        return [formula(*row) for row in zip(*columns)]
+    kernel.__name__ = formula.__name__.lstrip("_")
+    kernel.__doc__ = formula.__doc__
+    return kernel
+
+
+def _build_python_backend() -> Backend:
+    return Backend("python", {name: _elementwise(formula)
+                              for name, formula in _SCALAR_KERNELS.items()})
+
+
+def _build_numpy_backend() -> Backend:
+    def gravitational_force(mass_one, mass_two, distance):
+        distance = np.asarray(distance, dtype=float) * meters_in_a_kilometer
+        return gravitational_constant * np.multiply(mass_one, mass_two) / \
+            (distance * distance)
+
+    def gravitational_acceleration(mass, radius):
+        radius = np.asarray(radius, dtype=float) * meters_in_a_kilometer
+        return gravitational_constant * np.asarray(mass, dtype=float) / \
+            (radius * radius)
+
+    def schwarzschild_radius(mass):
+        return (2 * gravitational_constant / (speed_of_light *
+                                              speed_of_light)) * \
+            np.asarray(mass, dtype=float)
+
+    def stefan_boltzmann_luminosity(radius, temperature):
+        radius = np.asarray(radius, dtype=float) * meters_in_a_kilometer
+        temperature = np.asarray(temperature, dtype=float)
+        temperature_squared = temperature * temperature
+        return (4 * np.pi * stefan_boltzmann_constant) * radius * radius * \
+            temperature_squared * temperature_squared
+
+    def orbital_period(semimajor_axis, primary_body_mass,
+                       orbiting_body_mass):
+        semimajor_axis = np.asarray(semimajor_axis, dtype=float) * \
+            meters_in_a_kilometer
+        total_mass = np.add(primary_body_mass, orbiting_body_mass,
+                            dtype=float)
+        return np.sqrt((4 * np.pi * np.pi / gravitational_constant) *
+                       semimajor_axis * semimajor_axis * semimajor_axis /
+                       total_mass) / seconds_in_a_day
+
+    def perihelion(semimajor_axis, eccentricity):
+        return np.asarray(semimajor_axis, dtype=float) * \
+            (1 - np.asarray(eccentricity, dtype=float))
+
+    def aphelion(semimajor_axis, eccentricity):
+        return np.asarray(semimajor_axis, dtype=float) * \
+            (1 + np.asarray(eccentricity, dtype=float))
+
+    def planetary_surface_temperature(semimajor_axis, solar_radius,
+                                      solar_temperature):
+        return np.sqrt(np.asarray(solar_radius, dtype=float) /
+                       (2 * np.asarray(semimajor_axis, dtype=float))) * \
+            solar_temperature
+
+    functions = locals()
+    return Backend("numpy", {name: functions[name] for name in KERNEL_NAMES})
+
+
+def _build_numba_backend() -> Backend:
+    import numba
+    kernels = {}
+    for name, formula in _SCALAR_KERNELS.items():
+        arity = formula.__code__.co_argcount
+        signature = "float64(" + ", ".join(["float64"] * arity) + ")"
+        kernels[name] = numba.vectorize([signature], nopython=True,
+                                        cache=False)(formula)
+    return Backend("numba", kernels)
+
+
+_BACKEND_FACTORIES = {
+    "python": (_build_python_backend, None),
+    "numpy": (_build_numpy_backend, "numpy"),
+    "numba": (_build_numba_backend, "numba"),
+}
+_backend_cache: Dict[str, Backend] = {}
+_active_backend_name = None
+
+
+def available_backends() -> List[str]:
+    """Returns the names of the backends whose dependencies are installed.
+
+    :return: names of the available backends
+    :rtype: List[str]
+    """
+    return [name for name, (_, module) in _BACKEND_FACTORIES.items()
+            if module is None or importlib.util.find_spec(module) is not None]
+
+
+def get_backend(name: str = None) -> Backend:
+    """Returns a backend by name, building (and, for numba, compiling) it on
+    first use. If no name is supplied, the active backend is returned.
+
+    :param str name: the name of the backend
+    :return: the backend
+    :rtype: Backend
+    """
+    if name is None:
+        name = _active_backend_name or os.environ.get(
+            "CELESTIAL_BACKEND", "numpy")
+    # Force loops look the backend up on every call
+    backend = _backend_cache.get(name)
+    if backend is not None:
+        return backend
+    if name not in _BACKEND_FACTORIES:
+        raise KeyError(f"Unknown backend {name}; choose from "
+                       f"{', '.join(_BACKEND_FACTORIES)}")
+    if name not in available_backends():
+        raise ImportError(f"Backend {name} requires "
+                          f"{_BACKEND_FACTORIES[name][1]} to be installed.")
+    backend = _BACKEND_FACTORIES[name][0]()
+    _backend_cache[name] = backend
+    return backend
+
+
+def set_backend(name: str) -> Backend:
+    """Sets the active backend used by the module-level kernels.
+
+    :param str name: the name of the backend
+    :return: the newly active backend
+    :rtype: Backend
+    """
+    global _active_backend_name
+    backend = get_backend(name)
+    _active_backend_name = name
+    return backend
+
+
+def benchmark_backends(size: int = 100000, repeat: int = 3,
+                       backends: List[str] = None,
+                       seed: int = 0) -> Dict[str, float]:
+    """Times every kernel of every available backend on arrays of the given
+    size, returning the best total time (in seconds) per backend. Backends
+    are warmed up (and JIT-compiled) before timing.
+
+    :param int size: the number of elements per kernel call
+    :param int repeat: the number of timed repetitions (best is kept)
+    :param List[str] backends: the backends to benchmark; defaults to all
+    available backends
+    :param int seed: the seed of the random inputs
+    :return: seconds per backend to evaluate every kernel once
+    :rtype: Dict[str, float]
+    """
+    rng = as_generator(seed)
+    arrays = {
+        "mass": rng.uniform(1e20, 1e30, size),
+        "distance": rng.uniform(1e3, 1e9, size),
+        "eccentricity": rng.uniform(0, 0.9, size),
+        "temperature": rng.uniform(2400, 30000, size),
+    }
+    timings = {}
+    for name in backends or available_backends():
+        backend = get_backend(name)
+        if name == "python":
+            inputs = {k: v.tolist() for k, v in arrays.items()}
+        else:
+            inputs = arrays
+        calls = [
+            (backend.gravitational_force,
+             (inputs["mass"], inputs["mass"], inputs["distance"])),
+            (backend.gravitational_acceleration,
+             (inputs["mass"], inputs["distance"])),
+            (backend.schwarzschild_radius, (inputs["mass"],)),
+            (backend.stefan_boltzmann_luminosity,
+             (inputs["distance"], inputs["temperature"])),
+            (backend.orbital_period,
+             (inputs["distance"], inputs["mass"], inputs["mass"])),
+            (backend.perihelion,
+             (inputs["distance"], inputs["eccentricity"])),
+            (backend.aphelion, (inputs["distance"], inputs["eccentricity"])),
+            (backend.planetary_surface_temperature,
+             (inputs["distance"], inputs["distance"],
+              inputs["temperature"])),
+        ]
+
+        def run_all():
+            for kernel, args in calls:
+                kernel(*args)
+        run_all()
+        timings[name] = min(timeit.repeat(run_all, number=1, repeat=repeat))
+    return timings
+
+
+def select_fastest_backend(size: int = 100000, repeat: int = 3) -> str:
+    """Benchmarks every available backend and activates the fastest.
+
+    :param int size: the number of elements per kernel call
+    :param int repeat: the number of timed repetitions
+    :return: the name of the fastest (now active) backend
+    :rtype: str
+    """
+    timings = benchmark_backends(size, repeat)
+    fastest = min(timings, key=timings.get)
+    set_backend(fastest)
+    return fastest
+
+
+def _dispatch(name: str) -> Callable:
+    def kernel(*args):
+        return getattr(get_backend(), name)(*args)
+    kernel.__name__ = name
+    kernel.__doc__ = f"Evaluates the {name.replace('_', ' ')} kernel " \
+                     f"with the active backend."
+    return kernel
+
+
+gravitational_force = _dispatch("gravitational_force")
+gravitational_acceleration = _dispatch("gravitational_acceleration")
+schwarzschild_radius = _dispatch("schwarzschild_radius")
+stefan_boltzmann_luminosity = _dispatch("stefan_boltzmann_luminosity")
+orbital_period = _dispatch("orbital_period")
+perihelion = _dispatch("perihelion")
+aphelion = _dispatch("aphelion")
+planetary_surface_temperature = _dispatch("planetary_surface_temperature")
@@ -0,0 +1,261 @@
+"""Lookup tables for physics functions evaluated over and over on the same
+bounded ranges (e.g., surface temperatures across a sweep of semi-major
+axes, or luminosities over a fixed grid of temperatures).
+
+A Table tabulates a function of one variable over a declared domain
+[low, high] as piecewise polynomials (cubic by default), on intervals of
+equal width in the variable or in its logarithm. On each interval the
+polynomial interpolates the function at the Chebyshev nodes, and the number
+of intervals is doubled until the largest relative error, checked at
+points spread over every interval (its ends included), is within rtol.
+The error is only checked at those sample points, not bounded between
+them, so a function with features narrower than the check spacing (e.g.,
+a sharp peak) can exceed rtol elsewhere in an interval.
+Evaluating the table finds the interval by arithmetic rather than search
+and evaluates the polynomial by Horner's rule, so it costs the same
+whatever the function. Arguments outside the domain fall back to the
+function itself; the table counts both (stats, hit_rate).
+
+Tables pay off for functions that cost more than a lookup: scalar functions
+called once per element (such as the validated functions of gravity,
+luminosity and orbital_dynamics) or long formulas. A single numpy
+expression (such as most kernels of the numpy backend) is usually as fast
+as its table.
+
+Example:
+    temperature = Table(
+        lambda a: calculate_planetary_surface_temperature(a, 695700, 5778),
+        1e+07, 1e+10, rtol=1e-9, scale="log", vectorized=False)
+    temperature(semimajor_axes)
+    temperature.hit_rate
+
+    luminosity = tabulate_kernel("stefan_boltzmann_luminosity",
+                                 "temperature", 2400, 30000, radius=695700)
+"""
+import math
+from typing import Callable
+import numpy as np
+
+# The largest number of intervals of a table
+_max_intervals = 2 ** 22
+# Check points per interval, relative to the number of nodes
+_checks_per_node = 4
+# Arguments looked up at once: temporaries of this size stay in cache
+_chunk_size = 2 ** 14
+
+
+class Table:
+    """A function of one variable tabulated over [low, high] to a maximum
+    relative error, falling back to the function outside the domain."""
+
+    def __init__(self, function: Callable, low: float, high: float,
+                 rtol: float = 1e-9, scale: str = "linear",
+                 vectorized: bool = True, degree: int = 3) -> None:
+        """Builds the table, evaluating the function on as many intervals
+        as the tolerance needs.
+
+        :param Callable function: the function of one variable
+        :param float low: the lower end of the domain
+        :param float high: the upper end of the domain
+        :param float rtol: the largest relative error of the table, at the
+        sample points checked within each interval
+        :param str scale: "linear" for intervals of equal width, or "log"
+        for intervals of equal width in the logarithm (low > 0)
+        :param bool vectorized: whether the function accepts arrays (if not,
+        it is called once per element)
+        :param int degree: the degree of the polynomials
+        """
+        if not high > low:
+            raise ValueError(f"The domain [{low}, {high}] is empty.")
+        if scale not in ("linear", "log"):
+            raise ValueError(f"Unknown scale {scale}; choose from linear, "
+                             f"log")
+        if scale == "log" and low <= 0:
+            raise ValueError("A log scale needs a positive domain.")
+        if rtol <= 0 or degree < 1:
+            raise ValueError("rtol and degree must be positive.")
+        self.function = function
+        self.low, self.high = float(low), float(high)
+        self.rtol = rtol
+        self.scale = scale
+        self.vectorized = vectorized
+        self.stats = {"hits": 0, "misses": 0}
+        self._start, self._stop = self._transform(np.array([self.low,
+                                                            self.high]))
+        self.coefficients, self.max_error = self._build(degree)
+        self._width = (self._stop - self._start) / self.intervals
+
+    def __repr__(self):
+        name = getattr(self.function, "__name__", "function")
+        return f"{self.__class__.__name__}({name}, [{self.low}, " \
+            f"{self.high}], {self.intervals} intervals)"
+
+    @property
+    def degree(self) -> int:
+        """Returns the degree of the polynomials.
+
+        :return: the degree
+        :rtype: int
+        """
+        return self.coefficients.shape[0] - 1
+
+    @property
+    def intervals(self) -> int:
+        """Returns the number of intervals.
+
+        :return: the number of intervals
+        :rtype: int
+        """
+        return self.coefficients.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Returns the memory held by the coefficients.
+
+        :return: size in bytes
+        :rtype: int
+        """
+        return self.coefficients.nbytes
+
+    @property
+    def hit_rate(self) -> float:
+        """Returns the fraction of evaluated arguments served by the table.
+
+        :return: hit rate between 0 and 1
+        :rtype: float
+        """
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups > 0 else 0.0
+
+    def reset_stats(self) -> None:
+        """Resets the hit and miss counts.
+
+        :return: None
+        """
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _transform(self, x: np.ndarray) -> np.ndarray:
+        return np.log(x) if self.scale == "log" else x
+
+    def _evaluate(self, x: np.ndarray) -> np.ndarray:
+        """Evaluates the function itself."""
+        if self.vectorized:
+            return np.asarray(self.function(x), dtype=float)
+        return np.array([self.function(float(value)) for value in x.ravel()],
+                        dtype=float).reshape(x.shape)
+
+    def _build(self, degree: int):
+        """Doubles the number of intervals until the table is within rtol,
+        returning the coefficients (terms first, of the local variable in
+        [-1, 1]) and the largest relative error found."""
+        nodes = np.cos(math.pi * (np.arange(degree + 1) + 0.5) /
+                       (degree + 1))
+        # From values at the nodes to coefficients of 1, t, t^2, ...
+        inverse = np.linalg.inv(np.vander(nodes, increasing=True))
+        checks = np.linspace(-1, 1, _checks_per_node * (degree + 1) + 1)
+        powers = np.vander(checks, degree + 1, increasing=True)
+        intervals = 8
+        while True:
+            width = (self._stop - self._start) / intervals
+            middle = self._start + width * (np.arange(intervals) + 0.5)
+            values = self._exact(middle[:, None] + width / 2 * nodes)
+            coefficients = values @ inverse.T
+            exact = self._exact(middle[:, None] + width / 2 * checks)
+            approximate = coefficients @ powers.T
+            with np.errstate(divide="ignore", invalid="ignore"):
+                error = np.abs(approximate - exact) / np.abs(exact)
+            error = np.where(exact == 0, np.abs(approximate), error)
+            max_error = float(error.max())
+            if not np.isfinite(max_error):
+                raise ValueError("The function is not finite over the "
+                                 "domain.")
+            if max_error <= self.rtol:
+                return np.ascontiguousarray(coefficients.T), max_error
+            if intervals >= _max_intervals:
+                raise ValueError(f"Could not reach a relative error of "
+                                 f"{self.rtol} with {intervals} intervals "
+                                 f"(reached {max_error}).")
+            intervals *= 2
+
+    def _exact(self, u: np.ndarray) -> np.ndarray:
+        """Evaluates the function at points of the (transformed) variable,
+        kept within the domain against rounding."""
+        x = np.exp(u) if self.scale == "log" else u
+        return self._evaluate(np.clip(x, self.low, self.high))
+
+    def __call__(self, x) -> np.ndarray:
+        """Evaluates the table (or, outside its domain, the function).
+
+        :param x: the arguments
+        :return: the values, of the shape of x
+        :rtype: np.ndarray
+        """
+        x = np.asarray(x, dtype=float)
+        inside = (x >= self.low) & (x <= self.high)
+        hits = int(np.count_nonzero(inside))
+        self.stats["hits"] += hits
+        self.stats["misses"] += x.size - hits
+        if hits == x.size:
+            return self._lookup(x.ravel()).reshape(x.shape)
+        result = np.empty(x.shape)
+        result[inside] = self._lookup(x[inside])
+        result[~inside] = self._evaluate(x[~inside])
+        return result
+
+    def _lookup(self, x: np.ndarray) -> np.ndarray:
+        """Evaluates the polynomials at (flat) arguments within the
+        domain."""
+        result = np.empty(len(x))
+        for low in range(0, len(x), _chunk_size):
+            chunk = x[low:low + _chunk_size]
+            local = (self._transform(chunk) - self._start) / self._width
+            interval = np.minimum(local.astype(np.int64), self.intervals - 1)
+            t = 2 * (local - interval) - 1
+            coefficients = np.take(self.coefficients, interval, axis=1)
+            value = result[low:low + _chunk_size]
+            value[...] = coefficients[self.degree]
+            for k in range(self.degree - 1, -1, -1):
+                value *= t
+                value += coefficients[k]
+        return result
+
+
+def tabulate_kernel(name: str, argument: str, low: float, high: float,
+                    backend: str = None, **fixed) -> Table:
+    """Tabulates a kernel over one of its arguments, the others being
+    fixed (see Table).
+
+    :param str name: the name of the kernel (one of KERNEL_NAMES)
+    :param str argument: the name of the tabulated argument
+    :param float low: the lower end of the domain
+    :param float high: the upper end of the domain
+    :param str backend: the backend whose kernel is tabulated (and used
+    outside the domain); defaults to numpy
+    :param fixed: the values of the other arguments, and the options of
+    Table (rtol, scale, degree)
+    :return: the table
+    :rtype: Table
+    """
+    from kernels import kernels
+    parameters = list(kernels.kernel_arguments(name))
+    options = {key: fixed.pop(key) for key in ("rtol", "scale", "degree")
+               if key in fixed}
+    if argument not in parameters:
+        raise ValueError(f"{name} has no argument {argument}; its arguments "
+                         f"are {', '.join(parameters)}")
+    missing = set(parameters) - set(fixed) - {argument}
+    unknown = set(fixed) - set(parameters)
+    if len(missing) > 0 or len(unknown) > 0:
+        raise ValueError(f"Fix exactly the other arguments of {name}: "
+                         f"{', '.join(sorted(set(parameters) - {argument}))}")
+    kernel = getattr(kernels.get_backend(backend or "numpy"), name)
+    position = parameters.index(argument)
+
+    def function(x):
+        args = [fixed.get(parameter) for parameter in parameters]
+        args[position] = x
+        return kernel(*args)
+
+    function.__name__ = name
+    return Table(function, low, high,
+                 vectorized=backend in (None, "numpy", "numba"), **options)
@@ -0,0 +1,112 @@
+import pytest
+import numpy as np
+from kernels import kernels
+from gravity.direct_sum import calculate_accelerations
+from gravity.gravity import \
+    calculate_gravitational_force_between_two_objects, \
+    calculate_gravitational_acceleration, calculate_schwarzschild_radius
+from luminosity.luminosity import calculate_stefan_boltzmann_luminosity
+from orbital_dynamics.orbital_calculations import *
+from facts.fact_sheets import planetary_facts, sun_facts
+from orbital_dynamics.block_timestep import calculate_acceleration_and_jerk
+from orbital_dynamics.events import orbit_arrays
+from universe.generator import generate_star_systems
+
+planets = [fact_dict for fact_dict in planetary_facts.values()
+           if "distance from sun" in fact_dict.keys()]
+masses = [fact_dict["mass"] for fact_dict in planets]
+radii = [fact_dict["radius"] for fact_dict in planets]
+distances = [fact_dict["distance from sun"] for fact_dict in planets]
+eccentricities = [fact_dict["orbital eccentricity"] for fact_dict in planets]
+
+
+@pytest.mark.parametrize("backend", kernels.available_backends())
+@pytest.mark.parametrize("kernel,scalar_function,args", [
+    ("gravitational_force",
+     calculate_gravitational_force_between_two_objects,
+     (masses, sun_facts["mass"], distances)),
+    ("gravitational_acceleration", calculate_gravitational_acceleration,
+     (masses, radii)),
+    ("schwarzschild_radius", calculate_schwarzschild_radius, (masses,)),
+    ("stefan_boltzmann_luminosity", calculate_stefan_boltzmann_luminosity,
+     (radii, 5778)),
+    ("orbital_period", calculate_orbital_period,
+     (distances, sun_facts["mass"], masses)),
+    ("perihelion", calculate_perihelion_of_ellipse,
+     (distances, eccentricities)),
+    ("aphelion", calculate_aphelion_of_ellipse, (distances, eccentricities)),
+    ("planetary_surface_temperature",
+     calculate_planetary_surface_temperature,
+     (distances, sun_facts["radius"], 5778)),
+])
+def test_kernel_matches_scalar_function(backend, kernel, scalar_function,
+                                        args):
+    result = getattr(kernels.get_backend(backend), kernel)(
+        *[np.asarray(a) if backend != "python" and not np.isscalar(a) else a
+          for a in args])
+    rows = zip(*[a if not np.isscalar(a) else [a] * len(planets)
+                 for a in args])
+    expected = [scalar_function(*row) for row in rows]
+    assert np.allclose(result, expected, rtol=1e-12)
+
+
+def test_unknown_backend():
+    with pytest.raises(KeyError):
+        kernels.get_backend("fortran")
+
+
+def test_kernel_arguments():
+    assert kernels.kernel_arguments("orbital_period") == (
+        "semimajor_axis", "primary_body_mass", "orbiting_body_mass")
+    with pytest.raises(KeyError):
+        kernels.kernel_arguments("escape_velocity")
+
+
+def test_set_backend_dispatch():
+    active = kernels.get_backend().name
+    kernels.set_backend("python")
+    try:
+        assert isinstance(kernels.perihelion([100.0], 0.5), list)
+    finally:
+        kernels.set_backend(active)
+    assert kernels.get_backend().name == active
+
+
+@pytest.mark.parametrize("backend", kernels.available_backends())
+def test_force_and_propagation_loops_use_the_backend(backend, monkeypatch):
+    calls = []
+    for name in ("gravitational_acceleration", "orbital_period"):
+        kernel = kernels.get_backend(backend).kernels[name]
+
+        def counting(*args, kernel=kernel, name=name):
+            calls.append(name)
+            return kernel(*args)
+        monkeypatch.setitem(kernels.get_backend(backend).kernels, name,
+                            counting)
+    rng = np.random.default_rng(0)
+    positions = rng.normal(size=(20, 3)) * 1e6
+    masses = rng.uniform(1e22, 1e24, 20)
+    active = kernels.get_backend().name
+    kernels.set_backend(backend)
+    try:
+        accelerations = calculate_accelerations(positions, masses,
+                                                tile_size=8).accelerations
+        _, jerk = calculate_acceleration_and_jerk(
+            np.arange(20), positions, np.ones((20, 3)), masses)
+        arrays = orbit_arrays(generate_star_systems(5, seed=1).columns())
+    finally:
+        kernels.set_backend(active)
+    assert calls.count("gravitational_acceleration") == 7
+    assert calls.count("orbital_period") == 1
+    expected = calculate_accelerations(positions, masses, tile_size=8,
+                                       backend="numpy").accelerations
+    np.testing.assert_allclose(accelerations, expected, rtol=1e-12)
+    assert np.all(np.isfinite(jerk))
+    orbiting = arrays["parent"] >= 0
+    assert np.all(arrays["mean_motion"][orbiting] > 0)
+
+
+def test_benchmark_backends():
+    timings = kernels.benchmark_backends(size=1000, repeat=1)
+    assert set(timings) == set(kernels.available_backends())
+    assert all(t > 0 for t in timings.values())
@@ -0,0 +1,82 @@
+import math
+import pytest
+import numpy as np
+from kernels import kernels
+from kernels.tabulation import *
+from facts.fact_sheets import sun_facts
+from orbital_dynamics.orbital_calculations import \
+    calculate_planetary_surface_temperature
+
+
+def surface_temperature(semimajor_axis):
+    return calculate_planetary_surface_temperature(
+        semimajor_axis, sun_facts["radius"], 5778)
+
+
+def test_scalar_function_within_tolerance():
+    table = Table(surface_temperature, 1e+07, 1e+10, rtol=1e-9, scale="log",
+                  vectorized=False)
+    assert table.max_error <= 1e-9
+    rng = np.random.default_rng(0)
+    a = np.exp(rng.uniform(math.log(1e+07), math.log(1e+10), (50, 40)))
+    expected = kernels.get_backend("numpy").planetary_surface_temperature(
+        a, sun_facts["radius"], 5778)
+    values = table(a)
+    assert values.shape == (50, 40)
+    np.testing.assert_allclose(values, expected, rtol=1e-9)
+    # The ends of the domain
+    np.testing.assert_allclose(table([1e+07, 1e+10]),
+                               [surface_temperature(1e+07),
+                                surface_temperature(1e+10)], rtol=1e-9)
+    assert table.stats == {"hits": 2002, "misses": 0}
+    assert table.nbytes == table.intervals * 4 * 8
+
+
+def test_fallback_outside_the_domain():
+    table = Table(np.sqrt, 1.0, 4.0, rtol=1e-12)
+    values = table([0.25, 2.0, 9.0, 4.0])
+    assert values[0] == 0.5 and values[2] == 3.0
+    assert values[1] == pytest.approx(math.sqrt(2.0), rel=1e-12)
+    assert table.stats == {"hits": 2, "misses": 2}
+    assert table.hit_rate == 0.5
+    table.reset_stats()
+    assert table.hit_rate == 0.0
+    assert np.isnan(table(np.nan))
+
+
+def test_tabulated_kernels():
+    luminosity = tabulate_kernel("stefan_boltzmann_luminosity",
+                                 "temperature", 2400, 30000,
+                                 radius=sun_facts["radius"], rtol=1e-11)
+    temperatures = np.linspace(2000, 31000, 1001)
+    expected = kernels.get_backend("numpy").stefan_boltzmann_luminosity(
+        sun_facts["radius"], temperatures)
+    np.testing.assert_allclose(luminosity(temperatures), expected,
+                               rtol=1e-11)
+    assert 0.9 < luminosity.hit_rate < 1.0
+    # The python backend is called once per element
+    period = tabulate_kernel("orbital_period", "semimajor_axis", 1e+07,
+                             1e+09, backend="python", scale="log",
+                             primary_body_mass=2e+30,
+                             orbiting_body_mass=6e+24)
+    assert not period.vectorized
+    assert period(1.5e+08) == pytest.approx(
+        kernels.get_backend("python").orbital_period(1.5e+08, 2e+30, 6e+24),
+        rel=1e-9)
+
+
+def test_invalid_tables():
+    with pytest.raises(ValueError):
+        Table(np.sqrt, 1.0, 1.0)
+    with pytest.raises(ValueError):
+        Table(np.log, 0.0, 1.0, scale="log")
+    with pytest.raises(ValueError):
+        Table(np.sqrt, 1.0, 2.0, scale="cubic")
+    with pytest.raises(ValueError), np.errstate(all="ignore"):
+        Table(np.log, -1.0, 1.0)
+    with pytest.raises(KeyError):
+        tabulate_kernel("escape_velocity", "mass", 1.0, 2.0)
+    with pytest.raises(ValueError):
+        tabulate_kernel("perihelion", "eccentricity", 0.0, 0.9)
+    with pytest.raises(ValueError):
+        tabulate_kernel("perihelion", "mass", 0.0, 0.9, semimajor_axis=1.0)
@@ -1,7 +1,20 @@
 import math
 from numbers import Real
 from typing import Tuple
-from facts.numerical_constants import stefan_boltzmann_constant
+import numpy as np
+from facts.numerical_constants import stefan_boltzmann_constant, \
+    meters_in_a_kilometer
+
+# (minimum temperature in Kelvin, classification, chromaticity), hottest first
+harvard_spectral_classes = (
+    (30000, "O", "blue"),
+    (10000, "B", "deep blue white"),
+    (7500, "A", "blue white"),
+    (6000, "F", "white"),
+    (5200, "G", "yellowish white"),
+    (3700, "K", "pale yellow orange"),
+    (2400, "M", "light orange red"),
+)
 
 
 def calculate_stefan_boltzmann_luminosity(radius: float,
@@ -24,7 +37,7 @@ def calculate_stefan_boltzmann_luminosity(radius: float,
     if temperature <= 0:
         raise ValueError(f"temperature ({temperature}) must be greater than "
                          f"0.")
-    return 4 * math.pi * math.pow(radius * 1000, 2) * \
+    return 4 * math.pi * math.pow(radius * meters_in_a_kilometer, 2) * \
         stefan_boltzmann_constant * math.pow(temperature, 4)
 
 
@@ -42,21 +55,32 @@ def classify_harvard_spectral_classification(
     if not isinstance(solar_temperature, Real):
         raise TypeError(f"solar_temperature ({solar_temperature}) must be a "
                         f"Real number.")
-    if solar_temperature >= 30000:
-        return "O", "blue"
-    elif solar_temperature >= 10000:
-        return "B", "deep blue white"
-    elif solar_temperature >= 7500:
-        return "A", "blue white"
-    elif solar_temperature >= 6000:
-        return "F", "white"
-    elif solar_temperature >= 5200:
-        return "G", "yellowish white"
-    elif solar_temperature >= 3700:
-        return "K", "pale yellow orange"
-    elif solar_temperature >= 2400:
-        return "M", "light orange red"
-    else:
-        raise ValueError(f"No classification is defined in the Harvard "
-                         f"Spectral Classification for a solar body with "
-                         f"temperature < 2400 Kelvin.")
+    for minimum_temperature, classification, chromaticity in \
+            harvard_spectral_classes:
+        if solar_temperature >= minimum_temperature:
+            return classification, chromaticity
+    raise ValueError(f"No classification is defined in the Harvard "
+                     f"Spectral Classification for a solar body with "
+                     f"temperature < 2400 Kelvin.")
+
+
+def classify_harvard_spectral_classifications(solar_temperatures) -> \
+        Tuple[np.ndarray, np.ndarray]:
+    """Classifies many solar bodies at once using the Harvard Spectral
+    Classification system (see classify_harvard_spectral_classification).
+    Temperatures below 2400 Kelvin (or NaN) are classified as "".
+
+    :param solar_temperatures: array-like of temperatures (in Kelvin)
+    :return: the classifications and chromaticities of the solar bodies
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    temperatures = np.asarray(solar_temperatures, dtype=float)
+    # Classes from coolest to hottest, with "" below the coolest
+    minimums = np.array([row[0] for row in harvard_spectral_classes[::-1]])
+    classifications = np.array(
+        [""] + [row[1] for row in harvard_spectral_classes[::-1]])
+    chromaticities = np.array(
+        [""] + [row[2] for row in harvard_spectral_classes[::-1]])
+    idx = np.searchsorted(minimums, temperatures, side="right")
+    idx[np.isnan(temperatures)] = 0
+    return classifications[idx], chromaticities[idx]
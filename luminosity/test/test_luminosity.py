@@ -69,3 +69,15 @@ def test_value_error_classify_harvard_spectral_classification(
         solar_temperature):
     with pytest.raises(ValueError):
         classify_harvard_spectral_classification(solar_temperature)
+
+
+def test_classify_harvard_spectral_classifications():
+    temperatures = [1000, 2400, 3699, sun_facts["mean temperature"], 7500,
+                    45000, float("nan")]
+    classifications, chromaticities = \
+        classify_harvard_spectral_classifications(temperatures)
+    assert list(classifications) == ["", "M", "M", "G", "A", "O", ""]
+    for temperature, classification, chromaticity in zip(
+            temperatures[1:-1], classifications[1:-1], chromaticities[1:-1]):
+        assert (classification, chromaticity) == \
+            classify_harvard_spectral_classification(temperature)
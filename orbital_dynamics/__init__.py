@@ -0,0 +1,23 @@
+from utilities.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "Orbit": "orbital_dynamics.orbit",
+    "BarycentricOrbit": "orbital_dynamics.orbit",
+    "create_binary": "orbital_dynamics.binary",
+    "HierarchicalPropagator": "orbital_dynamics.hierarchical",
+    "BlockTimestepIntegrator": "orbital_dynamics.block_timestep",
+    "LeapfrogIntegrator": "orbital_dynamics.leapfrog",
+    "DiagnosticsMonitor": "orbital_dynamics.diagnostics",
+    "calculate_diagnostics": "orbital_dynamics.diagnostics",
+    "find_apsides": "orbital_dynamics.events",
+    "find_alignments": "orbital_dynamics.events",
+    "find_eclipses": "orbital_dynamics.events",
+    "build_ephemeris": "orbital_dynamics.ephemeris",
+    "save_ephemeris": "orbital_dynamics.ephemeris",
+    "load_ephemeris": "orbital_dynamics.ephemeris",
+    "fit_orbits": "orbital_dynamics.fitting",
+    "solve_secular": "orbital_dynamics.secular",
+    "secular_systems": "orbital_dynamics.secular",
+    "benchmark_integrators": "orbital_dynamics.benchmarks",
+    "check_regressions": "orbital_dynamics.benchmarks",
+})
@@ -0,0 +1,594 @@
+"""Correctness and performance benchmarks of the integrators.
+
+Every integrator is run on canonical problems whose answers are known:
+
+    two-body: a Keplerian orbit, integrated for a whole number of periods
+    (from calculate_orbital_period), after which every body is back where
+    it started
+    sun-planets: the Sun and planets of facts.fact_sheets over the period of
+    the innermost planet, against a converged run (a fourth-order Hermite
+    integration at 4096 steps per orbit)
+    figure-eight: the periodic three-body orbit of Chenciner & Montgomery
+    (2000), with the initial conditions of Simo, over whole periods
+    plummer-<n>: a softened Plummer sphere of n equal masses (Aarseth, Henon
+    & Wielen 1974), whose only known answer is its conserved energy
+
+and measured for:
+
+    energy error: max |E(t) - E0| / |E0| over the samples of a run
+    energy drift: (E(end) - E0) / |E0|
+    phase error: max over the bodies of |r(end) - r_ref| / R, R the largest
+    distance of the body from the barycenter during the run (for an error
+    along the orbit, the phase error in radians)
+    wall time: seconds spent stepping (the samples are not timed), and per
+    step
+
+The accuracy of an integrator is set by its number of steps per orbit (the
+time scale of the problem: its shortest period, or the dynamical time
+sqrt(R^3 / GM) of a Plummer sphere). A sweep over steps per orbit gives the
+accuracy versus cost curve of each integrator on each problem; the
+measurements can be saved as a baseline, and later measurements checked
+against it, failing when a change makes any integrator less accurate or
+slower. Wall times are only comparable on the same host.
+
+Example:
+    measurements = benchmark_integrators(steps_per_orbit=(16, 32, 64))
+    save_baseline(measurements, "integrators.json")
+    ...
+    check_regressions(benchmark_integrators(steps_per_orbit=(16, 32, 64)),
+                      load_baseline("integrators.json"))
+"""
+import json
+import math
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple, Union, BinaryIO
+import numpy as np
+from celestial_bodies.celestial_bodies import SolarBody, PlanetaryBody
+from facts.fact_sheets import planetary_facts, sun_facts
+from facts.numerical_constants import gravitational_constant, \
+    meters_in_a_kilometer, seconds_in_a_day, solar_mass, astronomical_unit
+from orbital_dynamics.block_timestep import BlockTimestepIntegrator
+from orbital_dynamics.diagnostics import calculate_diagnostics
+from orbital_dynamics.hierarchical import HierarchicalPropagator
+from orbital_dynamics.leapfrog import LeapfrogIntegrator
+from orbital_dynamics.orbit import Orbit
+from orbital_dynamics.orbital_calculations import calculate_orbital_period
+from universe.universe import Universe
+from utilities.random_streams import as_generator
+
+planets = ("Mercury", "Venus", "Earth", "Mars", "Jupiter", "Saturn",
+           "Uranus", "Neptune")
+# Positions, the velocity of the third body and the period of the
+# figure-eight orbit, for G = 1 and unit masses (Simo)
+_figure_eight_position = (0.97000436, -0.24308753)
+_figure_eight_velocity = (-0.93240737, -0.86473146)
+_figure_eight_period = 6.32591398
+# Steps per orbit of the converged reference runs
+_reference_steps_per_orbit = 4096
+_parsec = 3.0857e+13
+_baseline_version = 1
+
+
+class RegressionError(ValueError):
+    """Exception raised when an integrator is less accurate or slower than
+    its baseline."""
+    pass
+
+
+class Problem(NamedTuple):
+    """A canonical problem: the initial state of its bodies, and the
+    expected state at the end of the run.
+
+    Units: positions in kilometers, velocities in kilometers / second,
+    masses in kilograms, times in days.
+    """
+    name: str
+    positions: np.ndarray
+    velocities: np.ndarray
+    masses: np.ndarray
+    time_scale: float
+    duration: float
+    reference: np.ndarray = None
+    universe: object = None
+    softening: float = 0.0
+
+    @property
+    def n_bodies(self) -> int:
+        return len(self.masses)
+
+
+class Measurement(NamedTuple):
+    """The accuracy and cost of one integrator on one problem.
+
+    Units: wall times in seconds, errors relative.
+    """
+    problem: str
+    integrator: str
+    n_bodies: int
+    steps_per_orbit: int
+    steps: int
+    force_evaluations: int
+    wall_time: float
+    energy_error: float
+    energy_drift: float
+    phase_error: float
+
+    @property
+    def key(self) -> Tuple[str, str, int]:
+        return self.problem, self.integrator, self.steps_per_orbit
+
+    @property
+    def wall_time_per_step(self) -> float:
+        return self.wall_time / self.steps if self.steps > 0 else math.nan
+
+
+class AccuracyCostCurve(NamedTuple):
+    """The accuracy of an integrator on a problem against its cost,
+    ordered by cost."""
+    steps_per_orbit: np.ndarray
+    wall_time: np.ndarray
+    energy_error: np.ndarray
+    phase_error: np.ndarray
+
+
+class Regression(NamedTuple):
+    """A metric of a measurement which is worse than its baseline."""
+    key: Tuple[str, str, int]
+    metric: str
+    baseline: float
+    value: float
+
+    def __str__(self):
+        problem, integrator, steps_per_orbit = self.key
+        return f"{integrator} on {problem} at {steps_per_orbit} steps per " \
+            f"orbit: {self.metric} {self.value:.3g} (baseline " \
+            f"{self.baseline:.3g})"
+
+
+def _universe_problem(name: str, universe, duration: float,
+                      time_scale: float, reference: np.ndarray = None) \
+        -> Problem:
+    bodies, positions, velocities = universe.state_vectors(0.0)
+    masses = np.array([body.mass for body in bodies], dtype=float)
+    weights = masses[:, None] / masses.sum()
+    positions = positions - (weights * positions).sum(axis=0)
+    velocities = velocities - (weights * velocities).sum(axis=0)
+    if reference is None:
+        reference = positions
+    return Problem(name, positions, velocities, masses, time_scale, duration,
+                   reference, universe)
+
+
+def _sun_and_planets(planet_names, eccentricity: float = None):
+    universe = Universe("Benchmark")
+    sun = SolarBody(sun_facts["mass"], sun_facts["radius"],
+                    sun_facts["mean temperature"], name="Sun")
+    universe.add_celestial_body(sun)
+    for name in planet_names:
+        facts = planetary_facts[name]
+        planet = PlanetaryBody(facts["mass"], facts["radius"], name=name)
+        universe.add_celestial_body(planet)
+        universe.add_orbit(Orbit(
+            sun, planet, facts["distance from sun"],
+            facts["orbital eccentricity"] if eccentricity is None
+            else eccentricity))
+    return universe
+
+
+def two_body_problem(planet_name: str = "Earth", eccentricity: float = 0.1,
+                     orbits: int = 10) -> Problem:
+    """Returns the Sun and a planet on a Keplerian orbit, run for a whole
+    number of periods (from calculate_orbital_period), after which they are
+    back where they started.
+
+    :param str planet_name: the planet (from planetary_facts)
+    :param float eccentricity: the eccentricity of the orbit
+    :param int orbits: the number of periods of the run
+    :return: the problem
+    :rtype: Problem
+    """
+    universe = _sun_and_planets([planet_name], eccentricity)
+    facts = planetary_facts[planet_name]
+    period = calculate_orbital_period(facts["distance from sun"],
+                                      sun_facts["mass"], facts["mass"])
+    return _universe_problem("two-body", universe, orbits * period, period)
+
+
+def sun_planets_problem(planet_names=planets, orbits: int = 1) -> Problem:
+    """Returns the Sun and planets (from fact_sheets), run for whole periods
+    of the innermost planet, with the reference state of a converged
+    integration.
+
+    :param planet_names: the planets
+    :param int orbits: the number of periods of the innermost planet
+    :return: the problem
+    :rtype: Problem
+    """
+    universe = _sun_and_planets(planet_names)
+    period = min(orbit.period for orbit in universe.orbits)
+    reference = BlockTimestepIntegrator(
+        universe, steps_per_orbit=_reference_steps_per_orbit,
+        max_time_step=period)
+    reference.propagate(orbits * period)
+    return _universe_problem("sun-planets", universe, orbits * period, period,
+                             reference.positions.copy())
+
+
+def _unit_scales(total_mass: float, length: float) -> Tuple[float, float]:
+    """Returns the time (days) and velocity (kilometers / second) of unit
+    G = 1 in units of the given mass (kilograms) and length (kilometers)."""
+    seconds = math.sqrt((length * meters_in_a_kilometer) ** 3 /
+                        (gravitational_constant * total_mass))
+    return seconds / seconds_in_a_day, length / seconds
+
+
+def figure_eight_problem(mass: float = solar_mass,
+                         scale: float = astronomical_unit,
+                         orbits: int = 2) -> Problem:
+    """Returns three equal masses on the figure-eight orbit, run for whole
+    periods, after which they are back where they started (to the 8 digits
+    of the initial conditions).
+
+    :param float mass: the mass of each body in kilograms
+    :param float scale: the length unit of the orbit in kilometers (the
+    bodies reach about one unit from the center)
+    :param int orbits: the number of periods of the run
+    :return: the problem
+    :rtype: Problem
+    """
+    time_unit, velocity_unit = _unit_scales(mass, scale)
+    x = np.array([_figure_eight_position + (0.0,),
+                  [-p for p in _figure_eight_position] + [0.0],
+                  [0.0, 0.0, 0.0]])
+    v3 = np.array(_figure_eight_velocity + (0.0,))
+    v = np.array([-v3 / 2, -v3 / 2, v3])
+    period = _figure_eight_period * time_unit
+    positions = x * scale
+    return Problem("figure-eight", positions, v * velocity_unit,
+                   np.full(3, float(mass)), period, orbits * period,
+                   positions)
+
+
+def plummer_problem(n_bodies: int = 64, total_mass: float = 1e+03 *
+                    solar_mass, radius: float = _parsec,
+                    softening: float = 0.05, duration: float = 2.0,
+                    seed=0) -> Problem:
+    """Returns a Plummer sphere of equal masses in virial equilibrium,
+    drawn by the method of Aarseth, Henon & Wielen (1974) and truncated at
+    10 scale radii.
+
+    :param int n_bodies: the number of bodies
+    :param float total_mass: the mass of the sphere in kilograms
+    :param float radius: the virial radius in kilometers (16 / 3pi Plummer
+    scale radii)
+    :param float softening: the softening length, relative to the radius
+    :param float duration: the duration of the run, in dynamical times
+    sqrt(R^3 / GM)
+    :param seed: the seed (or RandomStreams, or Generator) of the sphere
+    :return: the problem
+    :rtype: Problem
+    """
+    if n_bodies < 2:
+        raise ValueError(f"n_bodies ({n_bodies}) must be at least 2.")
+    rng = as_generator(seed)
+    distances = np.empty(0)
+    while len(distances) < n_bodies:
+        r = (rng.uniform(0.0, 1.0, n_bodies) ** (-2 / 3) - 1) ** -0.5
+        distances = np.concatenate((distances, r[r < 10.0]))[:n_bodies]
+    # Fractions q of the local escape velocity, from g(q) = q^2 (1 -
+    # q^2)^7/2, whose maximum is below 0.1
+    fractions = np.empty(0)
+    while len(fractions) < n_bodies:
+        q = rng.uniform(0.0, 1.0, 4 * n_bodies)
+        accepted = rng.uniform(0.0, 0.1, len(q)) < q ** 2 * \
+            (1 - q ** 2) ** 3.5
+        fractions = np.concatenate((fractions, q[accepted]))[:n_bodies]
+    speeds = fractions * math.sqrt(2) * (1 + distances ** 2) ** -0.25
+
+    def directions():
+        z = rng.uniform(-1.0, 1.0, n_bodies)
+        phi = rng.uniform(0.0, 2 * math.pi, n_bodies)
+        s = np.sqrt(1 - z ** 2)
+        return np.stack((s * np.cos(phi), s * np.sin(phi), z), axis=-1)
+
+    # From G = M = a = 1 to a virial radius of 1
+    positions = distances[:, None] * directions() * (3 * math.pi / 16)
+    velocities = speeds[:, None] * directions() / math.sqrt(3 * math.pi / 16)
+    positions -= positions.mean(axis=0)
+    velocities -= velocities.mean(axis=0)
+    time_unit, velocity_unit = _unit_scales(total_mass, radius)
+    return Problem(f"plummer-{n_bodies}", positions * radius,
+                   velocities * velocity_unit,
+                   np.full(n_bodies, total_mass / n_bodies), time_unit,
+                   duration * time_unit, softening=softening * radius)
+
+
+def canonical_problems(planet_names=planets,
+                       plummer_sizes=(32, 128)) -> List[Problem]:
+    """Returns the canonical problems: two-body, sun-planets, figure-eight
+    and a Plummer sphere of each size.
+
+    :param planet_names: the planets of the sun-planets problem
+    :param plummer_sizes: the numbers of bodies of the Plummer spheres
+    :return: the problems
+    :rtype: List[Problem]
+    """
+    return [two_body_problem(), sun_planets_problem(planet_names),
+            figure_eight_problem()] + \
+        [plummer_problem(n_bodies) for n_bodies in plummer_sizes]
+
+
+def _leapfrog(problem: Problem, steps_per_orbit: int, samples: int):
+    return LeapfrogIntegrator(problem.positions, problem.velocities,
+                              problem.masses,
+                              problem.time_scale / steps_per_orbit,
+                              problem.softening)
+
+
+def _hierarchical(problem: Problem, steps_per_orbit: int, samples: int):
+    if problem.universe is None:
+        return None
+    return HierarchicalPropagator(
+        problem.universe, time_step=problem.time_scale / steps_per_orbit,
+        softening=problem.softening)
+
+
+def _block_timestep(problem: Problem, steps_per_orbit: int, samples: int):
+    if problem.universe is None:
+        return None
+    # Bodies are synchronized at every sample
+    return BlockTimestepIntegrator(
+        problem.universe, steps_per_orbit=steps_per_orbit,
+        max_time_step=problem.duration / samples,
+        softening=problem.softening)
+
+
+# Builds an integrator for a problem at a number of steps per orbit (and
+# samples per run), or returns None if it cannot integrate the problem
+integrator_builders: Dict[str, Callable] = {
+    "leapfrog": _leapfrog,
+    "hierarchical": _hierarchical,
+    "block_timestep": _block_timestep,
+}
+
+
+def measure(problem: Problem, integrator: str = "leapfrog",
+            steps_per_orbit: int = 64, samples: int = 8,
+            repeat: int = 1) -> Measurement:
+    """Runs an integrator on a problem, sampling its energy at evenly
+    spaced times, and measures its accuracy and (best) wall time.
+
+    :param Problem problem: the problem
+    :param str integrator: the name of the integrator (one of
+    integrator_builders)
+    :param int steps_per_orbit: the number of steps per time scale of the
+    problem
+    :param int samples: the number of times the energy is sampled
+    :param int repeat: the number of timed runs (the best is kept)
+    :return: the measurement, or None if the integrator cannot integrate
+    the problem
+    :rtype: Measurement
+    """
+    if integrator not in integrator_builders:
+        raise KeyError(f"Unknown integrator {integrator}; choose from "
+                       f"{', '.join(integrator_builders)}")
+    if steps_per_orbit < 1 or samples < 1 or repeat < 1:
+        raise ValueError("steps_per_orbit, samples and repeat must be "
+                         "positive.")
+    wall_times = []
+    for _ in range(repeat):
+        instance = integrator_builders[integrator](problem, steps_per_orbit,
+                                                   samples)
+        if instance is None:
+            return None
+        energies = [calculate_diagnostics(
+            *instance.barycentric_state(), instance.masses,
+            softening=problem.softening).total_energy]
+        extent = np.zeros(problem.n_bodies)
+        wall_time = 0.0
+        for _ in range(samples):
+            start = time.perf_counter()
+            instance.propagate(problem.duration / samples)
+            wall_time += time.perf_counter() - start
+            positions, velocities = instance.barycentric_state()
+            energies.append(calculate_diagnostics(
+                positions, velocities, instance.masses,
+                softening=problem.softening).total_energy)
+            extent = np.maximum(extent, np.linalg.norm(positions, axis=1))
+        wall_times.append(wall_time)
+    energies = np.array(energies)
+    errors = (energies - energies[0]) / abs(energies[0])
+    phase_error = math.nan
+    if problem.reference is not None:
+        extent = np.maximum(extent, np.linalg.norm(problem.reference, axis=1))
+        phase_error = float(np.max(np.linalg.norm(
+            positions - problem.reference, axis=1) / extent))
+    steps = getattr(instance, "block_steps", None)
+    if steps is None:
+        steps = instance.steps
+    return Measurement(problem.name, integrator, problem.n_bodies,
+                       steps_per_orbit, steps, instance.force_evaluations,
+                       min(wall_times), float(np.abs(errors).max()),
+                       float(errors[-1]), phase_error)
+
+
+def benchmark_integrators(problems: List[Problem] = None,
+                          integrators: List[str] = None,
+                          steps_per_orbit=(16, 32, 64, 128),
+                          samples: int = 8,
+                          repeat: int = 3) -> List[Measurement]:
+    """Measures every integrator on every problem it can integrate, at
+    every number of steps per orbit.
+
+    :param List[Problem] problems: the problems; defaults to
+    canonical_problems()
+    :param List[str] integrators: the names of the integrators; defaults to
+    all of them
+    :param steps_per_orbit: the numbers of steps per time scale
+    :param int samples: the number of times the energy is sampled per run
+    :param int repeat: the number of timed runs of each measurement
+    :return: the measurements
+    :rtype: List[Measurement]
+    """
+    if problems is None:
+        problems = canonical_problems()
+    if integrators is None:
+        integrators = list(integrator_builders)
+    measurements = []
+    for problem in problems:
+        for name in integrators:
+            for steps in steps_per_orbit:
+                measurement = measure(problem, name, steps, samples, repeat)
+                if measurement is not None:
+                    measurements.append(measurement)
+    return measurements
+
+
+def accuracy_cost_curves(measurements: List[Measurement]) \
+        -> Dict[Tuple[str, str], AccuracyCostCurve]:
+    """Groups measurements into the accuracy versus cost curve of each
+    integrator on each problem.
+
+    :param List[Measurement] measurements: the measurements
+    :return: the curve of each (problem, integrator)
+    :rtype: Dict[Tuple[str, str], AccuracyCostCurve]
+    """
+    groups: Dict[Tuple[str, str], List[Measurement]] = {}
+    for measurement in measurements:
+        groups.setdefault((measurement.problem, measurement.integrator),
+                          []).append(measurement)
+    curves = {}
+    for key, group in groups.items():
+        group.sort(key=lambda measurement: measurement.wall_time)
+        curves[key] = AccuracyCostCurve(
+            np.array([m.steps_per_orbit for m in group]),
+            np.array([m.wall_time for m in group]),
+            np.array([m.energy_error for m in group]),
+            np.array([m.phase_error for m in group]))
+    return curves
+
+
+def plot_accuracy_cost_curves(measurements: List[Measurement],
+                              output: Union[str, BinaryIO] = None,
+                              image_format: str = "png", dpi: int = 120):
+    """Plots the energy and phase errors of each integrator against its
+    wall time, one row of panels per problem.
+
+    :param List[Measurement] measurements: the measurements
+    :param output: a path or binary file the figure is saved to
+    :param str image_format: the image format of output
+    :param int dpi: the resolution of output
+    :return: the figure
+    :rtype: matplotlib.figure.Figure
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    curves = accuracy_cost_curves(measurements)
+    problems = list(dict.fromkeys(problem for problem, _ in curves))
+    figure = Figure(figsize=(10, 3.5 * len(problems)))
+    FigureCanvasAgg(figure)
+    axes = figure.subplots(len(problems), 2, squeeze=False)
+    for row, problem in zip(axes, problems):
+        for (name, integrator), curve in curves.items():
+            if name != problem:
+                continue
+            for ax, errors in zip(row, (curve.energy_error,
+                                        curve.phase_error)):
+                ax.loglog(curve.wall_time, np.maximum(errors, 1e-17), "o-",
+                          label=integrator)
+        for ax, metric in zip(row, ("energy error", "phase error")):
+            ax.set_title(f"{problem}: {metric}")
+            ax.set_xlabel("wall time (s)")
+            ax.legend()
+    figure.tight_layout()
+    if output is not None:
+        figure.savefig(output, format=image_format, dpi=dpi)
+    return figure
+
+
+def save_baseline(measurements: List[Measurement], path: str) -> None:
+    """Saves measurements as a baseline (JSON).
+
+    :param List[Measurement] measurements: the measurements
+    :param str path: the file
+    :return: None
+    """
+    with open(path, "w") as file:
+        json.dump({"version": _baseline_version,
+                   "measurements": [m._asdict() for m in measurements]},
+                  file, indent=1)
+
+
+def load_baseline(path: str) -> List[Measurement]:
+    """Loads a baseline saved by save_baseline.
+
+    :param str path: the file
+    :return: the measurements
+    :rtype: List[Measurement]
+    """
+    with open(path) as file:
+        contents = json.load(file)
+    if contents.get("version") != _baseline_version:
+        raise ValueError(f"{path} is not a version {_baseline_version} "
+                         f"baseline.")
+    return [Measurement(**m) for m in contents["measurements"]]
+
+
+def find_regressions(measurements: List[Measurement],
+                     baseline: List[Measurement],
+                     accuracy_factor: float = 2.0,
+                     speed_factor: float = 1.5,
+                     accuracy_floor: float = 1e-13) -> List[Regression]:
+    """Compares measurements against the baseline measurements with the
+    same problem, integrator and steps per orbit. An error regresses when
+    it exceeds accuracy_factor times its baseline (and the floor, below
+    which errors are rounding); the wall time per step regresses when it
+    exceeds speed_factor times its baseline.
+
+    :param List[Measurement] measurements: the measurements
+    :param List[Measurement] baseline: the baseline measurements
+    :param float accuracy_factor: the factor errors may grow by
+    :param float speed_factor: the factor wall times per step may grow by
+    :param float accuracy_floor: errors below which are never regressions
+    :return: the regressions
+    :rtype: List[Regression]
+    """
+    expected = {m.key: m for m in baseline}
+    regressions = []
+    for measurement in measurements:
+        reference = expected.get(measurement.key)
+        if reference is None:
+            continue
+        for metric in ("energy_error", "phase_error"):
+            value = getattr(measurement, metric)
+            expected_value = getattr(reference, metric)
+            # Problems without a reference state have no phase error
+            if math.isnan(expected_value):
+                continue
+            if math.isnan(value) or value > max(
+                    accuracy_factor * expected_value, accuracy_floor):
+                regressions.append(Regression(measurement.key, metric,
+                                              expected_value, value))
+        if measurement.wall_time_per_step > \
+                speed_factor * reference.wall_time_per_step:
+            regressions.append(Regression(
+                measurement.key, "wall_time_per_step",
+                reference.wall_time_per_step,
+                measurement.wall_time_per_step))
+    return regressions
+
+
+def check_regressions(measurements: List[Measurement],
+                      baseline: List[Measurement], **tolerances) -> None:
+    """Raises a RegressionError if any measurement is less accurate or
+    slower than its baseline (see find_regressions for the tolerances).
+
+    :param List[Measurement] measurements: the measurements
+    :param List[Measurement] baseline: the baseline measurements
+    :return: None
+    :raises: RegressionError
+    """
+    regressions = find_regressions(measurements, baseline, **tolerances)
+    if len(regressions) > 0:
+        raise RegressionError("Integrators regressed:\n" + "\n".join(
+            str(regression) for regression in regressions))
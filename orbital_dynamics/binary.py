@@ -0,0 +1,76 @@
+"""Binary and hierarchical multiple systems.
+
+Orbit treats its primary body as fixed, which suits a planet around a star
+but not two stars of comparable mass, which both orbit their shared center
+of mass. A binary is instead built around a Barycenter, which stands in as
+the primary body of both members in the orbital graph:
+
+    barycenter (mass m_1 + m_2)
+        star 1: BarycentricOrbit, a_1 = a m_2 / (m_1 + m_2)
+        star 2: BarycentricOrbit, a_2 = a m_1 / (m_1 + m_2), opposite side
+        planet: Orbit around both stars (circumbinary)
+
+Hierarchical multiples nest barycenters, e.g., a triple is the binary of an
+inner binary's barycenter and a third star:
+
+    inner, orbit_a, orbit_b = create_binary(star_a, star_b, 3.0e7, 0.1)
+    outer, orbit_ab, orbit_c = create_binary(inner, star_c, 1.5e9, 0.3)
+    universe.add_celestial_bodies([inner, outer])
+    universe.add_orbits([orbit_a, orbit_b, orbit_ab, orbit_c])
+
+Universe.propagate_state_vectors then sums the orbits up the graph (with
+barycentric=True, about the center of mass of the bodies).
+"""
+import math
+from typing import Tuple
+from celestial_bodies.celestial_bodies import CelestialBody, Barycenter
+from orbital_dynamics.orbit import BarycentricOrbit, CollisionError
+
+
+def create_binary(body1: CelestialBody, body2: CelestialBody,
+                  semimajor_axis: float, eccentricity: float,
+                  argument_of_periapsis: float = 0.0,
+                  mean_anomaly_at_epoch: float = 0.0,
+                  name: str = None) \
+        -> Tuple[Barycenter, BarycentricOrbit, BarycentricOrbit]:
+    """Creates the barycenter of two bodies and the orbits of both bodies
+    around it, from their relative orbit (the orbit of body2 as seen from
+    body1).
+
+    Either body may itself be a Barycenter, which makes a hierarchical
+    multiple.
+
+    :param CelestialBody body1: the first member
+    :param CelestialBody body2: the second member
+    :param float semimajor_axis: the semi-major axis of the relative orbit
+    in kilometers
+    :param float eccentricity: the eccentricity of the relative orbit
+    (0 <= e < 1)
+    :param float argument_of_periapsis: the angle (in radians) from the
+    reference direction to body1's periapsis (body2's lies opposite)
+    :param float mean_anomaly_at_epoch: the mean anomaly (in radians) of
+    the relative orbit at time 0
+    :param str name: the name of the barycenter; defaults to the names of
+    the members (e.g., "Alpha Centauri A-Alpha Centauri B")
+    :return: the barycenter and the orbits of body1 and body2
+    :rtype: Tuple[Barycenter, BarycentricOrbit, BarycentricOrbit]
+    :raises: CollisionError if the members touch at periapsis
+    """
+    if semimajor_axis * (1 - eccentricity) <= body1.radius + body2.radius:
+        raise CollisionError(f"{body1.name} and {body2.name} collide at "
+                             f"periapsis.")
+    mass = body1.mass + body2.mass
+    if name is None:
+        name = f"{body1.name}-{body2.name}"
+    barycenter = Barycenter(mass, name)
+    orbit1 = BarycentricOrbit(barycenter, body1,
+                              semimajor_axis * body2.mass / mass,
+                              eccentricity, argument_of_periapsis,
+                              mean_anomaly_at_epoch)
+    orbit2 = BarycentricOrbit(barycenter, body2,
+                              semimajor_axis * body1.mass / mass,
+                              eccentricity,
+                              (argument_of_periapsis + math.pi) %
+                              (2 * math.pi),
+                              mean_anomaly_at_epoch)
+    return barycenter, orbit1, orbit2
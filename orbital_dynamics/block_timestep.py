@@ -0,0 +1,311 @@
+"""Block (individual) time stepping for multi-scale systems.
+
+Each body is given its own time step, quantized to a power-of-two fraction
+of a maximum step: dt_k = max_time_step / 2^k. Bodies on the same level
+are advanced together, and only the bodies that are due at the next block
+time are updated; everyone else is merely predicted to that time to serve
+as a source of gravity. Bodies are advanced with a fourth-order Hermite
+predictor-corrector (Makino & Aarseth 1992).
+
+A body's level is chosen either from the orbital periods it takes part in
+("period": the period of its own orbit and of every orbit around it,
+divided by steps_per_orbit) or from its local acceleration and jerk
+("aarseth": eta * |a| / |j|). Times are tracked as integer ticks of the
+smallest level, so block times are exactly commensurate.
+"""
+import math
+from typing import Dict, List
+import numpy as np
+from celestial_bodies.celestial_bodies import Barycenter
+from facts.numerical_constants import meters_in_a_kilometer, \
+    seconds_in_a_day
+from kernels import kernels
+
+
+def calculate_acceleration_and_jerk(active: np.ndarray,
+                                    positions: np.ndarray,
+                                    velocities: np.ndarray,
+                                    masses: np.ndarray,
+                                    softening: float = 0.0,
+                                    backend: str = None):
+    """Calculates the gravitational acceleration and its time derivative
+    (jerk) of the active bodies due to every other body, with the pull of
+    each body from the gravitational_acceleration kernel of the backend.
+
+    :param np.ndarray active: indices of the bodies to evaluate
+    :param np.ndarray positions: (n, 3) positions in kilometers
+    :param np.ndarray velocities: (n, 3) velocities in kilometers / second
+    :param np.ndarray masses: (n,) masses in kilograms
+    :param float softening: Plummer softening length in kilometers
+    :param str backend: the kernel backend (see kernels.get_backend);
+    defaults to the active backend
+    :return: (len(active), 3) accelerations in kilometers / second squared
+    and jerks in kilometers / second cubed
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    dx = positions[None, :, :] - positions[active, None, :]
+    dv = velocities[None, :, :] - velocities[active, None, :]
+    distance_squared = np.einsum("abk,abk->ab", dx, dx) + softening ** 2
+    distance_squared[np.arange(len(active)), active] = np.inf
+    distance = np.sqrt(distance_squared)
+    rv = np.einsum("abk,abk->ab", dx, dv) / distance_squared
+    # G m / |r|^2 in kilometers / second squared, along dx / |r|
+    weights = kernels.get_backend(backend).array_kernel(
+        "gravitational_acceleration")(masses[None, :], distance) / \
+        (meters_in_a_kilometer * distance)
+    acceleration = np.einsum("ab,abk->ak", weights, dx)
+    jerk = np.einsum("ab,abk->ak", weights, dv) - \
+        3 * np.einsum("ab,abk->ak", weights * rv, dx)
+    return acceleration, jerk
+
+
+class BlockTimestepIntegrator:
+    """Integrates every body of a Universe with individual, power-of-two
+    block time steps.
+
+    Units: positions in kilometers, velocities in kilometers / second,
+    time in days.
+    """
+
+    def __init__(self, universe, criterion: str = "period",
+                 steps_per_orbit: int = 200, eta: float = 0.02,
+                 max_time_step: float = None, max_level: int = 30,
+                 softening: float = 0.0) -> None:
+        """Initializes the barycentric state of every body from its Orbit at
+        time 0 and assigns each body to a time step level.
+
+        :param Universe universe: the universe to integrate
+        :param str criterion: "period" or "aarseth"
+        :param int steps_per_orbit: steps per orbital period ("period")
+        :param float eta: accuracy parameter for |a| / |j| ("aarseth")
+        :param float max_time_step: the largest time step in days; defaults
+        to the largest step requested by any body
+        :param int max_level: the deepest level (smallest step is
+        max_time_step / 2^max_level)
+        :param float softening: Plummer softening length in kilometers
+        """
+        if criterion not in ("period", "aarseth"):
+            raise ValueError(f"criterion ({criterion}) must be 'period' or "
+                             f"'aarseth'.")
+        bodies, positions, velocities = universe.state_vectors(0.0)
+        _, parents, orbits = universe.flatten_orbital_graph()
+        if parents.count(-1) > 1:
+            # Every root sits at rest at the origin (see state_vectors), so
+            # the roots of unrelated trees would coincide
+            raise ValueError(f"{universe.name} has {parents.count(-1)} "
+                             f"unrelated roots; integrate each tree in a "
+                             f"universe of its own.")
+        # Barycenters of binaries and multiples are points, not bodies: only
+        # their members are integrated
+        keep = np.array([not isinstance(body, Barycenter) for body in bodies],
+                        dtype=bool)
+        if keep.sum() < 2:
+            raise ValueError(f"{universe.name} has no orbits to integrate.")
+        bodies = [body for body, kept in zip(bodies, keep) if kept]
+        positions, velocities = positions[keep], velocities[keep]
+        self.bodies = bodies
+        self.masses = np.array([body.mass for body in bodies], dtype=float)
+        weights = self.masses[:, None] / self.masses.sum()
+        self.positions = positions - (weights * positions).sum(axis=0)
+        self.velocities = velocities - (weights * velocities).sum(axis=0)
+        self.criterion = criterion
+        self.steps_per_orbit = steps_per_orbit
+        self.eta = eta
+        self.max_level = max_level
+        self.softening = softening
+        # Smallest period each body takes part in (its own orbit and every
+        # orbit around it), in seconds
+        periods = np.full(len(keep), np.inf)
+        for idx, (parent, orbit) in enumerate(zip(parents, orbits)):
+            if parent < 0:
+                continue
+            period = orbit.period * seconds_in_a_day
+            periods[idx] = min(periods[idx], period)
+            periods[parent] = min(periods[parent], period)
+        self._periods = periods[keep]
+        everyone = np.arange(len(bodies))
+        self.accelerations, self.jerks = calculate_acceleration_and_jerk(
+            everyone, self.positions, self.velocities, self.masses,
+            softening)
+        desired = self._desired_time_steps(everyone)
+        if max_time_step is None:
+            max_time_step = desired.max() / seconds_in_a_day
+        if max_time_step <= 0:
+            raise ValueError(f"max_time_step ({max_time_step}) must be "
+                             f"positive.")
+        self.max_time_step = max_time_step
+        self.tick = max_time_step * seconds_in_a_day / 2 ** max_level
+        self.levels = self._quantize(desired)
+        self.body_ticks = np.zeros(len(bodies), dtype=np.int64)
+        self.ticks = 0
+        self.force_evaluations = 0
+        self.block_steps = 0
+        self.smallest_level = int(self.levels.max())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self.bodies)} bodies, " \
+            f"criterion={self.criterion})"
+
+    @property
+    def time(self) -> float:
+        """Returns the current (block) time in days.
+
+        :return: time in days
+        :rtype: float
+        """
+        return self.ticks * self.tick / seconds_in_a_day
+
+    @property
+    def body_names(self) -> List[str]:
+        """Returns the names of the bodies, in integration order.
+
+        :return: names of the bodies
+        :rtype: List[str]
+        """
+        return [body.name for body in self.bodies]
+
+    def barycentric_state(self):
+        """Returns every body's position and velocity at the current block
+        time (bodies which are not due are predicted to it).
+
+        :return: (n, 3) positions in kilometers and (n, 3) velocities in
+        kilometers / second
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        return self._predict(self.ticks)
+
+    def reduce_time_step(self, factor: float = 0.5) -> None:
+        """Shrinks every body's time step by at least the given factor, by
+        moving each body down whole levels (a body may move to a smaller
+        step at any time).
+
+        :param float factor: the factor (0 < factor < 1)
+        :return: None
+        """
+        if not 0 < factor < 1:
+            raise ValueError(f"factor ({factor}) must be between 0 and 1.")
+        levels = math.ceil(-math.log2(factor) - 1e-12)
+        self.levels = np.minimum(self.levels + levels, self.max_level)
+        self.steps_per_orbit /= factor
+        self.eta *= factor
+        self.smallest_level = max(self.smallest_level,
+                                  int(self.levels.max()))
+
+    def _desired_time_steps(self, idx: np.ndarray) -> np.ndarray:
+        """Returns the unquantized time step (seconds) requested by each of
+        the given bodies."""
+        if self.criterion == "period":
+            return self._periods[idx] / self.steps_per_orbit
+        acceleration = np.linalg.norm(self.accelerations[idx], axis=1)
+        jerk = np.linalg.norm(self.jerks[idx], axis=1)
+        with np.errstate(divide="ignore"):
+            return self.eta * acceleration / jerk
+
+    def _quantize(self, time_steps: np.ndarray) -> np.ndarray:
+        """Returns the level whose step is the largest power-of-two
+        fraction of max_time_step not exceeding each time step."""
+        ratio = self.max_time_step * seconds_in_a_day / time_steps
+        with np.errstate(divide="ignore"):
+            levels = np.ceil(np.log2(np.maximum(ratio, 1.0)) - 1e-12)
+        return np.clip(levels, 0, self.max_level).astype(np.int64)
+
+    def _level_ticks(self, levels: np.ndarray) -> np.ndarray:
+        return np.left_shift(np.int64(1), self.max_level - levels)
+
+    def _predict(self, target_ticks: int):
+        """Predicts every body to the given time with a Taylor expansion.
+
+        :return: predicted positions and velocities
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        dt = ((target_ticks - self.body_ticks) * self.tick)[:, None]
+        positions = self.positions + self.velocities * dt + \
+            self.accelerations * dt ** 2 / 2 + self.jerks * dt ** 3 / 6
+        velocities = self.velocities + self.accelerations * dt + \
+            self.jerks * dt ** 2 / 2
+        return positions, velocities
+
+    def step(self) -> np.ndarray:
+        """Advances the bodies which are due at the next block time.
+
+        :return: indices of the bodies that were advanced
+        :rtype: np.ndarray
+        """
+        due_ticks = self.body_ticks + self._level_ticks(self.levels)
+        target = int(due_ticks.min())
+        active = np.flatnonzero(due_ticks == target)
+        positions, velocities = self._predict(target)
+        acceleration, jerk = calculate_acceleration_and_jerk(
+            active, positions, velocities, self.masses, self.softening)
+        dt = ((target - self.body_ticks[active]) * self.tick)[:, None]
+        a0, j0 = self.accelerations[active], self.jerks[active]
+        v0 = self.velocities[active]
+        # Hermite corrector
+        v1 = v0 + (a0 + acceleration) * dt / 2 + \
+            (j0 - jerk) * dt ** 2 / 12
+        x1 = self.positions[active] + (v0 + v1) * dt / 2 + \
+            (a0 - acceleration) * dt ** 2 / 12
+        self.positions[active] = x1
+        self.velocities[active] = v1
+        self.accelerations[active] = acceleration
+        self.jerks[active] = jerk
+        self.body_ticks[active] = target
+        self.ticks = target
+        self.force_evaluations += len(active)
+        self.block_steps += 1
+        if self.criterion == "aarseth":
+            self._update_levels(active)
+        self.smallest_level = max(self.smallest_level,
+                                  int(self.levels.max()))
+        return active
+
+    def _update_levels(self, active: np.ndarray) -> None:
+        """Moves active bodies to the level of their new desired step. A
+        body may move to a smaller step at any time, but only to the next
+        larger step when its time is commensurate with that step."""
+        desired = self._quantize(self._desired_time_steps(active))
+        current = self.levels[active]
+        new = np.where(desired > current, desired, current)
+        can_grow = (desired < current) & (current > 0) & (
+            self.body_ticks[active] %
+            self._level_ticks(np.maximum(current - 1, 0)) == 0)
+        new = np.where(can_grow, current - 1, new)
+        self.levels[active] = new
+
+    def propagate(self, duration: float) -> np.ndarray:
+        """Advances every body by at least the given duration, stopping at
+        the first multiple of max_time_step (where all bodies are
+        synchronized).
+
+        :param float duration: the duration in days
+        :return: (n, 3) array of barycentric positions in kilometers
+        :rtype: np.ndarray
+        """
+        if duration < 0:
+            raise ValueError(f"duration ({duration}) must not be negative.")
+        n_blocks = math.ceil(duration / self.max_time_step - 1e-12)
+        end = self.ticks + n_blocks * (1 << self.max_level)
+        while self.ticks < end:
+            self.step()
+        return self.positions.copy()
+
+    def work_report(self) -> Dict[str, float]:
+        """Compares the force evaluations performed so far against a single
+        global time step equal to the smallest step used by any body.
+
+        :return: force evaluations performed, evaluations a global step
+        would have needed, and the fraction of work saved
+        :rtype: Dict[str, float]
+        """
+        smallest_step_ticks = 1 << (self.max_level - self.smallest_level)
+        global_evaluations = len(self.bodies) * (
+            self.ticks / smallest_step_ticks)
+        saved = 0.0
+        if global_evaluations > 0:
+            saved = 1 - self.force_evaluations / global_evaluations
+        return {
+            "force_evaluations": self.force_evaluations,
+            "global_force_evaluations": global_evaluations,
+            "work_saved": saved,
+            "block_steps": self.block_steps,
+        }
@@ -0,0 +1,302 @@
+"""Conservation diagnostics for integrators.
+
+An isolated system conserves its total energy, linear momentum and angular
+momentum; how far an integrator lets them drift measures whether its time
+step is small enough. The diagnostics of a state are computed over whole
+body arrays, with the potential energy from the direct-sum solver:
+
+    kinetic energy: K = sum 1/2 m v^2
+    potential energy: U = -G sum_i<j m_i m_j / r_ij
+    linear momentum: P = sum m v
+    angular momentum: L = sum m r x v
+    virial ratio: 2K / |U| (1 for a relaxed, bound system)
+
+A DiagnosticsMonitor drives an integrator (HierarchicalPropagator,
+BlockTimestepIntegrator, or anything with step(), time, masses and
+barycentric_state()), samples the diagnostics every cadence steps, streams
+them to a CSV file, and reacts when the energy or angular momentum error
+exceeds a tolerance: by reducing the integrator's time step (if it has
+reduce_time_step()), by issuing a ConservationWarning, or by calling a
+function.
+"""
+import csv
+import math
+import warnings
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Union
+import numpy as np
+from facts.numerical_constants import meters_in_a_kilometer
+from gravity.direct_sum import calculate_potential_energy
+
+actions = ("reduce", "warn", "raise")
+
+
+class ConservationWarning(UserWarning):
+    """Warning issued when an integrator fails to conserve energy or
+    angular momentum to the requested tolerance."""
+    pass
+
+
+class ConservationError(ValueError):
+    """Exception raised (with the "raise" action) when an integrator fails
+    to conserve energy or angular momentum to the requested tolerance."""
+    pass
+
+
+class Diagnostics(NamedTuple):
+    """Conservation quantities of a system at one time.
+
+    Units: time in days, energies in Joules, linear momentum in kilogram
+    meters / second, angular momentum in kilogram square meters / second.
+    """
+    time: float
+    kinetic_energy: float
+    potential_energy: float
+    linear_momentum: np.ndarray
+    angular_momentum: np.ndarray
+
+    @property
+    def total_energy(self) -> float:
+        return self.kinetic_energy + self.potential_energy
+
+    @property
+    def virial_ratio(self) -> float:
+        if self.potential_energy == 0:
+            return math.inf
+        return 2 * self.kinetic_energy / abs(self.potential_energy)
+
+
+def calculate_diagnostics(positions, velocities, masses, time: float = 0.0,
+                          softening: float = 0.0) -> Diagnostics:
+    """Calculates the conservation quantities of a system of bodies.
+
+    :param positions: (n, 3) array of positions in kilometers
+    :param velocities: (n, 3) array of velocities in kilometers / second
+    :param masses: (n,) array of masses in kilograms
+    :param float time: the time of the state in days
+    :param float softening: Plummer softening length in kilometers (use the
+    integrator's, so that the energy is the one it conserves)
+    :return: the diagnostics
+    :rtype: Diagnostics
+    """
+    positions = np.asarray(positions, dtype=float)
+    velocities = np.asarray(velocities, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    # Work in meters and meters / second
+    r = positions * meters_in_a_kilometer
+    v = velocities * meters_in_a_kilometer
+    kinetic = 0.5 * float(masses @ np.einsum("ij,ij->i", v, v))
+    potential = calculate_potential_energy(positions, masses, softening)
+    momentum = masses @ v
+    angular_momentum = masses @ np.cross(r, v)
+    return Diagnostics(time, kinetic, potential, momentum, angular_momentum)
+
+
+_csv_header = ("time", "kinetic_energy", "potential_energy", "total_energy",
+               "energy_error", "linear_momentum_x", "linear_momentum_y",
+               "linear_momentum_z", "angular_momentum_x",
+               "angular_momentum_y", "angular_momentum_z",
+               "angular_momentum_error", "virial_ratio")
+
+
+class DiagnosticsMonitor:
+    """Steps an integrator while sampling its conservation diagnostics.
+
+    Example:
+        propagator = HierarchicalPropagator(universe)
+        with DiagnosticsMonitor(propagator, cadence=10,
+                                path="diagnostics.csv",
+                                energy_tolerance=1e-6) as monitor:
+            monitor.propagate(365.25 * 100)
+    """
+
+    def __init__(self, integrator, cadence: int = 1, path: str = None,
+                 energy_tolerance: float = None,
+                 angular_momentum_tolerance: float = None,
+                 action: Union[str, Callable] = "reduce",
+                 reduction_factor: float = 0.5, history: int = 1000,
+                 softening: float = None) -> None:
+        """Samples the initial state as the baseline of the errors.
+
+        :param integrator: the integrator to drive
+        :param int cadence: the number of steps between samples
+        :param str path: the CSV file the samples are streamed to; if None,
+        samples are only kept in memory (see history)
+        :param float energy_tolerance: the largest relative energy error,
+        |E - E0| / |E0|, before action is taken
+        :param float angular_momentum_tolerance: the largest relative
+        angular momentum error, |L - L0| / |L0|, before action is taken
+        :param action: "reduce" (the time step, or warn if the integrator
+        cannot), "warn", "raise", or a function called with the monitor and
+        the violation
+        :param float reduction_factor: the factor the time step is reduced
+        by
+        :param int history: the number of recent samples kept in memory
+        :param float softening: softening length (kilometers) of the
+        potential energy; defaults to the integrator's
+        """
+        if cadence < 1:
+            raise ValueError(f"cadence ({cadence}) must be >= 1.")
+        if not callable(action) and action not in actions:
+            raise ValueError(f"action ({action}) must be callable or one of "
+                             f"{', '.join(actions)}")
+        self.integrator = integrator
+        self.cadence = cadence
+        self.energy_tolerance = energy_tolerance
+        self.angular_momentum_tolerance = angular_momentum_tolerance
+        self.action = action
+        self.reduction_factor = reduction_factor
+        if softening is None:
+            softening = getattr(integrator, "softening", 0.0)
+        self.softening = softening
+        self.samples = deque(maxlen=history)
+        self.violations: List[Dict[str, float]] = []
+        self.steps = 0
+        self._file = None
+        if path is not None:
+            self._file = open(path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(_csv_header)
+        self.baseline = self.sample()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.integrator!r}, " \
+            f"cadence={self.cadence})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Closes the CSV file of the samples.
+
+        :return: None
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def energy_error(self, diagnostics: Diagnostics) -> float:
+        """Returns the relative energy error of a sample against the
+        baseline, or the absolute error if the baseline energy is zero.
+
+        :param Diagnostics diagnostics: the sample
+        :return: |E - E0| / |E0|, or |E - E0| if E0 = 0
+        :rtype: float
+        """
+        reference = self.baseline.total_energy
+        error = abs(diagnostics.total_energy - reference)
+        if reference == 0:
+            return error
+        return error / abs(reference)
+
+    def angular_momentum_error(self, diagnostics: Diagnostics) -> float:
+        """Returns the relative angular momentum error of a sample against
+        the baseline, or the absolute error if the baseline angular
+        momentum is zero.
+
+        :param Diagnostics diagnostics: the sample
+        :return: |L - L0| / |L0|, or |L - L0| if L0 = 0
+        :rtype: float
+        """
+        reference = self.baseline.angular_momentum
+        error = float(np.linalg.norm(diagnostics.angular_momentum -
+                                     reference))
+        scale = np.linalg.norm(reference)
+        if scale == 0:
+            return error
+        return float(error / scale)
+
+    def sample(self) -> Diagnostics:
+        """Samples the integrator's current state, streaming it to the CSV
+        file.
+
+        :return: the diagnostics
+        :rtype: Diagnostics
+        """
+        positions, velocities = self.integrator.barycentric_state()
+        diagnostics = calculate_diagnostics(
+            positions, velocities, self.integrator.masses,
+            self.integrator.time, self.softening)
+        self.samples.append(diagnostics)
+        if self._file is not None:
+            if len(self.samples) == 1 and self.steps == 0:
+                energy_error = angular_momentum_error = 0.0
+            else:
+                energy_error = self.energy_error(diagnostics)
+                angular_momentum_error = self.angular_momentum_error(
+                    diagnostics)
+            self._writer.writerow(
+                [diagnostics.time, diagnostics.kinetic_energy,
+                 diagnostics.potential_energy, diagnostics.total_energy,
+                 energy_error, *diagnostics.linear_momentum,
+                 *diagnostics.angular_momentum, angular_momentum_error,
+                 diagnostics.virial_ratio])
+        return diagnostics
+
+    def check(self, diagnostics: Diagnostics) -> None:
+        """Takes action if a sample exceeds a tolerance. After the time step
+        is reduced, the sample becomes the new baseline, so that later
+        errors measure the drift at the new time step.
+
+        :param Diagnostics diagnostics: the sample
+        :return: None
+        :raises: ConservationError with the "raise" action
+        """
+        errors = {"energy": (self.energy_error(diagnostics),
+                             self.energy_tolerance),
+                  "angular_momentum": (
+                      self.angular_momentum_error(diagnostics),
+                      self.angular_momentum_tolerance)}
+        exceeded = {name: error for name, (error, tolerance)
+                    in errors.items()
+                    if tolerance is not None and error > tolerance}
+        if len(exceeded) == 0:
+            return
+        violation = {"time": diagnostics.time, **exceeded}
+        self.violations.append(violation)
+        message = f"Conservation error at t={diagnostics.time} days: " + \
+            ", ".join(f"{name} {error:.3g}"
+                      for name, error in exceeded.items())
+        if callable(self.action):
+            self.action(self, violation)
+        elif self.action == "raise":
+            raise ConservationError(message)
+        elif self.action == "reduce" and \
+                hasattr(self.integrator, "reduce_time_step"):
+            self.integrator.reduce_time_step(self.reduction_factor)
+            self.baseline = diagnostics
+        else:
+            warnings.warn(message, ConservationWarning)
+
+    def step(self) -> None:
+        """Advances the integrator by one step, sampling (and checking) the
+        diagnostics every cadence steps.
+
+        :return: None
+        """
+        self.integrator.step()
+        self.steps += 1
+        if self.steps % self.cadence == 0:
+            self.check(self.sample())
+
+    def propagate(self, duration: float) -> Diagnostics:
+        """Steps the integrator until at least the given duration (in days)
+        has passed, then samples the final state.
+
+        :param float duration: the duration in days
+        :return: the diagnostics of the final state
+        :rtype: Diagnostics
+        """
+        if duration < 0:
+            raise ValueError(f"duration ({duration}) must not be negative.")
+        end = self.integrator.time + duration
+        while self.integrator.time < end - 1e-9 * max(abs(end), 1):
+            self.step()
+        if self.steps % self.cadence != 0:
+            diagnostics = self.sample()
+            self.check(diagnostics)
+            return diagnostics
+        return self.samples[-1]
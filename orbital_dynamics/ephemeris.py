@@ -0,0 +1,356 @@
+"""Ephemerides: orbits tabulated as piecewise Chebyshev polynomials.
+
+Solving Kepler's equation for every query is wasteful when the same spans
+are queried over and over; an ephemeris is built once and then answers
+position and velocity queries by evaluating polynomials.
+
+Every orbit is tabulated relative to its primary body, split into
+segments of equal length, on each of which x and y are Chebyshev series of
+a fixed degree, fitted at the Chebyshev nodes of the segment:
+
+    p(t) = sum_k c_k T_k(x),  x = 2 (t - t_0) / L - 1  in [-1, 1]
+
+and evaluated from the recurrences of the Chebyshev polynomials, a chunk
+of queries at a time; velocities are the derivatives of the same series,
+T'_k = k U_(k-1). The segment length is sized per body to an error
+tolerance: the number of segments per orbital period is doubled until the
+largest error, checked between the nodes of every segment, is within the
+tolerance. Kepler orbits relative to their primaries are periodic and the
+segments tile the period, so only one period of segments is stored per
+body, however long the span (orbits with periods longer than the span are
+tiled over the span instead). Positions relative to the roots of the tree
+sum the orbits up the tree, like calculate_positions.
+
+save_ephemeris writes an ephemeris to a directory of raw .npy arrays plus
+a small JSON manifest, and load_ephemeris memory-maps the arrays, so that
+processes share the pages of large ephemerides and only the segments that
+are queried are read from disk.
+
+Example:
+    ephemeris = build_ephemeris(universe.columns(), 0, 36525,
+                                tolerance=1e-3)
+    save_ephemeris(ephemeris, "ephemeris")
+    ephemeris = load_ephemeris("ephemeris")
+    positions, velocities = ephemeris.state("Mars", np.linspace(0, 100, 99))
+
+Units: time in days (since epoch), positions in kilometers and velocities
+in kilometers / second.
+"""
+import json
+import math
+import os
+from typing import Dict, NamedTuple, Tuple
+import numpy as np
+from facts.numerical_constants import seconds_in_a_day
+from orbital_dynamics import kepler
+from orbital_dynamics.events import body_index, orbit_arrays
+
+# The largest number of segments per orbital period
+_max_segments = 2 ** 16
+# Samples (segments x points) fitted at once when sizing segments
+_chunk_samples = 2 ** 20
+# Queries evaluated at once
+_chunk_queries = 2 ** 12
+_format_version = 2
+
+
+class Ephemeris(NamedTuple):
+    """Chebyshev coefficients of the orbits of a tree of bodies, valid
+    over [start, stop]. The segments of body i are rows first_segment[i]
+    to first_segment[i] + segment_count[i] of coefficients, each covering
+    segment_length[i] days (roots have no segments). coefficients has shape
+    (segments, 2, degree + 1), so that the terms of the x and y series of
+    a segment are read contiguously."""
+    start: float
+    stop: float
+    tolerance: float
+    parent: np.ndarray
+    first_segment: np.ndarray
+    segment_count: np.ndarray
+    segment_length: np.ndarray
+    coefficients: np.ndarray
+    names: np.ndarray = None
+
+    @property
+    def degree(self) -> int:
+        """Returns the degree of the Chebyshev series.
+
+        :return: the degree
+        :rtype: int
+        """
+        return self.coefficients.shape[-1] - 1
+
+    def _evaluate(self, bodies: np.ndarray, times: np.ndarray,
+                  velocities: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Evaluates the orbits of (orbiting) bodies at times (1D arrays of
+        the same length) relative to their primaries."""
+        length = self.segment_length[bodies]
+        local = (times - self.start) / length
+        # The last segment is closed on the right
+        last = np.ceil((self.stop - self.start) / length) - 1
+        segment = np.minimum(np.floor(local), last)
+        x2 = local - segment
+        x2 *= 4
+        x2 -= 2
+        rows = segment.astype(np.int64)
+        rows %= self.segment_count[bodies]
+        rows += self.first_segment[bodies]
+        coefficients = np.take(self.coefficients, rows, axis=0)
+        # T_k(x) for every k, by T_k = 2 x T_(k-1) - T_(k-2)
+        basis = np.empty((self.degree + 1, len(rows)))
+        basis[0] = 1
+        np.multiply(x2, 0.5, out=basis[1])
+        for k in range(2, self.degree + 1):
+            np.multiply(x2, basis[k - 1], out=basis[k])
+            basis[k] -= basis[k - 2]
+        positions = np.einsum("nck,kn->nc", coefficients, basis)
+        if not velocities:
+            return positions, None
+        # T'_k(x) = k U_(k-1)(x), by U_k = 2 x U_(k-1) - U_(k-2)
+        derivatives = np.empty_like(basis)
+        derivatives[0] = 0
+        derivatives[1] = 1
+        if self.degree > 1:
+            derivatives[2] = x2
+        for k in range(3, self.degree + 1):
+            np.multiply(x2, derivatives[k - 1], out=derivatives[k])
+            derivatives[k] -= derivatives[k - 2]
+        derivatives *= np.arange(self.degree + 1)[:, None]
+        # dx/dt = 2 / length, and velocities are per second
+        derivatives *= 2 / (length * seconds_in_a_day)
+        return positions, np.einsum("nck,kn->nc", coefficients,
+                                    derivatives)
+
+    def _query(self, bodies, times, velocities: bool,
+               relative: bool) -> Tuple[np.ndarray, np.ndarray]:
+        if isinstance(bodies, str):
+            bodies = body_index(self.names, bodies)
+        elif isinstance(bodies, (list, tuple)):
+            bodies = [body_index(self.names, body) for body in bodies]
+        bodies, times = np.broadcast_arrays(
+            np.asarray(bodies, dtype=np.int64),
+            np.asarray(times, dtype=float))
+        shape = bodies.shape
+        bodies, times = bodies.ravel(), times.ravel()
+        if np.any((times < self.start) | (times > self.stop)):
+            raise ValueError(f"The ephemeris covers times in [{self.start}, "
+                             f"{self.stop}] days only.")
+        positions = np.zeros((len(bodies), 2))
+        derivatives = np.zeros((len(bodies), 2)) if velocities else None
+        # Queries are evaluated a chunk at a time so that the temporary
+        # arrays stay in cache
+        for low in range(0, len(bodies), _chunk_queries):
+            high = low + _chunk_queries
+            current, chunk_times = bodies[low:high], times[low:high]
+            active = None
+            while True:
+                orbiting = np.flatnonzero(self.parent[current] >= 0)
+                if len(orbiting) == 0:
+                    break
+                if len(orbiting) < len(current):
+                    active = orbiting if active is None \
+                        else active[orbiting]
+                    current, chunk_times = current[orbiting], \
+                        chunk_times[orbiting]
+                position, velocity = self._evaluate(current, chunk_times,
+                                                    velocities)
+                rows = slice(low, high) if active is None \
+                    else active + low
+                positions[rows] += position
+                if velocities:
+                    derivatives[rows] += velocity
+                if relative:
+                    break
+                current = self.parent[current]
+        return positions.reshape(shape + (2,)), \
+            derivatives.reshape(shape + (2,)) if velocities else None
+
+    def position(self, bodies, times, relative: bool = False) -> np.ndarray:
+        """Returns the positions of bodies at times (broadcast against each
+        other, e.g., bodies[None, :] and times[:, None] for every body at
+        every time).
+
+        :param bodies: the indices or names of the bodies
+        :param times: times since epoch in days, within [start, stop]
+        :param bool relative: whether to return positions relative to the
+        primary bodies instead of the roots of the tree
+        :return: positions of shape broadcast(bodies, times).shape + (2,)
+        in kilometers
+        :rtype: np.ndarray
+        """
+        return self._query(bodies, times, False, relative)[0]
+
+    def state(self, bodies, times, relative: bool = False) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the positions and velocities of bodies at times (see
+        position).
+
+        :param bodies: the indices or names of the bodies
+        :param times: times since epoch in days, within [start, stop]
+        :param bool relative: whether to return states relative to the
+        primary bodies instead of the roots of the tree
+        :return: positions in kilometers and velocities in kilometers /
+        second, both of shape broadcast(bodies, times).shape + (2,)
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        return self._query(bodies, times, True, relative)
+
+
+def _chebyshev_nodes(degree: int) -> np.ndarray:
+    """Returns the degree + 1 Chebyshev nodes in (-1, 1)."""
+    return np.cos(math.pi * (np.arange(degree + 1) + 0.5) / (degree + 1))
+
+
+def _chebyshev_transform(degree: int) -> np.ndarray:
+    """Returns the matrix taking values at the Chebyshev nodes to the
+    coefficients of the interpolating series."""
+    n = degree + 1
+    k = np.arange(n)[:, None]
+    transform = 2 / n * np.cos(math.pi * k * (np.arange(n) + 0.5) / n)
+    transform[0] /= 2
+    return transform
+
+
+def _relative_positions(arrays: Dict[str, np.ndarray], bodies,
+                        times) -> np.ndarray:
+    """Positions of bodies relative to their primaries (broadcast against
+    times)."""
+    e = arrays["eccentricity"][bodies]
+    eccentric_anomaly = kepler.solve_keplers_equation(
+        arrays["mean_anomaly_at_epoch"][bodies] +
+        arrays["mean_motion"][bodies] * times, e)
+    return kepler.calculate_orbital_position(
+        arrays["semimajor_axis"][bodies], e, eccentric_anomaly,
+        arrays["argument_of_periapsis"][bodies])
+
+
+def _fit_segments(arrays, bodies, start, length, count, degree):
+    """Fits count segments of the given lengths from start to each body,
+    returning the coefficients, of shape (bodies, count, degree + 1, 2),
+    and the largest error of each body, checked at 2 degree + 1 points
+    spread over every segment (including its ends)."""
+    nodes = _chebyshev_nodes(degree)
+    checks = np.linspace(-1, 1, 2 * degree + 1)
+    transform = _chebyshev_transform(degree)
+    coefficients = np.empty((len(bodies), count, degree + 1, 2))
+    errors = np.empty(len(bodies))
+    per_body = count * (len(nodes) + len(checks))
+    chunk = max(1, _chunk_samples // per_body)
+    for low in range(0, len(bodies), chunk):
+        body = bodies[low:low + chunk, None, None]
+        half = length[low:low + chunk, None, None] / 2
+        middle = start + half * (2 * np.arange(count)[None, :, None] + 1)
+        values = _relative_positions(arrays, body, middle + half * nodes)
+        fitted = np.einsum("kj,bsjc->bskc", transform, values)
+        exact = _relative_positions(arrays, body, middle + half * checks)
+        # T_k at the check points, shape (checks, degree + 1)
+        basis = np.cos(np.arange(degree + 1) * np.arccos(checks)[:, None])
+        interpolated = np.einsum("pk,bskc->bspc", basis, fitted)
+        errors[low:low + chunk] = np.linalg.norm(
+            interpolated - exact, axis=-1).max(axis=(1, 2))
+        coefficients[low:low + chunk] = fitted
+    return coefficients, errors
+
+
+def build_ephemeris(columns: Dict[str, np.ndarray], start: float,
+                    stop: float, tolerance: float = 1e-3,
+                    degree: int = 12) -> Ephemeris:
+    """Builds the ephemeris of every orbit of a tree of bodies (see
+    Universe.columns() or StarSystemPopulation.columns()) over a span.
+
+    :param Dict[str, np.ndarray] columns: the columns of the bodies
+    :param float start: the start of the span in days
+    :param float stop: the end of the span in days
+    :param float tolerance: the largest error in the position of each
+    orbit (relative to its primary) in kilometers
+    :param int degree: the degree of the Chebyshev series
+    :return: the ephemeris
+    :rtype: Ephemeris
+    """
+    if not stop > start:
+        raise ValueError("The span must end after it starts.")
+    if tolerance <= 0 or degree < 1:
+        raise ValueError("The tolerance and the degree must be positive.")
+    arrays = orbit_arrays(columns)
+    orbiting = np.flatnonzero(arrays["parent"] >= 0)
+    # One period is tabulated, or the whole span if it is shorter
+    window = np.minimum(2 * math.pi / arrays["mean_motion"][orbiting],
+                        stop - start)
+    counts = np.zeros(len(orbiting), dtype=np.int64)
+    fits = [None] * len(orbiting)
+    pending = np.arange(len(orbiting))
+    count = 1
+    while len(pending) > 0:
+        if count > _max_segments:
+            raise ValueError(f"Could not reach a tolerance of {tolerance} "
+                             f"km with degree {degree} for bodies "
+                             f"{orbiting[pending].tolist()}.")
+        coefficients, errors = _fit_segments(
+            arrays, orbiting[pending], start, window[pending] / count,
+            count, degree)
+        for idx in np.flatnonzero(errors <= tolerance):
+            fits[pending[idx]] = coefficients[idx]
+        counts[pending[errors <= tolerance]] = count
+        pending = pending[errors > tolerance]
+        count *= 2
+    n = len(arrays["parent"])
+    segment_count = np.zeros(n, dtype=np.int64)
+    segment_count[orbiting] = counts
+    segment_length = np.full(n, np.nan)
+    segment_length[orbiting] = window / np.maximum(counts, 1)
+    first_segment = np.concatenate(([0], np.cumsum(segment_count)[:-1]))
+    coefficients = np.ascontiguousarray(np.concatenate(
+        [np.swapaxes(fit, 1, 2) for fit in fits] or
+        [np.empty((0, 2, degree + 1))]))
+    names = columns.get("name")
+    return Ephemeris(float(start), float(stop), float(tolerance),
+                     arrays["parent"], first_segment, segment_count,
+                     segment_length, coefficients,
+                     None if names is None else np.asarray(names))
+
+
+_arrays = ("parent", "first_segment", "segment_count", "segment_length",
+           "coefficients")
+
+
+def save_ephemeris(ephemeris: Ephemeris, directory: str) -> None:
+    """Writes an ephemeris to a directory (created if needed) as .npy
+    arrays and an ephemeris.json manifest.
+
+    :param Ephemeris ephemeris: the ephemeris
+    :param str directory: the directory
+    """
+    os.makedirs(directory, exist_ok=True)
+    for field in _arrays:
+        np.save(os.path.join(directory, f"{field}.npy"),
+                np.ascontiguousarray(getattr(ephemeris, field)))
+    manifest = {"version": _format_version, "start": ephemeris.start,
+                "stop": ephemeris.stop, "tolerance": ephemeris.tolerance,
+                "names": None if ephemeris.names is None
+                else [str(name) for name in ephemeris.names]}
+    with open(os.path.join(directory, "ephemeris.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_ephemeris(directory: str, mmap: bool = True) -> Ephemeris:
+    """Reads an ephemeris written by save_ephemeris.
+
+    :param str directory: the directory
+    :param bool mmap: whether to memory-map the arrays (read-only) instead
+    of reading them into memory
+    :return: the ephemeris
+    :rtype: Ephemeris
+    """
+    with open(os.path.join(directory, "ephemeris.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != _format_version:
+        raise ValueError(f"Unsupported ephemeris format version "
+                         f"{manifest.get('version')}.")
+    arrays = {field: np.load(os.path.join(directory, f"{field}.npy"),
+                             mmap_mode="r" if mmap else None)
+              for field in _arrays}
+    names = manifest["names"]
+    return Ephemeris(manifest["start"], manifest["stop"],
+                     manifest["tolerance"],
+                     names=None if names is None else np.array(names),
+                     **arrays)
@@ -0,0 +1,595 @@
+"""Events of propagated orbits: apsides, conjunctions, transits and
+eclipses.
+
+Every search runs over the columns of a tree of bodies (see
+Universe.columns() or StarSystemPopulation.columns()), so that thousands of
+bodies are searched at once and the work can be shared with worker
+processes without pickling the bodies:
+
+    find_apsides: the periapsis and apoapsis passages of every orbit,
+    which follow from the mean anomaly in closed form
+    find_alignments: conjunctions and oppositions of pairs of bodies as
+    seen from an observer (the roots of sin(theta), theta being the angle
+    between the bodies), and transits: conjunctions in which the disk of
+    the nearer body crosses the disk of the farther one, with the times of
+    first and last contact
+    find_eclipses: transits of moons and their planets as seen from the
+    star they orbit, i.e., the moon's shadow falling on the planet, or the
+    planet's shadow on the moon (treating the star as a point of light)
+
+Alignments are bracketed by sampling every pair on a coarse grid of times
+(a fraction of the shortest orbital period involved), and each bracketed
+root is then refined by regula falsi, all pairs and brackets at once
+(roots closer together than the sampling step may be missed). Long
+spans are split into windows, which bounds the memory used and can be
+searched in parallel (workers > 1).
+
+Each search returns an EventTable sorted by time; use combine_events to
+merge several.
+
+Example:
+    columns = universe.columns()
+    events = combine_events(
+        find_apsides(columns, 0, 3650),
+        find_alignments(columns, [("Venus", "Earth")], "Sun", 0, 3650),
+        find_eclipses(columns, 0, 3650))
+    events.select("eclipse", "Moon")
+    events.next_time("periapsis", "Mars", after=1000)
+
+Units: time in days (since epoch), distances in kilometers.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple, Union
+import numpy as np
+from facts.numerical_constants import seconds_in_a_day
+from kernels import kernels
+from orbital_dynamics import kepler
+from utilities.shared_arrays import SharedArrays, call_attached
+
+event_kinds = ("periapsis", "apoapsis", "conjunction", "opposition",
+               "transit", "eclipse")
+_codes = {kind: code for code, kind in enumerate(event_kinds)}
+# Samples per shortest orbital period when bracketing alignments
+_samples_per_period = 16
+# Samples (times x bodies) held in memory per window
+_window_samples = 2 ** 21
+
+Body = Union[int, str]
+
+
+class EventTable(NamedTuple):
+    """Events sorted by time. body, other and observer index the bodies of
+    the searched columns (-1 where an event has no such body); for
+    transits and eclipses, body is the nearer body (in front) and other the
+    farther one. start and stop are the times of first and last contact
+    (equal to time for instantaneous events)."""
+    time: np.ndarray
+    kind: np.ndarray
+    body: np.ndarray
+    other: np.ndarray
+    observer: np.ndarray
+    start: np.ndarray
+    stop: np.ndarray
+    names: np.ndarray = None
+
+    @property
+    def duration(self) -> np.ndarray:
+        """Returns the duration of every event (0 for instantaneous
+        events).
+
+        :return: durations in days
+        :rtype: np.ndarray
+        """
+        return self.stop - self.start
+
+    def _index(self, body: Body) -> int:
+        return body_index(self.names, body)
+
+    def select(self, kind: str = None, body: Body = None) -> "EventTable":
+        """Returns the events of a kind and/or involving a body (as body,
+        other or observer).
+
+        :param str kind: one of event_kinds
+        :param body: the index or name of the body
+        :return: the selected events
+        :rtype: EventTable
+        """
+        mask = np.ones(len(self.time), dtype=bool)
+        if kind is not None:
+            if kind not in _codes:
+                raise KeyError(f"Unknown event {kind}; choose from "
+                               f"{', '.join(event_kinds)}")
+            mask &= self.kind == kind
+        if body is not None:
+            index = self._index(body)
+            mask &= (self.body == index) | (self.other == index) | \
+                (self.observer == index)
+        return EventTable(*[column[mask] for column in self[:-1]],
+                          self.names)
+
+    def next_time(self, kind: str, body: Body,
+                  after: float = -math.inf) -> float:
+        """Returns the time of the next event of a kind involving a body.
+
+        :param str kind: one of event_kinds
+        :param body: the index or name of the body
+        :param float after: the time (in days) after which to look
+        :return: the time in days (NaN if there is none in the table)
+        :rtype: float
+        """
+        times = self.select(kind, body).time
+        times = times[times > after]
+        return float(times[0]) if len(times) > 0 else math.nan
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Returns the events as dictionaries, with the names of the bodies
+        where known.
+
+        :return: the events
+        :rtype: List[Dict[str, Any]]
+        """
+        def name(index):
+            if index < 0:
+                return None
+            return str(self.names[index]) if self.names is not None \
+                else int(index)
+
+        return [{"time": float(self.time[idx]), "kind": str(self.kind[idx]),
+                 "body": name(self.body[idx]),
+                 "other": name(self.other[idx]),
+                 "observer": name(self.observer[idx]),
+                 "start": float(self.start[idx]),
+                 "stop": float(self.stop[idx])}
+                for idx in range(len(self.time))]
+
+
+def body_index(names, body: Body) -> int:
+    """Returns the index of a body given by index or name.
+
+    :param np.ndarray names: the names of the bodies (or None)
+    :param body: the index or name of the body
+    :return: the index of the body
+    :rtype: int
+    :raises: KeyError if no body has the name
+    """
+    if isinstance(body, str):
+        matches = np.flatnonzero(names == body) if names is not None else []
+        if len(matches) == 0:
+            raise KeyError(f"{body} is not one of the searched bodies.")
+        return int(matches[0])
+    return int(body)
+
+
+def _make_table(parts: Sequence[Tuple[np.ndarray, ...]],
+                names) -> EventTable:
+    """Concatenates (time, kind code, body, other, observer, start, stop)
+    arrays into an EventTable sorted by time."""
+    if len(parts) == 0:
+        parts = [(np.empty(0), np.empty(0, dtype=np.int64)) +
+                 tuple(np.empty(0, dtype=np.int64) for _ in range(3)) +
+                 (np.empty(0), np.empty(0))]
+    columns = [np.concatenate(column) for column in zip(*parts)]
+    order = np.lexsort((columns[1], columns[0]))
+    time, code, body, other, observer, start, stop = \
+        [column[order] for column in columns]
+    kind = np.asarray(event_kinds)[code.astype(np.int64)]
+    return EventTable(time, kind, body.astype(np.int64),
+                      other.astype(np.int64), observer.astype(np.int64),
+                      start, stop, names)
+
+
+def combine_events(*tables: EventTable) -> EventTable:
+    """Merges event tables (of the same columns) into one sorted table.
+
+    :param EventTable tables: the tables
+    :return: the merged table
+    :rtype: EventTable
+    """
+    names = next((table.names for table in tables
+                  if table.names is not None), None)
+    parts = [(table.time, np.array([_codes[kind] for kind in table.kind],
+                                   dtype=np.int64),
+              table.body, table.other, table.observer, table.start,
+              table.stop) for table in tables]
+    return _make_table(parts, names)
+
+
+def orbit_arrays(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Returns the numeric columns needed to propagate every orbit, with
+    mean motions in radians / day (NaN for roots). Without a
+    gravitational_parameter column, the periods come from the orbital_period
+    kernel of the active backend (see kernels)."""
+    parent = np.asarray(columns["parent"], dtype=np.int64)
+    mass = np.asarray(columns["mass"], dtype=float)
+    a = np.asarray(columns["semimajor_axis"], dtype=float)
+    orbiting = parent >= 0
+    mu = columns.get("gravitational_parameter")
+    mean_motion = np.full(len(parent), np.nan)
+    if mu is None:
+        period = kernels.get_backend().array_kernel("orbital_period")(
+            a[orbiting], mass[parent[orbiting]], mass[orbiting])
+        mean_motion[orbiting] = 2 * math.pi / period
+    else:
+        mean_motion[orbiting] = kepler.calculate_mean_motion(
+            a[orbiting], np.asarray(mu, dtype=float)[orbiting]) * \
+            seconds_in_a_day
+    return {
+        "parent": parent,
+        "radius": np.asarray(columns["radius"], dtype=float),
+        "semimajor_axis": a,
+        "eccentricity": np.asarray(columns["eccentricity"], dtype=float),
+        "argument_of_periapsis": np.asarray(columns["argument_of_periapsis"],
+                                            dtype=float),
+        "mean_anomaly_at_epoch": np.asarray(columns["mean_anomaly_at_epoch"],
+                                            dtype=float),
+        "mean_motion": mean_motion,
+    }
+
+
+def calculate_positions(arrays: Dict[str, np.ndarray], bodies,
+                        times) -> np.ndarray:
+    """Calculates the positions of bodies at times (broadcast against each
+    other, e.g., bodies[None, :] and times[:, None] for every body at every
+    time) by summing their orbits up the tree; roots sit at the origin.
+
+    :param Dict[str, np.ndarray] arrays: parent, semimajor_axis,
+    eccentricity, argument_of_periapsis, mean_anomaly_at_epoch and
+    mean_motion (in radians / day) of every body
+    :param bodies: indices of the bodies
+    :param times: times since epoch in days
+    :return: positions of shape broadcast(bodies, times).shape + (2,) in
+    kilometers
+    :rtype: np.ndarray
+    """
+    bodies, times = np.broadcast_arrays(np.asarray(bodies, dtype=np.int64),
+                                        np.asarray(times, dtype=float))
+    shape = bodies.shape
+    current, times = bodies.ravel().copy(), times.ravel()
+    positions = np.zeros((len(current), 2))
+    parent = arrays["parent"]
+    active = np.arange(len(current))
+    while len(active) > 0:
+        orbit = current[active]
+        orbiting = parent[orbit] >= 0
+        active, orbit = active[orbiting], orbit[orbiting]
+        e = arrays["eccentricity"][orbit]
+        eccentric_anomaly = kepler.solve_keplers_equation(
+            arrays["mean_anomaly_at_epoch"][orbit] +
+            arrays["mean_motion"][orbit] * times[active], e)
+        positions[active] += kepler.calculate_orbital_position(
+            arrays["semimajor_axis"][orbit], e, eccentric_anomaly,
+            arrays["argument_of_periapsis"][orbit])
+        current[active] = parent[orbit]
+    return positions.reshape(shape + (2,))
+
+
+def find_apsides(columns: Dict[str, np.ndarray], start: float, stop: float,
+                 bodies: Sequence[Body] = None) -> EventTable:
+    """Finds the periapsis and apoapsis passages of orbits (relative to
+    their primary bodies) in [start, stop), in closed form: the mean
+    anomaly is 0 at periapsis and pi at apoapsis.
+
+    :param Dict[str, np.ndarray] columns: the columns of the bodies
+    :param float start: the start of the span in days
+    :param float stop: the end of the span in days
+    :param Sequence bodies: the indices or names of the orbiting bodies to
+    search; defaults to every orbiting body
+    :return: the events
+    :rtype: EventTable
+    """
+    arrays = orbit_arrays(columns)
+    names = columns.get("name")
+    if bodies is None:
+        bodies = np.flatnonzero(arrays["parent"] >= 0)
+    else:
+        bodies = np.array([body_index(names, body) for body in bodies],
+                          dtype=np.int64)
+        if np.any(arrays["parent"][bodies] < 0):
+            raise ValueError("Every searched body must orbit a primary body.")
+    n = arrays["mean_motion"][bodies]
+    m0 = arrays["mean_anomaly_at_epoch"][bodies]
+    parts = []
+    for kind, phase in (("periapsis", 0.0), ("apoapsis", math.pi)):
+        first = np.ceil((m0 + n * start - phase) / (2 * math.pi))
+        last = np.ceil((m0 + n * stop - phase) / (2 * math.pi))
+        counts = (last - first).astype(np.int64)
+        body = np.repeat(bodies, counts)
+        # The k-th passage of each body, k = first, first + 1, ...
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        passage = np.repeat(first, counts) + offsets
+        time = (2 * math.pi * passage + phase - np.repeat(m0, counts)) / \
+            np.repeat(n, counts)
+        none = np.full(len(time), -1, dtype=np.int64)
+        parts.append((time, np.full(len(time), _codes[kind]), body, none,
+                      none, time, time))
+    return _make_table(parts, names)
+
+
+def _geometry(arrays, body, other, observer, times):
+    """Returns the positions of body and other relative to the observer."""
+    n = len(body)
+    positions = calculate_positions(
+        arrays, np.concatenate((body, other, observer)),
+        np.concatenate((times, times, times)))
+    origin = positions[2 * n:]
+    return positions[:n] - origin, positions[n:2 * n] - origin
+
+
+def _sine(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Returns the sine of the angle from u to v."""
+    cross = u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+    return cross / (np.linalg.norm(u, axis=-1) * np.linalg.norm(v, axis=-1))
+
+
+def _overlap(arrays, body, other, u, v) -> np.ndarray:
+    """Returns the angular separation of two bodies less the sum of their
+    angular radii (negative while their disks overlap)."""
+    cross = u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+    separation = np.arctan2(np.abs(cross), (u * v).sum(axis=-1))
+    radii = [np.arcsin(np.minimum(arrays["radius"][index] /
+                                  np.linalg.norm(w, axis=-1), 1.0))
+             for index, w in ((body, u), (other, v))]
+    return separation - radii[0] - radii[1]
+
+
+def _refine(function, low: np.ndarray, high: np.ndarray,
+            tolerance: float, max_iterations: int = 100) -> np.ndarray:
+    """Refines every bracket [low, high] of a root of function(selection,
+    times) (which evaluates the functions of the selected brackets) at
+    once, with the Illinois variant of regula falsi; only the brackets that
+    have not converged are evaluated again."""
+    everything = np.arange(len(low))
+    low, high = low.astype(float), high.astype(float)
+    f_low, f_high = function(everything, low), function(everything, high)
+    root = np.where(f_low == 0, low, high)
+    active = everything[(f_low != 0) & (f_high != 0) &
+                        (high - low > tolerance)]
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        a, b, fa, fb = low[active], high[active], f_low[active], \
+            f_high[active]
+        guess = b - fb * (b - a) / (fb - fa)
+        # Regula falsi stalls on a bracket that shrinks from one side only;
+        # fall back to bisection where the guess leaves the bracket
+        guess = np.where((guess > np.minimum(a, b)) &
+                         (guess < np.maximum(a, b)), guess, (a + b) / 2)
+        f_guess = function(active, guess)
+        crossed = np.sign(f_guess) != np.sign(fb)
+        # Keep the root bracketed between low and high, halving the
+        # retained end's value when the same end is retained twice
+        low[active] = np.where(crossed, b, a)
+        f_low[active] = np.where(crossed, fb, fa / 2)
+        high[active], f_high[active] = guess, f_guess
+        root[active] = guess
+        done = (f_guess == 0) | (np.abs(guess - low[active]) <= tolerance)
+        active = active[~done]
+    return root
+
+
+def _contact(arrays, body, other, observer, time, step, tolerance,
+             direction: int) -> np.ndarray:
+    """Finds the first (direction -1) or last (+1) contact of overlapping
+    disks around the given times."""
+    def overlap(selection, times):
+        u, v = _geometry(arrays, body[selection], other[selection],
+                         observer[selection], times)
+        return _overlap(arrays, body[selection], other[selection], u, v)
+
+    # Widen the brackets until the disks are apart at their far ends
+    delta = np.full(len(time), step / _samples_per_period)
+    pending = np.arange(len(time))
+    for _ in range(40):
+        if len(pending) == 0:
+            break
+        inside = overlap(pending, time[pending] +
+                         direction * delta[pending]) <= 0
+        pending = pending[inside]
+        delta[pending] *= 2
+    low, high = (time - delta, time) if direction < 0 else \
+        (time, time + delta)
+    return _refine(overlap, low, high, tolerance)
+
+
+def _search_window(arrays: Dict[str, np.ndarray], first: int, last: int,
+                   start: float, stop: float, step: float, tolerance: float,
+                   contacts: bool) -> Tuple[np.ndarray, ...]:
+    """Finds the alignments of the pairs first to last of arrays (body,
+    other, observer) in [start, stop), returning (time, kind code, body,
+    other, observer, start, stop) arrays."""
+    body, other, observer = arrays["body"][first:last], \
+        arrays["other"][first:last], arrays["observer"][first:last]
+    n_steps = max(int(math.ceil((stop - start) / step)), 1)
+    grid = np.minimum(start + step * np.arange(n_steps + 1), stop)
+    # Sample every body involved once, and gather the pairs
+    unique, inverse = np.unique(np.concatenate((body, other, observer)),
+                                return_inverse=True)
+    positions = calculate_positions(arrays, unique[None, :], grid[:, None])
+    n_pairs = len(body)
+    origin = positions[:, inverse[2 * n_pairs:]]
+    sine = _sine(positions[:, inverse[:n_pairs]] - origin,
+                 positions[:, inverse[n_pairs:2 * n_pairs]] - origin)
+    # Roots within [grid[i], grid[i + 1]) (exact zeros count at the left)
+    crossing = (sine[:-1] == 0) | (sine[:-1] * sine[1:] < 0)
+    sample, pair = np.nonzero(crossing)
+
+    def aligned(selection, times):
+        u, v = _geometry(arrays, body[pair[selection]], other[pair[selection]],
+                         observer[pair[selection]], times)
+        return _sine(u, v)
+
+    time = _refine(aligned, grid[sample], grid[sample + 1], tolerance)
+    time = np.where(sine[sample, pair] == 0, grid[sample], time)
+    keep = time < stop
+    time, pair = time[keep], pair[keep]
+    b, o, s = body[pair], other[pair], observer[pair]
+    u, v = _geometry(arrays, b, o, s, time)
+    conjunction = (u * v).sum(axis=-1) > 0
+    code = np.where(conjunction, _codes["conjunction"],
+                    _codes["opposition"])
+    parts = [(time, code, b, o, s, time, time)]
+    if contacts:
+        transit = conjunction & (_overlap(arrays, b, o, u, v) < 0)
+        time, b, o, s = time[transit], b[transit], o[transit], s[transit]
+        u, v = u[transit], v[transit]
+        behind = np.linalg.norm(u, axis=-1) > np.linalg.norm(v, axis=-1)
+        front, back = np.where(behind, o, b), np.where(behind, b, o)
+        first = _contact(arrays, front, back, s, time, step, tolerance, -1)
+        last = _contact(arrays, front, back, s, time, step, tolerance, 1)
+        parts.append((time, np.full(len(time), _codes["transit"]), front,
+                      back, s, first, last))
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def find_alignments(columns: Dict[str, np.ndarray],
+                    pairs: Sequence[Tuple[Body, Body]],
+                    observer: Union[Body, Sequence[Body]], start: float,
+                    stop: float, step: float = None,
+                    tolerance: float = 1e-6, contacts: bool = True,
+                    window: float = None, workers: int = 1) -> EventTable:
+    """Finds the conjunctions and oppositions of pairs of bodies as seen
+    from an observer in [start, stop), and the transits among the
+    conjunctions (with contacts=True).
+
+    :param Dict[str, np.ndarray] columns: the columns of the bodies
+    :param Sequence pairs: the (body, other) indices or names of each pair
+    :param observer: the index or name of the observer of every pair, or
+    one per pair
+    :param float start: the start of the span in days
+    :param float stop: the end of the span in days
+    :param float step: the sampling step (in days) of the bracketing;
+    defaults, for each pair, to 1/16 of the shortest orbital period of the
+    orbits its bodies and observer take part in
+    :param float tolerance: the accuracy of the event times in days
+    :param bool contacts: whether to find transits and their contacts
+    :param float window: the length (in days) of the windows searched at
+    once; defaults to a length that bounds the samples held in memory
+    :param int workers: the number of worker processes the windows are
+    shared between (1 searches them in this process; None uses every CPU)
+    :return: the events
+    :rtype: EventTable
+    """
+    arrays = orbit_arrays(columns)
+    names = columns.get("name")
+    if len(pairs) == 0:
+        return _make_table([], names)
+    body = np.array([body_index(names, pair[0]) for pair in pairs],
+                    dtype=np.int64)
+    other = np.array([body_index(names, pair[1]) for pair in pairs],
+                     dtype=np.int64)
+    if isinstance(observer, (str, int, np.integer)):
+        observer = [observer] * len(pairs)
+    observer = np.array([body_index(names, index) for index in observer],
+                        dtype=np.int64)
+    if len(observer) != len(pairs):
+        raise ValueError(f"Expected one observer or {len(pairs)}, not "
+                         f"{len(observer)}.")
+    if np.any((body == other) | (body == observer) | (other == observer)):
+        raise ValueError("The bodies and observer of a pair must differ.")
+    if stop <= start:
+        raise ValueError(f"stop ({stop}) must be after start ({start}).")
+    if step is None:
+        # Pairs are sampled by the power of two steps they need, so that
+        # fast orbits do not slow down the search of slow ones
+        steps = 2 ** np.floor(np.log2(_default_steps(arrays, body, other,
+                                                     observer)))
+    else:
+        steps = np.full(len(body), float(step))
+    if np.any(steps <= 0) or tolerance <= 0:
+        raise ValueError("step and tolerance must be positive.")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"workers ({workers}) must be >= 1.")
+    order = np.argsort(steps, kind="stable")
+    steps = steps[order]
+    arrays.update(body=body[order], other=other[order],
+                  observer=observer[order])
+    tasks = []
+    for bucket_step in np.unique(steps):
+        first, last = np.searchsorted(steps, bucket_step, side="left"), \
+            np.searchsorted(steps, bucket_step, side="right")
+        length = window
+        if length is None:
+            n_bodies = len(np.unique(np.concatenate(
+                [arrays[key][first:last]
+                 for key in ("body", "other", "observer")])))
+            length = bucket_step * max(_window_samples // n_bodies, 16)
+            if workers > 1:
+                length = min(length, (stop - start) / workers)
+        edges = np.append(np.arange(start, stop, length), stop)
+        tasks.extend((int(first), int(last), low, high, float(bucket_step))
+                     for low, high in zip(edges[:-1], edges[1:]))
+    if workers == 1:
+        parts = [_search_window(arrays, *task, tolerance, contacts)
+                 for task in tasks]
+    else:
+        with SharedArrays(arrays) as shared:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(call_attached, shared.handle,
+                                       _search_window, *task, tolerance,
+                                       contacts)
+                           for task in tasks]
+                parts = [future.result() for future in futures]
+    return _make_table(parts, names)
+
+
+def _default_steps(arrays: Dict[str, np.ndarray], *bodies: np.ndarray) \
+        -> np.ndarray:
+    """Returns, for each pair, a fraction of the shortest period of the
+    orbits its bodies take part in (their own orbits and those of their
+    primaries)."""
+    parent = arrays["parent"]
+    fastest = np.zeros(len(bodies[0]))
+    for current in bodies:
+        current = current.copy()
+        while np.any(current >= 0):
+            orbiting = current >= 0
+            orbiting[orbiting] = parent[current[orbiting]] >= 0
+            fastest[orbiting] = np.maximum(
+                fastest[orbiting],
+                arrays["mean_motion"][current[orbiting]])
+            current = np.where(orbiting, parent[np.maximum(current, 0)], -1)
+    if np.any(fastest == 0):
+        raise ValueError("Every pair must have a body orbiting another "
+                         "body.")
+    return 2 * math.pi / fastest / _samples_per_period
+
+
+def find_eclipses(columns: Dict[str, np.ndarray], start: float,
+                  stop: float, moons: Sequence[Body] = None,
+                  **options) -> EventTable:
+    """Finds the eclipses of moons and their planets in [start, stop): the
+    transits of a moon and its planet as seen from the star the planet
+    orbits. The nearer body (body) casts its shadow on the farther one
+    (other); the star is the observer.
+
+    :param Dict[str, np.ndarray] columns: the columns of the bodies
+    :param float start: the start of the span in days
+    :param float stop: the end of the span in days
+    :param Sequence moons: the indices or names of the moons to search;
+    defaults to every body orbiting a body that itself orbits a body
+    :param options: further options of find_alignments (step, tolerance,
+    window, workers)
+    :return: the eclipses
+    :rtype: EventTable
+    """
+    parent = np.asarray(columns["parent"], dtype=np.int64)
+    names = columns.get("name")
+    grandparent = np.where(parent >= 0, parent[parent], -1)
+    if moons is None:
+        moons = np.flatnonzero(grandparent >= 0)
+    else:
+        moons = np.array([body_index(names, moon) for moon in moons],
+                         dtype=np.int64)
+        if np.any(grandparent[moons] < 0):
+            raise ValueError("Every moon must orbit a body that itself "
+                             "orbits a body.")
+    planets = parent[moons]
+    table = find_alignments(columns, list(zip(moons, planets)),
+                            parent[planets], start, stop, contacts=True,
+                            **options).select("transit")
+    return table._replace(kind=np.full(len(table.time), "eclipse"))
@@ -0,0 +1,525 @@
+"""Orbit determination: fitting Kepler orbits to observed positions.
+
+Orbits are recovered from positions observed relative to the primary body
+(planar, like every Orbit) by least squares, with Levenberg-Marquardt
+iterations run on thousands of independent orbits at once. Each orbit is
+parametrized by equinoctial elements, which stay regular for circular
+orbits (where the argument of periapsis is undefined):
+
+    a, k = e cos(pomega), h = e sin(pomega), lambda_0, n
+
+with pomega the longitude (here: argument) of periapsis, lambda_0 the mean
+longitude at the reference time and n the mean motion. The eccentric
+longitude F = E + pomega solves lambda = F - k sin F + h cos F, and
+
+    x = a [(1 - h^2 beta) cos F + h k beta sin F - k]
+    y = a [h k beta cos F + (1 - k^2 beta) sin F - h]
+
+with beta = 1 / (1 + sqrt(1 - h^2 - k^2)). Residuals and their analytic
+Jacobians are evaluated over every observation of every orbit at once.
+The mean motion gives the gravitational parameter mu = n^2 a^3, and so the
+total mass of the bodies; when mu is known (e.g., from the masses), only
+a, k, h and lambda_0 are fitted.
+
+Starting values come from the observations alone: a conic with a focus at
+the primary body, 1 / r = (1 + e cos(theta - pomega)) / p, is fitted by
+linear least squares, and the mean anomalies it gives are unwrapped (orbits
+are prograde) and regressed against time: most observations must then be
+less than a period apart, unless mu or a period is given.
+
+Orbits are grouped by their (power of two) number of observations, so
+that the work is spread over arrays of equal shapes, and the groups can be
+fitted in worker processes (workers > 1).
+
+Observed periods give the semi-major axis or the masses in closed form
+(semimajor_axis_from_period, total_mass_from_period).
+
+Example:
+    fit = fit_orbits(times, positions, orbit=orbit, sigma=10.0)
+    fit.semimajor_axis[fit.converged], fit.total_mass
+
+Units: time in days, distances in kilometers, angles in radians, masses in
+kilograms and gravitational parameters in cubic kilometers / second squared.
+"""
+import math
+from typing import NamedTuple
+import numpy as np
+from facts.numerical_constants import gravitational_constant, \
+    meters_in_a_kilometer, seconds_in_a_day
+from orbital_dynamics import kepler
+from utilities.shared_arrays import map_ranges
+
+# The fitted parameters, in the order of OrbitFit.covariance
+fit_parameters = ("semimajor_axis", "k", "h", "mean_longitude_at_epoch",
+                  "mean_motion")
+# Observations (orbits x padded observations) fitted at once
+_chunk_samples = 2 ** 16
+_min_observations = 3
+# Mean anomaly (radians) by which noisy observations may seem to go back
+_backlash = 0.1
+# Levenberg-Marquardt damping: starting value and bounds
+_damping = 1e-3
+_max_damping = 1e+12
+
+
+class OrbitFit(NamedTuple):
+    """Fitted orbits (one entry per orbit). covariance is the covariance of
+    the fit_parameters (a in kilometers, k, h, the mean longitude at epoch
+    in radians and the mean motion in radians / day), scaled by the
+    residuals when no uncertainties were given; rms is the root mean square
+    distance between the observed and fitted positions in kilometers."""
+    semimajor_axis: np.ndarray
+    eccentricity: np.ndarray
+    argument_of_periapsis: np.ndarray
+    mean_anomaly_at_epoch: np.ndarray
+    gravitational_parameter: np.ndarray
+    covariance: np.ndarray
+    rms: np.ndarray
+    iterations: np.ndarray
+    converged: np.ndarray
+
+    @property
+    def period(self) -> np.ndarray:
+        """Returns the orbital periods.
+
+        :return: periods in days
+        :rtype: np.ndarray
+        """
+        return 2 * math.pi / (kepler.calculate_mean_motion(
+            self.semimajor_axis, self.gravitational_parameter) *
+            seconds_in_a_day)
+
+    @property
+    def total_mass(self) -> np.ndarray:
+        """Returns the total masses (primary and orbiting body) that the
+        fitted orbits imply.
+
+        :return: masses in kilograms
+        :rtype: np.ndarray
+        """
+        return self.gravitational_parameter * meters_in_a_kilometer ** 3 / \
+            gravitational_constant
+
+    def orbiting_mass(self, primary_mass) -> np.ndarray:
+        """Returns the masses of the orbiting bodies, given the masses of
+        the primary bodies.
+
+        :param primary_mass: masses of the primary bodies in kilograms
+        :return: masses in kilograms
+        :rtype: np.ndarray
+        """
+        return self.total_mass - np.asarray(primary_mass, dtype=float)
+
+
+def semimajor_axis_from_period(period, primary_mass, orbiting_mass):
+    """Calculates semi-major axes from orbital periods (the inverse of
+    calculate_orbital_period), vectorized.
+
+    Formula: a^3 = G(M1 + M2) T^2 / 4pi^2
+
+    :param period: orbital periods in days
+    :param primary_mass: masses of the primary bodies in kilograms
+    :param orbiting_mass: masses of the orbiting bodies in kilograms
+    :return: semi-major axes in kilometers
+    :rtype: np.ndarray
+    """
+    period = np.asarray(period, dtype=float)
+    if np.any(period <= 0):
+        raise ValueError("Periods must be positive.")
+    mu = kepler.calculate_gravitational_parameter(
+        np.asarray(primary_mass, dtype=float),
+        np.asarray(orbiting_mass, dtype=float))
+    return np.cbrt(mu * (period * seconds_in_a_day / (2 * math.pi)) ** 2)
+
+
+def total_mass_from_period(period, semimajor_axis):
+    """Calculates the total masses of orbiting pairs from their periods and
+    semi-major axes, vectorized.
+
+    Formula: M1 + M2 = 4pi^2 a^3 / G T^2
+
+    :param period: orbital periods in days
+    :param semimajor_axis: semi-major axes in kilometers
+    :return: masses in kilograms
+    :rtype: np.ndarray
+    """
+    period = np.asarray(period, dtype=float)
+    semimajor_axis = np.asarray(semimajor_axis, dtype=float)
+    if np.any(period <= 0) or np.any(semimajor_axis <= 0):
+        raise ValueError("Periods and semi-major axes must be positive.")
+    n = 2 * math.pi / (period * seconds_in_a_day)
+    return n ** 2 * (semimajor_axis * meters_in_a_kilometer) ** 3 / \
+        gravitational_constant
+
+
+def calculate_model(parameters: np.ndarray, times: np.ndarray,
+                    jacobian: bool = True):
+    """Calculates the positions of orbits given by equinoctial elements
+    (a, k, h, lambda_0, n) at times, and their derivatives with respect to
+    the elements.
+
+    :param np.ndarray parameters: elements of shape (orbits, 5)
+    :param np.ndarray times: times of shape (orbits, observations) in days
+    since the epoch of lambda_0
+    :param bool jacobian: whether to calculate the derivatives
+    :return: positions of shape (orbits, observations, 2) in kilometers,
+    and their derivatives of shape (orbits, observations, 2, 5) (or None)
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    a, k, h, longitude, n = (parameters[:, idx, None] for idx in range(5))
+    e = np.hypot(k, h)
+    periapsis = np.arctan2(h, k)
+    mean_longitude = longitude + n * times
+    eccentric_longitude = kepler.solve_keplers_equation(
+        mean_longitude - periapsis, e) + periapsis
+    cos_f, sin_f = np.cos(eccentric_longitude), np.sin(eccentric_longitude)
+    root = np.sqrt(1 - e * e)
+    beta = 1 / (1 + root)
+    x = a * ((1 - h * h * beta) * cos_f + h * k * beta * sin_f - k)
+    y = a * (h * k * beta * cos_f + (1 - k * k * beta) * sin_f - h)
+    positions = np.stack((x, y), axis=-1)
+    if not jacobian:
+        return positions, None
+    # d/dF at fixed elements, and dF/d(lambda, k, h) from Kepler's equation
+    dx_df = a * (-(1 - h * h * beta) * sin_f + h * k * beta * cos_f)
+    dy_df = a * (-h * k * beta * sin_f + (1 - k * k * beta) * cos_f)
+    distance = 1 - k * cos_f - h * sin_f
+    df_dlambda = 1 / distance
+    df_dk = sin_f / distance
+    df_dh = -cos_f / distance
+    dbeta_dk = beta * beta * k / root
+    dbeta_dh = beta * beta * h / root
+    dx_dk = a * (-h * h * dbeta_dk * cos_f +
+                 (h * beta + h * k * dbeta_dk) * sin_f - 1)
+    dx_dh = a * (-(2 * h * beta + h * h * dbeta_dh) * cos_f +
+                 (k * beta + h * k * dbeta_dh) * sin_f)
+    dy_dk = a * ((h * beta + h * k * dbeta_dk) * cos_f -
+                 (2 * k * beta + k * k * dbeta_dk) * sin_f)
+    dy_dh = a * ((k * beta + h * k * dbeta_dh) * cos_f -
+                 k * k * dbeta_dh * sin_f - 1)
+    derivatives = np.stack((
+        np.stack((x / a, y / a), axis=-1),
+        np.stack((dx_dk + dx_df * df_dk, dy_dk + dy_df * df_dk), axis=-1),
+        np.stack((dx_dh + dx_df * df_dh, dy_dh + dy_df * df_dh), axis=-1),
+        np.stack((dx_df * df_dlambda, dy_df * df_dlambda), axis=-1),
+        np.stack((dx_df * df_dlambda * times, dy_df * df_dlambda * times),
+                 axis=-1)), axis=-1)
+    return positions, derivatives
+
+
+def _residuals(parameters, times, positions, weights, mean_motion):
+    """Weighted residuals (orbits, 2 observations) and their Jacobian
+    (orbits, 2 observations, fitted parameters); with mean_motion given
+    (from a known mu), n follows a and is not fitted."""
+    if mean_motion is not None:
+        full = np.concatenate((parameters, mean_motion(parameters[:, 0])[
+            :, None]), axis=1)
+    else:
+        full = parameters
+    model, derivatives = calculate_model(full, times)
+    residuals = (model - positions) * weights[..., None]
+    derivatives = derivatives * weights[..., None, None]
+    if mean_motion is not None:
+        # dn/da = -3 n / 2 a
+        derivatives = derivatives[..., :4] + derivatives[..., 4:] * (
+            -1.5 * full[:, 4] / full[:, 0])[:, None, None, None]
+    shape = residuals.shape
+    return residuals.reshape(shape[0], -1), \
+        derivatives.reshape(shape[0], 2 * shape[1], -1)
+
+
+def _initial_guess(times, positions, valid, mu, period):
+    """Starting elements (orbits, 5) from a conic fitted with a focus at
+    the primary body and mean anomalies regressed against time."""
+    distance = np.linalg.norm(positions, axis=-1)
+    angle = np.arctan2(positions[..., 1], positions[..., 0])
+    # 1 / r = c0 + c1 cos(theta) + c2 sin(theta), by normal equations
+    design = np.stack((np.ones_like(angle), np.cos(angle), np.sin(angle)),
+                      axis=-1) * valid[..., None]
+    inverse = np.where(valid, 1 / np.where(valid, distance, 1), 0)
+    normal = np.einsum("bni,bnj->bij", design, design) + \
+        1e-12 * np.eye(3)
+    c = np.linalg.solve(normal, np.einsum("bni,bn->bi", design,
+                                          inverse)[..., None])[..., 0]
+    usable = c[:, 0] > 0
+    c0 = np.where(usable, c[:, 0], 1)
+    k, h = np.where(usable, c[:, 1] / c0, 0), np.where(usable, c[:, 2] / c0,
+                                                       0)
+    e = np.hypot(k, h)
+    shrink = np.where(e > 0.95, 0.95 / np.maximum(e, 1e-300), 1)
+    k, h, e = k * shrink, h * shrink, e * shrink
+    mean_distance = (distance * valid).sum(axis=1) / valid.sum(axis=1)
+    a = np.where(usable, 1 / c0 / (1 - e * e), mean_distance)
+    periapsis = np.arctan2(h, k)
+    true_anomaly = angle - periapsis[:, None]
+    eccentric_anomaly = np.arctan2(
+        np.sqrt(1 - e * e)[:, None] * np.sin(true_anomaly),
+        e[:, None] + np.cos(true_anomaly))
+    mean_anomaly = eccentric_anomaly - e[:, None] * np.sin(eccentric_anomaly)
+    # Mean motion: from mu or a period where given, else by regression of
+    # the unwrapped mean anomalies. Orbits are prograde, so the mean anomaly
+    # grows between observations (by less than a turn, unless they are a
+    # period apart); padding comes last, so it does not disturb the
+    # observations
+    step = np.diff(mean_anomaly, axis=1)
+    step = np.mod(step + _backlash, 2 * math.pi) - _backlash
+    unwrapped = np.concatenate((mean_anomaly[:, :1], mean_anomaly[:, :1] +
+                                np.cumsum(step, axis=1)), axis=1)
+    count = valid.sum(axis=1)
+    t_mean = (times * valid).sum(axis=1) / count
+    dt = (times - t_mean[:, None]) * valid
+    spread = (dt * dt).sum(axis=1)
+    for _ in range(2):
+        m_mean = (unwrapped * valid).sum(axis=1) / count
+        regressed = (dt * (unwrapped - m_mean[:, None])).sum(axis=1) / \
+            np.where(spread > 0, spread, 1)
+        # Phase connection: whole turns that bring every observation
+        # closest to the regression line
+        predicted = m_mean[:, None] + regressed[:, None] * dt
+        unwrapped += 2 * math.pi * np.round((predicted - unwrapped) /
+                                            (2 * math.pi))
+    n = np.where(np.isfinite(period), 2 * math.pi / period, regressed)
+    n = np.where(np.isfinite(mu), kepler.calculate_mean_motion(
+        a, np.where(np.isfinite(mu), mu, 1)) * seconds_in_a_day, n)
+    n = np.where(n > 0, n, 2 * math.pi / np.maximum(
+        np.ptp(np.where(valid, times, t_mean[:, None]), axis=1), 1))
+    # Mean anomaly at the reference time (t = 0), by a circular mean
+    phase = (mean_anomaly - n[:, None] * times)
+    m0 = np.arctan2((np.sin(phase) * valid).sum(axis=1),
+                    (np.cos(phase) * valid).sum(axis=1))
+    return np.stack((a, k, h, m0 + periapsis, n), axis=-1)
+
+
+def _valid(parameters: np.ndarray) -> np.ndarray:
+    """Whether elements describe a bound orbit."""
+    ok = (parameters[:, 0] > 0) & \
+        (np.hypot(parameters[:, 1], parameters[:, 2]) < 0.999)
+    if parameters.shape[1] == 5:
+        ok &= parameters[:, 4] > 0
+    return ok
+
+
+def _fit_range(arrays, start: int, stop: int, scale_covariance: bool,
+               max_iterations: int, tolerance: float) -> None:
+    """Fits the orbits start to stop of a group (writing parameters,
+    covariance, rms, iterations and converged), in chunks."""
+    size = arrays["times"].shape[1]
+    chunk = max(1, _chunk_samples // size)
+    for low in range(start, stop, chunk):
+        high = min(low + chunk, stop)
+        _fit_chunk(arrays, low, high, scale_covariance, max_iterations,
+                   tolerance)
+
+
+def _fit_chunk(arrays, low: int, high: int, scale_covariance: bool,
+               max_iterations: int, tolerance: float) -> None:
+    times = arrays["times"][low:high]
+    positions = arrays["positions"][low:high]
+    weights = arrays["weights"][low:high]
+    mu = arrays["gravitational_parameter"][low:high]
+    valid = weights > 0
+    # Times relative to the (mean) time of each orbit's observations, which
+    # decorrelates the mean longitude from the mean motion
+    reference = (times * valid).sum(axis=1) / valid.sum(axis=1)
+    times = np.where(valid, times - reference[:, None], 0)
+    guess = _initial_guess(times, positions, valid, mu,
+                           arrays["period"][low:high])
+    known = bool(np.all(np.isfinite(mu)))
+    n_fitted = 4 if known else 5
+
+    def residuals(rows, parameters):
+        mean_motion = None
+        if known:
+            def mean_motion(a):
+                return kepler.calculate_mean_motion(a, mu[rows]) * \
+                    seconds_in_a_day
+        return _residuals(parameters, times[rows], positions[rows],
+                          weights[rows], mean_motion)
+
+    parameters = guess[:, :n_fitted].copy()
+    rows = np.arange(high - low)
+    r, jacobian = residuals(rows, parameters)
+    cost = (r * r).sum(axis=1)
+    damping = np.full(len(rows), _damping)
+    iterations = np.zeros(len(rows), dtype=np.int64)
+    converged = np.zeros(len(rows), dtype=bool)
+    active = rows.copy()
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        iterations[active] += 1
+        j, res = jacobian[active], r[active]
+        normal = np.einsum("bki,bkj->bij", j, j)
+        gradient = np.einsum("bki,bk->bi", j, res)
+        diagonal = np.maximum(np.diagonal(normal, axis1=1, axis2=2), 1e-300)
+        damped = normal + (damping[active, None] * diagonal)[:, :, None] * \
+            np.eye(n_fitted)
+        step = -np.linalg.solve(damped, gradient[..., None])[..., 0]
+        trial = parameters[active] + step
+        ok = _valid(trial)
+        trial = np.where(ok[:, None], trial, parameters[active])
+        trial_r, trial_jacobian = residuals(active, trial)
+        trial_cost = np.where(ok, (trial_r * trial_r).sum(axis=1), np.inf)
+        accept = trial_cost < cost[active]
+        decrease = cost[active] - np.where(accept, trial_cost, cost[active])
+        # Relative changes of the elements (a and n relative to themselves)
+        scale = np.ones_like(step)
+        scale[:, 0] = parameters[active, 0]
+        if not known:
+            scale[:, 4] = parameters[active, 4]
+        small_step = np.all(np.abs(step) <= tolerance * scale, axis=1)
+        updated = active[accept]
+        parameters[updated] = trial[accept]
+        r[updated], jacobian[updated] = trial_r[accept], \
+            trial_jacobian[accept]
+        cost[updated] = trial_cost[accept]
+        damping[active] = np.where(accept,
+                                   np.maximum(damping[active] / 10, 1e-15),
+                                   damping[active] * 10)
+        done = (accept & (decrease <= tolerance * cost[active])) | \
+            small_step | (cost[active] == 0) | \
+            (damping[active] > _max_damping)
+        converged[active[done]] = True
+        active = active[~done]
+    # Covariance of the fitted parameters, scaled by the residual variance
+    # when no uncertainties were given
+    normal = np.einsum("bki,bkj->bij", jacobian, jacobian)
+    # Scaled to a unit diagonal first: the elements differ by many orders
+    # of magnitude
+    unit = 1 / np.sqrt(np.maximum(np.diagonal(normal, axis1=1, axis2=2),
+                                  1e-300))
+    covariance = np.linalg.pinv(normal * unit[:, :, None] * unit[:, None, :],
+                                hermitian=True) * unit[:, :, None] * \
+        unit[:, None, :]
+    count = valid.sum(axis=1)
+    if scale_covariance:
+        dof = np.maximum(2 * count - n_fitted, 1)
+        covariance *= (cost / dof)[:, None, None]
+    full = np.empty((len(rows), 5))
+    full[:, :n_fitted] = parameters
+    transform = np.zeros((len(rows), 5, n_fitted))
+    transform[:, np.arange(n_fitted), np.arange(n_fitted)] = 1
+    if known:
+        full[:, 4] = kepler.calculate_mean_motion(full[:, 0], mu) * \
+            seconds_in_a_day
+        transform[:, 4, 0] = -1.5 * full[:, 4] / full[:, 0]
+    # Back to the epoch: lambda_0 = lambda_ref - n t_ref
+    full[:, 3] -= full[:, 4] * reference
+    transform[:, 3] -= reference[:, None] * transform[:, 4]
+    covariance = transform @ covariance @ np.swapaxes(transform, 1, 2)
+    model, _ = calculate_model(full, times + reference[:, None], False)
+    squared = ((model - positions) ** 2).sum(axis=-1) * valid
+    arrays["parameters"][low:high] = full
+    arrays["covariance"][low:high] = covariance
+    arrays["rms"][low:high] = np.sqrt(squared.sum(axis=1) / count)
+    arrays["iterations"][low:high] = iterations
+    arrays["converged"][low:high] = converged
+
+
+def fit_orbits(times, positions, orbit=None, sigma=None,
+               gravitational_parameter=None, period=None,
+               max_iterations: int = 100, tolerance: float = 1e-12,
+               workers: int = 1) -> OrbitFit:
+    """Fits Kepler orbits to positions observed relative to the primary
+    bodies, for any number of independent orbits at once.
+
+    :param times: observation times in days since epoch, shape (k,)
+    :param positions: observed positions in kilometers, shape (k, 2)
+    :param orbit: the index (0, 1, ...) of the orbit of each observation;
+    by default every observation is of a single orbit
+    :param sigma: uncertainties of the positions in kilometers (per
+    observation, or a scalar); by default the covariance is scaled by the
+    residuals
+    :param gravitational_parameter: known G(M1 + M2) of each orbit (or a
+    scalar) in km^3 / s^2; by default it is fitted
+    :param period: approximate period of each orbit (or a scalar) in days,
+    which seeds the fit (e.g., for observations sparser than half a period)
+    :param int max_iterations: the largest number of Levenberg-Marquardt
+    iterations
+    :param float tolerance: the relative change of the sum of squares (or
+    of the elements) below which an orbit is converged
+    :param int workers: the number of worker processes; None uses every CPU
+    :return: the fitted orbits
+    :rtype: OrbitFit
+    """
+    times = np.asarray(times, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    if times.ndim != 1 or positions.shape != times.shape + (2,):
+        raise ValueError("times must have shape (k,) and positions (k, 2).")
+    orbit = np.zeros(len(times), dtype=np.int64) if orbit is None else \
+        np.asarray(orbit, dtype=np.int64)
+    if orbit.shape != times.shape or np.any(orbit < 0):
+        raise ValueError("orbit must give a non-negative index per "
+                         "observation.")
+    counts = np.bincount(orbit)
+    if np.any(counts < _min_observations):
+        raise ValueError(f"Every orbit needs at least {_min_observations} "
+                         f"observations.")
+    n_orbits = len(counts)
+    weights = np.ones(len(times))
+    if sigma is not None:
+        sigma = np.broadcast_to(np.asarray(sigma, dtype=float), times.shape)
+        if np.any(~(sigma > 0)) or np.any(~np.isfinite(sigma)):
+            raise ValueError("sigma must be positive.")
+        weights = 1 / sigma
+
+    def per_orbit(values):
+        if values is None:
+            return np.full(n_orbits, np.nan)
+        return np.broadcast_to(np.asarray(values, dtype=float),
+                               (n_orbits,)).copy()
+
+    mu, period = per_orbit(gravitational_parameter), per_orbit(period)
+    if gravitational_parameter is not None and np.any(~(mu > 0)):
+        raise ValueError("gravitational_parameter must be positive.")
+    order = np.lexsort((times, orbit))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    slot = np.arange(len(times)) - np.repeat(starts, counts)
+    sizes = 2 ** np.ceil(np.log2(np.maximum(counts, 4))).astype(np.int64)
+    outputs = {"parameters": ((n_orbits, 5), float),
+               "covariance": ((n_orbits, 5, 5), float),
+               "rms": ((n_orbits,), float),
+               "iterations": ((n_orbits,), np.int64),
+               "converged": ((n_orbits,), bool)}
+    results = {key: np.zeros(shape, dtype=dtype)
+               for key, (shape, dtype) in outputs.items()}
+    sorted_orbit = orbit[order]
+    for size in np.unique(sizes):
+        group = np.flatnonzero(sizes == size)
+        # The row of each orbit within its group
+        row = np.full(n_orbits, -1)
+        row[group] = np.arange(len(group))
+        members = row[sorted_orbit] >= 0
+        index = (row[sorted_orbit[members]], slot[members])
+        inputs = {"times": np.zeros((len(group), size)),
+                  "positions": np.zeros((len(group), size, 2)),
+                  "weights": np.zeros((len(group), size)),
+                  "gravitational_parameter": mu[group],
+                  "period": period[group]}
+        selected = order[members]
+        inputs["times"][index] = times[selected]
+        inputs["positions"][index] = positions[selected]
+        inputs["weights"][index] = weights[selected]
+        group_outputs = {key: ((len(group),) + shape[1:], dtype)
+                         for key, (shape, dtype) in outputs.items()}
+        if workers == 1:
+            arrays = dict(inputs, **{
+                key: np.zeros(shape, dtype=dtype)
+                for key, (shape, dtype) in group_outputs.items()})
+            _fit_range(arrays, 0, len(group), sigma is None, max_iterations,
+                       tolerance)
+        else:
+            arrays = map_ranges(_fit_range, inputs, group_outputs,
+                                len(group), workers=workers,
+                                args=(sigma is None, max_iterations,
+                                      tolerance))
+        for key in outputs:
+            results[key][group] = arrays[key]
+    parameters = results["parameters"]
+    a, k, h, longitude, n = parameters.T
+    periapsis = np.mod(np.arctan2(h, k), 2 * math.pi)
+    return OrbitFit(a, np.hypot(k, h), periapsis,
+                    np.mod(longitude - periapsis, 2 * math.pi),
+                    (n / seconds_in_a_day) ** 2 * a ** 3,
+                    results["covariance"], results["rms"],
+                    results["iterations"], results["converged"])
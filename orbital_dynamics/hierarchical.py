@@ -0,0 +1,227 @@
+"""Hierarchical (patched-conic) integration along the orbit tree of a
+Universe.
+
+Every body is integrated in the frame of its primary body, as defined by
+Universe.flatten_orbital_graph (e.g., black hole -> stars -> planets ->
+moons). The motion is split into:
+    drift: the exact Keplerian orbit around the primary body, with
+    gravitational parameter G(M_primary + m), advanced with f and g
+    functions (see kepler.kepler_drift)
+    kick: every other gravitational pull, i.e., the difference between the
+    relative acceleration from the direct-sum solver and the Keplerian term
+
+and the two are combined in a kick-drift-kick leapfrog, in the manner of
+the Wisdom-Holman mixed-variable symplectic map. Because the dominant
+primary pull is integrated exactly, the time step only needs to resolve the
+(much weaker) perturbations, which allows time steps of a sizable fraction
+of the shortest orbital period.
+
+Each root of the orbit tree sits at the origin of its own frame; the
+motion of the roots themselves is not integrated. Binaries and multiples
+(bodies orbiting a shared Barycenter) are not supported, since their
+members are not dominated by any one primary body; integrate them with the
+BlockTimestepIntegrator instead.
+"""
+import math
+from typing import List
+import numpy as np
+from celestial_bodies.celestial_bodies import Barycenter
+from facts.numerical_constants import meters_in_a_kilometer, \
+    seconds_in_a_day
+from gravity.direct_sum import calculate_accelerations
+from orbital_dynamics import kepler
+
+
+class HierarchicalPropagator:
+    """Propagates every body of a Universe relative to its primary body
+    with a Kepler-drift / perturbation-kick leapfrog.
+
+    Units: positions in kilometers, velocities in kilometers / second,
+    time in days.
+    """
+
+    def __init__(self, universe, time_step: float = None,
+                 steps_per_orbit: int = 20, softening: float = 0.0) -> None:
+        """Initializes the state of every body from its Orbit at time 0.
+
+        :param Universe universe: the universe to propagate
+        :param float time_step: the time step in days; defaults to the
+        shortest orbital period divided by steps_per_orbit
+        :param int steps_per_orbit: the number of steps per shortest orbit
+        used for the default time step
+        :param float softening: Plummer softening length (kilometers) used
+        for the perturbations
+        """
+        bodies, parents, orbits = universe.flatten_orbital_graph()
+        if len(bodies) < 2:
+            raise ValueError(f"{universe.name} has no orbits to propagate.")
+        if parents.count(-1) > 1:
+            # Every root sits at rest at the origin (see state_vectors), so
+            # the roots of unrelated trees would coincide
+            raise ValueError(f"{universe.name} has {parents.count(-1)} "
+                             f"unrelated roots; propagate each tree in a "
+                             f"universe of its own.")
+        if any(isinstance(body, Barycenter) for body in bodies):
+            raise ValueError(f"{universe.name} has binaries or multiples, "
+                             f"which cannot be propagated hierarchically; "
+                             f"use a BlockTimestepIntegrator.")
+        self.bodies = bodies
+        self.parent_index = np.array(parents)
+        self.masses = np.array([body.mass for body in bodies], dtype=float)
+        self.orbiting = np.flatnonzero(self.parent_index >= 0)
+        self.softening = softening
+        n_bodies = len(bodies)
+        self.depth = np.zeros(n_bodies, dtype=int)
+        for idx in self.orbiting:
+            self.depth[idx] = self.depth[self.parent_index[idx]] + 1
+        self.gravitational_parameter = np.zeros(n_bodies)
+        self.positions = np.zeros((n_bodies, 3))
+        self.velocities = np.zeros((n_bodies, 3))
+        for idx in self.orbiting:
+            orbit = orbits[idx]
+            self.gravitational_parameter[idx] = orbit.gravitational_parameter
+            self.positions[idx, :2] = orbit.position_at(0.0)
+            self.velocities[idx, :2] = orbit.velocity_at(0.0)
+        if time_step is None:
+            time_step = min(orbits[idx].period for idx in self.orbiting) / \
+                steps_per_orbit
+        if time_step <= 0:
+            raise ValueError(f"time_step ({time_step}) must be positive.")
+        self.time_step = time_step
+        self.time = 0.0
+        self.steps = 0
+        self.force_evaluations = 0
+        self._perturbations = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self.bodies)} bodies, " \
+            f"time_step={self.time_step})"
+
+    @property
+    def body_names(self) -> List[str]:
+        """Returns the names of the bodies, in integration order.
+
+        :return: names of the bodies
+        :rtype: List[str]
+        """
+        return [body.name for body in self.bodies]
+
+    def _to_root_frame(self, relative: np.ndarray) -> np.ndarray:
+        """Sums relative vectors up the tree, level by level.
+
+        :param np.ndarray relative: (n, 3) vectors relative to each body's
+        primary body
+        :return: (n, 3) vectors relative to the root of each body's tree
+        :rtype: np.ndarray
+        """
+        absolute = relative.copy()
+        for level in range(1, self.depth.max() + 1):
+            idx = np.flatnonzero(self.depth == level)
+            absolute[idx] += absolute[self.parent_index[idx]]
+        return absolute
+
+    def inertial_positions(self) -> np.ndarray:
+        """Returns the positions of every body relative to the root of its
+        tree.
+
+        :return: (n, 3) array of positions in kilometers
+        :rtype: np.ndarray
+        """
+        return self._to_root_frame(self.positions)
+
+    def inertial_velocities(self) -> np.ndarray:
+        """Returns the velocities of every body relative to the root of its
+        tree.
+
+        :return: (n, 3) array of velocities in kilometers / second
+        :rtype: np.ndarray
+        """
+        return self._to_root_frame(self.velocities)
+
+    def barycentric_state(self):
+        """Returns positions and velocities relative to the barycenter of
+        the whole system (a true inertial frame when there is a single
+        root).
+
+        :return: (n, 3) positions in kilometers and (n, 3) velocities in
+        kilometers / second
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        weights = self.masses[:, None] / self.masses.sum()
+        positions = self.inertial_positions()
+        velocities = self.inertial_velocities()
+        return positions - (weights * positions).sum(axis=0), \
+            velocities - (weights * velocities).sum(axis=0)
+
+    def reduce_time_step(self, factor: float = 0.5) -> None:
+        """Shrinks the time step by the given factor.
+
+        :param float factor: the factor (0 < factor < 1)
+        :return: None
+        """
+        if not 0 < factor < 1:
+            raise ValueError(f"factor ({factor}) must be between 0 and 1.")
+        self.time_step *= factor
+
+    def perturbing_accelerations(self) -> np.ndarray:
+        """Returns the acceleration of every body relative to its primary
+        body, minus the Keplerian pull of the primary body.
+
+        :return: (n, 3) array of accelerations in kilometers / second
+        squared (zero for the roots)
+        :rtype: np.ndarray
+        """
+        accelerations = calculate_accelerations(
+            self.inertial_positions(), self.masses,
+            softening=self.softening).accelerations / meters_in_a_kilometer
+        self.force_evaluations += 1
+        perturbations = np.zeros_like(accelerations)
+        idx = self.orbiting
+        r = self.positions[idx]
+        distance = np.linalg.norm(r, axis=1)
+        keplerian = -self.gravitational_parameter[idx, None] * r / \
+            distance[:, None] ** 3
+        perturbations[idx] = accelerations[idx] - \
+            accelerations[self.parent_index[idx]] - keplerian
+        return perturbations
+
+    def _drift(self, time_step_seconds: float) -> None:
+        idx = self.orbiting
+        self.positions[idx], self.velocities[idx] = kepler.kepler_drift(
+            self.positions[idx], self.velocities[idx],
+            self.gravitational_parameter[idx], time_step_seconds)
+
+    def step(self, time_step: float = None) -> None:
+        """Advances the system by one kick-drift-kick step.
+
+        :param float time_step: the step in days; defaults to the
+        propagator's time step
+        :return: None
+        """
+        if time_step is None:
+            time_step = self.time_step
+        seconds = time_step * seconds_in_a_day
+        if self._perturbations is None:
+            self._perturbations = self.perturbing_accelerations()
+        self.velocities += self._perturbations * (seconds / 2)
+        self._drift(seconds)
+        self._perturbations = self.perturbing_accelerations()
+        self.velocities += self._perturbations * (seconds / 2)
+        self.time += time_step
+        self.steps += 1
+
+    def propagate(self, duration: float) -> np.ndarray:
+        """Advances the system by the given duration, in as few steps as
+        possible without exceeding the time step.
+
+        :param float duration: the duration in days
+        :return: (n, 3) array of positions relative to the root of each
+        body's tree, in kilometers
+        :rtype: np.ndarray
+        """
+        if duration < 0:
+            raise ValueError(f"duration ({duration}) must not be negative.")
+        n_steps = math.ceil(duration / self.time_step)
+        for _ in range(n_steps):
+            self.step(duration / n_steps)
+        return self.inertial_positions()
@@ -0,0 +1,219 @@
+"""Vectorized Keplerian propagation.
+
+All functions accept scalars or numpy arrays and broadcast their arguments
+against each other, so that many orbits can be propagated over many times in
+a single call. Angles are in radians, distances in kilometers and times in
+seconds unless stated otherwise.
+"""
+import numpy as np
+from facts.numerical_constants import gravitational_constant, \
+    meters_in_a_kilometer
+
+
+def calculate_gravitational_parameter(primary_body_mass, orbiting_body_mass):
+    """Calculates the standard gravitational parameter of a two-body orbit.
+
+    Formula: mu = G(M1 + M2)
+
+    :param primary_body_mass: mass of the primary body in kilograms
+    :param orbiting_body_mass: mass of the orbiting body in kilograms
+    :return: gravitational parameter in cubic kilometers / second squared
+    :rtype: np.ndarray
+    """
+    total_mass = np.add(primary_body_mass, orbiting_body_mass)
+    if np.any(total_mass <= 0):
+        raise ValueError(f"The combined mass of the bodies must be positive.")
+    return gravitational_constant * total_mass / meters_in_a_kilometer ** 3
+
+
+def calculate_mean_motion(semimajor_axis, gravitational_parameter):
+    """Calculates the mean motion (average angular velocity) of an orbit.
+
+    Formula: n = (mu / a^3)^1/2
+
+    :param semimajor_axis: semi-major axis of the orbit in kilometers
+    :param gravitational_parameter: gravitational parameter in cubic
+    kilometers / second squared
+    :return: mean motion in radians / second
+    :rtype: np.ndarray
+    """
+    semimajor_axis = np.asarray(semimajor_axis, dtype=float)
+    if np.any(semimajor_axis <= 0):
+        raise ValueError(f"semi-major axis must be positive.")
+    return np.sqrt(gravitational_parameter / np.power(semimajor_axis, 3))
+
+
+def solve_keplers_equation(mean_anomaly, eccentricity,
+                           tolerance: float = 1e-12,
+                           max_iterations: int = 50):
+    """Solves Kepler's equation for the eccentric anomaly using Newton's
+    method, vectorized over all inputs.
+
+    Formula: M = E - e sin(E)
+
+    :param mean_anomaly: mean anomaly in radians
+    :param eccentricity: eccentricity of the orbit (0 <= e < 1)
+    :param float tolerance: absolute convergence tolerance in radians
+    :param int max_iterations: maximum number of Newton iterations
+    :return: eccentric anomaly in radians, wrapped to [0, 2pi)
+    :rtype: np.ndarray
+    """
+    eccentricity = np.asarray(eccentricity, dtype=float)
+    if np.any((eccentricity < 0) | (eccentricity >= 1)):
+        raise ValueError(f"eccentricity must be in the range 0 <= e < 1")
+    mean_anomaly = np.mod(np.asarray(mean_anomaly, dtype=float), 2 * np.pi)
+    mean_anomaly, eccentricity = np.broadcast_arrays(mean_anomaly,
+                                                     eccentricity)
+    # Starting guess from Danby (1987), robust for high eccentricities
+    eccentric_anomaly = mean_anomaly + 0.85 * eccentricity * np.sign(
+        np.sin(mean_anomaly))
+    for _ in range(max_iterations):
+        residual = eccentric_anomaly - eccentricity * np.sin(
+            eccentric_anomaly) - mean_anomaly
+        step = residual / (1 - eccentricity * np.cos(eccentric_anomaly))
+        eccentric_anomaly = eccentric_anomaly - step
+        if np.all(np.abs(step) < tolerance):
+            break
+    return np.mod(eccentric_anomaly, 2 * np.pi)
+
+
+def calculate_true_anomaly(eccentric_anomaly, eccentricity):
+    """Converts eccentric anomaly to true anomaly.
+
+    :param eccentric_anomaly: eccentric anomaly in radians
+    :param eccentricity: eccentricity of the orbit
+    :return: true anomaly in radians
+    :rtype: np.ndarray
+    """
+    return 2 * np.arctan2(
+        np.sqrt(1 + eccentricity) * np.sin(eccentric_anomaly / 2),
+        np.sqrt(1 - eccentricity) * np.cos(eccentric_anomaly / 2))
+
+
+def calculate_orbital_position(semimajor_axis, eccentricity,
+                               eccentric_anomaly,
+                               argument_of_periapsis=0.0):
+    """Calculates the position of an orbiting body relative to its primary
+    body (which sits at a focus of the ellipse), in the orbital plane.
+
+    :param semimajor_axis: semi-major axis of the orbit in kilometers
+    :param eccentricity: eccentricity of the orbit
+    :param eccentric_anomaly: eccentric anomaly in radians
+    :param argument_of_periapsis: angle from the x-axis to periapsis in
+    radians
+    :return: array of shape (..., 2) with (x, y) in kilometers
+    :rtype: np.ndarray
+    """
+    x = semimajor_axis * (np.cos(eccentric_anomaly) - eccentricity)
+    y = semimajor_axis * np.sqrt(1 - np.power(eccentricity, 2)) * \
+        np.sin(eccentric_anomaly)
+    cos_w, sin_w = np.cos(argument_of_periapsis), np.sin(
+        argument_of_periapsis)
+    return np.stack((x * cos_w - y * sin_w, x * sin_w + y * cos_w), axis=-1)
+
+
+def calculate_orbital_velocity(semimajor_axis, eccentricity,
+                               eccentric_anomaly, gravitational_parameter,
+                               argument_of_periapsis=0.0):
+    """Calculates the velocity of an orbiting body relative to its primary
+    body, in the orbital plane.
+
+    :param semimajor_axis: semi-major axis of the orbit in kilometers
+    :param eccentricity: eccentricity of the orbit
+    :param eccentric_anomaly: eccentric anomaly in radians
+    :param gravitational_parameter: gravitational parameter in cubic
+    kilometers / second squared
+    :param argument_of_periapsis: angle from the x-axis to periapsis in
+    radians
+    :return: array of shape (..., 2) with (vx, vy) in kilometers / second
+    :rtype: np.ndarray
+    """
+    mean_motion = calculate_mean_motion(semimajor_axis,
+                                        gravitational_parameter)
+    factor = semimajor_axis * mean_motion / (
+        1 - eccentricity * np.cos(eccentric_anomaly))
+    vx = -factor * np.sin(eccentric_anomaly)
+    vy = factor * np.sqrt(1 - np.power(eccentricity, 2)) * \
+        np.cos(eccentric_anomaly)
+    cos_w, sin_w = np.cos(argument_of_periapsis), np.sin(
+        argument_of_periapsis)
+    return np.stack((vx * cos_w - vy * sin_w, vx * sin_w + vy * cos_w),
+                    axis=-1)
+
+
+def propagate_eccentric_anomaly(time, mean_motion, eccentricity,
+                                mean_anomaly_at_epoch=0.0):
+    """Propagates orbits to the given times, returning the eccentric
+    anomaly. Broadcasting a column of times against a row of orbits (e.g.,
+    time[:, None] with arrays of shape (n_orbits,)) propagates every orbit
+    to every time at once.
+
+    :param time: time since epoch in seconds
+    :param mean_motion: mean motion in radians / second
+    :param eccentricity: eccentricity of the orbit
+    :param mean_anomaly_at_epoch: mean anomaly at time 0 in radians
+    :return: eccentric anomaly in radians
+    :rtype: np.ndarray
+    """
+    mean_anomaly = mean_anomaly_at_epoch + np.multiply(mean_motion, time)
+    return solve_keplers_equation(mean_anomaly, eccentricity)
+
+
+def kepler_drift(positions, velocities, gravitational_parameter, time_step,
+                 tolerance: float = 1e-13, max_iterations: int = 50):
+    """Advances bound two-body states along their Keplerian orbits by one
+    time step using Gauss's f and g functions, vectorized over bodies.
+
+    :param positions: (n, d) array of positions relative to the primary in
+    kilometers
+    :param velocities: (n, d) array of velocities relative to the primary in
+    kilometers / second
+    :param gravitational_parameter: (n,) array (or scalar) of G(M1 + M2) in
+    cubic kilometers / second squared
+    :param time_step: time step in seconds (scalar or (n,) array)
+    :param float tolerance: convergence tolerance on the eccentric anomaly
+    :param int max_iterations: maximum number of Newton iterations
+    :return: new positions and velocities
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    :raises: ValueError if any state is unbound
+    """
+    positions = np.asarray(positions, dtype=float)
+    velocities = np.asarray(velocities, dtype=float)
+    mu = np.broadcast_to(np.asarray(gravitational_parameter, dtype=float),
+                         positions.shape[:1])
+    time_step = np.broadcast_to(np.asarray(time_step, dtype=float),
+                                positions.shape[:1])
+    r0 = np.linalg.norm(positions, axis=1)
+    v0_squared = np.einsum("ij,ij->i", velocities, velocities)
+    inverse_semimajor_axis = 2 / r0 - v0_squared / mu
+    if np.any(inverse_semimajor_axis <= 0):
+        raise ValueError("kepler_drift only supports bound (elliptical) "
+                         "orbits.")
+    semimajor_axis = 1 / inverse_semimajor_axis
+    mean_motion = np.sqrt(mu * inverse_semimajor_axis ** 3)
+    # Whole orbits do not change the state, so only the remainder is solved
+    period = 2 * np.pi / mean_motion
+    time_step = time_step - np.floor(time_step / period) * period
+    e_cos = 1 - r0 * inverse_semimajor_axis
+    e_sin = np.einsum("ij,ij->i", positions, velocities) / (
+        mean_motion * semimajor_axis ** 2)
+    delta_mean_anomaly = mean_motion * time_step
+    # Solve dM = x - e_cos sin(x) + e_sin (1 - cos(x)) for x = dE
+    x = delta_mean_anomaly.copy()
+    for _ in range(max_iterations):
+        sin_x, cos_x = np.sin(x), np.cos(x)
+        residual = x - e_cos * sin_x + e_sin * (1 - cos_x) - \
+            delta_mean_anomaly
+        step = residual / (1 - e_cos * cos_x + e_sin * sin_x)
+        x = x - step
+        if np.all(np.abs(step) < tolerance):
+            break
+    sin_x, cos_x = np.sin(x), np.cos(x)
+    f = 1 - semimajor_axis / r0 * (1 - cos_x)
+    g = time_step - (x - sin_x) / mean_motion
+    new_positions = f[:, None] * positions + g[:, None] * velocities
+    r = semimajor_axis * (1 - e_cos * cos_x + e_sin * sin_x)
+    f_dot = -semimajor_axis ** 2 * mean_motion * sin_x / (r0 * r)
+    g_dot = 1 - semimajor_axis / r * (1 - cos_x)
+    new_velocities = f_dot[:, None] * positions + g_dot[:, None] * velocities
+    return new_positions, new_velocities
@@ -0,0 +1,160 @@
+"""Fixed-step kick-drift-kick leapfrog integration of arbitrary N-body
+states.
+
+The leapfrog is the simplest symplectic integrator: each step of h is
+
+    kick: v += a(x) h / 2
+    drift: x += v h
+    kick: v += a(x) h / 2
+
+with the accelerations from the direct-sum solver. It is second order,
+time-reversible, and keeps the energy error bounded (rather than drifting)
+for as long as the time step resolves every close approach. The second
+kick of a step and the first kick of the next share one force evaluation.
+
+Unlike the HierarchicalPropagator and the BlockTimestepIntegrator, it
+integrates any state, not only the orbit tree of a Universe (e.g., the
+figure-eight three-body orbit, or a star cluster); it is the baseline of
+the integrator benchmarks (see benchmarks).
+"""
+import math
+import numpy as np
+from celestial_bodies.celestial_bodies import Barycenter
+from facts.numerical_constants import meters_in_a_kilometer, \
+    seconds_in_a_day
+from gravity.direct_sum import calculate_accelerations
+
+
+class LeapfrogIntegrator:
+    """Integrates bodies with a fixed-step kick-drift-kick leapfrog.
+
+    Units: positions in kilometers, velocities in kilometers / second,
+    time in days.
+    """
+
+    def __init__(self, positions, velocities, masses, time_step: float,
+                 softening: float = 0.0) -> None:
+        """Initializes the state, moved to the barycentric frame.
+
+        :param positions: (n, 3) array of positions in kilometers
+        :param velocities: (n, 3) array of velocities in kilometers / second
+        :param masses: (n,) array of masses in kilograms
+        :param float time_step: the time step in days
+        :param float softening: Plummer softening length in kilometers
+        """
+        positions = np.array(positions, dtype=float)
+        velocities = np.array(velocities, dtype=float)
+        self.masses = np.array(masses, dtype=float)
+        if positions.ndim != 2 or positions.shape != velocities.shape or \
+                self.masses.shape != (len(positions),):
+            raise ValueError(f"positions {positions.shape}, velocities "
+                             f"{velocities.shape} and masses "
+                             f"{self.masses.shape} do not describe the same "
+                             f"bodies.")
+        if len(positions) < 2:
+            raise ValueError("There must be at least two bodies.")
+        if time_step <= 0:
+            raise ValueError(f"time_step ({time_step}) must be positive.")
+        weights = self.masses[:, None] / self.masses.sum()
+        self.positions = positions - (weights * positions).sum(axis=0)
+        self.velocities = velocities - (weights * velocities).sum(axis=0)
+        self.time_step = time_step
+        self.softening = softening
+        self.time = 0.0
+        self.steps = 0
+        self.force_evaluations = 0
+        self._accelerations = None
+
+    @classmethod
+    def from_universe(cls, universe, time_step: float,
+                      softening: float = 0.0) -> "LeapfrogIntegrator":
+        """Initializes the state of every body of a Universe at time 0
+        (barycenters of binaries and multiples are left out).
+
+        :param Universe universe: the universe to integrate
+        :param float time_step: the time step in days
+        :param float softening: Plummer softening length in kilometers
+        :return: the integrator
+        :rtype: LeapfrogIntegrator
+        """
+        _, parents, _ = universe.flatten_orbital_graph()
+        if parents.count(-1) > 1:
+            # Every root sits at rest at the origin (see state_vectors), so
+            # the roots of unrelated trees would coincide
+            raise ValueError(f"{universe.name} has {parents.count(-1)} "
+                             f"unrelated roots; integrate each tree in a "
+                             f"universe of its own.")
+        bodies, positions, velocities = universe.state_vectors(0.0)
+        keep = np.array([not isinstance(body, Barycenter) for body in bodies],
+                        dtype=bool)
+        masses = [body.mass for body, kept in zip(bodies, keep) if kept]
+        return cls(positions[keep], velocities[keep], masses, time_step,
+                   softening)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self.masses)} bodies, " \
+            f"time_step={self.time_step})"
+
+    def barycentric_state(self):
+        """Returns the positions and velocities of every body.
+
+        :return: (n, 3) positions in kilometers and (n, 3) velocities in
+        kilometers / second
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        return self.positions, self.velocities
+
+    def reduce_time_step(self, factor: float = 0.5) -> None:
+        """Shrinks the time step by the given factor.
+
+        :param float factor: the factor (0 < factor < 1)
+        :return: None
+        """
+        if not 0 < factor < 1:
+            raise ValueError(f"factor ({factor}) must be between 0 and 1.")
+        self.time_step *= factor
+
+    def accelerations(self) -> np.ndarray:
+        """Returns the gravitational acceleration of every body.
+
+        :return: (n, 3) array of accelerations in kilometers / second squared
+        :rtype: np.ndarray
+        """
+        self.force_evaluations += 1
+        return calculate_accelerations(
+            self.positions, self.masses,
+            softening=self.softening).accelerations / meters_in_a_kilometer
+
+    def step(self, time_step: float = None) -> None:
+        """Advances the system by one kick-drift-kick step.
+
+        :param float time_step: the step in days; defaults to the
+        integrator's time step
+        :return: None
+        """
+        if time_step is None:
+            time_step = self.time_step
+        seconds = time_step * seconds_in_a_day
+        if self._accelerations is None:
+            self._accelerations = self.accelerations()
+        self.velocities += self._accelerations * (seconds / 2)
+        self.positions += self.velocities * seconds
+        self._accelerations = self.accelerations()
+        self.velocities += self._accelerations * (seconds / 2)
+        self.time += time_step
+        self.steps += 1
+
+    def propagate(self, duration: float) -> np.ndarray:
+        """Advances the system by the given duration, in as few steps as
+        possible without exceeding the time step.
+
+        :param float duration: the duration in days
+        :return: (n, 3) array of barycentric positions in kilometers
+        :rtype: np.ndarray
+        """
+        if duration < 0:
+            raise ValueError(f"duration ({duration}) must not be negative.")
+        n_steps = math.ceil(duration / self.time_step - 1e-12)
+        for _ in range(n_steps):
+            self.step(duration / n_steps)
+        return self.positions.copy()
@@ -1,5 +1,10 @@
-from orbital_dynamics.orbital_calculations import *
-from celestial_bodies.celestial_bodies import *
+import numpy as np
+from facts.numerical_constants import seconds_in_a_day
+from orbital_dynamics.orbital_calculations import \
+    calculate_semiminor_axis_of_ellipse, calculate_perihelion_of_ellipse, \
+    calculate_aphelion_of_ellipse, calculate_orbital_period
+from orbital_dynamics import kepler
+from celestial_bodies.celestial_bodies import CelestialBody, Barycenter
 
 
 class CollisionError(ValueError):
@@ -27,7 +32,7 @@ class Orbit:
 
     To Do List:
     [ ] instability detection
-    [ ] determine position at time t
+    [x] determine position at time t
     [ ] update orbiting body to contain the basic stats of its own orbit
     (probably best accomplished by storing a pointer to this instance)
     [ ] str (pretty print)
@@ -35,7 +40,8 @@ class Orbit:
 
     def __init__(self, primary_body: CelestialBody,
                  orbiting_body: CelestialBody, semimajor_axis: float,
-                 eccentricity: float):
+                 eccentricity: float, argument_of_periapsis: float = 0.0,
+                 mean_anomaly_at_epoch: float = 0.0):
         """Initializes an orbit by performing basic calculations and
         checking the orbit for obvious near-term collision.
 
@@ -44,6 +50,10 @@ class Orbit:
         :param float semimajor_axis: 1/2 the major axis, which runs through
         the center of the ellipse, passes through a focus, and to the perimeter
         :param float eccentricity: the eccentricity of the orbit (0 <= e < 1)
+        :param float argument_of_periapsis: the angle (in radians) from the
+        reference direction to the periapsis of the orbit
+        :param float mean_anomaly_at_epoch: the mean anomaly (in radians) of
+        the orbiting body at time 0; 0 places the body at periapsis
         """
         self.primary_body = primary_body
         self.orbiting_body = orbiting_body
@@ -54,6 +64,8 @@ class Orbit:
                              f"between 0 and 1; 0 <= e < 1")
         self.semimajor_axis = semimajor_axis
         self.eccentricity = eccentricity
+        self.argument_of_periapsis = argument_of_periapsis
+        self.mean_anomaly_at_epoch = mean_anomaly_at_epoch
         self._collison_detection()
         self._update_celestial_bodies()
 
@@ -98,10 +110,69 @@ class Orbit:
             self.semimajor_axis, self.primary_body.mass,
             self.orbiting_body.mass)
 
+    @property
+    def gravitational_parameter(self):
+        """Calculates the gravitational parameter G(M1 + M2) of the orbit.
+
+        :return: gravitational parameter in cubic kilometers / second squared
+        :rtype: float
+        """
+        return float(kepler.calculate_gravitational_parameter(
+            self.primary_body.mass, self.orbiting_body.mass))
+
+    @property
+    def mean_motion(self):
+        """Calculates the mean motion (average angular velocity) of the
+        orbiting body.
+
+        :return: mean motion in radians / second
+        :rtype: float
+        """
+        return float(kepler.calculate_mean_motion(
+            self.semimajor_axis, self.gravitational_parameter))
+
+    def eccentric_anomaly_at(self, time):
+        """Calculates the eccentric anomaly of the orbiting body at the given
+        time(s).
+
+        :param time: time since epoch in days (scalar or array)
+        :return: eccentric anomaly in radians
+        :rtype: np.ndarray
+        """
+        return kepler.propagate_eccentric_anomaly(
+            np.multiply(time, seconds_in_a_day), self.mean_motion,
+            self.eccentricity, self.mean_anomaly_at_epoch)
+
+    def position_at(self, time):
+        """Calculates the position of the orbiting body relative to its
+        primary body at the given time(s).
+
+        :param time: time since epoch in days (scalar or array)
+        :return: array of shape (..., 2) with (x, y) in kilometers
+        :rtype: np.ndarray
+        """
+        return kepler.calculate_orbital_position(
+            self.semimajor_axis, self.eccentricity,
+            self.eccentric_anomaly_at(time), self.argument_of_periapsis)
+
+    def velocity_at(self, time):
+        """Calculates the velocity of the orbiting body relative to its
+        primary body at the given time(s).
+
+        :param time: time since epoch in days (scalar or array)
+        :return: array of shape (..., 2) with (vx, vy) in kilometers / second
+        :rtype: np.ndarray
+        """
+        return kepler.calculate_orbital_velocity(
+            self.semimajor_axis, self.eccentricity,
+            self.eccentric_anomaly_at(time), self.gravitational_parameter,
+            self.argument_of_periapsis)
+
     def __repr__(self):
         return f"{self.__class__.__name__}({repr(self.primary_body)}, " \
             f"{repr(self.orbiting_body)}, {self.semimajor_axis}, " \
-            f"{self.eccentricity})"
+            f"{self.eccentricity}, {self.argument_of_periapsis}, " \
+            f"{self.mean_anomaly_at_epoch})"
 
     def _update_celestial_bodies(self):
         """Updates the base celestial bodies to include references to their
@@ -136,3 +207,110 @@ class Orbit:
             raise CollisionError(f"The perihelion is so close that the "
                                  f"orbiting body could not successfully "
                                  f"circle its primary body without colliding.")
+
+
+class BarycentricOrbit(Orbit):
+    """Defines the orbit of a member of a binary (or of one level of a
+    hierarchical multiple) around the members' Barycenter.
+
+    The semi-major axis is the member's own distance from the barycenter,
+    a_1 = a m_2 / (m_1 + m_2), where a is the semi-major axis of the
+    relative orbit of the two members and m_2 the mass of the rest of the
+    barycenter. The member moves under the gravitational parameter
+    mu = G m_2^3 / (m_1 + m_2)^2, so that every member completes the
+    relative orbit in its period, 2 pi (a^3 / G(m_1 + m_2))^1/2.
+
+    Use create_binary (see orbital_dynamics.binary) to build both orbits
+    of a binary consistently.
+    """
+
+    def __init__(self, barycenter: Barycenter, orbiting_body: CelestialBody,
+                 semimajor_axis: float, eccentricity: float,
+                 argument_of_periapsis: float = 0.0,
+                 mean_anomaly_at_epoch: float = 0.0):
+        """
+        :param Barycenter barycenter: the barycenter of the members
+        :param CelestialBody orbiting_body: the member
+        :param float semimajor_axis: the member's distance from the
+        barycenter (semi-major axis, in kilometers)
+        :param float eccentricity: the eccentricity of the orbit (0 <= e < 1)
+        :param float argument_of_periapsis: the angle (in radians) from the
+        reference direction to the member's periapsis
+        :param float mean_anomaly_at_epoch: the mean anomaly (in radians) of
+        the member at time 0
+        """
+        if not isinstance(barycenter, Barycenter):
+            raise TypeError(f"{barycenter.name} is not a Barycenter.")
+        if orbiting_body.mass >= barycenter.mass:
+            raise ValueError(f"The mass of {orbiting_body.name} must be less "
+                             f"than the mass of {barycenter.name}.")
+        super().__init__(barycenter, orbiting_body, semimajor_axis,
+                         eccentricity, argument_of_periapsis,
+                         mean_anomaly_at_epoch)
+
+    @property
+    def companion_mass(self) -> float:
+        """Returns the mass of the rest of the barycenter (the other
+        members).
+
+        :return: mass in kilograms
+        :rtype: float
+        """
+        return self.primary_body.mass - self.orbiting_body.mass
+
+    @property
+    def relative_semimajor_axis(self) -> float:
+        """Returns the semi-major axis of the member's orbit relative to
+        the rest of the barycenter.
+
+        :return: semi-major axis in kilometers
+        :rtype: float
+        """
+        return self.semimajor_axis * self.primary_body.mass / \
+            self.companion_mass
+
+    @property
+    def period(self):
+        """Returns the orbital period, shared by every member.
+
+        :return: period in days
+        :rtype: float
+        """
+        return calculate_orbital_period(self.relative_semimajor_axis,
+                                        self.companion_mass,
+                                        self.orbiting_body.mass)
+
+    @property
+    def gravitational_parameter(self):
+        """Returns the gravitational parameter of the member's motion
+        about the barycenter, G m_2^3 / (m_1 + m_2)^2.
+
+        :return: gravitational parameter in cubic kilometers / second
+        squared
+        :rtype: float
+        """
+        return float(kepler.calculate_gravitational_parameter(
+            self.companion_mass ** 3 / self.primary_body.mass ** 2, 0.0))
+
+    def _update_celestial_bodies(self):
+        """Also records the orbiting body as a member of the barycenter.
+
+        :return: None
+        """
+        super()._update_celestial_bodies()
+        self.primary_body.members.append(self.orbiting_body)
+
+    def _collison_detection(self):
+        """Tests the member against the barycenter's mass in place of the
+        barycenter (which has no size): the relative orbit must clear the
+        member's radius. Collisions between members are checked by
+        create_binary, which knows both.
+
+        :return: None
+        :raises: CollisionError
+        """
+        if self.orbiting_body.radius >= self.relative_semimajor_axis * (
+                1 - self.eccentricity):
+            raise CollisionError(f"The periapsis of {self.orbiting_body.name} "
+                                 f"lies within its own radius of the rest of "
+                                 f"{self.primary_body.name}.")
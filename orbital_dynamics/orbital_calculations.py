@@ -1,6 +1,7 @@
 import math
 from numbers import Real
-from facts.numerical_constants import gravitational_constant
+from facts.numerical_constants import gravitational_constant, \
+    meters_in_a_kilometer, seconds_in_a_day
 
 
 def calculate_semiminor_axis_of_ellipse(
@@ -110,8 +111,8 @@ def calculate_orbital_period(
     return math.pow(
         ((4 * math.pow(math.pi, 2))
          / (gravitational_constant * (primary_body_mass + orbiting_body_mass)))
-        * math.pow(semimajor_axis * 1000, 3),
-        1/2) / (60 * 60 * 24)
+        * math.pow(semimajor_axis * meters_in_a_kilometer, 3),
+        1/2) / seconds_in_a_day
 
 
 def calculate_planetary_surface_temperature(
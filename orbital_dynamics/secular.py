@@ -0,0 +1,365 @@
+"""Secular (orbit-averaged) evolution of planetary systems with
+Laplace-Lagrange theory.
+
+Over millions to billions of years, the mutual perturbations of the
+planets of a system average out along their orbits, except for slow
+exchanges of eccentricity and inclination. To second order in the
+eccentricities and inclinations, these are linear (Murray & Dermott, Solar
+System Dynamics, chapter 7). With h = e sin(pomega), k = e cos(pomega),
+p = I sin(Omega) and q = I cos(Omega) (pomega the longitude of periapsis
+and Omega of the ascending node):
+
+    d(k + i h)/dt = i A (k + i h)
+    d(q + i p)/dt = i B (q + i p)
+
+    A_jj = n_j / 4 sum_k m_k / (M + m_j) alpha_jk alpha'_jk b_3/2^(1)
+    A_jk = -n_j / 4 m_k / (M + m_j) alpha_jk alpha'_jk b_3/2^(2)
+    B_jj = -A_jj
+    B_jk = n_j / 4 m_k / (M + m_j) alpha_jk alpha'_jk b_3/2^(1)
+
+where M is the mass of the central body, n_j the mean motion of planet j,
+alpha_jk the ratio of the smaller to the larger semi-major axis,
+alpha'_jk = alpha_jk if planet j is the inner one of the pair and 1
+otherwise, and b_s^(j)(alpha) are Laplace coefficients. The matrices depend
+only on the masses and semi-major axes (which secular perturbations leave
+unchanged), so each system is solved once by diagonalizing A and B, and
+then evaluated at any time in closed form as a sum of modes:
+
+    k + i h = sum_i V_i c_i exp(i g_i t)
+
+Every function is vectorized over leading dimensions, so that many systems
+with the same number of planets are solved at once; secular_systems groups
+the planetary systems of Universe.columns() or StarSystemPopulation.columns()
+that way.
+
+Units: masses in kilograms, distances in kilometers, angles in radians,
+time in days and frequencies in radians / day.
+"""
+import math
+from typing import Dict, List, NamedTuple
+import numpy as np
+from facts.numerical_constants import seconds_in_a_day
+from orbital_dynamics import kepler
+
+
+def _laplace_coefficients(s: float, indices, alpha: np.ndarray,
+                          tolerance: float, chunk_size: int) -> np.ndarray:
+    """Evaluates b_s^(j)(alpha) for several j at once (see
+    calculate_laplace_coefficient), returning (len(indices),) +
+    alpha.shape values."""
+    flat = alpha.ravel()
+    coefficients = np.empty((len(indices), len(flat)))
+    # The integrand is even, so the rule runs over [0, pi] with m intervals,
+    # and its error falls as alpha^(2 m): alphas are bucketed by the
+    # (power of two) number of intervals they need
+    with np.errstate(divide="ignore"):
+        needed = np.log(tolerance) / (2 * np.log(flat))
+    intervals = 2 ** np.ceil(np.log2(np.clip(needed, 8, 2 ** 16)))
+    j = np.asarray(indices, dtype=float)[:, None]
+    for m in np.unique(intervals):
+        psi = math.pi * np.arange(m + 1) / m
+        weights = np.cos(j * psi) * 2 / m
+        weights[:, [0, -1]] /= 2
+        cosine = np.cos(psi)
+        selected = np.flatnonzero(intervals == m)
+        for start in range(0, len(selected), chunk_size):
+            chunk = selected[start:start + chunk_size]
+            a = flat[chunk, None]
+            coefficients[:, chunk] = weights @ np.power(
+                1 - 2 * a * cosine + a * a, -s).T
+    return coefficients.reshape((len(indices),) + alpha.shape)
+
+
+def calculate_laplace_coefficient(s: float, j: int, alpha,
+                                  tolerance: float = 1e-12,
+                                  chunk_size: int = 4096):
+    """Calculates Laplace coefficients, vectorized.
+
+    Formula: b_s^(j)(alpha) = 1 / pi int_0^2pi cos(j psi) /
+    (1 - 2 alpha cos(psi) + alpha^2)^s dpsi
+
+    The integrand is smooth and periodic, so the trapezoidal rule converges
+    geometrically (the error falls as alpha^n for n points); each alpha
+    gets just enough points to reach the tolerance.
+
+    :param float s: the half-integer order (e.g., 1.5)
+    :param int j: the index
+    :param alpha: ratios of semi-major axes (0 <= alpha < 1)
+    :param float tolerance: the relative accuracy of the quadrature
+    :param int chunk_size: the number of coefficients evaluated at once,
+    which bounds the memory used
+    :return: the Laplace coefficients
+    :rtype: np.ndarray
+    """
+    alpha = np.asarray(alpha, dtype=float)
+    if np.any((alpha < 0) | (alpha >= 1)):
+        raise ValueError("alpha must be in the range 0 <= alpha < 1.")
+    return _laplace_coefficients(s, (j,), alpha, tolerance, chunk_size)[0]
+
+
+def calculate_secular_matrices(central_mass, masses, semimajor_axes):
+    """Calculates the Laplace-Lagrange matrices A (eccentricities) and B
+    (inclinations) of planetary systems.
+
+    :param central_mass: (...) masses of the central bodies in kilograms
+    :param masses: (..., n) masses of the planets in kilograms
+    :param semimajor_axes: (..., n) distinct semi-major axes of the planets
+    in kilometers
+    :return: A and B, each (..., n, n) in radians / day
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    masses = np.asarray(masses, dtype=float)
+    a = np.asarray(semimajor_axes, dtype=float)
+    central_mass = np.asarray(central_mass, dtype=float)[..., None]
+    n_planets = a.shape[-1]
+    mean_motion = kepler.calculate_mean_motion(
+        a, kepler.calculate_gravitational_parameter(central_mass, masses)) \
+        * seconds_in_a_day
+    a_j, a_k = a[..., :, None], a[..., None, :]
+    off_diagonal = ~np.eye(n_planets, dtype=bool)
+    if np.any((a_j == a_k) & off_diagonal):
+        raise ValueError("The planets of a system must have distinct "
+                         "semi-major axes.")
+    # The diagonal (a planet and itself) is masked out below
+    alpha = np.where(off_diagonal, np.minimum(a_j, a_k) /
+                     np.maximum(a_j, a_k), 0.0)
+    alpha_bar = np.where(a_j < a_k, alpha, 1.0)
+    coupling = np.where(
+        off_diagonal, mean_motion[..., :, None] / 4 * masses[..., None, :] /
+        (central_mass + masses)[..., :, None] * alpha * alpha_bar, 0.0)
+    # alpha is symmetric, so the coefficients are evaluated once per pair
+    upper = np.triu_indices(n_planets, 1)
+    laplace = np.zeros((2,) + alpha.shape)
+    laplace[(slice(None), Ellipsis) + upper] = _laplace_coefficients(
+        1.5, (1, 2), alpha[(Ellipsis,) + upper], 1e-12, 4096)
+    laplace += np.swapaxes(laplace, -1, -2)
+    b1, b2 = coupling * laplace[0], coupling * laplace[1]
+    diagonal = np.eye(n_planets) * b1.sum(axis=-1)[..., None]
+    return diagonal - b2, b1 - diagonal
+
+
+def _modes(matrix: np.ndarray, weights: np.ndarray, initial: np.ndarray):
+    """Diagonalizes a secular matrix and projects the initial conditions on
+    its eigenvectors.
+
+    With D = diag(weights^1/2), where the weights are the planets' angular
+    momenta (up to a constant), D A D^-1 is symmetric, so the eigensystem
+    is real and is found with eigh; the eigenvectors of A are then
+    V = D^-1 U, with V^-1 = U^T D."""
+    root = np.sqrt(weights)
+    symmetric = matrix * root[..., :, None] / root[..., None, :]
+    symmetric = (symmetric + np.swapaxes(symmetric, -1, -2)) / 2
+    frequencies, orthonormal = np.linalg.eigh(symmetric)
+    vectors = orthonormal / root[..., :, None]
+    amplitudes = np.einsum("...ji,...j->...i", orthonormal, root * initial)
+    return frequencies, vectors, amplitudes
+
+
+class SecularSolution(NamedTuple):
+    """The secular modes of planetary systems: the eccentricity (g) and
+    inclination (f) eigenfrequencies in radians / day, the eigenvectors
+    (columns of the (..., n, n) mode arrays) and the complex amplitude of
+    each mode, fitted to the initial conditions."""
+    g: np.ndarray
+    eccentricity_modes: np.ndarray
+    eccentricity_amplitudes: np.ndarray
+    f: np.ndarray
+    inclination_modes: np.ndarray
+    inclination_amplitudes: np.ndarray
+
+    @staticmethod
+    def _evaluate(frequencies, vectors, amplitudes, times) -> np.ndarray:
+        times = np.asarray(times, dtype=float)
+        shape = times.shape
+        times = times.reshape((-1,) + (1,) * frequencies.ndim)
+        terms = amplitudes * np.exp(1j * frequencies * times)
+        values = np.matmul(vectors, terms[..., None])[..., 0]
+        return values.reshape(shape + values.shape[1:])
+
+    def eccentricity_vector(self, times) -> np.ndarray:
+        """Returns k + i h = e exp(i pomega) of every planet at the given
+        times.
+
+        :param times: times since epoch in days (scalar or array)
+        :return: complex array of shape times.shape + (..., n)
+        :rtype: np.ndarray
+        """
+        return self._evaluate(self.g, self.eccentricity_modes,
+                              self.eccentricity_amplitudes, times)
+
+    def inclination_vector(self, times) -> np.ndarray:
+        """Returns q + i p = I exp(i Omega) of every planet at the given
+        times.
+
+        :param times: times since epoch in days (scalar or array)
+        :return: complex array of shape times.shape + (..., n)
+        :rtype: np.ndarray
+        """
+        return self._evaluate(self.f, self.inclination_modes,
+                              self.inclination_amplitudes, times)
+
+    def eccentricity(self, times) -> np.ndarray:
+        """Returns the eccentricity of every planet at the given times.
+
+        :param times: times since epoch in days (scalar or array)
+        :return: array of shape times.shape + (..., n)
+        :rtype: np.ndarray
+        """
+        return np.abs(self.eccentricity_vector(times))
+
+    def longitude_of_periapsis(self, times) -> np.ndarray:
+        """Returns the longitude of periapsis of every planet at the given
+        times.
+
+        :param times: times since epoch in days (scalar or array)
+        :return: angles in radians (0 <= pomega < 2 pi)
+        :rtype: np.ndarray
+        """
+        return np.angle(self.eccentricity_vector(times)) % (2 * math.pi)
+
+    def inclination(self, times) -> np.ndarray:
+        """Returns the inclination of every planet at the given times.
+
+        :param times: times since epoch in days (scalar or array)
+        :return: inclinations in radians
+        :rtype: np.ndarray
+        """
+        return np.abs(self.inclination_vector(times))
+
+    def longitude_of_ascending_node(self, times) -> np.ndarray:
+        """Returns the longitude of the ascending node of every planet at
+        the given times.
+
+        :param times: times since epoch in days (scalar or array)
+        :return: angles in radians (0 <= Omega < 2 pi)
+        :rtype: np.ndarray
+        """
+        return np.angle(self.inclination_vector(times)) % (2 * math.pi)
+
+    @property
+    def max_eccentricity(self) -> np.ndarray:
+        """Returns the largest eccentricity each planet ever reaches (when
+        every mode lines up).
+
+        :return: (..., n) eccentricities
+        :rtype: np.ndarray
+        """
+        return np.abs(self.eccentricity_modes *
+                      self.eccentricity_amplitudes[..., None, :]).sum(-1)
+
+    @property
+    def max_inclination(self) -> np.ndarray:
+        """Returns the largest inclination each planet ever reaches (when
+        every mode lines up).
+
+        :return: (..., n) inclinations in radians
+        :rtype: np.ndarray
+        """
+        return np.abs(self.inclination_modes *
+                      self.inclination_amplitudes[..., None, :]).sum(-1)
+
+
+def solve_secular(central_mass, masses, semimajor_axes, eccentricities,
+                  longitudes_of_periapsis, inclinations=None,
+                  longitudes_of_ascending_node=None) -> SecularSolution:
+    """Solves the Laplace-Lagrange secular evolution of planetary systems.
+
+    Example:
+        solution = solve_secular(sun.mass, [jupiter.mass, saturn.mass],
+                                 [7.78e+08, 1.43e+09], [0.048, 0.054],
+                                 [0.24, 1.61])
+        solution.eccentricity(np.linspace(0, 365.25e+09, 1000))
+
+    :param central_mass: (...) masses of the central bodies in kilograms
+    :param masses: (..., n) (positive) masses of the planets in kilograms
+    :param semimajor_axes: (..., n) semi-major axes in kilometers
+    :param eccentricities: (..., n) eccentricities at time 0
+    :param longitudes_of_periapsis: (..., n) longitudes of periapsis at time
+    0 in radians
+    :param inclinations: (..., n) inclinations at time 0 in radians;
+    defaults to 0 (coplanar orbits, as modeled by Orbit)
+    :param longitudes_of_ascending_node: (..., n) longitudes of the
+    ascending node at time 0 in radians; defaults to 0
+    :return: the solution
+    :rtype: SecularSolution
+    """
+    e = np.asarray(eccentricities, dtype=float)
+    inclinations = np.zeros_like(e) if inclinations is None \
+        else np.asarray(inclinations, dtype=float)
+    if longitudes_of_ascending_node is None:
+        longitudes_of_ascending_node = np.zeros_like(e)
+    a_matrix, b_matrix = calculate_secular_matrices(central_mass, masses,
+                                                    semimajor_axes)
+    masses = np.asarray(masses, dtype=float)
+    # Angular momenta m (G (M + m) a)^1/2, up to the constant G^1/2
+    weights = masses * np.sqrt(
+        (np.asarray(central_mass, dtype=float)[..., None] + masses) *
+        np.asarray(semimajor_axes, dtype=float))
+    g, eccentricity_modes, eccentricity_amplitudes = _modes(
+        a_matrix, weights,
+        e * np.exp(1j * np.asarray(longitudes_of_periapsis)))
+    f, inclination_modes, inclination_amplitudes = _modes(
+        b_matrix, weights, inclinations * np.exp(
+            1j * np.asarray(longitudes_of_ascending_node)))
+    return SecularSolution(g, eccentricity_modes, eccentricity_amplitudes, f,
+                           inclination_modes, inclination_amplitudes)
+
+
+class SecularSystems(NamedTuple):
+    """Planetary systems with the same number of planets, solved together:
+    the index of each central body (s,), the indices of its planets sorted
+    by semi-major axis (s, n), and their solution."""
+    primary: np.ndarray
+    planets: np.ndarray
+    solution: SecularSolution
+
+
+def secular_systems(columns: Dict[str, np.ndarray]) -> List[SecularSystems]:
+    """Solves the secular evolution of every planetary system of a tree of
+    bodies, grouping the systems by their number of planets so that each
+    group is solved in one vectorized pass.
+
+    The satellites of each primary body form a system; the members of
+    binaries (which orbit a Barycenter, when columns has a type column) are
+    left out, and bodies orbiting them alone form systems of their own.
+
+    Example:
+        for systems in secular_systems(population.columns()):
+            e_max = systems.solution.max_eccentricity
+
+    :param Dict[str, np.ndarray] columns: parent (index of the primary, -1
+    for roots), mass, semimajor_axis, eccentricity and argument_of_periapsis
+    of every body; optionally type, inclination and
+    longitude_of_ascending_node
+    :return: the solved groups, by increasing number of planets
+    :rtype: List[SecularSystems]
+    """
+    parent = np.asarray(columns["parent"], dtype=np.int64)
+    mass = np.asarray(columns["mass"], dtype=float)
+    a = np.asarray(columns["semimajor_axis"], dtype=float)
+    orbiting = parent >= 0
+    if "type" in columns:
+        body_type = np.asarray(columns["type"])
+        orbiting[orbiting] &= body_type[parent[orbiting]] != "Barycenter"
+    orbiting = np.flatnonzero(orbiting)
+    # Satellites grouped by primary body, innermost first
+    satellites = orbiting[np.lexsort((a[orbiting], parent[orbiting]))]
+    primaries, starts, counts = np.unique(parent[satellites],
+                                          return_index=True,
+                                          return_counts=True)
+    optional = {field: np.asarray(columns[field], dtype=float)
+                for field in ("inclination", "longitude_of_ascending_node")
+                if field in columns}
+    groups = []
+    for count in np.unique(counts):
+        selected = counts == count
+        planets = satellites[starts[selected, None] + np.arange(count)]
+        solution = solve_secular(
+            mass[primaries[selected]], mass[planets], a[planets],
+            np.asarray(columns["eccentricity"], dtype=float)[planets],
+            np.asarray(columns["argument_of_periapsis"],
+                       dtype=float)[planets],
+            *[optional[field][planets] if field in optional else None
+              for field in ("inclination", "longitude_of_ascending_node")])
+        groups.append(SecularSystems(primaries[selected], planets, solution))
+    return groups
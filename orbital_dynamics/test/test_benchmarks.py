@@ -0,0 +1,110 @@
+import io
+import math
+import os
+import numpy as np
+import pytest
+from orbital_dynamics.benchmarks import *
+from orbital_dynamics.diagnostics import calculate_diagnostics
+
+
+def test_canonical_problems():
+    two_body = two_body_problem()
+    assert two_body.time_scale == pytest.approx(
+        two_body.universe.orbits[0].period, rel=1e-12)
+    np.testing.assert_array_equal(two_body.reference, two_body.positions)
+    figure_eight = figure_eight_problem()
+    diagnostics = calculate_diagnostics(
+        figure_eight.positions, figure_eight.velocities, figure_eight.masses)
+    np.testing.assert_allclose(diagnostics.linear_momentum, 0.0, atol=1e+20)
+    assert diagnostics.total_energy < 0
+    plummer = plummer_problem(1000, seed=1)
+    diagnostics = calculate_diagnostics(plummer.positions,
+                                        plummer.velocities, plummer.masses)
+    assert diagnostics.virial_ratio == pytest.approx(1.0, abs=0.15)
+    assert plummer.reference is None and plummer.n_bodies == 1000
+    assert plummer_problem(32, seed=2).positions.tolist() == \
+        plummer_problem(32, seed=2).positions.tolist()
+
+
+def test_integrators_converge():
+    problem = two_body_problem()
+    exact = measure(problem, "hierarchical", 16)
+    assert exact.energy_error < 1e-12 and exact.phase_error < 1e-10
+    assert exact.steps == 160
+    coarse, fine = [measure(problem, "leapfrog", steps)
+                    for steps in (64, 128)]
+    # The leapfrog is second order
+    assert fine.energy_error == pytest.approx(coarse.energy_error / 4,
+                                              rel=0.1)
+    assert fine.phase_error == pytest.approx(coarse.phase_error / 4,
+                                             rel=0.1)
+    assert fine.wall_time_per_step > 0
+    figure_eight = measure(figure_eight_problem(), "leapfrog", 256)
+    assert figure_eight.phase_error < 1e-2
+
+
+def test_benchmark_and_curves():
+    problems = [sun_planets_problem(["Venus", "Earth"]),
+                plummer_problem(16)]
+    measurements = benchmark_integrators(problems, steps_per_orbit=(32, 64),
+                                         repeat=1)
+    # Only the leapfrog can integrate a Plummer sphere
+    assert [m.integrator for m in measurements
+            if m.problem == "plummer-16"] == ["leapfrog"] * 2
+    assert math.isnan(measurements[-1].phase_error)
+    curves = accuracy_cost_curves(measurements)
+    assert set(curves) == {("sun-planets", "leapfrog"),
+                           ("sun-planets", "hierarchical"),
+                           ("sun-planets", "block_timestep"),
+                           ("plummer-16", "leapfrog")}
+    for curve in curves.values():
+        assert np.all(np.diff(curve.wall_time) >= 0)
+        assert curve.energy_error[-1] < curve.energy_error[0]
+    output = io.BytesIO()
+    plot_accuracy_cost_curves(measurements, output)
+    assert output.getvalue()[:4] == b"\x89PNG"
+
+
+def test_regressions(tmp_path):
+    baseline = benchmark_integrators([figure_eight_problem()],
+                                     steps_per_orbit=(64,), repeat=1)
+    save_baseline(baseline, str(tmp_path / "baseline.json"))
+    loaded = load_baseline(str(tmp_path / "baseline.json"))
+    assert loaded == baseline
+    check_regressions(loaded, baseline)
+    measurement = baseline[0]
+    less_accurate = measurement._replace(
+        phase_error=measurement.phase_error * 3)
+    slower = measurement._replace(wall_time=measurement.wall_time * 2)
+    regressions = find_regressions([less_accurate, slower], baseline)
+    assert [regression.metric for regression in regressions] == \
+        ["phase_error", "wall_time_per_step"]
+    with pytest.raises(RegressionError):
+        check_regressions([less_accurate], baseline)
+    # Tolerances can be loosened
+    check_regressions([slower], baseline, speed_factor=3.0)
+
+
+def test_accuracy_baseline():
+    # The committed baseline was measured by
+    # save_baseline(benchmark_integrators([two_body_problem(),
+    # figure_eight_problem()], steps_per_orbit=(32, 64), repeat=1), path);
+    # its wall times are of another host, so only the accuracy is checked
+    baseline = load_baseline(os.path.join(os.path.dirname(__file__),
+                                          "integrators_baseline.json"))
+    measurements = benchmark_integrators(
+        [two_body_problem(), figure_eight_problem()],
+        steps_per_orbit=(32, 64), repeat=1)
+    assert [m.key for m in measurements] == [m.key for m in baseline]
+    check_regressions(measurements, baseline, speed_factor=math.inf)
+
+
+def test_invalid_measurements():
+    problem = figure_eight_problem()
+    with pytest.raises(KeyError):
+        measure(problem, "euler")
+    with pytest.raises(ValueError):
+        measure(problem, steps_per_orbit=0)
+    assert measure(problem, "hierarchical") is None
+    with pytest.raises(ValueError):
+        plummer_problem(1)
@@ -0,0 +1,150 @@
+import math
+import numpy as np
+import pytest
+from celestial_bodies.celestial_bodies import SolarBody, PlanetaryBody, \
+    Barycenter
+from celestial_bodies.report import BodyReport
+from orbital_dynamics.binary import create_binary
+from orbital_dynamics.block_timestep import BlockTimestepIntegrator
+from orbital_dynamics.diagnostics import calculate_diagnostics
+from orbital_dynamics.hierarchical import HierarchicalPropagator
+from orbital_dynamics.orbit import Orbit, BarycentricOrbit, CollisionError
+from orbital_dynamics.orbital_calculations import calculate_orbital_period
+from universe.specification import universe_from_specification, \
+    universe_to_specification
+from universe.universe import Universe
+
+
+def build_binary(planet=False):
+    """An Alpha Centauri AB-like binary (optionally with a circumbinary
+    planet)."""
+    star_a = SolarBody(2.2e+30, 8.5e+05, 5790, name="A")
+    star_b = SolarBody(1.8e+30, 6.0e+05, 5260, name="B")
+    barycenter, orbit_a, orbit_b = create_binary(star_a, star_b, 3.5e+09,
+                                                 0.5, 0.3, 1.0, name="AB")
+    universe = Universe("Binary")
+    universe.add_celestial_bodies([star_a, star_b, barycenter])
+    universe.add_orbits([orbit_a, orbit_b])
+    if planet:
+        universe.add_celestial_body(PlanetaryBody(6e+24, 6400, name="P"))
+        universe.add_orbit(Orbit(barycenter, universe.celestial_bodies["P"],
+                                 2.0e+10, 0.05))
+    return universe
+
+
+def test_members_share_the_relative_period():
+    universe = build_binary()
+    star_a, star_b = (universe.celestial_bodies[name] for name in "AB")
+    barycenter = universe.celestial_bodies["AB"]
+    assert barycenter.members == [star_a, star_b]
+    orbit_a, orbit_b = universe.orbits
+    expected = calculate_orbital_period(3.5e+09, star_a.mass, star_b.mass)
+    assert orbit_a.period == pytest.approx(expected)
+    assert orbit_b.period == pytest.approx(expected)
+    assert orbit_a.relative_semimajor_axis == pytest.approx(3.5e+09)
+    assert orbit_b.argument_of_periapsis == pytest.approx(0.3 + math.pi)
+
+
+def test_members_orbit_the_fixed_barycenter():
+    universe = build_binary()
+    times = np.linspace(0.0, 30000.0, 50)
+    bodies, positions, velocities = universe.propagate_state_vectors(times)
+    masses = np.array([0.0 if isinstance(body, Barycenter) else body.mass
+                       for body in bodies])
+    np.testing.assert_allclose(masses @ positions, 0.0, atol=1e-6 * 3.5e+09
+                               * masses.sum())
+    assert np.all(positions[:, 0] == 0.0)
+    # The separation follows the relative Keplerian orbit
+    index = {body.name: idx for idx, body in enumerate(bodies)}
+    separation = np.linalg.norm(positions[:, index["A"]] -
+                                positions[:, index["B"]], axis=1)
+    assert separation.min() >= 3.5e+09 * 0.5 * (1 - 1e-9)
+    assert separation.max() <= 3.5e+09 * 1.5 * (1 + 1e-9)
+    # state_vectors matches a single time of the batch
+    _, single, _ = universe.state_vectors(times[7])
+    np.testing.assert_allclose(single, positions[7])
+
+
+def test_circumbinary_planet_and_barycentric_frame():
+    universe = build_binary(planet=True)
+    planet_orbit = universe.orbits[-1]
+    total = sum(universe.celestial_bodies[name].mass for name in "ABP")
+    assert planet_orbit.period == pytest.approx(calculate_orbital_period(
+        2.0e+10, total - 6e+24, 6e+24))
+    bodies, positions, velocities = universe.propagate_state_vectors(
+        [0.0, 500.0], barycentric=True)
+    masses = np.array([0.0 if isinstance(body, Barycenter) else body.mass
+                       for body in bodies])
+    np.testing.assert_allclose(masses @ velocities, 0.0,
+                               atol=1e-9 * masses.sum())
+    report = BodyReport.from_bodies(universe.celestial_bodies.values())
+    barycenter = report["type"] == "Barycenter"
+    assert np.isnan(report["density"][barycenter]).all()
+    assert np.isfinite(report["density"][~barycenter]).all()
+
+
+def test_hierarchical_triple():
+    star_a = SolarBody(2.0e+30, 7.0e+05, 5800, name="A")
+    star_b = SolarBody(1.0e+30, 5.0e+05, 4500, name="B")
+    star_c = SolarBody(0.5e+30, 3.0e+05, 3500, name="C")
+    inner, orbit_a, orbit_b = create_binary(star_a, star_b, 3.0e+07, 0.1)
+    outer, orbit_ab, orbit_c = create_binary(inner, star_c, 1.5e+09, 0.3)
+    assert outer.name == "A-B-C"
+    assert inner.primary_body is outer
+    universe = Universe("Triple")
+    universe.add_celestial_bodies([star_a, star_b, star_c, inner, outer])
+    universe.add_orbits([orbit_a, orbit_b, orbit_ab, orbit_c])
+    bodies, positions, _ = universe.propagate_state_vectors(
+        np.linspace(0.0, 1000.0, 7), barycentric=True)
+    masses = np.array([0.0 if isinstance(body, Barycenter) else body.mass
+                       for body in bodies])
+    np.testing.assert_allclose(masses @ positions, 0.0,
+                               atol=1e-6 * 1.5e+09 * masses.sum())
+    index = {body.name: idx for idx, body in enumerate(bodies)}
+    # The inner barycenter is the center of mass of A and B
+    np.testing.assert_allclose(
+        (2 * positions[:, index["A"]] + positions[:, index["B"]]) / 3,
+        positions[:, index["A-B"]], atol=1e-3)
+
+
+def test_block_integrator_follows_the_binary():
+    universe = build_binary()
+    period = universe.orbits[0].period
+    integrator = BlockTimestepIntegrator(universe, steps_per_orbit=2000)
+    assert [body.name for body in integrator.bodies] == ["A", "B"]
+    before = calculate_diagnostics(integrator.positions,
+                                   integrator.velocities, integrator.masses)
+    integrator.propagate(period)
+    after = calculate_diagnostics(integrator.positions,
+                                  integrator.velocities, integrator.masses)
+    assert after.total_energy == pytest.approx(before.total_energy,
+                                               rel=1e-6)
+    _, positions, _ = universe.propagate_state_vectors(integrator.time,
+                                                       barycentric=True)
+    np.testing.assert_allclose(integrator.positions, positions[0, 1:],
+                               atol=1e-4 * 3.5e+09)
+    with pytest.raises(ValueError):
+        HierarchicalPropagator(universe)
+
+
+def test_specification_round_trip():
+    universe = build_binary(planet=True)
+    spec = universe_to_specification(universe)
+    types = [orbit.get("type", "Orbit") for orbit in spec["orbits"]]
+    assert types == ["BarycentricOrbit", "BarycentricOrbit", "Orbit"]
+    copy = universe_from_specification(spec)
+    assert universe_to_specification(copy) == spec
+    _, expected, _ = universe.state_vectors(123.0)
+    _, actual, _ = copy.state_vectors(123.0)
+    np.testing.assert_allclose(actual, expected)
+
+
+def test_impossible_binaries():
+    star_a = SolarBody(2.0e+30, 7.0e+05, 5800, name="A")
+    star_b = SolarBody(1.0e+30, 5.0e+05, 4500, name="B")
+    with pytest.raises(CollisionError):
+        create_binary(star_a, star_b, 2.0e+06, 0.5)
+    with pytest.raises(TypeError):
+        BarycentricOrbit(star_a, star_b, 1e+07, 0.0)
+    with pytest.raises(ValueError):
+        BarycentricOrbit(Barycenter(1.0e+30), star_a, 1e+07, 0.0)
@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+from orbital_dynamics.block_timestep import *
+from facts.numerical_constants import gravitational_constant
+
+
+def total_energy(integrator):
+    masses = integrator.masses
+    positions = integrator.positions
+    kinetic = 0.5 * (masses * (integrator.velocities ** 2).sum(axis=1)).sum()
+    potential = 0.0
+    for i in range(len(masses)):
+        for j in range(i + 1, len(masses)):
+            potential -= gravitational_constant / 1e9 * masses[i] * \
+                masses[j] / np.linalg.norm(positions[i] - positions[j])
+    return kinetic + potential
+
+
+def test_acceleration_and_jerk_matches_finite_difference():
+    rng = np.random.default_rng(1)
+    positions = rng.normal(size=(5, 3)) * 1e6
+    velocities = rng.normal(size=(5, 3))
+    masses = rng.uniform(1e22, 1e24, 5)
+    everyone = np.arange(5)
+    acceleration, jerk = calculate_acceleration_and_jerk(
+        everyone, positions, velocities, masses)
+    h = 1.0
+    later, _ = calculate_acceleration_and_jerk(
+        everyone, positions + velocities * h, velocities, masses)
+    earlier, _ = calculate_acceleration_and_jerk(
+        everyone, positions - velocities * h, velocities, masses)
+    assert np.allclose((later - earlier) / (2 * h), jerk, rtol=1e-6)
+
+
+@pytest.mark.parametrize("criterion", ["period", "aarseth"])
+def test_multi_scale_system(criterion, build_universe):
+    universe = build_universe(["Earth", "Jupiter"], moon=True)
+    integrator = BlockTimestepIntegrator(universe, criterion=criterion)
+    initial = total_energy(integrator)
+    integrator.propagate(integrator.max_time_step * 2)
+    assert abs((total_energy(integrator) - initial) / initial) < 1e-5
+    names = integrator.body_names
+    # The moon and its planet step faster than Jupiter
+    assert integrator.levels[names.index("Moon")] > \
+        integrator.levels[names.index("Jupiter")]
+    report = integrator.work_report()
+    assert report["force_evaluations"] < report["global_force_evaluations"]
+    assert 0 < report["work_saved"] < 1
+
+
+def test_all_bodies_synchronized_after_propagate(build_universe):
+    universe = build_universe(["Mercury", "Mars"])
+    integrator = BlockTimestepIntegrator(universe)
+    integrator.propagate(10.0)
+    assert np.all(integrator.body_ticks == integrator.ticks)
+    assert integrator.time >= 10.0
+
+
+def test_value_error_unknown_criterion(build_universe):
+    with pytest.raises(ValueError):
+        BlockTimestepIntegrator(build_universe(["Earth"]), criterion="none")
+
+
+def test_value_error_with_unrelated_roots(two_systems):
+    with pytest.raises(ValueError, match="roots"):
+        BlockTimestepIntegrator(two_systems)
@@ -0,0 +1,82 @@
+import csv
+import pytest
+import numpy as np
+from orbital_dynamics.block_timestep import BlockTimestepIntegrator
+from orbital_dynamics.diagnostics import *
+from orbital_dynamics.hierarchical import HierarchicalPropagator
+
+
+def test_calculate_diagnostics(build_universe, total_energy):
+    propagator = HierarchicalPropagator(build_universe(["Earth", "Jupiter"]))
+    positions, velocities = propagator.barycentric_state()
+    diagnostics = calculate_diagnostics(positions, velocities,
+                                        propagator.masses)
+    assert diagnostics.total_energy == pytest.approx(total_energy(propagator))
+    # Barycentric: no net momentum
+    scale = np.abs(propagator.masses[:, None] * velocities).max() * 1000
+    assert np.abs(diagnostics.linear_momentum).max() < 1e-9 * scale
+    assert np.linalg.norm(diagnostics.angular_momentum) > 0
+    # Bound planetary orbits are close to virial equilibrium
+    assert 0.5 < diagnostics.virial_ratio < 1.5
+
+
+@pytest.mark.parametrize("integrator", ["hierarchical", "block"])
+def test_monitor_streams_samples(tmp_path, integrator, build_universe):
+    universe = build_universe(["Earth", "Mars"])
+    if integrator == "hierarchical":
+        integrator = HierarchicalPropagator(universe)
+    else:
+        integrator = BlockTimestepIntegrator(universe)
+    path = tmp_path / "diagnostics.csv"
+    with DiagnosticsMonitor(integrator, cadence=3, path=str(path),
+                            energy_tolerance=1e-3,
+                            angular_momentum_tolerance=1e-6) as monitor:
+        final = monitor.propagate(365.25)
+    assert final.time >= 365.25
+    assert monitor.violations == []
+    rows = list(csv.DictReader(path.open()))
+    assert len(rows) == len(monitor.samples)
+    assert float(rows[0]["energy_error"]) == 0
+    assert float(rows[-1]["time"]) == pytest.approx(final.time)
+    assert float(rows[-1]["energy_error"]) < 1e-3
+
+
+def test_monitor_reduces_time_step(build_universe):
+    propagator = HierarchicalPropagator(
+        build_universe(["Venus", "Earth", "Jupiter"]), steps_per_orbit=8)
+    time_step = propagator.time_step
+    monitor = DiagnosticsMonitor(propagator, energy_tolerance=1e-8)
+    monitor.propagate(365.25)
+    assert len(monitor.violations) > 0
+    assert propagator.time_step < time_step
+
+
+def test_monitor_actions(build_universe):
+    propagator = HierarchicalPropagator(
+        build_universe(["Venus", "Earth", "Jupiter"]), steps_per_orbit=8)
+    with pytest.warns(ConservationWarning):
+        DiagnosticsMonitor(propagator, energy_tolerance=1e-8,
+                           action="warn").step()
+    with pytest.raises(ConservationError):
+        DiagnosticsMonitor(propagator, energy_tolerance=1e-8,
+                           action="raise").step()
+    alerts = []
+    DiagnosticsMonitor(propagator, energy_tolerance=1e-8,
+                       action=lambda monitor, violation:
+                       alerts.append(violation)).step()
+    assert "energy" in alerts[0]
+    with pytest.raises(ValueError):
+        DiagnosticsMonitor(propagator, action="ignore")
+
+
+def test_errors_against_a_zero_baseline(build_universe):
+    propagator = HierarchicalPropagator(build_universe(["Earth"]))
+    monitor = DiagnosticsMonitor(propagator)
+    sample = monitor.baseline
+    monitor.baseline = sample._replace(kinetic_energy=0.0,
+                                       potential_energy=0.0,
+                                       angular_momentum=np.zeros(3))
+    # Relative errors are undefined, so the errors are absolute
+    assert monitor.energy_error(sample) == abs(sample.total_energy)
+    assert monitor.angular_momentum_error(sample) == \
+        pytest.approx(np.linalg.norm(sample.angular_momentum))
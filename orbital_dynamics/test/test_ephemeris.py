@@ -0,0 +1,109 @@
+import time
+import numpy as np
+import pytest
+from orbital_dynamics.ephemeris import *
+from orbital_dynamics.events import calculate_positions, orbit_arrays
+from universe.generator import generate_star_systems
+
+
+def test_positions_within_tolerance(build_universe):
+    universe = build_universe(["Mercury", "Earth", "Jupiter"], moon=True)
+    columns = universe.columns()
+    ephemeris = build_ephemeris(columns, 0.0, 36525.0, tolerance=1e-3)
+    # One period of segments is stored per body
+    assert np.all(ephemeris.segment_count[1:] <= 64)
+    assert len(ephemeris.coefficients) == ephemeris.segment_count.sum()
+    bodies = np.arange(len(columns["parent"]))
+    times = np.concatenate((np.random.default_rng(1).uniform(
+        0.0, 36525.0, 2000), [0.0, 36525.0]))
+    expected = calculate_positions(orbit_arrays(columns), bodies[None, :],
+                                   times[:, None])
+    actual = ephemeris.position(bodies[None, :], times[:, None])
+    assert actual.shape == (len(times), len(bodies), 2)
+    # The moon's error adds to the Earth's
+    assert np.all(np.linalg.norm(actual - expected, axis=-1) <=
+                  [0.0, 1e-3, 1e-3, 1e-3, 2e-3])
+    relative = ephemeris.position("Moon", times, relative=True)
+    np.testing.assert_allclose(relative, expected[:, 4] - expected[:, 2],
+                               atol=1e-3)
+
+
+def test_velocities(build_universe):
+    universe = build_universe(["Venus", "Mars"])
+    ephemeris = build_ephemeris(universe.columns(), 100.0, 400.0)
+    times = np.linspace(100.0, 400.0, 97)
+    _, _, expected = universe.propagate_state_vectors(times)
+    positions, velocities = ephemeris.state([0, 1, 2], times[:, None])
+    np.testing.assert_allclose(velocities, expected[..., :2], rtol=1e-7,
+                               atol=1e-7)
+    np.testing.assert_allclose(positions,
+                               ephemeris.position([0, 1, 2], times[:, None]))
+    # The span is shorter than the period of Mars, so it is tiled instead
+    assert ephemeris.segment_length[2] * ephemeris.segment_count[2] == \
+        pytest.approx(300.0)
+
+
+def test_eccentric_orbits():
+    columns = generate_star_systems(50, seed=3).columns()
+    orbiting = columns["parent"] >= 0
+    columns["eccentricity"] = np.where(orbiting, 0.9, 0.0)
+    ephemeris = build_ephemeris(columns, 0.0, 1000.0, tolerance=1e-2)
+    bodies = np.flatnonzero(orbiting)
+    times = np.random.default_rng(2).uniform(0.0, 1000.0, (500, 1))
+    arrays = orbit_arrays(columns)
+    expected = calculate_positions(arrays, bodies, times) - \
+        calculate_positions(arrays, columns["parent"][bodies], times)
+    actual = ephemeris.position(bodies, times, relative=True)
+    assert np.linalg.norm(actual - expected, axis=-1).max() <= 1e-2
+
+
+def test_memory_mapped_round_trip(tmp_path, build_universe):
+    universe = build_universe(["Earth", "Mars"], moon=True)
+    ephemeris = build_ephemeris(universe.columns(), 0.0, 3652.5)
+    save_ephemeris(ephemeris, str(tmp_path / "ephemeris"))
+    loaded = load_ephemeris(str(tmp_path / "ephemeris"))
+    assert isinstance(loaded.coefficients, np.memmap)
+    assert loaded.names.tolist() == ["Sun", "Earth", "Mars", "Moon"]
+    times = np.linspace(0.0, 3652.5, 50)
+    for expected, actual in zip(ephemeris.state(["Mars", "Moon"],
+                                                times[:, None]),
+                                loaded.state(["Mars", "Moon"],
+                                             times[:, None])):
+        np.testing.assert_array_equal(actual, expected)
+    in_memory = load_ephemeris(str(tmp_path / "ephemeris"), mmap=False)
+    assert not isinstance(in_memory.coefficients, np.memmap)
+
+
+def test_invalid_ephemerides(build_universe):
+    columns = build_universe(["Earth"]).columns()
+    with pytest.raises(ValueError):
+        build_ephemeris(columns, 10.0, 0.0)
+    with pytest.raises(ValueError):
+        build_ephemeris(columns, 0.0, 10.0, tolerance=1e-12, degree=1)
+    ephemeris = build_ephemeris(columns, 0.0, 10.0)
+    with pytest.raises(ValueError):
+        ephemeris.position("Earth", 11.0)
+    with pytest.raises(KeyError):
+        ephemeris.position("Mars", 1.0)
+    # Roots sit at the origin
+    assert ephemeris.position("Sun", 1.0).tolist() == [0.0, 0.0]
+
+
+def test_faster_than_solving_keplers_equation():
+    columns = generate_star_systems(300, seed=1).columns()
+    arrays = orbit_arrays(columns)
+    ephemeris = build_ephemeris(columns, 0.0, 3650.0)
+    bodies = np.arange(len(arrays["parent"]))[None, :]
+    times = np.linspace(0.0, 3650.0, 200)[:, None]
+
+    def best(function, *args):
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            function(*args)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    solved = best(calculate_positions, arrays, bodies, times)
+    assert best(ephemeris.position, bodies, times) < solved / 1.5
+    assert best(ephemeris.state, bodies, times) < solved
@@ -0,0 +1,137 @@
+import math
+import numpy as np
+import pytest
+from facts.numerical_constants import gravitational_constant, \
+    meters_in_a_kilometer, seconds_in_a_day
+from orbital_dynamics.events import *
+from universe.generator import generate_star_systems
+
+
+def angle(vector):
+    return np.arctan2(vector[..., 1], vector[..., 0])
+
+
+def test_apsides(build_universe):
+    universe = build_universe(["Earth", "Mars"], moon=True)
+    events = find_apsides(universe.columns(), 0.0, 800.0, ["Earth", "Mars"])
+    assert np.all(np.diff(events.time) >= 0)
+    earth = universe.orbits[[orbit.orbiting_body.name
+                             for orbit in universe.orbits].index("Earth")]
+    periapsis = events.select("periapsis", "Earth").time
+    np.testing.assert_allclose(periapsis, [0.0, earth.period,
+                                           2 * earth.period])
+    apoapsis = events.select("apoapsis", "Earth").time
+    distance = np.linalg.norm(earth.position_at(apoapsis), axis=-1)
+    np.testing.assert_allclose(distance, earth.aphelion, rtol=1e-9)
+    assert events.next_time("periapsis", "Earth", after=1.0) == \
+        pytest.approx(earth.period)
+    assert math.isnan(events.next_time("periapsis", "Mars", after=800.0))
+    assert set(events.kind) == {"periapsis", "apoapsis"}
+    assert np.all(events.other == -1)
+
+
+def test_conjunctions_and_oppositions(build_universe):
+    universe = build_universe(["Venus", "Earth"])
+    events = find_alignments(universe.columns(), [("Venus", "Earth")],
+                             "Sun", 0.0, 3000.0, contacts=False)
+    conjunctions = events.select("conjunction").time
+    periods = [orbit.period for orbit in universe.orbits]
+    synodic = 1 / (1 / periods[0] - 1 / periods[1])
+    assert np.diff(conjunctions).mean() == pytest.approx(synodic, rel=0.01)
+    # Conjunctions and oppositions alternate
+    kinds = events.kind.tolist()
+    assert all(kinds[idx] != kinds[idx + 1] for idx in range(len(kinds) - 1))
+    for time in conjunctions:
+        bodies, positions, _ = universe.state_vectors(time)
+        names = [body.name for body in bodies]
+        difference = angle(positions[names.index("Venus")]) - \
+            angle(positions[names.index("Earth")])
+        assert abs(math.remainder(difference, 2 * math.pi)) < 1e-6
+
+
+def test_transit_of_venus_seen_from_earth(build_universe):
+    universe = build_universe(["Venus", "Earth"])
+    columns = universe.columns()
+    events = find_alignments(columns, [("Sun", "Venus")], "Earth", 0.0,
+                             1200.0)
+    # Coplanar orbits: Venus crosses the disk of the Sun at every inferior
+    # conjunction, and passes behind it at every superior one
+    transits = events.select("transit")
+    assert len(transits.time) == len(events.select("conjunction").time)
+    fronts = [record["body"] for record in transits.records()]
+    assert fronts == ["Venus", "Sun", "Venus", "Sun", "Venus"]
+    transits = EventTable(*[column[::2] for column in transits[:-1]],
+                          transits.names)
+    assert np.all((transits.duration > 0.2) & (transits.duration < 0.6))
+    assert np.all((transits.start < transits.time) &
+                  (transits.time < transits.stop))
+    # At first contact the disks touch
+    sun = universe.celestial_bodies["Sun"]
+    venus = universe.celestial_bodies["Venus"]
+    bodies, positions, _ = universe.state_vectors(transits.start[0])
+    names = [body.name for body in bodies]
+    earth = positions[names.index("Earth")]
+    to_sun = positions[names.index("Sun")] - earth
+    to_venus = positions[names.index("Venus")] - earth
+    separation = abs(math.remainder(angle(to_sun) - angle(to_venus),
+                                    2 * math.pi))
+    radii = math.asin(sun.radius / np.linalg.norm(to_sun)) + \
+        math.asin(venus.radius / np.linalg.norm(to_venus))
+    assert separation == pytest.approx(radii, rel=1e-4)
+
+
+def test_eclipses(build_universe):
+    universe = build_universe(["Earth"], moon=True)
+    eclipses = find_eclipses(universe.columns(), 0.0, 365.25)
+    # Coplanar orbits: an eclipse at every new and every full moon
+    assert 24 <= len(eclipses.time) <= 26
+    fronts = [record["body"] for record in eclipses.records()]
+    assert all(fronts[idx] != fronts[idx + 1]
+               for idx in range(len(fronts) - 1))
+    assert set(eclipses.observer) == {0}
+    assert np.all(eclipses.duration > 0)
+    with pytest.raises(ValueError):
+        find_eclipses(universe.columns(), 0.0, 10.0, moons=["Earth"])
+
+
+def test_windows_and_workers_agree(build_universe):
+    universe = build_universe(["Venus", "Earth", "Mars"], moon=True)
+    columns = universe.columns()
+    pairs = [("Venus", "Earth"), ("Earth", "Mars"), ("Moon", "Mars")]
+    expected = find_alignments(columns, pairs, "Sun", 0.0, 2000.0)
+    windowed = find_alignments(columns, pairs, "Sun", 0.0, 2000.0,
+                               window=37.0, workers=2)
+    assert windowed.kind.tolist() == expected.kind.tolist()
+    np.testing.assert_allclose(windowed.time, expected.time, atol=1e-5)
+    np.testing.assert_allclose(windowed.stop, expected.stop, atol=1e-5)
+    merged = combine_events(expected, find_apsides(columns, 0.0, 2000.0))
+    assert len(merged.time) > len(expected.time)
+    assert np.all(np.diff(merged.time) >= 0)
+
+
+def test_many_bodies_without_names():
+    columns = generate_star_systems(200, seed=4).columns()
+    events = find_apsides(columns, 0.0, 365.25)
+    orbiting = np.flatnonzero(columns["parent"] >= 0)
+    counts = np.bincount(events.select("periapsis").body,
+                         minlength=len(columns["parent"]))[orbiting]
+    mu = gravitational_constant / meters_in_a_kilometer ** 3 * \
+        (columns["mass"][columns["parent"][orbiting]] +
+         columns["mass"][orbiting])
+    n = np.sqrt(mu / columns["semimajor_axis"][orbiting] ** 3) * \
+        seconds_in_a_day
+    assert np.all(np.abs(counts - n * 365.25 / (2 * math.pi)) <= 1)
+    assert events.records()[0]["other"] is None
+
+
+def test_invalid_searches(build_universe):
+    universe = build_universe(["Venus", "Earth"])
+    columns = universe.columns()
+    with pytest.raises(ValueError):
+        find_alignments(columns, [("Venus", "Venus")], "Sun", 0.0, 10.0)
+    with pytest.raises(ValueError):
+        find_alignments(columns, [("Venus", "Earth")], "Sun", 10.0, 0.0)
+    with pytest.raises(KeyError):
+        find_alignments(columns, [("Venus", "Pluto")], "Sun", 0.0, 10.0)
+    with pytest.raises(KeyError):
+        find_apsides(columns, 0.0, 10.0).select("occultation")
@@ -0,0 +1,146 @@
+import math
+import numpy as np
+import pytest
+from orbital_dynamics import kepler
+from orbital_dynamics.fitting import *
+from orbital_dynamics.orbital_calculations import calculate_orbital_period
+
+
+def random_orbits(n_orbits, seed, periods=3.0):
+    """Observations of random orbits (3 to 60 per orbit), and their
+    elements."""
+    rng = np.random.default_rng(seed)
+    elements = {"a": rng.uniform(5e+07, 5e+08, n_orbits),
+                "e": rng.uniform(0.0, 0.6, n_orbits),
+                "w": rng.uniform(0.0, 2 * math.pi, n_orbits),
+                "m0": rng.uniform(0.0, 2 * math.pi, n_orbits),
+                "mu": kepler.calculate_gravitational_parameter(
+                    rng.uniform(1e+29, 4e+30, n_orbits), 0.0)}
+    n = kepler.calculate_mean_motion(elements["a"], elements["mu"]) * 86400
+    orbit = np.repeat(np.arange(n_orbits), rng.integers(20, 60, n_orbits))
+    times = rng.uniform(0.0, periods * 2 * math.pi, len(orbit)) / n[orbit]
+    positions = kepler.calculate_orbital_position(
+        elements["a"][orbit], elements["e"][orbit],
+        kepler.solve_keplers_equation(
+            elements["m0"][orbit] + n[orbit] * times, elements["e"][orbit]),
+        elements["w"][orbit])
+    return orbit, times, positions, elements
+
+
+def test_model_and_jacobian():
+    a, e, w, m0, n = 1.5e+08, 0.3, 1.2, 0.4, 0.0172
+    parameters = np.array([[a, e * math.cos(w), e * math.sin(w), m0 + w, n]])
+    times = np.linspace(-300.0, 300.0, 11)[None]
+    positions, jacobian = calculate_model(parameters, times)
+    expected = kepler.calculate_orbital_position(
+        a, e, kepler.solve_keplers_equation(m0 + n * times, e), w)
+    np.testing.assert_allclose(positions, expected, atol=1e-6)
+    for idx in range(5):
+        delta = np.zeros((1, 5))
+        delta[0, idx] = 1e-7 * max(abs(parameters[0, idx]), 1e-3)
+        numeric = (calculate_model(parameters + delta, times, False)[0] -
+                   calculate_model(parameters - delta, times, False)[0]) / \
+            (2 * delta[0, idx])
+        np.testing.assert_allclose(jacobian[..., idx], numeric,
+                                   atol=1e-6 * np.abs(numeric).max())
+
+
+def test_recovers_planets_and_the_mass_of_the_sun(build_universe):
+    universe = build_universe(["Venus", "Earth", "Mars"])
+    times = np.linspace(0.0, 1000.0, 40)
+    positions = np.concatenate([orbit.position_at(times)[:, :2]
+                                for orbit in universe.orbits])
+    fit = fit_orbits(np.tile(times, 3), positions, np.repeat(np.arange(3),
+                                                             40))
+    assert np.all(fit.converged)
+    for idx, orbit in enumerate(universe.orbits):
+        assert fit.semimajor_axis[idx] == pytest.approx(
+            orbit.semimajor_axis, rel=1e-9)
+        assert fit.eccentricity[idx] == pytest.approx(orbit.eccentricity,
+                                                      abs=1e-9)
+        assert fit.period[idx] == pytest.approx(orbit.period, rel=1e-9)
+        assert fit.total_mass[idx] == pytest.approx(
+            orbit.primary_body.mass + orbit.orbiting_body.mass, rel=1e-8)
+    assert np.all(fit.rms < 1e-3)
+
+
+def test_circular_orbit():
+    times = np.linspace(0.0, 50.0, 12)
+    positions = 1e+06 * np.stack((np.cos(0.3 + 0.2 * times),
+                                  np.sin(0.3 + 0.2 * times)), axis=-1)
+    fit = fit_orbits(times, positions)
+    assert fit.eccentricity[0] == pytest.approx(0.0, abs=1e-9)
+    assert fit.period[0] == pytest.approx(2 * math.pi / 0.2, rel=1e-9)
+    # At e = 0 only the mean longitude is defined
+    assert math.remainder(fit.argument_of_periapsis[0] +
+                          fit.mean_anomaly_at_epoch[0] - 0.3,
+                          2 * math.pi) == pytest.approx(0.0, abs=1e-9)
+
+
+def test_noisy_batch_within_uncertainties():
+    orbit, times, positions, elements = random_orbits(400, seed=1)
+    sigma = 1e-6 * elements["a"][orbit]
+    noise = np.random.default_rng(2).normal(size=positions.shape)
+    fit = fit_orbits(times, positions + noise * sigma[:, None], orbit,
+                     sigma=sigma)
+    assert np.mean(fit.converged) > 0.98
+    error = fit.semimajor_axis - elements["a"]
+    pull = error / np.sqrt(fit.covariance[:, 0, 0])
+    # Errors follow the covariance: a unit normal distribution of pulls
+    assert np.mean(np.abs(pull) < 3) > 0.95
+    assert np.median(np.abs(fit.gravitational_parameter / elements["mu"] -
+                            1)) < 1e-5
+    assert np.median(fit.rms / (math.sqrt(2) * 1e-6 * elements["a"])) == \
+        pytest.approx(1.0, rel=0.2)
+
+
+def test_known_mass_and_sparse_observations():
+    # Observations about three periods apart, which only a known mu (or a
+    # period) connects
+    orbit, times, positions, elements = random_orbits(200, seed=3,
+                                                      periods=60.0)
+    fit = fit_orbits(times, positions, orbit,
+                     gravitational_parameter=elements["mu"])
+    assert np.all(fit.converged)
+    np.testing.assert_allclose(fit.semimajor_axis, elements["a"], rtol=1e-8)
+    np.testing.assert_allclose(fit.gravitational_parameter, elements["mu"])
+    periods = 2 * math.pi / (kepler.calculate_mean_motion(
+        elements["a"], elements["mu"]) * 86400)
+    seeded = fit_orbits(times, positions, orbit,
+                        period=periods * (1 + 1e-4))
+    np.testing.assert_allclose(seeded.semimajor_axis, elements["a"],
+                               rtol=1e-8)
+
+
+def test_workers_agree():
+    orbit, times, positions, _ = random_orbits(60, seed=4)
+    serial = fit_orbits(times, positions, orbit)
+    parallel = fit_orbits(times, positions, orbit, workers=2)
+    for expected, actual in zip(serial, parallel):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_periods():
+    period = calculate_orbital_period(1.5e+08, 2e+30, 6e+24)
+    assert semimajor_axis_from_period(period, 2e+30, 6e+24) == \
+        pytest.approx(1.5e+08)
+    np.testing.assert_allclose(
+        semimajor_axis_from_period([period, 8 * period], 2e+30, 6e+24),
+        [1.5e+08, 6e+08])
+    assert total_mass_from_period(period, 1.5e+08) == \
+        pytest.approx(2e+30 + 6e+24)
+    with pytest.raises(ValueError):
+        semimajor_axis_from_period(-1.0, 2e+30, 6e+24)
+
+
+def test_invalid_observations():
+    times = np.arange(5.0)
+    positions = np.ones((5, 2))
+    with pytest.raises(ValueError):
+        fit_orbits(times, positions[:4])
+    with pytest.raises(ValueError):
+        fit_orbits(times, positions, orbit=[0, 0, 0, 1, 1])
+    with pytest.raises(ValueError):
+        fit_orbits(times, positions, sigma=0.0)
+    with pytest.raises(ValueError):
+        fit_orbits(times, positions, gravitational_parameter=-1.0)
@@ -0,0 +1,52 @@
+import pytest
+import numpy as np
+from universe.universe import *
+from orbital_dynamics.hierarchical import HierarchicalPropagator
+
+
+def test_two_body_is_exact(build_universe):
+    universe = build_universe(["Earth"])
+    orbit = universe.orbits[0]
+    propagator = HierarchicalPropagator(universe, time_step=orbit.period / 3)
+    propagator.propagate(orbit.period * 3)
+    assert np.allclose(propagator.positions[1, :2], orbit.position_at(0.0),
+                       rtol=1e-9, atol=1.0)
+
+
+def test_body_order_follows_orbit_tree(build_universe):
+    universe = build_universe(["Earth", "Mars"], moon=True)
+    propagator = HierarchicalPropagator(universe)
+    names = propagator.body_names
+    assert names[0] == "Sun"
+    assert names.index("Earth") < names.index("Moon")
+    assert propagator.parent_index[names.index("Moon")] == \
+        names.index("Earth")
+
+
+def test_energy_conservation_with_large_steps(build_universe, total_energy):
+    universe = build_universe(["Jupiter", "Saturn"])
+    propagator = HierarchicalPropagator(universe, time_step=100.0)
+    initial = total_energy(propagator)
+    propagator.propagate(100 * 365.25)
+    assert abs((total_energy(propagator) - initial) / initial) < 1e-6
+
+
+def test_moon_stays_bound_to_planet(build_universe):
+    universe = build_universe(["Earth"], moon=True)
+    propagator = HierarchicalPropagator(universe, time_step=1.0)
+    propagator.propagate(365.25)
+    moon = propagator.body_names.index("Moon")
+    distance = np.linalg.norm(propagator.positions[moon])
+    assert 3.84e+05 * (1 - 0.1) < distance < 3.84e+05 * (1 + 0.1)
+
+
+def test_value_error_without_orbits():
+    universe = Universe("Empty")
+    with pytest.raises(ValueError):
+        HierarchicalPropagator(universe)
+
+
+def test_value_error_with_unrelated_roots(two_systems):
+    # Both stars would sit at the origin
+    with pytest.raises(ValueError, match="roots"):
+        HierarchicalPropagator(two_systems)
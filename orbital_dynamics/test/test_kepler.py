@@ -0,0 +1,57 @@
+import pytest
+import numpy as np
+from orbital_dynamics.kepler import *
+from orbital_dynamics.orbital_calculations import calculate_orbital_period
+from facts.fact_sheets import planetary_facts, sun_facts
+
+
+@pytest.mark.parametrize("eccentricity", [0.0, 0.017, 0.205, 0.6, 0.95])
+def test_solve_keplers_equation(eccentricity):
+    mean_anomaly = np.linspace(0, 2 * np.pi, 101)
+    eccentric_anomaly = solve_keplers_equation(mean_anomaly, eccentricity)
+    residual = eccentric_anomaly - eccentricity * np.sin(
+        eccentric_anomaly) - mean_anomaly
+    assert np.allclose(np.mod(residual + np.pi, 2 * np.pi) - np.pi, 0,
+                       atol=1e-10)
+
+
+@pytest.mark.parametrize("eccentricity", [-0.1, 1, 2])
+def test_value_error_solve_keplers_equation(eccentricity):
+    with pytest.raises(ValueError):
+        solve_keplers_equation(1.0, eccentricity)
+
+
+@pytest.mark.parametrize("semimajor_axis,eccentricity,period", [
+    (fact_dict["distance from sun"], fact_dict["orbital eccentricity"],
+     fact_dict["orbital period"])
+    for fact_dict in planetary_facts.values()
+    if "distance from sun" in fact_dict.keys()
+])
+def test_mean_motion_matches_orbital_period(semimajor_axis, eccentricity,
+                                            period):
+    mu = calculate_gravitational_parameter(sun_facts["mass"], 1.0)
+    mean_motion = calculate_mean_motion(semimajor_axis, mu)
+    expected = calculate_orbital_period(semimajor_axis, sun_facts["mass"],
+                                        1.0)
+    assert np.isclose(2 * np.pi / mean_motion / 86400, expected)
+
+
+@pytest.mark.parametrize("eccentricity", [0.0, 0.205, 0.7])
+def test_orbital_position_extremes(eccentricity):
+    position = calculate_orbital_position(1000.0, eccentricity,
+                                          np.array([0.0, np.pi]))
+    assert np.allclose(position[0], [1000.0 * (1 - eccentricity), 0])
+    assert np.allclose(position[1], [-1000.0 * (1 + eccentricity), 0])
+
+
+@pytest.mark.parametrize("eccentricity", [0.0, 0.3, 0.8])
+def test_vis_viva(eccentricity):
+    mu = 1.3e11
+    eccentric_anomaly = np.linspace(0, 2 * np.pi, 17)
+    position = calculate_orbital_position(1e8, eccentricity,
+                                          eccentric_anomaly, 0.4)
+    velocity = calculate_orbital_velocity(1e8, eccentricity,
+                                          eccentric_anomaly, mu, 0.4)
+    r = np.linalg.norm(position, axis=-1)
+    v = np.linalg.norm(velocity, axis=-1)
+    assert np.allclose(v ** 2, mu * (2 / r - 1 / 1e8))
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from orbital_dynamics.leapfrog import *
+from orbital_dynamics.diagnostics import calculate_diagnostics
+from universe.universe import *
+from facts.fact_sheets import planetary_facts, sun_facts
+
+
+def energy_errors(integrator, duration):
+    initial = calculate_diagnostics(*integrator.barycentric_state(),
+                                    integrator.masses).total_energy
+    errors = []
+    while integrator.time < duration - 1e-9:
+        integrator.step()
+        energy = calculate_diagnostics(*integrator.barycentric_state(),
+                                       integrator.masses).total_energy
+        errors.append(abs(energy / initial - 1))
+    return np.array(errors)
+
+
+def test_second_order_and_bounded_energy_error():
+    universe = Universe("Eccentric")
+    sun = SolarBody(sun_facts["mass"], sun_facts["radius"], 5778, name="Sun")
+    earth = PlanetaryBody(planetary_facts["Earth"]["mass"], 6378,
+                          name="Earth")
+    universe.add_celestial_bodies([sun, earth])
+    universe.add_orbit(Orbit(sun, earth, 1.496e+08, 0.3))
+    period = universe.orbits[0].period
+    coarse = energy_errors(LeapfrogIntegrator.from_universe(
+        universe, period / 100), 5 * period)
+    fine = energy_errors(LeapfrogIntegrator.from_universe(
+        universe, period / 200), 5 * period)
+    assert fine.max() == pytest.approx(coarse.max() / 4, rel=0.1)
+    # The error oscillates instead of drifting
+    assert coarse[-100:].max() < 1.1 * coarse[:100].max()
+
+
+def test_state_and_counters(build_universe):
+    universe = build_universe(["Venus", "Mars"])
+    integrator = LeapfrogIntegrator.from_universe(universe, 1.0)
+    positions, _ = integrator.barycentric_state()
+    np.testing.assert_allclose(integrator.masses @ positions, 0.0,
+                               atol=1e-6 * np.abs(positions).max() *
+                               integrator.masses.sum())
+    integrator.propagate(10.5)
+    assert integrator.steps == 11
+    assert integrator.force_evaluations == 12
+    assert integrator.time == pytest.approx(10.5)
+    integrator.reduce_time_step(0.5)
+    assert integrator.time_step == 0.5
+
+
+def test_invalid_states(two_systems):
+    with pytest.raises(ValueError, match="roots"):
+        LeapfrogIntegrator.from_universe(two_systems, 1.0)
+    with pytest.raises(ValueError):
+        LeapfrogIntegrator(np.zeros((1, 3)), np.zeros((1, 3)), [1.0], 1.0)
+    with pytest.raises(ValueError):
+        LeapfrogIntegrator(np.zeros((2, 3)), np.zeros((3, 3)), [1.0, 1.0],
+                           1.0)
+    with pytest.raises(ValueError):
+        LeapfrogIntegrator(np.eye(3), np.zeros((3, 3)), [1.0] * 3, 0.0)
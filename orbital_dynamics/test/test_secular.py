@@ -0,0 +1,102 @@
+import math
+import numpy as np
+import pytest
+from facts.numerical_constants import astronomical_unit
+from orbital_dynamics.secular import *
+from universe.generator import generate_star_systems
+
+# Arcseconds per year in radians per day
+arcseconds_per_year = math.radians(1 / 3600) / 365.25
+sun_mass = 1.98855e+30
+
+
+def solve_jupiter_and_saturn():
+    """The two-planet example of Murray & Dermott (section 7.4)."""
+    return solve_secular(
+        sun_mass, [9.54786e-4 * sun_mass, 2.85837e-4 * sun_mass],
+        np.array([5.202545, 9.554841]) * astronomical_unit,
+        [0.0474622, 0.0575481], np.radians([13.983865, 88.719425]),
+        np.radians([1.30667, 2.48795]), np.radians([100.0381, 113.1334]))
+
+
+def test_laplace_coefficients():
+    # Murray & Dermott, section 7.4
+    assert calculate_laplace_coefficient(1.5, 1, 0.544493) == \
+        pytest.approx(3.17296, abs=1e-5)
+    assert calculate_laplace_coefficient(1.5, 2, 0.544493) == \
+        pytest.approx(2.07110, abs=1e-5)
+    # b_1/2^(0)(alpha) = 4 K(alpha) / pi, with K from the arithmetic-
+    # geometric mean
+    alpha = np.array([0.1, 0.5, 0.95])
+    elliptic_k = math.pi / 2 / np.array(
+        [_arithmetic_geometric_mean(1, math.sqrt(1 - x * x)) for x in alpha])
+    np.testing.assert_allclose(calculate_laplace_coefficient(0.5, 0, alpha),
+                               4 * elliptic_k / math.pi, rtol=1e-11)
+    with pytest.raises(ValueError):
+        calculate_laplace_coefficient(1.5, 1, 1.0)
+
+
+def _arithmetic_geometric_mean(a, b):
+    for _ in range(10):
+        a, b = (a + b) / 2, math.sqrt(a * b)
+    return a
+
+
+def test_jupiter_and_saturn():
+    solution = solve_jupiter_and_saturn()
+    np.testing.assert_allclose(solution.g / arcseconds_per_year,
+                               [3.469, 21.959], rtol=1e-3)
+    # One inclination mode is the invariable plane, which does not precess
+    assert solution.f[1] == pytest.approx(0.0, abs=1e-12)
+    assert solution.f[0] / arcseconds_per_year == pytest.approx(-25.43,
+                                                                rel=1e-3)
+    np.testing.assert_allclose(solution.eccentricity(0.0),
+                               [0.0474622, 0.0575481])
+    np.testing.assert_allclose(solution.longitude_of_periapsis(0.0),
+                               np.radians([13.983865, 88.719425]))
+    np.testing.assert_allclose(solution.inclination(0.0),
+                               np.radians([1.30667, 2.48795]))
+    times = np.linspace(0.0, 365.25e+09, 2001)
+    e = solution.eccentricity(times)
+    assert e.shape == (2001, 2)
+    assert np.all(e <= solution.max_eccentricity + 1e-12)
+    assert e.max(axis=0) == pytest.approx(solution.max_eccentricity,
+                                          rel=0.05)
+    assert np.all(solution.inclination(times) <=
+                  solution.max_inclination + 1e-12)
+
+
+def test_angular_momentum_deficit_is_conserved(build_universe):
+    universe = build_universe(["Venus", "Earth", "Mars", "Jupiter"])
+    (systems,) = secular_systems(universe.columns())
+    columns = universe.columns()
+    planets = systems.planets[0]
+    mass, a = columns["mass"][planets], columns["semimajor_axis"][planets]
+    weights = mass * np.sqrt(a)
+    times = np.linspace(0.0, 365.25e+08, 101)
+    deficit = (weights * systems.solution.eccentricity(times)[:, 0] ** 2 /
+               2).sum(axis=-1)
+    np.testing.assert_allclose(deficit, deficit[0], rtol=1e-6)
+
+
+def test_many_systems_at_once():
+    columns = generate_star_systems(500, seed=2).columns()
+    groups = secular_systems(columns)
+    planets = np.concatenate([group.planets.ravel() for group in groups])
+    orbiting = np.flatnonzero(columns["parent"] >= 0)
+    assert sorted(planets.tolist()) == orbiting.tolist()
+    for group in groups:
+        a = columns["semimajor_axis"][group.planets]
+        assert np.all(np.diff(a, axis=-1) > 0)
+        assert np.all(columns["parent"][group.planets] ==
+                      group.primary[:, None])
+    # A system solved within its group matches the system solved alone
+    group = groups[-1]
+    planets, primary = group.planets[0], group.primary[0]
+    alone = solve_secular(columns["mass"][primary], columns["mass"][planets],
+                          columns["semimajor_axis"][planets],
+                          columns["eccentricity"][planets],
+                          columns["argument_of_periapsis"][planets])
+    times = [0.0, 365.25e+06, 365.25e+09]
+    np.testing.assert_allclose(group.solution.eccentricity(times)[:, 0],
+                               alone.eccentricity(times), rtol=1e-9)
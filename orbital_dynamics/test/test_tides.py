@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from celestial_bodies.celestial_bodies import PlanetaryBody
+from orbital_dynamics.orbit import Orbit
+from orbital_dynamics.tides import *
+from universe.generator import generate_star_systems
+
+
+def test_limits_of_the_moon(build_universe):
+    universe = build_universe(["Earth"], moon=True)
+    earth = universe.celestial_bodies["Earth"]
+    moon = universe.celestial_bodies["Moon"]
+    roche = calculate_roche_limit(earth.radius, earth.density, moon.density)
+    # The Earth-Moon fluid Roche limit is about 18,000 km
+    assert 17000 < roche < 20000
+    hill = calculate_hill_radius(1.496e+08, 0.0, earth.mass, 1.989e+30)
+    assert hill == pytest.approx(1.5e+06, rel=0.02)
+    # The Moon locked to the Earth within tens of millions of years
+    days = calculate_tidal_locking_timescale(3.84e+05, moon.mass,
+                                             moon.radius, earth.mass)
+    assert 1e6 < days / 365.25 < 1e9
+    analysis = analyze_tides(universe.columns())
+    assert analysis.valid.all()
+    assert analysis.names[np.isnan(analysis.roche_limit)].tolist() == ["Sun"]
+    moon_index = analysis.names.tolist().index("Moon")
+    assert analysis.roche_limit[moon_index] == pytest.approx(roche)
+    assert analysis.violations("Moon") == []
+    assert analysis.positions["Moon"] == moon_index
+    # Without a density column, densities are those of the bodies
+    columns = universe.columns()
+    del columns["density"]
+    assert analyze_tides(columns).roche_limit[moon_index] == \
+        pytest.approx(roche)
+
+
+def test_density_matches_the_bodies(build_universe):
+    universe = build_universe(["Mercury", "Earth", "Jupiter"], moon=True)
+    columns = universe.columns()
+    bodies = [universe.celestial_bodies[name] for name in columns["name"]]
+    np.testing.assert_allclose(
+        calculate_density(columns["mass"], columns["radius"]),
+        [body.density for body in bodies], rtol=1e-12)
+    assert np.isnan(calculate_density([1e+30, 0.0], [0.0, 1.0])).all()
+
+
+def test_violations_are_indexed(build_universe):
+    universe = build_universe(["Earth", "Mars"], moon=True)
+    earth = universe.celestial_bodies["Earth"]
+    mars = universe.celestial_bodies["Mars"]
+    # Clear of the collision checks of Orbit, but not of the tidal limits
+    universe.add_celestial_body(PlanetaryBody(1e20, 300, name="Shard"))
+    universe.add_orbit(Orbit(earth, universe.celestial_bodies["Shard"],
+                             12000, 0.0))
+    universe.add_celestial_body(PlanetaryBody(1e20, 100, name="Stray"))
+    universe.add_orbit(Orbit(mars, universe.celestial_bodies["Stray"],
+                             8e+05, 0.1))
+    analysis = analyze_tides(universe.columns())
+    assert analysis.violators("roche").tolist() == ["Shard"]
+    assert analysis.violators("hill").tolist() == ["Stray"]
+    assert analysis.violations("Stray") == ["hill"]
+    assert analysis.valid.sum() == len(analysis.names) - 2
+    with pytest.raises(KeyError):
+        analysis.violators("collision")
+    with pytest.raises(KeyError):
+        analysis.violations("Pluto")
+
+
+def test_generated_systems_in_bulk():
+    population = generate_star_systems(2000, seed=5)
+    analysis = analyze_tides(population.columns())
+    n_stars = len(population)
+    assert analysis.names is None
+    assert np.isnan(analysis.hill_radius[:n_stars]).all()
+    # Planets orbit stars at the roots, so they have no Hill violations
+    assert len(analysis.index["hill"]) == 0
+    planets = np.arange(len(population.planet_mass))
+    periapsis = population.semimajor_axis * (1 - population.eccentricity)
+    inside = periapsis < analysis.roche_limit[planets + n_stars]
+    assert np.array_equal(analysis.index["roche"], planets[inside] + n_stars)
@@ -0,0 +1,256 @@
+"""Tidal limits of orbits: Roche limits, Hill spheres and tidal locking.
+
+Orbit only rejects orbits that collide outright. An orbit that clears its
+primary body can still be unphysical: a satellite inside its primary's
+Roche limit is torn apart by tides, and a satellite beyond its primary's
+Hill sphere is captured by the next body up (e.g., a moon wandering off to
+orbit the Sun). The limits are:
+
+    Roche limit: d = C R_M (rho_M / rho_m)^1/3, with C = 2.44 for a fluid
+    satellite and 1.26 for a rigid one
+    Hill radius: r_H = a (1 - e) (m / 3 M)^1/3
+    tidal locking timescale (Gladman et al. 1996):
+    t = omega a^6 I Q / (3 G M^2 k2 R^5), with I = 0.4 m R^2
+
+where M and rho_M are the mass and density of the primary body and m, R
+and rho_m those of the satellite.
+
+analyze_tides evaluates every orbit of a tree of bodies at once, given as
+the columns of Universe.columns() or StarSystemPopulation.columns(), and
+indexes the orbits that violate a limit so that they can be looked up by
+body or by kind of violation.
+"""
+import math
+from typing import Dict, List, NamedTuple, Union
+import numpy as np
+from facts.numerical_constants import gravitational_constant, \
+    meters_in_a_kilometer, seconds_in_a_day
+
+fluid_roche_coefficient = 2.44
+rigid_roche_coefficient = 1.26
+# Prograde satellites are only stable within about half the Hill radius
+hill_stability_fraction = 0.5
+violation_kinds = ("roche", "hill")
+_flags = {kind: 1 << bit for bit, kind in enumerate(violation_kinds)}
+
+
+def calculate_density(mass, radius):
+    """Calculates the density of spherical bodies (as
+    CelestialBody.density does), vectorized. Bodies without a mass or a
+    size (e.g., barycenters) have no density (NaN).
+
+    :param mass: masses in kilograms
+    :param radius: radii in kilometers
+    :return: densities in kilograms per cubic meter
+    :rtype: np.ndarray
+    """
+    mass = np.asarray(mass, dtype=float)
+    radius = np.asarray(radius, dtype=float)
+    volume = 4 / 3 * math.pi * (radius * meters_in_a_kilometer) ** 3
+    with np.errstate(divide="ignore", invalid="ignore"):
+        density = mass / volume
+    return np.where((mass > 0) & (radius > 0), density, np.nan)
+
+
+def calculate_roche_limit(primary_radius, primary_density,
+                          satellite_density,
+                          coefficient: float = fluid_roche_coefficient):
+    """Calculates the distance within which tides pull a satellite apart.
+
+    Formula: d = C R_M (rho_M / rho_m)^1/3
+
+    :param primary_radius: radii of the primary bodies in kilometers
+    :param primary_density: densities of the primary bodies in kilograms
+    per cubic meter
+    :param satellite_density: densities of the satellites in kilograms per
+    cubic meter
+    :param float coefficient: 2.44 for fluid satellites (the default), 1.26
+    for rigid ones
+    :return: the Roche limits in kilometers
+    :rtype: np.ndarray
+    """
+    return coefficient * np.multiply(primary_radius, np.cbrt(
+        np.divide(primary_density, satellite_density)))
+
+
+def calculate_hill_radius(semimajor_axis, eccentricity, mass,
+                          primary_mass):
+    """Calculates the radius of the region within which a body's gravity
+    dominates its primary body's (at periapsis).
+
+    Formula: r_H = a (1 - e) (m / 3 M)^1/3
+
+    :param semimajor_axis: semi-major axes of the bodies' orbits in
+    kilometers
+    :param eccentricity: eccentricities of the bodies' orbits
+    :param mass: masses of the bodies in kilograms
+    :param primary_mass: masses of their primary bodies in kilograms
+    :return: the Hill radii in kilometers
+    :rtype: np.ndarray
+    """
+    return np.multiply(semimajor_axis, np.subtract(1, eccentricity)) * \
+        np.cbrt(np.divide(mass, np.multiply(3, primary_mass)))
+
+
+def calculate_tidal_locking_timescale(semimajor_axis, mass, radius,
+                                      primary_mass,
+                                      initial_spin_period: float = 0.5,
+                                      dissipation: float = 100.0,
+                                      love_number: float = 0.3):
+    """Calculates the time for tides to lock a satellite's rotation to its
+    orbit (so that it always shows its primary body the same face).
+
+    Formula: t = omega a^6 (0.4 m R^2) Q / (3 G M^2 k2 R^5)
+
+    :param semimajor_axis: semi-major axes in kilometers
+    :param mass: masses of the satellites in kilograms
+    :param radius: radii of the satellites in kilometers
+    :param primary_mass: masses of the primary bodies in kilograms
+    :param float initial_spin_period: the satellites' initial rotation
+    period in days
+    :param float dissipation: the tidal dissipation factor Q
+    :param float love_number: the tidal Love number k2
+    :return: the timescales in days
+    :rtype: np.ndarray
+    """
+    spin = 2 * math.pi / (initial_spin_period * seconds_in_a_day)
+    a = np.multiply(semimajor_axis, meters_in_a_kilometer)
+    r = np.multiply(radius, meters_in_a_kilometer)
+    seconds = spin * a ** 6 * 0.4 * np.multiply(mass, r ** 2) * \
+        dissipation / (3 * gravitational_constant *
+                       np.power(primary_mass, 2) * love_number * r ** 5)
+    return seconds / seconds_in_a_day
+
+
+class TidalAnalysis(NamedTuple):
+    """Tidal limits of every body of a tree of bodies (NaN for the roots,
+    and for Hill radii of bodies without a Hill sphere).
+
+    flags holds one bit per violation kind (see violation_kinds) for each
+    body, index the sorted indices of the bodies with each kind of
+    violation, and positions the index of each named body.
+    """
+    names: np.ndarray
+    roche_limit: np.ndarray
+    hill_radius: np.ndarray
+    tidal_locking_timescale: np.ndarray
+    periapsis: np.ndarray
+    apoapsis: np.ndarray
+    flags: np.ndarray
+    index: Dict[str, np.ndarray]
+    positions: Dict[str, int] = None
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Returns whether each body's orbit respects every limit.
+
+        :return: (n,) boolean mask
+        :rtype: np.ndarray
+        """
+        return self.flags == 0
+
+    def violations(self, body: Union[int, str]) -> List[str]:
+        """Returns the kinds of violation of a body's orbit.
+
+        :param body: the index or name of the body
+        :return: the kinds of violation
+        :rtype: List[str]
+        """
+        if isinstance(body, str):
+            if self.positions is None or body not in self.positions:
+                raise KeyError(f"{body} is not one of the analyzed bodies.")
+            body = self.positions[body]
+        return [kind for kind in violation_kinds
+                if self.flags[body] & _flags[kind]]
+
+    def violators(self, kind: str) -> np.ndarray:
+        """Returns the names (or, for unnamed bodies, the indices) of the
+        bodies with the given kind of violation.
+
+        :param str kind: one of violation_kinds
+        :return: the bodies
+        :rtype: np.ndarray
+        """
+        if kind not in self.index:
+            raise KeyError(f"Unknown violation {kind}; choose from "
+                           f"{', '.join(violation_kinds)}")
+        if self.names is None:
+            return self.index[kind]
+        return self.names[self.index[kind]]
+
+
+def analyze_tides(columns: Dict[str, np.ndarray],
+                  roche_coefficient: float = fluid_roche_coefficient,
+                  hill_fraction: float = hill_stability_fraction,
+                  initial_spin_period: float = 0.5,
+                  dissipation: float = 100.0,
+                  love_number: float = 0.3) -> TidalAnalysis:
+    """Evaluates the tidal limits of every orbit of a tree of bodies, in
+    vectorized passes over the tree.
+
+    A body violates:
+        roche: if its periapsis lies within its primary's Roche limit
+        hill: if its apoapsis lies beyond hill_fraction of its primary's
+        Hill radius (only for primaries which themselves orbit a body)
+
+    Example:
+        analysis = analyze_tides(universe.columns())
+        analysis.violations("Moon")
+        analysis.violators("roche")
+
+    :param Dict[str, np.ndarray] columns: parent (index of the primary,
+    -1 for roots), mass, radius, semimajor_axis and eccentricity of every
+    body, with primaries before their satellites; optionally name and
+    density (otherwise computed from mass and radius)
+    :param float roche_coefficient: see calculate_roche_limit
+    :param float hill_fraction: the fraction of the Hill radius within
+    which satellites are stable
+    :param float initial_spin_period: see calculate_tidal_locking_timescale
+    :param float dissipation: see calculate_tidal_locking_timescale
+    :param float love_number: see calculate_tidal_locking_timescale
+    :return: the analysis
+    :rtype: TidalAnalysis
+    """
+    parent = np.asarray(columns["parent"], dtype=np.int64)
+    mass = np.asarray(columns["mass"], dtype=float)
+    radius = np.asarray(columns["radius"], dtype=float)
+    a = np.asarray(columns["semimajor_axis"], dtype=float)
+    e = np.asarray(columns["eccentricity"], dtype=float)
+    density = columns.get("density")
+    density = calculate_density(mass, radius) if density is None \
+        else np.asarray(density, dtype=float)
+    names = columns.get("name")
+    n = len(parent)
+    orbiting = np.flatnonzero(parent >= 0)
+    primary = parent[orbiting]
+    roche_limit = np.full(n, np.nan)
+    roche_limit[orbiting] = calculate_roche_limit(
+        radius[primary], density[primary], density[orbiting],
+        roche_coefficient)
+    hill_radius = np.full(n, np.nan)
+    hill_radius[orbiting] = calculate_hill_radius(
+        a[orbiting], e[orbiting], mass[orbiting], mass[primary])
+    timescale = np.full(n, np.nan)
+    timescale[orbiting] = calculate_tidal_locking_timescale(
+        a[orbiting], mass[orbiting], radius[orbiting], mass[primary],
+        initial_spin_period, dissipation, love_number)
+    periapsis = a * (1 - e)
+    apoapsis = a * (1 + e)
+    flags = np.zeros(n, dtype=np.uint8)
+    flags[orbiting[periapsis[orbiting] < roche_limit[orbiting]]] |= \
+        _flags["roche"]
+    # NaN Hill radii (primaries at the roots) never compare greater
+    flags[orbiting[apoapsis[orbiting] >
+                   hill_fraction * hill_radius[primary]]] |= _flags["hill"]
+    index = {kind: np.flatnonzero(flags & bit)
+             for kind, bit in _flags.items()}
+    positions = None
+    if names is not None:
+        names = np.asarray(names)
+        # The first of bodies sharing a name wins
+        positions = {name: idx for idx, name in
+                     reversed(list(enumerate(names.tolist())))}
+    return TidalAnalysis(names, roche_limit, hill_radius, timescale,
+                         np.where(parent >= 0, periapsis, np.nan),
+                         np.where(parent >= 0, apoapsis, np.nan), flags,
+                         index, positions)
@@ -0,0 +1,18 @@
+import argparse
+import json
+from service.service import run
+
+parser = argparse.ArgumentParser(
+    description="Serve universes over a local HTTP/JSON API.")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--workers", type=int, default=None)
+parser.add_argument("universes", nargs="*", metavar="SPEC.json",
+                    help="universe specifications to host at startup")
+args = parser.parse_args()
+specifications = {}
+for file_name in args.universes:
+    with open(file_name) as f:
+        spec = json.load(f)
+    specifications[spec.get("name", file_name)] = spec
+run(args.host, args.port, args.workers, specifications)
@@ -0,0 +1,580 @@
+"""A long-lived asyncio simulation service with a local HTTP/JSON API.
+
+Universes are built once and kept in memory under a name, so that several
+analysis tools can share them (and their warmed-up worker caches) instead
+of rebuilding them from scratch.
+
+Routes:
+    GET    /universes                           names of hosted universes
+    PUT    /universes/{name}                    host a universe (the body is
+                                                a specification, see
+                                                universe.specification)
+    GET    /universes/{name}                    the universe's specification
+    DELETE /universes/{name}                    stop hosting a universe
+    GET    /universes/{name}/bodies/{body}      statistics of a body
+    GET    /universes/{name}/orbits/{body}      properties of a body's orbit
+    GET    /universes/{name}/positions?t=a,b,c  positions (km) of every body
+                                                at times t (days), streamed
+    POST   /universes/{name}/sweeps             parameter sweep, streamed
+
+A sweep request body looks like:
+    {"body": "Earth", "parameter": "semimajor_axis",
+     "values": [1.0e+08, 1.5e+08], "quantities": ["period", "temperature"]}
+where parameter is "semimajor_axis" or "eccentricity", and quantities are
+any of "period", "perihelion", "aphelion" and "temperature".
+
+CPU-bound work (positions and sweeps) is split into chunks and run in a
+process pool; each worker caches the universes it has built, keyed by the
+digest of their specification. Concurrent identical requests for the same
+chunk share a single computation, and finished chunks are kept in a
+ResultCache keyed by the universe's content and the code version, so they
+are served from memory (or disk) on later requests and runs. Streamed
+responses use chunked transfer encoding, with one JSON document per line;
+an error after the stream has started ends it with an {"error": ...} line.
+Values which JSON cannot represent (NaN and infinities, e.g., the density
+of a Barycenter) are sent as null. The service only binds to loopback
+addresses.
+"""
+import asyncio
+import ipaddress
+import json
+import math
+import multiprocessing
+import socket
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List
+import numpy as np
+from celestial_bodies.celestial_bodies import CelestialBody, SolarBody
+from kernels import kernels
+from orbital_dynamics.orbit import Orbit
+from universe.specification import universe_from_specification, \
+    universe_to_specification, specification_digest
+from utilities.result_cache import ResultCache, content_hash, code_version, \
+    default_cache
+
+sweep_parameters = ("semimajor_axis", "eccentricity")
+sweep_quantities = ("period", "perihelion", "aphelion", "temperature")
+_status_reasons = {200: "OK", 201: "Created", 400: "Bad Request",
+                   404: "Not Found", 405: "Method Not Allowed",
+                   500: "Internal Server Error"}
+
+# Universes built by this (worker) process, keyed by specification digest
+_worker_universes = {}
+
+
+def _json_safe(value: Any) -> Any:
+    """Replaces the NaNs and infinities of a JSON-compatible value (e.g.,
+    the density of a Barycenter), which JSON cannot represent, by None."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    return value
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(_json_safe(value), allow_nan=False)
+
+
+class HTTPError(Exception):
+    """Exception raised by a route to return an HTTP error status."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _universe_for(digest: str, spec: Dict[str, Any]):
+    """Returns the universe for a specification, building it on first use
+    in this process."""
+    if digest not in _worker_universes:
+        _worker_universes[digest] = universe_from_specification(spec)
+    return _worker_universes[digest]
+
+
+def body_statistics(body: CelestialBody) -> Dict[str, Any]:
+    """Returns the statistics of a celestial body as a JSON-compatible
+    dictionary.
+
+    :param CelestialBody body: the celestial body
+    :return: statistics of the body
+    :rtype: Dict[str, Any]
+    """
+    stats = {
+        "name": body.name,
+        "type": body.celestial_body_type,
+        "mass": body.mass,
+        "radius": body.radius,
+        "volume": body.volume,
+        "density": body.density,
+        "gravitational_acceleration": body.gravitational_acceleration,
+        "primary_body": None if body.primary_body is None
+        else body.primary_body.name,
+        "orbiting_bodies": [x.name for x in body.orbiting_bodies],
+    }
+    if isinstance(body, SolarBody):
+        stats["temperature"] = body.temperature
+        stats["luminosity"] = body.luminosity
+        stats["harvard_spectral_classification"] = \
+            body.harvard_spectral_classification
+        stats["chromaticity"] = body.chromaticity
+    return stats
+
+
+def orbit_statistics(orbit: Orbit) -> Dict[str, Any]:
+    """Returns the properties of an orbit as a JSON-compatible dictionary.
+
+    :param Orbit orbit: the orbit
+    :return: properties of the orbit
+    :rtype: Dict[str, Any]
+    """
+    return {
+        "primary_body": orbit.primary_body.name,
+        "orbiting_body": orbit.orbiting_body.name,
+        "semimajor_axis": orbit.semimajor_axis,
+        "semiminor_axis": orbit.semiminor_axis,
+        "eccentricity": orbit.eccentricity,
+        "perihelion": orbit.perihelion,
+        "aphelion": orbit.aphelion,
+        "period": orbit.period,
+        "argument_of_periapsis": orbit.argument_of_periapsis,
+        "mean_anomaly_at_epoch": orbit.mean_anomaly_at_epoch,
+    }
+
+
+def compute_positions(digest: str, spec: Dict[str, Any],
+                      times: List[float]) -> List[Dict[str, Any]]:
+    """Computes the position of every body at each time (worker task).
+
+    :return: one row per time with the positions (km) of every body
+    :rtype: List[Dict[str, Any]]
+    """
+    universe = _universe_for(digest, spec)
+    rows = []
+    for time in times:
+        bodies, positions, _ = universe.state_vectors(time)
+        rows.append({"time": time,
+                     "positions": {body.name: position.tolist()
+                                   for body, position in
+                                   zip(bodies, positions)}})
+    return rows
+
+
+def orbit_quantities(orbit: Orbit, semimajor_axis, eccentricity,
+                     quantities: List[str],
+                     backend: str = "numpy") -> Dict[str, np.ndarray]:
+    """Evaluates quantities of variations of an orbit (its semi-major axis
+    and eccentricity replaced by arrays of values), vectorized.
+
+    :param Orbit orbit: the orbit (which supplies the bodies)
+    :param semimajor_axis: semi-major axes in kilometers
+    :param eccentricity: eccentricities
+    :param List[str] quantities: any of sweep_quantities
+    :param str backend: the kernel backend
+    :return: one array per quantity
+    :rtype: Dict[str, np.ndarray]
+    """
+    backend = kernels.get_backend(backend)
+    semimajor_axis, eccentricity = np.broadcast_arrays(
+        np.asarray(semimajor_axis, dtype=float),
+        np.asarray(eccentricity, dtype=float))
+    if np.any(semimajor_axis <= 0):
+        raise ValueError("semimajor_axis values must be positive.")
+    if np.any((eccentricity < 0) | (eccentricity >= 1)):
+        raise ValueError("eccentricity values must be in the range "
+                         "0 <= e < 1")
+    columns = {}
+    for quantity in quantities:
+        if quantity == "period":
+            columns[quantity] = backend.orbital_period(
+                semimajor_axis, orbit.primary_body.mass,
+                orbit.orbiting_body.mass)
+        elif quantity == "perihelion":
+            columns[quantity] = backend.perihelion(semimajor_axis,
+                                                   eccentricity)
+        elif quantity == "aphelion":
+            columns[quantity] = backend.aphelion(semimajor_axis,
+                                                 eccentricity)
+        elif quantity == "temperature":
+            if not isinstance(orbit.primary_body, SolarBody):
+                raise ValueError(f"{orbit.orbiting_body.name} does not "
+                                 f"orbit a SolarBody.")
+            columns[quantity] = backend.planetary_surface_temperature(
+                semimajor_axis, orbit.primary_body.radius,
+                orbit.primary_body.temperature)
+        else:
+            raise ValueError(f"Unknown quantity {quantity}; choose from "
+                             f"{', '.join(sweep_quantities)}")
+    return columns
+
+
+def compute_sweep(digest: str, spec: Dict[str, Any], body: str,
+                  parameter: str, values: List[float],
+                  quantities: List[str]) -> List[Dict[str, Any]]:
+    """Evaluates the requested quantities of a body's orbit over values of
+    one orbital parameter, in a single vectorized pass (worker task).
+
+    :return: one row per value
+    :rtype: List[Dict[str, Any]]
+    """
+    universe = _universe_for(digest, spec)
+    orbit = _orbit_of(universe, body)
+    values = np.asarray(values, dtype=float)
+    semimajor_axis = values if parameter == "semimajor_axis" \
+        else orbit.semimajor_axis
+    eccentricity = values if parameter == "eccentricity" \
+        else orbit.eccentricity
+    columns = {parameter: values}
+    columns.update(orbit_quantities(orbit, semimajor_axis, eccentricity,
+                                    quantities))
+    names = list(columns)
+    return [dict(zip(names, row))
+            for row in zip(*[np.asarray(columns[n]).tolist()
+                             for n in names])]
+
+
+def _orbit_of(universe, body: str) -> Orbit:
+    if body not in universe.celestial_bodies:
+        raise KeyError(f"{body} does not exist in {universe.name}")
+    for orbit in universe.orbits:
+        if orbit.orbiting_body.name == body:
+            return orbit
+    raise KeyError(f"{body} does not orbit another body in "
+                   f"{universe.name}")
+
+
+class SimulationService:
+    """Hosts named universes in memory and serves queries about them over
+    a local HTTP/JSON API (see the module documentation for the routes)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765,
+                 workers: int = None, chunk_size: int = 1000,
+                 cache: ResultCache = None) -> None:
+        """
+        :param str host: the loopback address to bind to
+        :param int port: the port to bind to (0 picks a free port)
+        :param int workers: the number of worker processes (defaults to the
+        number of CPUs)
+        :param int chunk_size: the number of values (or times) per worker
+        task, which is also the granularity of streamed responses
+        :param ResultCache cache: the cache of finished chunks; defaults to
+        the process-wide cache (see result_cache.default_cache)
+        """
+        address = ipaddress.ip_address(socket.gethostbyname(host))
+        if not address.is_loopback:
+            raise ValueError(f"{host} is not a loopback address; the "
+                             f"simulation service only binds to localhost.")
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size ({chunk_size}) must be at least "
+                             f"1.")
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = cache if cache is not None else default_cache()
+        self.universes = {}
+        self._specifications = {}
+        self._in_flight: Dict[Any, asyncio.Future] = {}
+        self._executor = None
+        self._server = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.host}, {self.port})"
+
+    def add_universe(self, name: str, universe_or_spec) -> None:
+        """Hosts a universe under a name, replacing any existing one.
+
+        :param str name: the name to host the universe under
+        :param universe_or_spec: a Universe or its specification
+        :return: None
+        """
+        if isinstance(universe_or_spec, dict):
+            spec = universe_or_spec
+            universe = universe_from_specification(spec)
+        else:
+            universe = universe_or_spec
+            spec = universe_to_specification(universe)
+        self.universes[name] = universe
+        self._specifications[name] = (specification_digest(spec), spec)
+
+    async def start(self) -> None:
+        """Starts the worker pool and begins listening.
+
+        :return: None
+        """
+        # Forked workers would inherit (and keep open) client sockets
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn")
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=context)
+        self._server = await asyncio.start_server(self._handle_connection,
+                                                  self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stops listening and shuts the worker pool down.
+
+        :return: None
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    async def serve_forever(self) -> None:
+        """Starts the service and serves until cancelled.
+
+        :return: None
+        """
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _single_flight(self, key,
+                             factory: Callable[[], Awaitable]) -> Any:
+        """Runs factory() unless an identical request (same key) is already
+        in flight, in which case its result is shared."""
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+        future = asyncio.ensure_future(factory())
+        self._in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._in_flight.pop(key, None)
+            else:
+                future.add_done_callback(
+                    lambda _: self._in_flight.pop(key, None))
+
+    def _run_in_pool(self, key, function, *args) -> Awaitable:
+        """Runs function(*args) in the process pool, unless its result is
+        cached or an identical call is in flight. The key must identify the
+        content of the arguments."""
+        loop = asyncio.get_running_loop()
+        cache_key = content_hash(code_version(function), key)
+
+        async def compute():
+            result = self.cache.get(cache_key)
+            if result is None:
+                result = await loop.run_in_executor(self._executor,
+                                                    function, *args)
+                self.cache.put(cache_key, result)
+            return result
+        return self._single_flight(key, compute)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                method, path, query, body = await self._read_request(reader)
+                await self._route(method, path, query, body, writer)
+            except HTTPError as e:
+                await self._send_json(writer, e.status, {"error": str(e)})
+            except KeyError as e:
+                await self._send_json(writer, 404, {"error": str(e)})
+            except (ValueError, TypeError) as e:
+                await self._send_json(writer, 400, {"error": str(e)})
+            except Exception as e:
+                await self._send_json(writer, 500, {"error": repr(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        try:
+            method, target, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.") from None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length",
+                                                        0)))
+        url = urllib.parse.urlsplit(target)
+        path = [urllib.parse.unquote(part)
+                for part in url.path.strip("/").split("/") if part]
+        query = urllib.parse.parse_qs(url.query)
+        return method.upper(), path, query, body
+
+    async def _route(self, method: str, path: List[str],
+                     query: Dict[str, List[str]], body: bytes,
+                     writer: asyncio.StreamWriter) -> None:
+        if len(path) == 0 or path[0] != "universes":
+            raise HTTPError(404, f"No route for /{'/'.join(path)}")
+        if len(path) == 1:
+            self._allow(method, "GET")
+            return await self._send_json(writer, 200,
+                                         sorted(self.universes))
+        name = path[1]
+        if len(path) == 2:
+            self._allow(method, "GET", "PUT", "DELETE")
+            if method == "PUT":
+                self.add_universe(name, self._decode(body))
+                return await self._send_json(writer, 201, {"name": name})
+            self._universe(name)
+            if method == "DELETE":
+                del self.universes[name]
+                del self._specifications[name]
+                return await self._send_json(writer, 200, {"name": name})
+            return await self._send_json(writer, 200,
+                                         self._specifications[name][1])
+        universe = self._universe(name)
+        if path[2] == "bodies" and len(path) == 4:
+            self._allow(method, "GET")
+            if path[3] not in universe.celestial_bodies:
+                raise KeyError(f"{path[3]} does not exist in {name}")
+            return await self._send_json(writer, 200, body_statistics(
+                universe.celestial_bodies[path[3]]))
+        if path[2] == "orbits" and len(path) == 4:
+            self._allow(method, "GET")
+            return await self._send_json(writer, 200, orbit_statistics(
+                _orbit_of(universe, path[3])))
+        if path[2] == "positions" and len(path) == 3:
+            self._allow(method, "GET")
+            times = [float(t) for value in query.get("t", ["0"])
+                     for t in value.split(",")]
+            return await self._stream_positions(name, times, writer)
+        if path[2] == "sweeps" and len(path) == 3:
+            self._allow(method, "POST")
+            return await self._stream_sweep(name, self._decode(body),
+                                            writer)
+        raise HTTPError(404, f"No route for /{'/'.join(path)}")
+
+    @staticmethod
+    def _allow(method: str, *methods: str) -> None:
+        if method not in methods:
+            raise HTTPError(405, f"{method} is not allowed; use "
+                                 f"{', '.join(methods)}")
+
+    @staticmethod
+    def _decode(body: bytes) -> Any:
+        try:
+            return json.loads(body.decode("utf-8"))
+        except ValueError:
+            raise HTTPError(400, "The request body must be JSON.") from None
+
+    def _universe(self, name: str):
+        if name not in self.universes:
+            raise KeyError(f"No universe named {name} is hosted.")
+        return self.universes[name]
+
+    def _chunks(self, values: List) -> List[List]:
+        return [values[i:i + self.chunk_size]
+                for i in range(0, len(values), self.chunk_size)]
+
+    async def _stream_positions(self, name: str, times: List[float],
+                                writer: asyncio.StreamWriter) -> None:
+        digest, spec = self._specifications[name]
+        tasks = [asyncio.ensure_future(self._run_in_pool(
+            ("positions", digest, tuple(chunk)), compute_positions, digest,
+            spec, chunk)) for chunk in self._chunks(times)]
+        await self._stream(writer, tasks)
+
+    async def _stream_sweep(self, name: str, request: Dict[str, Any],
+                            writer: asyncio.StreamWriter) -> None:
+        digest, spec = self._specifications[name]
+        body = request.get("body")
+        parameter = request.get("parameter")
+        values = [float(v) for v in request.get("values", [])]
+        quantities = request.get("quantities", list(sweep_quantities))
+        _orbit_of(self.universes[name], body)
+        if parameter not in sweep_parameters:
+            raise ValueError(f"parameter ({parameter}) must be one of "
+                             f"{', '.join(sweep_parameters)}")
+        unknown = set(quantities) - set(sweep_quantities)
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown quantities: "
+                             f"{', '.join(sorted(unknown))}")
+        tasks = [asyncio.ensure_future(self._run_in_pool(
+            ("sweep", digest, body, parameter, tuple(chunk),
+             tuple(quantities)), compute_sweep, digest, spec, body,
+            parameter, chunk, quantities))
+            for chunk in self._chunks(values)]
+        await self._stream(writer, tasks)
+
+    async def _stream(self, writer: asyncio.StreamWriter,
+                      tasks: List[asyncio.Future]) -> None:
+        """Streams the rows of each task, in order, as newline-delimited
+        JSON. An error after the stream has started is sent as a final
+        {"error": ...} row."""
+        try:
+            first = await tasks[0] if len(tasks) > 0 else []
+        except BaseException:
+            for task in tasks[1:]:
+                task.cancel()
+            raise
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\n"
+                     b"Connection: close\r\n\r\n")
+        try:
+            await self._write_chunk(writer, first)
+            for task in tasks[1:]:
+                await self._write_chunk(writer, await task)
+        except ConnectionError:
+            raise
+        except (ValueError, KeyError) as e:
+            await self._write_chunk(writer, [{"error": str(e)}])
+        except Exception as e:
+            # The status line has been sent: the error can only end the
+            # stream
+            await self._write_chunk(writer, [{"error": repr(e)}])
+        finally:
+            for task in tasks:
+                task.cancel()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _write_chunk(writer: asyncio.StreamWriter,
+                           rows: List[Dict[str, Any]]) -> None:
+        if len(rows) == 0:
+            return
+        data = "".join(_dumps(row) + "\n" for row in rows).encode()
+        writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int,
+                         payload: Any) -> None:
+        data = _dumps(payload).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {_status_reasons[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+
+
+def run(host: str = "127.0.0.1", port: int = 8765, workers: int = None,
+        universes: Dict[str, Dict[str, Any]] = None) -> None:
+    """Runs the simulation service until interrupted.
+
+    :param str host: the loopback address to bind to
+    :param int port: the port to bind to
+    :param int workers: the number of worker processes
+    :param Dict[str, Dict[str, Any]] universes: universe specifications to
+    host at startup, keyed by name
+    :return: None
+    """
+    service = SimulationService(host, port, workers)
+    for name, spec in (universes or {}).items():
+        service.add_universe(name, spec)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
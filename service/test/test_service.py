@@ -0,0 +1,154 @@
+import asyncio
+import json
+import pytest
+from service.service import SimulationService
+from utilities.result_cache import ResultCache
+from facts.fact_sheets import sun_facts
+
+async def request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    if b"Transfer-Encoding: chunked" in head:
+        decoded = b""
+        while True:
+            size, _, data = data.partition(b"\r\n")
+            if int(size, 16) == 0:
+                break
+            decoded += data[:int(size, 16)]
+            data = data[int(size, 16) + 2:]
+        return status, [json.loads(line) for line in decoded.splitlines()]
+    return status, json.loads(data)
+
+
+def run_with_service(scenario):
+    async def main():
+        service = SimulationService(port=0, workers=1, chunk_size=2)
+        await service.start()
+        try:
+            return await scenario(service.port)
+        finally:
+            await service.stop()
+    return asyncio.run(main())
+
+
+def test_service_routes(specification):
+    async def scenario(port):
+        assert await request(port, "PUT", "/universes/sol",
+                             specification) == (201, {"name": "sol"})
+        assert await request(port, "GET", "/universes") == (200, ["sol"])
+        status, stats = await request(port, "GET", "/universes/sol/bodies/Sun")
+        assert status == 200 and stats["harvard_spectral_classification"] \
+            == "G"
+        status, orbit = await request(port, "GET",
+                                      "/universes/sol/orbits/Earth")
+        assert status == 200 and 364 < orbit["period"] < 366
+        status, rows = await request(port, "GET",
+                                     "/universes/sol/positions?t=0,1,2")
+        assert status == 200 and [r["time"] for r in rows] == [0, 1, 2]
+        assert rows[0]["positions"]["Earth"][0] == pytest.approx(
+            orbit["perihelion"])
+        status, rows = await request(port, "POST", "/universes/sol/sweeps", {
+            "body": "Earth", "parameter": "semimajor_axis",
+            "values": [1.0e8, 1.496e8, 2.0e8],
+            "quantities": ["period", "temperature"]})
+        assert status == 200 and len(rows) == 3
+        assert rows[1]["period"] == pytest.approx(orbit["period"])
+        assert rows[0]["temperature"] > rows[2]["temperature"]
+    run_with_service(scenario)
+
+
+def test_concurrent_requests_share_one_computation(specification):
+    async def main():
+        service = SimulationService(port=0, workers=1, chunk_size=2,
+                                    cache=ResultCache())
+        await service.start()
+        submitted = []
+        submit = service._executor.submit
+
+        def counting_submit(function, *args):
+            submitted.append(function.__name__)
+            return submit(function, *args)
+        service._executor.submit = counting_submit
+        try:
+            await request(service.port, "PUT", "/universes/sol",
+                          specification)
+            results = await asyncio.gather(*[
+                request(service.port, "GET", "/universes/sol/positions?t=5")
+                for _ in range(4)])
+        finally:
+            await service.stop()
+        assert all(result == results[0] for result in results)
+        assert submitted == ["compute_positions"]
+    asyncio.run(main())
+
+
+def test_errors_end_the_stream(specification):
+    async def main():
+        service = SimulationService(port=0, workers=1, chunk_size=2,
+                                    cache=ResultCache())
+        await service.start()
+        run_in_pool = service._run_in_pool
+
+        def failing_run_in_pool(key, function, *args):
+            if 4.0 in key[-1]:
+                async def fail():
+                    raise RuntimeError("worker lost")
+                return fail()
+            return run_in_pool(key, function, *args)
+        service._run_in_pool = failing_run_in_pool
+        try:
+            await request(service.port, "PUT", "/universes/sol",
+                          specification)
+            return await request(service.port, "GET",
+                                 "/universes/sol/positions?t=0,1,2,3,4,5")
+        finally:
+            await service.stop()
+    status, rows = asyncio.run(main())
+    # The chunks before the error, then the error, in a well-formed stream
+    assert status == 200
+    assert [row["time"] for row in rows[:-1]] == [0, 1, 2, 3]
+    assert rows[-1] == {"error": "RuntimeError('worker lost')"}
+
+
+def test_nan_values_are_sent_as_null():
+    binary = {"name": "Binary", "bodies": [
+        {"type": "Barycenter", "name": "AB", "mass": 2 * sun_facts["mass"]}],
+        "orbits": []}
+
+    async def scenario(port):
+        await request(port, "PUT", "/universes/binary", binary)
+        return await request(port, "GET", "/universes/binary/bodies/AB")
+    status, stats = run_with_service(scenario)
+    assert status == 200
+    assert stats["density"] is None
+
+
+@pytest.mark.parametrize("method,path,payload,status", [
+    ("GET", "/universes/missing", None, 404),
+    ("GET", "/nowhere", None, 404),
+    ("POST", "/universes", None, 405),
+    ("GET", "/universes/sol/orbits/Sun", None, 404),
+    ("POST", "/universes/sol/sweeps",
+     {"body": "Earth", "parameter": "eccentricity", "values": [1.5]}, 400),
+    ("POST", "/universes/sol/sweeps",
+     {"body": "Earth", "parameter": "mass", "values": [1.0]}, 400),
+])
+def test_service_errors(method, path, payload, status, specification):
+    async def scenario(port):
+        await request(port, "PUT", "/universes/sol", specification)
+        response_status, response = await request(port, method, path,
+                                                  payload)
+        assert response_status == status and "error" in response
+    run_with_service(scenario)
+
+
+def test_service_refuses_non_loopback_host():
+    with pytest.raises(ValueError):
+        SimulationService(host="8.8.8.8")
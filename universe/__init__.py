@@ -0,0 +1,12 @@
+from utilities.lazy import lazy_exports
+
+# OrbitRenderer and OrbitAnimation import matplotlib when first used
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "Universe": "universe.universe",
+    "universe_from_specification": "universe.specification",
+    "universe_to_specification": "universe.specification",
+    "generate_star_systems": "universe.generator",
+    "ingest": "universe.ingestion",
+    "OrbitRenderer": "universe.rendering",
+    "OrbitAnimation": "universe.animation",
+})
@@ -0,0 +1,217 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Sequence
+import numpy as np
+import matplotlib.image
+from celestial_bodies.celestial_bodies import CelestialBody
+from facts.numerical_constants import seconds_in_a_day
+from orbital_dynamics import kepler
+from universe.rendering import OrbitRenderer
+
+# Animation rendered by this worker process (see _initialize_worker)
+_worker_animation = None
+
+
+def _initialize_worker(animation: "OrbitAnimation") -> None:
+    """Stores the animation in the worker process, so that each worker
+    builds (and caches) its static layer exactly once.
+
+    :param OrbitAnimation animation: the animation to render
+    :return: None
+    """
+    global _worker_animation
+    _worker_animation = animation
+
+
+def _render_chunk(start: int, stop: int, directory: str, prefix: str,
+                  image_format: str) -> List[str]:
+    """Renders frames [start, stop) of the worker's animation to files.
+
+    :return: the file names written
+    :rtype: List[str]
+    """
+    return _worker_animation.write_frames(range(start, stop), directory,
+                                          prefix, image_format)
+
+
+class OrbitAnimation:
+    """Animates the orbiting bodies around a single primary body over a
+    range of times.
+
+    Every orbit is propagated with Kepler's equation in a single vectorized
+    pass. The orbital paths are drawn once into a cached background layer
+    (see OrbitRenderer), and each frame only redraws the body markers on top
+    of it (blitting). Frames can be exported to an image sequence or a video,
+    with contiguous chunks of frames rendered in parallel by a pool of worker
+    processes.
+
+    Note that bodies are drawn on the plotted (centered, squashed) orbital
+    paths at their eccentric anomaly, so that they always sit on the drawn
+    ellipse.
+    """
+
+    def __init__(self, primary_body: CelestialBody, orbits: Sequence,
+                 start: float, stop: float, frames: int,
+                 simulate_three_dimensions: bool = True, dpi: int = 100,
+                 min_band_separation: float = 1.0) -> None:
+        """Initializes the animation and propagates every orbit to every
+        frame time.
+
+        :param CelestialBody primary_body: the body at the origin
+        :param Sequence orbits: the orbits around the primary body
+        :param float start: time (in days) of the first frame
+        :param float stop: time (in days) of the last frame
+        :param int frames: the number of frames
+        :param bool simulate_three_dimensions: whether or not to simulate a 3D
+        effect by squashing the semi-minor axis
+        :param int dpi: resolution of the frames
+        :param float min_band_separation: the minimum separation (in pixels)
+        for two orbits to be drawn individually
+        """
+        if frames < 1:
+            raise ValueError(f"frames ({frames}) must be at least 1.")
+        if stop < start:
+            raise ValueError(f"stop ({stop}) must not be before start "
+                             f"({start}).")
+        self.primary_body = primary_body
+        self.orbits = sorted(orbits, key=lambda o: o.semimajor_axis)
+        self.times = np.linspace(start, stop, frames)
+        self.simulate_three_dimensions = simulate_three_dimensions
+        self.dpi = dpi
+        self.min_band_separation = min_band_separation
+        self._renderer = None
+        mean_motion = np.array([o.mean_motion for o in self.orbits])
+        eccentricity = np.array([o.eccentricity for o in self.orbits])
+        mean_anomaly_at_epoch = np.array(
+            [o.mean_anomaly_at_epoch for o in self.orbits])
+        self.eccentric_anomaly = kepler.propagate_eccentric_anomaly(
+            self.times[:, None] * seconds_in_a_day, mean_motion, eccentricity,
+            mean_anomaly_at_epoch)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({repr(self.primary_body)}, " \
+            f"{self.times[0]}, {self.times[-1]}, {len(self.times)})"
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getstate__(self):
+        # The renderer (and its cached raster) is rebuilt in each worker
+        state = self.__dict__.copy()
+        state["_renderer"] = None
+        return state
+
+    @property
+    def renderer(self) -> OrbitRenderer:
+        """Returns the renderer, building it on first use.
+
+        :return: the renderer holding the cached background layer
+        :rtype: OrbitRenderer
+        """
+        if self._renderer is None:
+            self._renderer = OrbitRenderer(
+                self.primary_body, self.orbits,
+                simulate_three_dimensions=self.simulate_three_dimensions,
+                dpi=self.dpi, min_band_separation=self.min_band_separation)
+        return self._renderer
+
+    def positions(self, frame: int) -> np.ndarray:
+        """Returns the plotted positions of the orbiting bodies in a frame.
+
+        :param int frame: index of the frame
+        :return: (n_orbits, 2) array of positions in figure units
+        :rtype: np.ndarray
+        """
+        return self.renderer.project(self.eccentric_anomaly[frame])
+
+    def frames(self) -> Iterator[np.ndarray]:
+        """Yields every frame as an RGBA array.
+
+        :return: iterator of (height, width, 4) RGBA arrays
+        :rtype: Iterator[np.ndarray]
+        """
+        for frame in range(len(self)):
+            yield self.renderer.render_frame(self.positions(frame))
+
+    def write_frames(self, frames: Sequence[int], directory: str,
+                     prefix: str = "frame",
+                     image_format: str = "png") -> List[str]:
+        """Renders the given frames to numbered image files.
+
+        :param Sequence[int] frames: indices of the frames to render
+        :param str directory: the directory to write into
+        :param str prefix: file name prefix of the frames
+        :param str image_format: image format understood by matplotlib
+        :return: the file names written
+        :rtype: List[str]
+        """
+        digits = len(str(len(self) - 1))
+        file_names = []
+        for frame in frames:
+            image = self.renderer.render_frame(self.positions(frame))
+            file_name = os.path.join(
+                directory, f"{prefix}_{frame:0{digits}d}.{image_format}")
+            matplotlib.image.imsave(file_name, image, format=image_format)
+            file_names.append(file_name)
+        return file_names
+
+    def export_frames(self, directory: str, prefix: str = "frame",
+                      image_format: str = "png",
+                      workers: int = None) -> List[str]:
+        """Exports every frame to a numbered image sequence, rendering
+        contiguous chunks of frames in parallel worker processes.
+
+        :param str directory: the directory to write into (created if needed)
+        :param str prefix: file name prefix of the frames
+        :param str image_format: image format understood by matplotlib
+        :param int workers: the number of worker processes; defaults to the
+        number of CPUs, and 1 renders in the current process
+        :return: the file names written, in frame order
+        :rtype: List[str]
+        """
+        os.makedirs(directory, exist_ok=True)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(self)))
+        if workers == 1:
+            return self.write_frames(range(len(self)), directory, prefix,
+                                     image_format)
+        bounds = np.linspace(0, len(self), workers + 1).astype(int)
+        file_names = []
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_initialize_worker,
+                                 initargs=(self,)) as executor:
+            futures = [executor.submit(_render_chunk, start, stop, directory,
+                                       prefix, image_format)
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
+            for future in futures:
+                file_names.extend(future.result())
+        return file_names
+
+    def export_video(self, file_name: str, fps: int = 30,
+                     workers: int = None) -> None:
+        """Exports the animation to a video. Frames are rendered in parallel
+        (see export_frames) and then encoded with ffmpeg.
+
+        :param str file_name: the video file (e.g., "orbits.mp4")
+        :param int fps: frames per second
+        :param int workers: the number of worker processes used to render
+        :return: None
+        :raises: RuntimeError if ffmpeg cannot be found
+        """
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg is required to export a video; use "
+                               "export_frames() for an image sequence.")
+        with tempfile.TemporaryDirectory() as directory:
+            self.export_frames(directory, workers=workers)
+            digits = len(str(len(self) - 1))
+            subprocess.run(
+                [ffmpeg, "-y", "-loglevel", "error", "-framerate", str(fps),
+                 "-i", os.path.join(directory, f"frame_%0{digits}d.png"),
+                 "-pix_fmt", "yuv420p",
+                 "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", file_name],
+                check=True)
@@ -0,0 +1,517 @@
+"""Procedural generation of star systems.
+
+Systems are generated column by column rather than body by body: every
+stellar mass of a chunk is drawn in one call, every planet of the chunk in
+another, and the feasibility checks that Orbit performs one at a time are
+applied to whole arrays at once. Only the systems that are turned into a
+Universe (StarSystemPopulation.to_universe) are ever made into objects.
+
+The models are deliberately simple:
+    stellar masses: the Kroupa (2001) initial mass function, a broken power
+    law with exponents 1.3 below 0.5 and 2.3 above 0.5 solar masses
+    stellar luminosity: the piecewise main-sequence mass-luminosity relation
+    stellar radius: R ~ M^0.8 below and R ~ M^0.57 above one solar mass
+    stellar temperature: from luminosity and radius (Stefan-Boltzmann)
+    planet counts: Poisson, capped at max_planets
+    planet masses: log-uniform; radii from a broken power law in mass
+    spacing: log-normal period ratios between neighbouring planets
+    eccentricities: Rayleigh distributed
+
+Chunk i draws from the random stream keyed (i,) under the population's
+seed (see utilities.random_streams), so the generated population depends
+only on the seed and the chunk size, never on the number of worker
+processes, and any one chunk can be regenerated alone (replay_chunk).
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, NamedTuple, Sequence, Union
+import numpy as np
+from celestial_bodies.celestial_bodies import SolarBody, PlanetaryBody
+from facts.numerical_constants import solar_mass, solar_radius, \
+    solar_temperature, earth_mass, earth_radius, astronomical_unit
+from orbital_dynamics.orbit import Orbit
+from utilities.random_streams import SeedLike, as_generator, as_streams
+
+# (upper bound in solar masses, coefficient, exponent) of L / L_sun
+_mass_luminosity = ((0.43, 0.23, 2.3), (2.0, 1.0, 4.0), (55.0, 1.4, 3.5),
+                    (np.inf, 32000.0, 1.0))
+# Lowest temperature with a Harvard Spectral Classification
+_minimum_temperature = 2400
+
+
+class GeneratorParameters(NamedTuple):
+    """Parameters of the generated population. Masses are in solar masses
+    (stars) or Earth masses (planets) and distances in astronomical units.
+    """
+    minimum_star_mass: float = 0.08
+    maximum_star_mass: float = 120.0
+    mean_planets: float = 3.0
+    max_planets: int = 10
+    minimum_planet_mass: float = 0.1
+    maximum_planet_mass: float = 1000.0
+    minimum_inner_orbit: float = 0.03
+    maximum_inner_orbit: float = 0.5
+    median_period_ratio: float = 1.8
+    period_ratio_spread: float = 0.35
+    eccentricity_scale: float = 0.05
+    min_hill_spacing: float = 8.0
+
+
+def sample_broken_power_law(rng: np.random.Generator, size: int,
+                            breaks: Sequence[float],
+                            exponents: Sequence[float]) -> np.ndarray:
+    """Samples a continuous broken power law, p(x) ~ x^-exponent between
+    consecutive breaks, by inverting its cumulative distribution.
+
+    :param np.random.Generator rng: the random number generator
+    :param int size: the number of samples
+    :param Sequence[float] breaks: the (increasing) bounds of the segments,
+    one more than there are exponents
+    :param Sequence[float] exponents: the exponent of each segment
+    :return: the samples
+    :rtype: np.ndarray
+    """
+    breaks = np.asarray(breaks, dtype=float)
+    exponents = np.asarray(exponents, dtype=float)
+    if len(breaks) != len(exponents) + 1:
+        raise ValueError(f"{len(exponents)} exponents require "
+                         f"{len(exponents) + 1} breaks, not {len(breaks)}.")
+    if np.any(breaks <= 0) or np.any(np.diff(breaks) <= 0):
+        raise ValueError("breaks must be positive and increasing.")
+    lower, upper = breaks[:-1], breaks[1:]
+    # Keep the density continuous across each break
+    scale = np.ones(len(exponents))
+    for idx in range(1, len(exponents)):
+        scale[idx] = scale[idx - 1] * lower[idx] ** (
+            exponents[idx] - exponents[idx - 1])
+    power = 1 - exponents
+    logarithmic = np.abs(power) < 1e-12
+    safe_power = np.where(logarithmic, 1.0, power)
+    weights = scale * np.where(
+        logarithmic, np.log(upper / lower),
+        (upper ** safe_power - lower ** safe_power) / safe_power)
+    segment = rng.choice(len(exponents), size=size, p=weights / weights.sum())
+    u = rng.random(size)
+    lo, hi, p = lower[segment], upper[segment], safe_power[segment]
+    return np.where(
+        logarithmic[segment], lo * (hi / lo) ** u,
+        (lo ** p + u * (hi ** p - lo ** p)) ** (1 / p))
+
+
+def sample_stellar_masses(rng: np.random.Generator, size: int,
+                          minimum: float = 0.08,
+                          maximum: float = 120.0) -> np.ndarray:
+    """Samples stellar masses from the Kroupa initial mass function.
+
+    :param np.random.Generator rng: the random number generator
+    :param int size: the number of stars
+    :param float minimum: the smallest mass in solar masses
+    :param float maximum: the largest mass in solar masses
+    :return: masses in solar masses
+    :rtype: np.ndarray
+    """
+    if not 0 < minimum < maximum:
+        raise ValueError(f"Stellar masses must satisfy 0 < minimum "
+                         f"({minimum}) < maximum ({maximum}).")
+    if minimum >= 0.5 or maximum <= 0.5:
+        exponent = 1.3 if maximum <= 0.5 else 2.3
+        return sample_broken_power_law(rng, size, (minimum, maximum),
+                                       (exponent,))
+    return sample_broken_power_law(rng, size, (minimum, 0.5, maximum),
+                                   (1.3, 2.3))
+
+
+def calculate_main_sequence_luminosity(mass):
+    """Calculates the luminosity of a main-sequence star from its mass.
+
+    :param mass: mass in solar masses
+    :return: luminosity in solar luminosities
+    :rtype: np.ndarray
+    """
+    mass = np.asarray(mass, dtype=float)
+    conditions = [mass < upper for upper, _, _ in _mass_luminosity]
+    choices = [k * mass ** a for _, k, a in _mass_luminosity]
+    return np.select(conditions, choices)
+
+
+def calculate_main_sequence_radius(mass):
+    """Calculates the radius of a main-sequence star from its mass.
+
+    :param mass: mass in solar masses
+    :return: radius in solar radii
+    :rtype: np.ndarray
+    """
+    mass = np.asarray(mass, dtype=float)
+    return np.where(mass < 1, mass ** 0.8, mass ** 0.57)
+
+
+def calculate_effective_temperature(luminosity, radius):
+    """Calculates the surface temperature of a star from its luminosity and
+    radius, relative to the Sun.
+
+    Formula: T = T_sun (L / R^2)^1/4
+
+    :param luminosity: luminosity in solar luminosities
+    :param radius: radius in solar radii
+    :return: temperature in Kelvin
+    :rtype: np.ndarray
+    """
+    return solar_temperature * np.power(
+        np.divide(luminosity, np.square(radius)), 0.25)
+
+
+def calculate_planet_radius(mass):
+    """Calculates the radius of a planet from its mass with a broken power
+    law (rocky below 2, volatile-rich below 130, and degenerate above 130
+    Earth masses).
+
+    :param mass: mass in Earth masses
+    :return: radius in Earth radii
+    :rtype: np.ndarray
+    """
+    mass = np.asarray(mass, dtype=float)
+    rocky = np.power(mass, 0.28)
+    volatile = 2 ** 0.28 * np.power(mass / 2, 0.59)
+    degenerate = 2 ** 0.28 * 65 ** 0.59 * np.power(mass / 130, -0.04)
+    return np.select([mass < 2, mass < 130], [rocky, volatile], degenerate)
+
+
+class StarSystemPopulation:
+    """A columnar population of single-star planetary systems.
+
+    Stars are stored in arrays of length n_systems. Planets are stored in
+    arrays of length n_planets, grouped by system and ordered outward;
+    the planets of system i are planet_offsets[i]:planet_offsets[i + 1].
+
+    Units: masses in kilograms, radii and semi-major axes in kilometers,
+    temperatures in Kelvin, angles in radians.
+    """
+    star_columns = ("star_mass", "star_radius", "star_temperature",
+                    "feasible")
+    planet_columns = ("planet_mass", "planet_radius", "semimajor_axis",
+                      "eccentricity", "argument_of_periapsis",
+                      "mean_anomaly_at_epoch", "planet_feasible")
+
+    def __init__(self, star_mass: np.ndarray, star_radius: np.ndarray,
+                 star_temperature: np.ndarray, planet_offsets: np.ndarray,
+                 planet_mass: np.ndarray, planet_radius: np.ndarray,
+                 semimajor_axis: np.ndarray, eccentricity: np.ndarray,
+                 argument_of_periapsis: np.ndarray,
+                 mean_anomaly_at_epoch: np.ndarray,
+                 min_hill_spacing: float = 8.0) -> None:
+        """Stores the columns and checks the feasibility of every system.
+
+        :param np.ndarray planet_offsets: (n_systems + 1,) start of each
+        system's planets, ending with n_planets
+        :param float min_hill_spacing: the smallest separation of
+        neighbouring planets, in mutual Hill radii, of a feasible system
+        """
+        self.star_mass = star_mass
+        self.star_radius = star_radius
+        self.star_temperature = star_temperature
+        self.planet_offsets = planet_offsets
+        self.planet_mass = planet_mass
+        self.planet_radius = planet_radius
+        self.semimajor_axis = semimajor_axis
+        self.eccentricity = eccentricity
+        self.argument_of_periapsis = argument_of_periapsis
+        self.mean_anomaly_at_epoch = mean_anomaly_at_epoch
+        self.min_hill_spacing = min_hill_spacing
+        self.planet_feasible, self.feasible = self._check_feasibility()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self)} systems, " \
+            f"{len(self.planet_mass)} planets)"
+
+    def __len__(self):
+        return len(self.star_mass)
+
+    @property
+    def planet_counts(self) -> np.ndarray:
+        """Returns the number of planets of each system.
+
+        :return: (n_systems,) planet counts
+        :rtype: np.ndarray
+        """
+        return np.diff(self.planet_offsets)
+
+    @property
+    def planet_system(self) -> np.ndarray:
+        """Returns the index of the system of each planet.
+
+        :return: (n_planets,) system indices
+        :rtype: np.ndarray
+        """
+        return np.repeat(np.arange(len(self)), self.planet_counts)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Returns the stars and planets as the columns of one tree of
+        bodies, in the format of Universe.columns(): every star (in order),
+        then every planet (in order), without names.
+
+        :return: parent, mass, radius, temperature, semimajor_axis,
+        eccentricity, argument_of_periapsis and mean_anomaly_at_epoch
+        :rtype: Dict[str, np.ndarray]
+        """
+        n_planets = len(self.planet_mass)
+        no_orbit = np.full(len(self), np.nan)
+        columns = {
+            "parent": np.concatenate((np.full(len(self), -1),
+                                      self.planet_system)),
+            "mass": np.concatenate((self.star_mass, self.planet_mass)),
+            "radius": np.concatenate((self.star_radius, self.planet_radius)),
+            "temperature": np.concatenate((self.star_temperature,
+                                           np.full(n_planets, np.nan))),
+        }
+        for column in self.planet_columns[2:-1]:
+            columns[column] = np.concatenate((no_orbit,
+                                              getattr(self, column)))
+        return columns
+
+    def _check_feasibility(self):
+        """Applies, to every planet at once, the collision checks of Orbit
+        and a stability check against each planet's outer neighbour:
+            - the semi-minor axis and the perihelion must exceed the
+            combined radii of the star and the planet
+            - the orbits of neighbouring planets must not cross, and must
+            be separated by at least min_hill_spacing mutual Hill radii
+
+        A system is feasible if its star has a Harvard Spectral
+        Classification and all of its planets pass.
+
+        :return: (n_planets,) and (n_systems,) boolean masks
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        system = self.planet_system
+        star_mass = self.star_mass[system]
+        a, e = self.semimajor_axis, self.eccentricity
+        contact = self.star_radius[system] + self.planet_radius
+        feasible = (a * np.sqrt(1 - e ** 2) > contact) & (a * (1 - e) >
+                                                           contact)
+        # Every planet but the last of its system has an outer neighbour
+        inner = np.ones(len(a), dtype=bool)
+        inner[self.planet_offsets[1:] - 1] = False
+        inner = np.flatnonzero(inner)
+        outer = inner + 1
+        mutual_hill_radius = np.cbrt(
+            (self.planet_mass[inner] + self.planet_mass[outer]) /
+            (3 * star_mass[inner])) * (a[inner] + a[outer]) / 2
+        spaced = (a[inner] * (1 + e[inner]) < a[outer] * (1 - e[outer])) & (
+            a[outer] - a[inner] >= self.min_hill_spacing * mutual_hill_radius)
+        feasible[inner] &= spaced
+        feasible[outer] &= spaced
+        systems = self.star_temperature >= _minimum_temperature
+        failed = np.bincount(system[~feasible], minlength=len(self))
+        return feasible, systems & (failed == 0)
+
+    def select(self, systems: Union[np.ndarray, Sequence[int]]) \
+            -> "StarSystemPopulation":
+        """Returns the sub-population of the given systems.
+
+        :param systems: a boolean mask or indices of systems
+        :return: the selected systems
+        :rtype: StarSystemPopulation
+        """
+        systems = np.asarray(systems)
+        if systems.dtype == bool:
+            systems = np.flatnonzero(systems)
+        counts = self.planet_counts[systems]
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        # Index of every planet of the selected systems, in order
+        planets = np.repeat(self.planet_offsets[systems] - offsets[:-1],
+                            counts) + np.arange(offsets[-1])
+        return StarSystemPopulation(
+            self.star_mass[systems], self.star_radius[systems],
+            self.star_temperature[systems], offsets,
+            *[getattr(self, column)[planets]
+              for column in self.planet_columns[:-1]],
+            min_hill_spacing=self.min_hill_spacing)
+
+    @classmethod
+    def concatenate(cls, populations: Sequence["StarSystemPopulation"]) \
+            -> "StarSystemPopulation":
+        """Joins populations end to end.
+
+        :param Sequence[StarSystemPopulation] populations: the populations
+        :return: the joined population
+        :rtype: StarSystemPopulation
+        """
+        if len(populations) == 0:
+            raise ValueError("At least one population is required.")
+        counts = np.concatenate([p.planet_counts for p in populations])
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return cls(*[np.concatenate([getattr(p, column) for p in populations])
+                     for column in cls.star_columns[:-1]],
+                   offsets,
+                   *[np.concatenate([getattr(p, column) for p in populations])
+                     for column in cls.planet_columns[:-1]],
+                   min_hill_spacing=populations[0].min_hill_spacing)
+
+    def to_universe(self, system: int, name: str = None):
+        """Builds a Universe holding one system, adding its bodies and
+        orbits in bulk.
+
+        The star is named after the system (e.g., "System 42") and its
+        planets after the star, outward from "b" (e.g., "System 42 b").
+
+        :param int system: the index of the system
+        :param str name: the name of the star; defaults to "System <index>"
+        :return: the universe
+        :rtype: Universe
+        :raises: ValueError if the system is not feasible
+        """
+        from universe.universe import Universe
+        if not self.feasible[system]:
+            raise ValueError(f"System {system} is not feasible.")
+        if name is None:
+            name = f"System {system}"
+        star = SolarBody(float(self.star_mass[system]),
+                         float(self.star_radius[system]),
+                         float(self.star_temperature[system]), name=name)
+        planets = []
+        orbits = []
+        start, stop = self.planet_offsets[system:system + 2]
+        for k, idx in enumerate(range(start, stop)):
+            planet = PlanetaryBody(float(self.planet_mass[idx]),
+                                   float(self.planet_radius[idx]),
+                                   name=f"{name} {chr(ord('b') + k)}")
+            planets.append(planet)
+            orbits.append(Orbit(
+                star, planet, float(self.semimajor_axis[idx]),
+                float(self.eccentricity[idx]),
+                float(self.argument_of_periapsis[idx]),
+                float(self.mean_anomaly_at_epoch[idx])))
+        universe = Universe(name)
+        universe.add_celestial_bodies([star] + planets)
+        universe.add_orbits(orbits)
+        return universe
+
+
+def generate_chunk(size: int,
+                   seed: Union[SeedLike, np.random.Generator],
+                   parameters: GeneratorParameters = GeneratorParameters()) \
+        -> StarSystemPopulation:
+    """Generates one chunk of star systems with a single random stream.
+
+    :param int size: the number of systems
+    :param seed: the seed (or generator) of the chunk's random stream
+    :param GeneratorParameters parameters: the population parameters
+    :return: the systems
+    :rtype: StarSystemPopulation
+    """
+    p = parameters
+    rng = as_generator(seed)
+    # Stars
+    mass = sample_stellar_masses(rng, size, p.minimum_star_mass,
+                                 p.maximum_star_mass)
+    radius = calculate_main_sequence_radius(mass)
+    temperature = calculate_effective_temperature(
+        calculate_main_sequence_luminosity(mass), radius)
+    # Planets, grouped by system
+    counts = np.minimum(rng.poisson(p.mean_planets, size), p.max_planets)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    n_planets = int(offsets[-1])
+    system = np.repeat(np.arange(size), counts)
+    first = offsets[:-1][counts > 0]
+    planet_mass = np.exp(rng.uniform(np.log(p.minimum_planet_mass),
+                                     np.log(p.maximum_planet_mass),
+                                     n_planets))
+    planet_radius = calculate_planet_radius(planet_mass)
+    # Orbits: an inner edge (scaled with the star's mass) followed by a
+    # cumulative product of period ratios within each system
+    log_inner = rng.uniform(np.log(p.minimum_inner_orbit),
+                            np.log(p.maximum_inner_orbit), size) + \
+        np.log(mass) / 3
+    log_ratio = np.maximum(
+        rng.normal(np.log(p.median_period_ratio), p.period_ratio_spread,
+                   n_planets), 0.01) * 2 / 3
+    log_ratio[first] = 0
+    cumulative = np.cumsum(log_ratio)
+    log_axis = log_inner[system] + cumulative - \
+        np.repeat(cumulative[first], counts[counts > 0])
+    eccentricity = np.minimum(rng.rayleigh(p.eccentricity_scale, n_planets),
+                              0.95)
+    return StarSystemPopulation(
+        mass * solar_mass, radius * solar_radius, temperature, offsets,
+        planet_mass * earth_mass, planet_radius * earth_radius,
+        np.exp(log_axis) * astronomical_unit, eccentricity,
+        rng.uniform(0, 2 * np.pi, n_planets),
+        rng.uniform(0, 2 * np.pi, n_planets),
+        min_hill_spacing=p.min_hill_spacing)
+
+
+def _chunk_sizes(n_systems: int, chunk_size: int) -> Sequence[int]:
+    """Returns the number of systems of each chunk."""
+    if n_systems < 0:
+        raise ValueError(f"n_systems ({n_systems}) must be >= 0.")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size ({chunk_size}) must be >= 1.")
+    n_chunks = max(math.ceil(n_systems / chunk_size), 1)
+    return [min(chunk_size, n_systems - idx * chunk_size)
+            for idx in range(n_chunks)]
+
+
+def replay_chunk(n_systems: int, chunk: int, seed: SeedLike,
+                 parameters: GeneratorParameters = GeneratorParameters(),
+                 chunk_size: int = 100000) -> StarSystemPopulation:
+    """Regenerates one chunk of a population, identical to the chunk
+    generate_star_systems generates with the same arguments.
+
+    :param int n_systems: the number of systems of the population
+    :param int chunk: the index of the chunk
+    :param SeedLike seed: the seed of the population
+    :param GeneratorParameters parameters: the population parameters
+    :param int chunk_size: the number of systems per chunk
+    :return: the systems of the chunk
+    :rtype: StarSystemPopulation
+    """
+    sizes = _chunk_sizes(n_systems, chunk_size)
+    if not 0 <= chunk < len(sizes):
+        raise ValueError(f"chunk ({chunk}) must be between 0 and "
+                         f"{len(sizes) - 1}.")
+    return generate_chunk(sizes[chunk], as_streams(seed).seed_sequence(chunk),
+                          parameters)
+
+
+def generate_star_systems(n_systems: int, seed: SeedLike = None,
+                          parameters: GeneratorParameters =
+                          GeneratorParameters(), chunk_size: int = 100000,
+                          workers: int = 1,
+                          feasible_only: bool = False) \
+        -> StarSystemPopulation:
+    """Generates a population of star systems, in chunks of chunk_size
+    systems spread over worker processes.
+
+    Example:
+        population = generate_star_systems(1000000, seed=42, workers=8,
+                                           feasible_only=True)
+        universe = population.to_universe(0)
+
+    :param int n_systems: the number of systems to generate
+    :param SeedLike seed: the seed (or RandomStreams) of the population;
+    the same seed and chunk_size always generate the same population
+    :param GeneratorParameters parameters: the population parameters
+    :param int chunk_size: the number of systems per chunk
+    :param int workers: the number of worker processes (1 generates in
+    this process)
+    :param bool feasible_only: if True, drop infeasible systems (the result
+    then holds fewer than n_systems systems)
+    :return: the systems
+    :rtype: StarSystemPopulation
+    """
+    sizes = _chunk_sizes(n_systems, chunk_size)
+    if workers < 1:
+        raise ValueError(f"workers ({workers}) must be >= 1.")
+    n_chunks = len(sizes)
+    streams = as_streams(seed)
+    seeds = [streams.seed_sequence(idx) for idx in range(n_chunks)]
+    if workers == 1 or n_chunks == 1:
+        chunks = [generate_chunk(size, chunk_seed, parameters)
+                  for size, chunk_seed in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(generate_chunk, sizes, seeds,
+                                       [parameters] * n_chunks))
+    if feasible_only:
+        chunks = [chunk.select(chunk.feasible) for chunk in chunks]
+    return StarSystemPopulation.concatenate(chunks)
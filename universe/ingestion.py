@@ -0,0 +1,475 @@
+"""Streaming ingestion of tabular catalogs of bodies and orbits.
+
+A catalog is a table with one row per celestial body, e.g.:
+
+    name,type,mass,radius,temperature,primary,semimajor_axis,eccentricity
+    Sun,SolarBody,1.9885e+30,695700,5778,,,
+    Earth,PlanetaryBody,5.97e+24,6378.0,,Sun,1.496e+08,0.017
+
+Its columns are matched to the catalog fields below by name, or through a
+mapping {field: column}. Only name and mass are always required; see
+universe.specification for the fields each body type requires. A row with
+a primary body also defines the orbit of the body around its primary.
+Values are expected in the units of the rest of the package (kilograms,
+kilometers, Kelvin and radians) unless the unit of a field is given, e.g.,
+units={"mass": "solar_mass", "semimajor_axis": "au"}; each column is then
+converted once per chunk (see utilities.units).
+
+Catalogs are read chunk_size rows at a time (CSV with the csv module,
+Parquet with pyarrow if it is installed), so that memory use is bounded by
+the chunk size and not by the size of the file. Each chunk is validated in
+vectorized form; rejected rows are written, together with the reason, to an
+optional side file, and accepted rows are passed on to a sink:
+    UniverseSink: adds bodies (and, once every body has been read, orbits)
+    to a Universe
+    ColumnarSink: writes each chunk to an .npz file in a
+    directory, to be read back chunk by chunk with read_columnar
+"""
+import csv
+import itertools
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
+import numpy as np
+from orbital_dynamics.orbit import Orbit
+from universe.specification import body_types, orbit_fields
+from utilities.units import conversion_factor, field_units
+
+# A catalog row defines a plain Orbit around its primary body, which cannot
+# describe the members of a binary; build those from a specification
+catalog_body_types = {name: value for name, value in body_types.items()
+                      if name != "Barycenter"}
+
+catalog_fields = ("name", "type", "mass", "radius", "temperature",
+                  "primary") + orbit_fields
+text_fields = ("name", "type", "primary")
+numeric_fields = tuple(field for field in catalog_fields
+                       if field not in text_fields)
+file_formats = ("csv", "tsv", "parquet")
+
+Chunk = Dict[str, np.ndarray]
+Rejects = List[Tuple[int, str, Dict[str, Any]]]
+
+
+class IngestionReport(NamedTuple):
+    """Row counts of an ingestion."""
+    rows: int
+    accepted: int
+    rejected: int
+
+
+def _to_float(values: np.ndarray) -> np.ndarray:
+    """Converts text to floats, with NaN for missing or malformed values.
+
+    :param np.ndarray values: the values
+    :return: the converted values
+    :rtype: np.ndarray
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "U":
+        # Empty cells are the common failure; replace them before falling
+        # back to parsing value by value
+        values = np.where(np.char.str_len(values) == 0, "nan", values)
+    try:
+        return values.astype(float)
+    except (TypeError, ValueError):
+        pass
+
+    def parse(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+    return np.array([parse(value) for value in values], dtype=float)
+
+
+def _to_text(values: np.ndarray) -> np.ndarray:
+    """Converts values to stripped strings, with "" for missing values.
+
+    :param np.ndarray values: the values
+    :return: the converted values
+    :rtype: np.ndarray
+    """
+    values = np.asarray(values)
+    if values.dtype.kind != "U":
+        values = np.array(["" if value is None else str(value)
+                           for value in values], dtype=str)
+    return np.char.strip(values)
+
+
+def read_csv_chunks(path: str, chunk_size: int = 100000,
+                    delimiter: str = ",") -> Iterator[Tuple[Chunk, Rejects]]:
+    """Reads a delimited text file with a header row in chunks.
+
+    :param str path: the path of the file
+    :param int chunk_size: the number of rows per chunk
+    :param str delimiter: the delimiter of the columns
+    :return: for each chunk, its columns (as arrays of text, keyed by the
+    header) and the rows that could not be split into columns
+    :rtype: Iterator[Tuple[Chunk, Rejects]]
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [column.strip() for column in next(reader, [])]
+        row = 0
+        while True:
+            lines = list(itertools.islice(reader, chunk_size))
+            if len(lines) == 0:
+                return
+            rows = np.arange(row, row + len(lines))
+            row += len(lines)
+            well_formed = np.array([len(line) == len(header)
+                                    for line in lines], dtype=bool)
+            malformed = [(int(rows[idx]), "malformed row",
+                          dict(zip(header, lines[idx])))
+                         for idx in np.flatnonzero(~well_formed)]
+            lines = [line for line, ok in zip(lines, well_formed) if ok]
+            values = np.array(lines, dtype=str).reshape(len(lines),
+                                                        len(header))
+            chunk = {column: values[:, idx]
+                     for idx, column in enumerate(header)}
+            chunk["row"] = rows[well_formed]
+            yield chunk, malformed
+
+
+def read_parquet_chunks(path: str, chunk_size: int = 100000) \
+        -> Iterator[Tuple[Chunk, Rejects]]:
+    """Reads a Parquet file in chunks (requires pyarrow).
+
+    :param str path: the path of the file
+    :param int chunk_size: the number of rows per chunk
+    :return: for each chunk, its columns (keyed by name) and no rejects
+    :rtype: Iterator[Tuple[Chunk, Rejects]]
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow to be "
+                          "installed.")
+    row = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        chunk = {name: column.to_numpy(zero_copy_only=False)
+                 for name, column in zip(batch.schema.names, batch.columns)}
+        chunk["row"] = np.arange(row, row + batch.num_rows)
+        row += batch.num_rows
+        yield chunk, []
+
+
+def map_columns(chunk: Chunk, mapping: Dict[str, str] = None,
+                units: Dict[str, str] = None) -> Chunk:
+    """Selects the catalog fields from the columns of a chunk and converts
+    them to text or floats (in the package's units). Missing columns become
+    "" or NaN.
+
+    :param Chunk chunk: the columns of the chunk, keyed by column name
+    :param Dict[str, str] mapping: the column of each field, for those
+    whose column is not named after the field
+    :param Dict[str, str] units: the unit of each numeric field, for those
+    not in the package's units
+    :return: the fields of the chunk
+    :rtype: Chunk
+    """
+    mapping = mapping or {}
+    units = units or {}
+    unknown = (set(mapping) - set(catalog_fields)) | (
+        set(units) - set(numeric_fields))
+    if len(unknown) > 0:
+        raise KeyError(f"Unknown catalog fields "
+                       f"{', '.join(sorted(unknown))}; choose from "
+                       f"{', '.join(catalog_fields)}")
+    n_rows = len(chunk["row"])
+    fields = {"row": chunk["row"]}
+    for field in catalog_fields:
+        column = mapping.get(field, field)
+        if field in text_fields:
+            fields[field] = _to_text(chunk[column]) if column in chunk \
+                else np.full(n_rows, "", dtype=str)
+        else:
+            fields[field] = _to_float(chunk[column]) if column in chunk \
+                else np.full(n_rows, np.nan)
+            if field in units:
+                fields[field] *= conversion_factor(units[field],
+                                                   field_units[field])
+    return fields
+
+
+def validate_chunk(fields: Chunk) -> Tuple[Chunk, np.ndarray]:
+    """Validates every row of a chunk at once. Rows with no type are
+    CelestialBody rows, and rows with no argument of periapsis or mean
+    anomaly at epoch default to 0 (both are filled in a copy of the
+    fields).
+
+    :param Chunk fields: the fields of the chunk (see map_columns)
+    :return: the completed fields, and the reason each row is rejected
+    ("" for accepted rows)
+    :rtype: Tuple[Chunk, np.ndarray]
+    """
+    fields = dict(fields)
+    n_rows = len(fields["row"])
+    reasons = np.full(n_rows, "", dtype=object)
+
+    def reject(mask, reason):
+        reasons[(reasons == "") & mask] = reason
+
+    body_type = np.where(fields["type"] == "", "CelestialBody",
+                         fields["type"])
+    fields["type"] = body_type
+    reject(fields["name"] == "", "missing name")
+    reject(~np.isin(body_type, list(catalog_body_types)), "unknown type")
+    for name, (_, required) in catalog_body_types.items():
+        is_type = body_type == name
+        for field in required:
+            value = fields[field]
+            reject(is_type & ~np.isfinite(value), f"missing {field}")
+            reject(is_type & (value <= 0), f"{field} must be > 0")
+    # The name of a row must be unique within its chunk
+    _, first = np.unique(fields["name"], return_index=True)
+    duplicate = np.ones(n_rows, dtype=bool)
+    duplicate[first] = False
+    reject(duplicate, "duplicate name")
+    orbiting = fields["primary"] != ""
+    a, e = fields["semimajor_axis"], fields["eccentricity"]
+    reject(orbiting & (fields["primary"] == fields["name"]),
+           "body cannot orbit itself")
+    reject(orbiting & ~np.isfinite(a), "missing semimajor_axis")
+    reject(orbiting & ~np.isfinite(e), "missing eccentricity")
+    reject(orbiting & (a <= 0), "semimajor_axis must be > 0")
+    reject(orbiting & ((e < 0) | (e >= 1)), "eccentricity must be in the "
+                                            "range 0 <= e < 1")
+    for field in ("argument_of_periapsis", "mean_anomaly_at_epoch"):
+        value = fields[field]
+        fields[field] = np.where(np.isfinite(value), value, 0.0)
+    return fields, reasons
+
+
+def _select(fields: Chunk, mask: np.ndarray) -> Chunk:
+    return {field: values[mask] for field, values in fields.items()}
+
+
+def _row_values(fields: Chunk, idx: int) -> Dict[str, Any]:
+    return {field: fields[field][idx] for field in catalog_fields}
+
+
+class UniverseSink:
+    """Feeds the accepted rows of a catalog to a Universe. Bodies with no
+    primary body are added chunk by chunk; orbiting bodies (and their
+    orbits) are added when the sink is closed, level by level, as a
+    primary body may appear after the bodies orbiting it."""
+
+    def __init__(self, universe) -> None:
+        """
+        :param Universe universe: the universe to add bodies and orbits to
+        """
+        self.universe = universe
+        self._pending = []
+        self._pending_names = set()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.universe.name})"
+
+    @staticmethod
+    def _build_bodies(fields: Chunk) -> list:
+        bodies = []
+        for idx, body_type in enumerate(fields["type"]):
+            body_class, required = catalog_body_types[body_type]
+            bodies.append(body_class(
+                *[float(fields[field][idx]) for field in required],
+                name=str(fields["name"][idx])))
+        return bodies
+
+    def write(self, fields: Chunk) -> Rejects:
+        """Adds the bodies of a validated chunk with no primary body to the
+        universe, and holds the others until the sink is closed.
+
+        :param Chunk fields: the accepted rows of a chunk
+        :return: rows rejected because their name is already taken
+        :rtype: Rejects
+        """
+        existing = self.universe.celestial_bodies
+        taken = np.array([name in existing or name in self._pending_names
+                          for name in fields["name"]], dtype=bool)
+        rejects = [(int(fields["row"][idx]), "duplicate name",
+                    _row_values(fields, idx)) for idx in np.flatnonzero(taken)]
+        fields = _select(fields, ~taken)
+        orbiting = fields["primary"] != ""
+        self.universe.add_celestial_bodies(
+            self._build_bodies(_select(fields, ~orbiting)))
+        if np.any(orbiting):
+            self._pending.append(_select(fields, orbiting))
+            self._pending_names.update(fields["name"][orbiting])
+        return rejects
+
+    def close(self) -> Rejects:
+        """Adds the held bodies and their orbits to the universe, starting
+        with those whose primary body is already in the universe.
+
+        :return: rows rejected because their primary body is unknown or
+        their orbit is impossible (see Orbit)
+        :rtype: Rejects
+        """
+        if len(self._pending) == 0:
+            return []
+        pending = {field: np.concatenate([chunk[field]
+                                          for chunk in self._pending])
+                   for field in self._pending[0]}
+        self._pending = []
+        self._pending_names = set()
+        rejects = []
+        while len(pending["row"]) > 0:
+            existing = self.universe.celestial_bodies
+            ready = np.array([primary in existing
+                              for primary in pending["primary"]], dtype=bool)
+            if not np.any(ready):
+                break
+            fields = _select(pending, ready)
+            pending = _select(pending, ~ready)
+            bodies = []
+            orbits = []
+            for idx, body in enumerate(self._build_bodies(fields)):
+                try:
+                    orbit = Orbit(existing[fields["primary"][idx]], body,
+                                  *[float(fields[field][idx])
+                                    for field in orbit_fields])
+                except ValueError as error:
+                    rejects.append((int(fields["row"][idx]), str(error),
+                                    _row_values(fields, idx)))
+                    continue
+                bodies.append(body)
+                orbits.append(orbit)
+            self.universe.add_celestial_bodies(bodies)
+            self.universe.add_orbits(orbits)
+        rejects.extend((int(pending["row"][idx]), "unknown primary",
+                        _row_values(pending, idx))
+                       for idx in range(len(pending["row"])))
+        return rejects
+
+
+class ColumnarSink:
+    """Writes the accepted rows of a catalog to a directory of .npz files,
+    one per chunk."""
+
+    def __init__(self, directory: str) -> None:
+        """
+        :param str directory: the directory of the store
+        """
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.parts = len([f for f in os.listdir(self.directory)
+                          if f.endswith(".npz")])
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.directory})"
+
+    def write(self, fields: Chunk) -> Rejects:
+        """Writes a validated chunk as the next part of the store.
+
+        :param Chunk fields: the accepted rows of a chunk
+        :return: no rejects
+        :rtype: Rejects
+        """
+        if len(fields["row"]) == 0:
+            return []
+        path = os.path.join(self.directory, f"part-{self.parts:05d}.npz")
+        np.savez(path, **fields)
+        self.parts += 1
+        return []
+
+    def close(self) -> Rejects:
+        return []
+
+
+def read_columnar(directory: str) -> Iterator[Chunk]:
+    """Reads a store written by ColumnarSink, one chunk at a time.
+
+    :param str directory: the directory of the store
+    :return: the fields of each chunk
+    :rtype: Iterator[Chunk]
+    """
+    directory = os.path.expanduser(directory)
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith(".npz"):
+            with np.load(os.path.join(directory, file_name)) as part:
+                yield {field: part[field] for field in part.files}
+
+
+class _RejectWriter:
+    """Appends rejected rows to a CSV side file (or counts them only)."""
+
+    def __init__(self, path: str = None) -> None:
+        self.count = 0
+        self._file = None
+        if path is not None:
+            self._file = open(path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(("row", "reason") + catalog_fields)
+
+    def write(self, rejects: Rejects) -> None:
+        self.count += len(rejects)
+        if self._file is None:
+            return
+        for row, reason, values in rejects:
+            self._writer.writerow([row, reason] + [
+                "" if values.get(field) is None else values.get(field)
+                for field in catalog_fields])
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+def ingest(path: str, sink, chunk_size: int = 100000,
+           mapping: Dict[str, str] = None, rejects: str = None,
+           file_format: str = None,
+           units: Dict[str, str] = None) -> IngestionReport:
+    """Streams a catalog into a sink, chunk by chunk.
+
+    Example:
+        universe = Universe("Catalog")
+        report = ingest("stars.csv", UniverseSink(universe),
+                        mapping={"mass": "mass_kg"},
+                        rejects="stars.rejects.csv")
+
+    :param str path: the path of the catalog
+    :param sink: a UniverseSink, ColumnarSink, or any object with write
+    and close methods like theirs
+    :param int chunk_size: the number of rows held in memory at once
+    :param Dict[str, str] mapping: the column of each field, for those
+    whose column is not named after the field
+    :param str rejects: the path of the CSV file of rejected rows; if None,
+    rejected rows are only counted
+    :param str file_format: "csv", "tsv" or "parquet"; inferred from the
+    extension of the path if None
+    :param Dict[str, str] units: the unit of each numeric field, for those
+    not in the package's units
+    :return: the number of rows read, accepted and rejected
+    :rtype: IngestionReport
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size ({chunk_size}) must be >= 1.")
+    if file_format is None:
+        file_format = os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format not in file_formats:
+        raise ValueError(f"Unknown file format {file_format}; choose from "
+                         f"{', '.join(file_formats)}")
+    if file_format == "parquet":
+        chunks = read_parquet_chunks(path, chunk_size)
+    else:
+        chunks = read_csv_chunks(path, chunk_size,
+                                 "\t" if file_format == "tsv" else ",")
+    reject_writer = _RejectWriter(rejects)
+    rows = 0
+    try:
+        for chunk, malformed in chunks:
+            reject_writer.write(malformed)
+            fields = map_columns(chunk, mapping, units)
+            rows += len(fields["row"]) + len(malformed)
+            fields, reasons = validate_chunk(fields)
+            rejected = np.flatnonzero(reasons != "")
+            reject_writer.write([(int(fields["row"][idx]), reasons[idx],
+                                  _row_values(fields, idx))
+                                 for idx in rejected])
+            reject_writer.write(sink.write(_select(fields, reasons == "")))
+        reject_writer.write(sink.close())
+    finally:
+        reject_writer.close()
+    return IngestionReport(rows, rows - reject_writer.count,
+                           reject_writer.count)
@@ -0,0 +1,379 @@
+import io
+from typing import List, Sequence, Tuple, Union, BinaryIO
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import EllipseCollection, LineCollection
+from matplotlib.colors import to_rgba
+from matplotlib.lines import Line2D
+import matplotlib.image
+from celestial_bodies.celestial_bodies import CelestialBody
+
+
+def rescale(values: np.ndarray, min_value: float, max_value: float,
+            min_out: float, max_out: float) -> np.ndarray:
+    """Linearly maps values from [min_value, max_value] onto [min_out,
+    max_out]. If the input range is empty (e.g., a single orbit), every
+    value maps to max_out.
+
+    :param np.ndarray values: the values to rescale
+    :param float min_value: the minimum of the input range
+    :param float max_value: the maximum of the input range
+    :param float min_out: the minimum of the output range
+    :param float max_out: the maximum of the output range
+    :return: the rescaled values
+    :rtype: np.ndarray
+    """
+    values = np.asarray(values, dtype=float)
+    if max_value == min_value:
+        return np.full_like(values, max_out)
+    scaled = (values - min_value) / (max_value - min_value)
+    return scaled * (max_out - min_out) + min_out
+
+
+def merge_into_bands(pixel_sizes: np.ndarray,
+                     min_separation: float = 1.0) -> List[np.ndarray]:
+    """Groups sorted orbit sizes (in pixels) into density bands. Consecutive
+    orbits that would be drawn less than min_separation pixels apart from the
+    first orbit of the current band are merged into that band.
+
+    :param np.ndarray pixel_sizes: orbit sizes in pixels, sorted ascending
+    :param float min_separation: the minimum separation (in pixels) for two
+    orbits to be drawn individually
+    :return: a list of index arrays, one per band
+    :rtype: List[np.ndarray]
+    """
+    pixel_sizes = np.asarray(pixel_sizes, dtype=float)
+    if len(pixel_sizes) == 0:
+        return []
+    bands = []
+    start = 0
+    for idx in range(1, len(pixel_sizes)):
+        if pixel_sizes[idx] - pixel_sizes[start] >= min_separation:
+            bands.append(np.arange(start, idx))
+            start = idx
+    bands.append(np.arange(start, len(pixel_sizes)))
+    return bands
+
+
+class OrbitRenderer:
+    """Renders the orbits around a single primary body with batched
+    matplotlib collections, without requiring a GUI.
+
+    The drawing is split into a static layer (orbital paths, the primary
+    body, axes and legend) and a dynamic layer (the orbiting bodies). The
+    static layer is rasterized once and cached, so that subsequent frames
+    only redraw the orbiting bodies on top of it.
+
+    Scaling Notes:
+    The scaling is identical to Universe.plot_orbits: orbit sizes are mapped
+    to between 15% and 100% of the figure width, and body sizes to between
+    0.5% and 8% of the figure width. Orbits which would be drawn less than
+    min_band_separation pixels apart are merged into a single density band,
+    whose line width covers the merged orbits and whose opacity grows with
+    the number of orbits it contains.
+    """
+    figure_width = 16
+    figure_height = 9
+    primary_color = "yellow"
+    orbiting_color = "blue"
+    edge_color = "black"
+    max_legend_entries = 20
+    # Orbital paths get one point per segment_pixels of their projected
+    # length, between min_arc_resolution and arc_resolution per half orbit
+    min_arc_resolution = 8
+    segment_pixels = 4.0
+
+    def __init__(self, primary_body: CelestialBody, orbits: Sequence,
+                 simulate_three_dimensions: bool = True, dpi: int = 180,
+                 figure: Figure = None, arc_resolution: int = 128,
+                 min_band_separation: float = 1.0) -> None:
+        """Initializes the renderer by scaling the orbits and building the
+        collections used to draw them.
+
+        :param CelestialBody primary_body: the body at the origin
+        :param Sequence orbits: the orbits around the primary body
+        :param bool simulate_three_dimensions: whether or not to simulate a 3D
+        effect by squashing the semi-minor axis
+        :param int dpi: resolution of the rasterized output
+        :param Figure figure: an existing figure to draw into (e.g., a pyplot
+        figure); if None, a headless Agg figure is created
+        :param int arc_resolution: the maximum number of points used per
+        half orbit (smaller orbits get fewer)
+        :param float min_band_separation: the minimum separation (in pixels)
+        for two orbits to be drawn individually
+        """
+        if len(orbits) == 0:
+            raise ValueError(f"No orbits around {primary_body.name} to "
+                             f"render.")
+        if arc_resolution < 2:
+            raise ValueError(f"arc_resolution ({arc_resolution}) must be at "
+                             f"least 2.")
+        self.primary_body = primary_body
+        self.orbits = sorted(orbits, key=lambda o: o.semimajor_axis)
+        self.three_dim_val = 0.1 if simulate_three_dimensions else 1.0
+        self.dpi = dpi
+        self.arc_resolution = arc_resolution
+        self.min_band_separation = min_band_separation
+        if figure is None:
+            figure = Figure(figsize=(self.figure_width, self.figure_height),
+                            dpi=dpi)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+        self.ax = figure.add_subplot(aspect="equal")
+        self._background = None
+        self._background_size = None
+        self._scale()
+        self._build_artists()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({repr(self.primary_body)}, " \
+            f"{len(self.orbits)} orbits)"
+
+    @property
+    def canvas(self) -> FigureCanvasAgg:
+        """Returns the canvas of the figure being drawn into.
+
+        :return: the figure canvas
+        :rtype: FigureCanvasAgg
+        """
+        return self.figure.canvas
+
+    def _scale(self) -> None:
+        """Scales the orbital paths and body radii to figure units.
+
+        :return: None
+        """
+        semimajor = np.array([o.semimajor_axis for o in self.orbits])
+        semiminor = np.array([o.semiminor_axis for o in self.orbits])
+        radii = np.array([o.orbiting_body.radius for o in self.orbits])
+        self.max_orbit = semimajor[-1]
+        min_orbit = semimajor[0]
+        all_radii = np.append(radii, self.primary_body.radius)
+        min_radius, max_radius = all_radii.min(), all_radii.max()
+        self.widths = rescale(semimajor, min_orbit, self.max_orbit,
+                              self.figure_width * 0.15,
+                              self.figure_width) * 2
+        self.heights = rescale(semiminor, min_orbit, self.max_orbit,
+                               self.figure_width * 0.15,
+                               self.figure_width) * 2 * self.three_dim_val
+        self.body_radii = rescale(radii, min_radius, max_radius,
+                                  self.figure_width * 0.005,
+                                  self.figure_width * 0.08)
+        self.primary_radius = rescale(
+            [self.primary_body.radius], min_radius, max_radius,
+            self.figure_width * 0.005, self.figure_width * 0.08)[0]
+
+    def _pixels_per_unit(self) -> float:
+        """Returns the number of display pixels per figure (data) unit.
+
+        :return: pixels per data unit
+        :rtype: float
+        """
+        self.ax.apply_aspect()
+        (x0, _), (x1, _) = self.ax.transData.transform([(0, 0), (1, 0)])
+        return abs(x1 - x0)
+
+    def _band_segments(self, start: float) -> Tuple[List[np.ndarray],
+                                                    np.ndarray, np.ndarray]:
+        """Returns the polyline segments, line widths and colors of the
+        (possibly merged) orbital paths over the half orbit from the given
+        angle. Each path is sampled according to its projected length in
+        pixels.
+
+        :param float start: the angle (radians) the half orbit starts at
+        :return: segments, line widths (points), RGBA colors
+        :rtype: Tuple[List[np.ndarray], np.ndarray, np.ndarray]
+        """
+        pixels_per_unit = self._pixels_per_unit()
+        bands = merge_into_bands(self.widths / 2 * pixels_per_unit,
+                                 self.min_band_separation)
+        widths = np.array([self.widths[b].mean() for b in bands])
+        heights = np.array([self.heights[b].mean() for b in bands])
+        counts = np.array([len(b) for b in bands])
+        spans = np.array([(self.widths[b[-1]] - self.widths[b[0]]) / 2
+                          for b in bands]) * pixels_per_unit
+        # Half the perimeter of each ellipse (Ramanujan), in pixels
+        a, b = widths / 2, heights / 2
+        half_perimeters = np.pi / 2 * (3 * (a + b) - np.sqrt(
+            (3 * a + b) * (a + 3 * b))) * pixels_per_unit
+        resolutions = np.clip(
+            np.ceil(half_perimeters / self.segment_pixels).astype(int) + 1,
+            min(self.min_arc_resolution, self.arc_resolution),
+            self.arc_resolution)
+        segments = []
+        for width, height, resolution in zip(widths, heights, resolutions):
+            theta = np.linspace(start, start + np.pi, resolution)
+            segments.append(np.column_stack((width / 2 * np.cos(theta),
+                                             height / 2 * np.sin(theta))))
+        line_widths = np.maximum(spans * 72 / self.dpi, 1.0)
+        colors = np.tile(to_rgba(self.edge_color), (len(bands), 1))
+        colors[:, 3] = 1 - np.power(0.5, counts)
+        colors[counts == 1, 3] = 1.0
+        return segments, line_widths, colors
+
+    def _build_artists(self) -> None:
+        """Builds the collections for the static and dynamic layers.
+
+        :return: None
+        """
+        ax = self.ax
+        ax.set_xlim(-(self.figure_width + self.figure_width * 0.1),
+                    self.figure_width + self.figure_width * 0.1)
+        ax.set_ylim(-self.figure_height, self.figure_height)
+        # Orbital paths: the far half is drawn behind the bodies and the near
+        # half in front of them
+        for zorder, start in ((1, 0.0), (3, np.pi)):
+            segments, line_widths, colors = self._band_segments(start)
+            ax.add_collection(LineCollection(
+                segments, linewidths=line_widths, colors=colors,
+                zorder=zorder))
+        self.primary_artist = EllipseCollection(
+            [self.primary_radius * 2], [self.primary_radius * 2], [0.0],
+            units="xy", offsets=[(0.0, 0.0)],
+            offset_transform=ax.transData,
+            facecolors=self.primary_color, edgecolors=self.edge_color,
+            zorder=2)
+        ax.add_collection(self.primary_artist)
+        self.bodies_artist = EllipseCollection(
+            self.body_radii * 2, self.body_radii * 2,
+            np.zeros(len(self.orbits)), units="xy",
+            offsets=self.default_positions(), offset_transform=ax.transData,
+            facecolors=self.orbiting_color, edgecolors=self.edge_color,
+            zorder=2)
+        ax.add_collection(self.bodies_artist)
+        # Set x_ticks to be scaled
+        x_ticks = [-self.figure_width, -(self.figure_width / 2), 0.0,
+                   self.figure_width / 2, self.figure_width]
+        ax.set_xticks(x_ticks)
+        ax.set_xticklabels([f"{item * self.max_orbit:.2E} km"
+                            for item in x_ticks])
+        # Remove y_axis
+        ax.get_yaxis().set_visible(False)
+        ax.set_title(f"Orbiting Bodies around {self.primary_body.name}")
+        ax.tick_params(axis='both', which='major', labelsize=10)
+        if len(self.orbits) <= self.max_legend_entries:
+            ax.legend(handles=self._legend_handles(), loc=2,
+                      prop={'size': 10},
+                      title="Orbiting Bodies and Orbital Period")
+
+    def _legend_handles(self) -> List[Line2D]:
+        """Returns proxy artists for the legend.
+
+        :return: legend handles
+        :rtype: List[Line2D]
+        """
+        handles = [Line2D([], [], marker="o", linestyle="",
+                          markerfacecolor=self.primary_color,
+                          markeredgecolor=self.edge_color,
+                          label=self.primary_body.name)]
+        for orbit in self.orbits:
+            handles.append(Line2D(
+                [], [], marker="o", linestyle="",
+                markerfacecolor=self.orbiting_color,
+                markeredgecolor=self.edge_color,
+                label=f"{orbit.orbiting_body.name}: "
+                      f"p = {orbit.period:0,.0f} days"))
+        return handles
+
+    def default_positions(self) -> np.ndarray:
+        """Returns the position of every orbiting body at the right-hand
+        vertex of its orbit (i.e., where Universe.plot_orbits places them).
+
+        :return: array of (x, y) positions in figure units
+        :rtype: np.ndarray
+        """
+        return np.column_stack((self.widths / 2,
+                                np.zeros(len(self.orbits))))
+
+    def project(self, eccentric_anomaly: np.ndarray) -> np.ndarray:
+        """Projects eccentric anomalies onto the drawn (centered, squashed)
+        orbital paths. The last axis must index the renderer's orbits,
+        which are sorted by semi-major axis.
+
+        :param np.ndarray eccentric_anomaly: eccentric anomalies (radians) of
+        shape (..., n_orbits)
+        :return: array of shape (..., n_orbits, 2) of positions in figure
+        units
+        :rtype: np.ndarray
+        """
+        return np.stack((self.widths / 2 * np.cos(eccentric_anomaly),
+                         self.heights / 2 * np.sin(eccentric_anomaly)),
+                        axis=-1)
+
+    def draw(self) -> None:
+        """Draws the full figure (static and dynamic layers).
+
+        :return: None
+        """
+        self.canvas.draw()
+
+    def draw_static_layer(self) -> None:
+        """Draws and caches the static layer (everything except the orbiting
+        bodies).
+
+        :return: None
+        """
+        self.bodies_artist.set_visible(False)
+        self.canvas.draw()
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._background_size = self.canvas.get_width_height()
+        self.bodies_artist.set_visible(True)
+
+    def invalidate(self) -> None:
+        """Discards the cached static layer (e.g., after the figure has been
+        resized or restyled).
+
+        :return: None
+        """
+        self._background = None
+        self._background_size = None
+
+    def render_frame(self, positions: np.ndarray = None) -> np.ndarray:
+        """Redraws only the orbiting bodies on top of the cached static
+        layer, returning the rasterized frame.
+
+        :param np.ndarray positions: (n_orbits, 2) array of body positions in
+        figure units; if None, the default positions are used
+        :return: (height, width, 4) RGBA array of the frame
+        :rtype: np.ndarray
+        """
+        if self._background is None or \
+                self._background_size != self.canvas.get_width_height():
+            self.draw_static_layer()
+        if positions is None:
+            positions = self.default_positions()
+        self.canvas.restore_region(self._background)
+        self.bodies_artist.set_offsets(positions)
+        self.ax.draw_artist(self.bodies_artist)
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+    def render(self, target: Union[str, BinaryIO] = None,
+               image_format: str = "png") -> Union[bytes, None]:
+        """Rasterizes the full figure to a file or buffer without a GUI.
+
+        :param target: a file name or writable binary buffer; if None,
+        the encoded image is returned as bytes
+        :param str image_format: image format understood by matplotlib
+        (e.g., "png", "jpg", "svg")
+        :return: the encoded image if no target was supplied, else None
+        :rtype: Union[bytes, None]
+        """
+        buffer = io.BytesIO() if target is None else target
+        self.figure.savefig(buffer, format=image_format, dpi=self.dpi)
+        if target is None:
+            return buffer.getvalue()
+        return None
+
+    @staticmethod
+    def save_frame(frame: np.ndarray, target: Union[str, BinaryIO],
+                   image_format: str = "png") -> None:
+        """Writes an RGBA frame returned by render_frame() to a file or
+        buffer.
+
+        :param np.ndarray frame: RGBA frame
+        :param target: a file name or writable binary buffer
+        :param str image_format: image format understood by matplotlib
+        :return: None
+        """
+        matplotlib.image.imsave(target, frame, format=image_format)
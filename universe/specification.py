@@ -0,0 +1,142 @@
+"""Declarative (JSON-compatible) specifications of a Universe.
+
+A specification is a plain dictionary, e.g.:
+
+    {
+        "name": "Solar System",
+        "bodies": [
+            {"type": "SolarBody", "name": "Sun", "mass": 1.9885e+30,
+             "radius": 695700, "temperature": 5778},
+            {"type": "PlanetaryBody", "name": "Earth", "mass": 5.97e+24,
+             "radius": 6378.0}
+        ],
+        "orbits": [
+            {"primary": "Sun", "orbiting": "Earth",
+             "semimajor_axis": 1.496e+08, "eccentricity": 0.017}
+        ]
+    }
+
+Bodies require the arguments of their class (BlackHole and Barycenter:
+mass; SolarBody: mass, radius, temperature; PlanetaryBody and
+CelestialBody: mass, radius). Orbits may also supply argument_of_periapsis
+and mean_anomaly_at_epoch, and the members of a binary or multiple
+"type": "BarycentricOrbit" (see orbital_dynamics.binary).
+"""
+import hashlib
+import json
+from typing import Any, Dict
+from celestial_bodies.celestial_bodies import CelestialBody, BlackHole, \
+    SolarBody, PlanetaryBody, Barycenter
+from orbital_dynamics.orbit import Orbit, BarycentricOrbit
+
+body_types = {
+    "CelestialBody": (CelestialBody, ("mass", "radius")),
+    "BlackHole": (BlackHole, ("mass",)),
+    "SolarBody": (SolarBody, ("mass", "radius", "temperature")),
+    "PlanetaryBody": (PlanetaryBody, ("mass", "radius")),
+    "Barycenter": (Barycenter, ("mass",)),
+}
+orbit_types = {
+    "Orbit": Orbit,
+    "BarycentricOrbit": BarycentricOrbit,
+}
+orbit_fields = ("semimajor_axis", "eccentricity", "argument_of_periapsis",
+                "mean_anomaly_at_epoch")
+
+
+def body_from_specification(spec: Dict[str, Any]) -> CelestialBody:
+    """Builds a celestial body from its specification.
+
+    :param Dict[str, Any] spec: the body specification
+    :return: the celestial body
+    :rtype: CelestialBody
+    :raises: KeyError if the type or a required field is unknown/missing
+    """
+    body_type = spec.get("type", "CelestialBody")
+    if body_type not in body_types:
+        raise KeyError(f"Unknown body type {body_type}; choose from "
+                       f"{', '.join(body_types)}")
+    body_class, fields = body_types[body_type]
+    missing = [field for field in fields if field not in spec]
+    if len(missing) > 0:
+        raise KeyError(f"{body_type} {spec.get('name')} is missing "
+                       f"{', '.join(missing)}")
+    return body_class(*[spec[field] for field in fields],
+                      name=spec.get("name"))
+
+
+def body_to_specification(body: CelestialBody) -> Dict[str, Any]:
+    """Returns the specification of a celestial body.
+
+    :param CelestialBody body: the celestial body
+    :return: the body specification
+    :rtype: Dict[str, Any]
+    """
+    body_type = body.__class__.__name__
+    if body_type not in body_types:
+        raise KeyError(f"Cannot specify body type {body_type}")
+    spec = {"type": body_type, "name": body.name}
+    for field in body_types[body_type][1]:
+        spec[field] = getattr(body, field)
+    return spec
+
+
+def universe_from_specification(spec: Dict[str, Any]):
+    """Builds a Universe from its specification.
+
+    :param Dict[str, Any] spec: the universe specification
+    :return: the universe
+    :rtype: Universe
+    """
+    from universe.universe import Universe
+    universe = Universe(spec.get("name"))
+    for body_spec in spec.get("bodies", []):
+        universe.add_celestial_body(body_from_specification(body_spec))
+    bodies = universe.celestial_bodies
+    for orbit_spec in spec.get("orbits", []):
+        kwargs = {field: orbit_spec[field] for field in orbit_fields
+                  if field in orbit_spec}
+        orbit_type = orbit_spec.get("type", "Orbit")
+        if orbit_type not in orbit_types:
+            raise KeyError(f"Unknown orbit type {orbit_type}; choose from "
+                           f"{', '.join(orbit_types)}")
+        universe.add_orbit(orbit_types[orbit_type](
+            bodies[orbit_spec["primary"]], bodies[orbit_spec["orbiting"]],
+            **kwargs))
+    return universe
+
+
+def universe_to_specification(universe) -> Dict[str, Any]:
+    """Returns the specification of a Universe.
+
+    :param Universe universe: the universe
+    :return: the universe specification
+    :rtype: Dict[str, Any]
+    """
+    orbits = []
+    for orbit in universe.orbits:
+        orbit_spec = {"primary": orbit.primary_body.name,
+                      "orbiting": orbit.orbiting_body.name}
+        orbit_spec.update({field: getattr(orbit, field)
+                           for field in orbit_fields})
+        if isinstance(orbit, BarycentricOrbit):
+            orbit_spec["type"] = BarycentricOrbit.__name__
+        orbits.append(orbit_spec)
+    return {
+        "name": universe.name,
+        "bodies": [body_to_specification(body)
+                   for body in universe.celestial_bodies.values()],
+        "orbits": orbits,
+    }
+
+
+def specification_digest(spec: Dict[str, Any]) -> str:
+    """Returns a stable digest of a specification, independent of key
+    order.
+
+    :param Dict[str, Any] spec: the specification
+    :return: hexadecimal SHA-256 digest
+    :rtype: str
+    """
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
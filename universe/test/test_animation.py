@@ -0,0 +1,55 @@
+import math
+import pytest
+import numpy as np
+import matplotlib.image
+from universe.animation import OrbitAnimation
+
+
+@pytest.fixture
+def animation(build_universe):
+    universe = build_universe(["Mercury", "Venus", "Earth"])
+    return universe.animate_orbits("Sun", 0.0, 60.0, 6, dpi=20)
+
+
+def test_frames_advance_the_bodies(animation):
+    assert len(animation) == 6
+    # Every body moves forward along its orbit, by its mean motion
+    assert np.all(np.diff(animation.eccentric_anomaly, axis=0) > 0)
+    mercury = np.argmin([orbit.semimajor_axis for orbit in animation.orbits])
+    assert animation.eccentric_anomaly[-1, mercury] - \
+        animation.eccentric_anomaly[0, mercury] == pytest.approx(
+            2 * math.pi * 60.0 / animation.orbits[mercury].period, rel=0.3)
+    assert not np.allclose(animation.positions(0), animation.positions(5))
+    frames = list(animation.frames())
+    assert len(frames) == 6
+    assert frames[0].shape == frames[5].shape
+    assert not np.array_equal(frames[0], frames[5])
+
+
+def test_parallel_export_matches_serial(animation, tmp_path):
+    serial = animation.export_frames(str(tmp_path / "serial"), workers=1)
+    parallel = animation.export_frames(str(tmp_path / "parallel"),
+                                       workers=2)
+    assert [name.split("serial")[-1] for name in serial] == \
+        [name.split("parallel")[-1] for name in parallel]
+    for expected, actual in zip(serial, parallel):
+        np.testing.assert_array_equal(matplotlib.image.imread(actual),
+                                      matplotlib.image.imread(expected))
+
+
+def test_video_needs_ffmpeg(animation, tmp_path, monkeypatch):
+    monkeypatch.setattr("universe.animation.shutil.which",
+                        lambda name: None)
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        animation.export_video(str(tmp_path / "orbits.mp4"))
+    assert not (tmp_path / "orbits.mp4").exists()
+
+
+def test_invalid_animations(build_universe):
+    universe = build_universe(["Earth"])
+    orbits = universe.orbits
+    sun = universe.celestial_bodies["Sun"]
+    with pytest.raises(ValueError):
+        OrbitAnimation(sun, orbits, 0.0, 10.0, 0)
+    with pytest.raises(ValueError):
+        OrbitAnimation(sun, orbits, 10.0, 0.0, 5)
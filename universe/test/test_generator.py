@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from celestial_bodies.celestial_bodies import PlanetaryBody
+from orbital_dynamics.orbit import Orbit
+from universe.generator import *
+from universe.universe import Universe
+
+
+def test_reproducible_across_workers():
+    serial = generate_star_systems(3000, seed=7, chunk_size=1000)
+    parallel = generate_star_systems(3000, seed=7, chunk_size=1000,
+                                     workers=2)
+    for column in StarSystemPopulation.star_columns + \
+            StarSystemPopulation.planet_columns:
+        assert np.array_equal(getattr(serial, column),
+                              getattr(parallel, column))
+    other = generate_star_systems(3000, seed=8, chunk_size=1000)
+    assert not np.array_equal(serial.star_mass, other.star_mass)
+
+
+def test_stellar_masses():
+    rng = np.random.default_rng(0)
+    masses = sample_stellar_masses(rng, 100000)
+    assert masses.min() >= 0.08 and masses.max() <= 120
+    # Kroupa: roughly 80% of stars are below 0.5 solar masses
+    assert 0.75 < np.mean(masses < 0.5) < 0.85
+    temperature = calculate_effective_temperature(
+        calculate_main_sequence_luminosity(1.0),
+        calculate_main_sequence_radius(1.0))
+    assert temperature == pytest.approx(5778)
+
+
+def test_feasible_systems_build_universes():
+    population = generate_star_systems(2000, seed=1, feasible_only=True)
+    assert population.feasible.all()
+    assert len(population.planet_mass) == population.planet_counts.sum()
+    for system in range(50):
+        universe = population.to_universe(system)
+        assert len(universe.celestial_bodies) == \
+            population.planet_counts[system] + 1
+    planets = population.planet_counts[0]
+    assert len(population.to_universe(0).orbits) == planets
+
+
+def test_infeasible_system():
+    population = generate_star_systems(2000, seed=1)
+    system = np.flatnonzero(~population.feasible)[0]
+    with pytest.raises(ValueError):
+        population.to_universe(system)
+    crowded = population.select([system])
+    assert not crowded.feasible[0]
+    assert np.array_equal(
+        crowded.semimajor_axis,
+        population.semimajor_axis[population.planet_offsets[system]:
+                                  population.planet_offsets[system + 1]])
+
+
+def test_add_orbits_is_all_or_nothing():
+    universe = generate_star_systems(
+        200, seed=3, feasible_only=True).to_universe(0)
+    star = universe.celestial_bodies["System 0"]
+    moon = PlanetaryBody(1e20, 100, name="Moon")
+    universe.add_celestial_bodies([moon])
+    with pytest.raises(ValueError):
+        universe.add_celestial_bodies([PlanetaryBody(1, 1, name="X"), moon])
+    assert "X" not in universe.celestial_bodies
+    orbits = len(universe.orbits)
+    planet = universe.orbits[0].orbiting_body
+    with pytest.raises(AttributeError):
+        universe.add_orbits([Orbit(star, moon, 1e9, 0.0),
+                             Orbit(star, planet, 2e9, 0.0)])
+    assert len(universe.orbits) == orbits
+
+
+def test_bulk_universe_matches_incremental():
+    universe = generate_star_systems(
+        200, seed=3, feasible_only=True).to_universe(0)
+    incremental = Universe()
+    for body in universe.celestial_bodies.values():
+        incremental.add_celestial_body(body)
+    for orbit in universe.orbits:
+        incremental.add_orbit(orbit)
+    assert incremental.orbital_graph == universe.orbital_graph
+
+
+def test_replay_chunk():
+    population = generate_star_systems(2500, seed=11, chunk_size=1000)
+    chunk = replay_chunk(2500, 2, seed=11, chunk_size=1000)
+    assert len(chunk.star_mass) == 500
+    assert np.array_equal(chunk.star_mass, population.star_mass[2000:])
+    assert np.array_equal(
+        chunk.semimajor_axis,
+        population.semimajor_axis[population.planet_offsets[2000]:])
+    with pytest.raises(ValueError):
+        replay_chunk(2500, 3, seed=11, chunk_size=1000)
@@ -0,0 +1,106 @@
+import csv
+import numpy as np
+import pytest
+from universe.ingestion import *
+from universe.universe import Universe
+
+catalog = "name,type,mass_kg,radius,temperature,primary,semimajor_axis," \
+    """eccentricity
+Earth,PlanetaryBody,5.97e+24,6378.0,,Sun,1.496e+08,0.017
+Sun,SolarBody,1.9885e+30,695700,5778,,,
+Moon,,7.35e+22,1737,,Earth,384400,0.055
+Comet,Asteroid,1e+12,1,,Sun,1e+08,0.5
+Heavy,PlanetaryBody,abc,1000,,Sun,1e+08,0.1
+Sun,SolarBody,1.9885e+30,695700,5778,,,
+Mars,PlanetaryBody,6.42e+23,3396,,Sun,2.279e+08,1.2
+Vulcan,PlanetaryBody,1e+23,1000,,Sun,1e+05,0.0
+Rogue,PlanetaryBody,1e+23,1000,,Nemesis,1e+08,0.0
+Broken,row
+"""
+
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text(catalog)
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_ingest_into_universe(catalog_file, tmp_path, chunk_size):
+    universe = Universe("Catalog")
+    rejects = str(tmp_path / "rejects.csv")
+    report = ingest(catalog_file, UniverseSink(universe),
+                    chunk_size=chunk_size, mapping={"mass": "mass_kg"},
+                    rejects=rejects)
+    assert report == IngestionReport(10, 3, 7)
+    assert set(universe.celestial_bodies) == {"Sun", "Earth", "Moon"}
+    assert universe.celestial_bodies["Moon"].primary_body.name == "Earth"
+    assert universe.celestial_bodies["Moon"].__class__.__name__ == \
+        "CelestialBody"
+    with open(rejects, newline="") as f:
+        reasons = {row["row"]: row["reason"] for row in csv.DictReader(f)}
+    assert reasons["3"] == "unknown type"
+    assert reasons["4"] == "missing mass"
+    assert reasons["5"] == "duplicate name"
+    assert reasons["6"].startswith("eccentricity")
+    assert "colliding" in reasons["7"]
+    assert reasons["8"] == "unknown primary"
+    assert reasons["9"] == "malformed row"
+
+
+def test_ingest_into_columnar_store(catalog_file, tmp_path):
+    directory = tmp_path / "store"
+    report = ingest(catalog_file, ColumnarSink(str(directory)),
+                    chunk_size=4, mapping={"mass": "mass_kg"})
+    # The columnar store only applies the per-row checks
+    assert report.accepted == 6
+    chunks = list(read_columnar(str(directory)))
+    assert len(chunks) == 3
+    names = np.concatenate([chunk["name"] for chunk in chunks])
+    assert list(names) == ["Earth", "Sun", "Moon", "Sun", "Vulcan", "Rogue"]
+    rows = np.concatenate([chunk["row"] for chunk in chunks])
+    assert list(rows) == [0, 1, 2, 5, 7, 8]
+    assert chunks[0]["mass"].dtype == float
+
+
+def test_validate_chunk_leaves_the_fields_untouched(catalog_file):
+    (chunk, _), = read_csv_chunks(catalog_file, 100)
+    fields = map_columns(chunk, {"mass": "mass_kg"})
+    types = fields["type"].copy()
+    angles = fields["argument_of_periapsis"].copy()
+    completed, reasons = validate_chunk(fields)
+    assert np.array_equal(fields["type"], types)
+    assert np.array_equal(fields["argument_of_periapsis"], angles,
+                          equal_nan=True)
+    assert completed["type"][2] == "CelestialBody"
+    assert np.isfinite(completed["argument_of_periapsis"]).all()
+    assert reasons.tolist()[:3] == ["", "", ""]
+
+
+def test_map_columns_unknown_field():
+    with pytest.raises(KeyError):
+        map_columns({"row": np.arange(1)}, {"weight": "mass"})
+
+
+def test_unknown_file_format(catalog_file):
+    with pytest.raises(ValueError):
+        ingest(catalog_file, ColumnarSink, file_format="xlsx")
+
+
+def test_ingest_with_units(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text("name,type,mass,radius,temperature,primary,a,e\n"
+                    "Sun,SolarBody,1,1,5778,,,\n"
+                    "Earth,PlanetaryBody,1,1,,Sun,1,0.017\n")
+    universe = Universe()
+    ingest(str(path), UniverseSink(universe),
+           mapping={"semimajor_axis": "a", "eccentricity": "e"},
+           units={"mass": "solar_mass", "radius": "solar_radius",
+                  "semimajor_axis": "au"})
+    bodies = universe.celestial_bodies
+    assert bodies["Sun"].mass == pytest.approx(1.989e+30)
+    assert bodies["Sun"].radius == pytest.approx(695700)
+    assert universe.orbits[0].semimajor_axis == pytest.approx(1.496e+08)
+    with pytest.raises(KeyError):
+        ingest(str(path), UniverseSink(Universe()), units={"name": "km"})
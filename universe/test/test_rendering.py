@@ -0,0 +1,84 @@
+import io
+import pytest
+import numpy as np
+from universe.rendering import OrbitRenderer, rescale, merge_into_bands
+
+
+@pytest.mark.parametrize("values,expected", [
+    ([0, 5, 10], [1, 3, 5]),
+    ([10, 10], [5, 5]),
+])
+def test_rescale(values, expected):
+    low, high = min(values), max(values)
+    assert np.allclose(rescale(values, low, high, 1, 5), expected)
+
+
+@pytest.mark.parametrize("pixel_sizes,expected", [
+    ([], []),
+    ([10.0], [[0]]),
+    ([10.0, 12.0, 14.0], [[0], [1], [2]]),
+    ([10.0, 10.2, 10.9, 11.0, 20.0], [[0, 1, 2], [3], [4]]),
+])
+def test_merge_into_bands(pixel_sizes, expected):
+    bands = merge_into_bands(pixel_sizes, min_separation=1.0)
+    assert [list(b) for b in bands] == expected
+
+
+def test_render_writes_an_image(build_universe):
+    universe = build_universe(["Mercury", "Venus", "Earth"])
+    renderer = OrbitRenderer(universe.celestial_bodies["Sun"],
+                             universe.orbits, dpi=20)
+    image = renderer.render()
+    assert image[:8] == b"\x89PNG\r\n\x1a\n"
+    output = io.BytesIO()
+    assert renderer.render(output, image_format="jpg") is None
+    assert output.getvalue()[:2] == b"\xff\xd8"
+
+
+def test_plot_orbits_to_buffer(build_universe):
+    universe = build_universe(["Earth", "Mars"])
+    output = io.BytesIO()
+    renderer = universe.plot_orbits("Sun", output=output, dpi=20)
+    assert isinstance(renderer, OrbitRenderer)
+    assert output.getvalue()[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_render_frame_reuses_the_static_layer(monkeypatch, build_universe):
+    universe = build_universe(["Venus", "Earth", "Mars"])
+    renderer = OrbitRenderer(universe.celestial_bodies["Sun"],
+                             universe.orbits, dpi=20)
+    draws = []
+    draw_static_layer = renderer.draw_static_layer
+
+    def counting_draw_static_layer():
+        draws.append(1)
+        draw_static_layer()
+
+    monkeypatch.setattr(renderer, "draw_static_layer",
+                        counting_draw_static_layer)
+    first = renderer.render_frame()
+    background = renderer._background
+    positions = renderer.project(np.full(3, 2.0))
+    second = renderer.render_frame(positions)
+    assert len(draws) == 1
+    assert renderer._background is background
+    assert first.shape == second.shape and not np.array_equal(first, second)
+    # Invalidating the layer redraws it once more
+    renderer.invalidate()
+    renderer.render_frame()
+    assert len(draws) == 2
+
+
+def test_arc_resolution_follows_the_pixel_size(build_universe):
+    universe = build_universe(["Mercury", "Earth", "Jupiter", "Neptune"])
+    sun = universe.celestial_bodies["Sun"]
+    small = OrbitRenderer(sun, universe.orbits, dpi=20)
+    large = OrbitRenderer(sun, universe.orbits, dpi=180, arc_resolution=64)
+    small_points = [len(s) for s in small.ax.collections[0].get_segments()]
+    large_points = [len(s) for s in large.ax.collections[0].get_segments()]
+    # Larger orbits get more points, up to arc_resolution
+    assert small_points == sorted(small_points)
+    assert OrbitRenderer.min_arc_resolution <= small_points[0] < \
+        small_points[-1] < 128
+    assert max(large_points) == 64
+    assert all(s <= l for s, l in zip(small_points, large_points))
@@ -0,0 +1,21 @@
+import pytest
+from universe.specification import *
+
+
+def test_round_trip(specification):
+    universe = universe_from_specification(specification)
+    assert universe.celestial_bodies["Earth"].primary_body.name == "Sun"
+    spec = universe_to_specification(universe)
+    assert universe_to_specification(universe_from_specification(spec)) \
+        == spec
+    assert specification_digest(spec) == specification_digest(
+        dict(reversed(list(spec.items()))))
+
+
+@pytest.mark.parametrize("body_spec", [
+    {"type": "Comet", "name": "X", "mass": 1.0, "radius": 1.0},
+    {"type": "SolarBody", "name": "X", "mass": 1.0, "radius": 1.0},
+])
+def test_key_error_body_from_specification(body_spec):
+    with pytest.raises(KeyError):
+        body_from_specification(body_spec)
@@ -1,7 +1,30 @@
-from typing import List, Dict
-from orbital_dynamics.orbit import *
-import matplotlib.pyplot as plt
-from matplotlib.patches import Arc, Circle
+from collections import deque
+import numpy as np
+from typing import TYPE_CHECKING, List, Dict, Iterable, Tuple, Union, \
+    BinaryIO
+from celestial_bodies.celestial_bodies import CelestialBody, BlackHole, \
+    SolarBody, PlanetaryBody, Barycenter
+from orbital_dynamics.orbit import Orbit, BarycentricOrbit, CollisionError, \
+    UnstableOrbit
+from orbital_dynamics.orbital_calculations import \
+    calculate_semiminor_axis_of_ellipse, calculate_perihelion_of_ellipse, \
+    calculate_aphelion_of_ellipse, calculate_orbital_period, \
+    calculate_planetary_surface_temperature
+from utilities.result_cache import content_hash
+
+# Plotting (and matplotlib) is imported by the methods that plot, so that
+# importing a Universe stays cheap for scripts and workers that never plot
+if TYPE_CHECKING:
+    from universe.rendering import OrbitRenderer
+    from universe.animation import OrbitAnimation
+
+__all__ = ["Universe", "CelestialBody", "BlackHole", "SolarBody",
+           "PlanetaryBody", "Barycenter", "Orbit", "BarycentricOrbit",
+           "CollisionError", "UnstableOrbit",
+           "calculate_semiminor_axis_of_ellipse",
+           "calculate_perihelion_of_ellipse", "calculate_aphelion_of_ellipse",
+           "calculate_orbital_period",
+           "calculate_planetary_surface_temperature"]
 
 
 class Universe:
@@ -72,6 +95,141 @@ class Universe:
         """
         return self.__orbits
 
+    def content_hash(self) -> str:
+        """Returns a stable hash of the bodies and orbits in the Universe
+        (see utilities.result_cache.content_hash), suitable as a cache key
+        for results derived from them.
+
+        :return: hexadecimal SHA-256 digest
+        :rtype: str
+        """
+        return content_hash(self)
+
+    @property
+    def orbital_graph(self) -> Dict[CelestialBody, dict]:
+        """Simple getter for the acyclic graph of orbits, represented as a
+        nested dictionary (see _build_acyclic_graph_of_orbits).
+
+        :return: nested dictionary of CelestialBodies
+        :rtype: Dict[CelestialBody, dict]
+        """
+        return self.__orbital_graph
+
+    def flatten_orbital_graph(self) -> Tuple[List[CelestialBody], List[int],
+                                             List[Orbit]]:
+        """Flattens the acyclic graph of orbits in breadth-first order, so
+        that every primary body comes before the bodies orbiting it.
+
+        :return: the bodies, the index of each body's primary body (-1 for
+        the roots of the graph), and the orbit of each body around its
+        primary body (None for the roots)
+        :rtype: Tuple[List[CelestialBody], List[int], List[Orbit]]
+        """
+        orbit_of = {o.orbiting_body: o for o in self.__orbits}
+        bodies, parents, orbits = [], [], []
+        queue = deque((root, edges, -1)
+                      for root, edges in self.__orbital_graph.items())
+        while len(queue) > 0:
+            body, edges, parent = queue.popleft()
+            bodies.append(body)
+            parents.append(parent)
+            orbits.append(orbit_of.get(body))
+            index = len(bodies) - 1
+            queue.extend((child, child_edges, index)
+                         for child, child_edges in edges.items())
+        return bodies, parents, orbits
+
+    def state_vectors(self, time: float = 0.0) -> Tuple[
+            List[CelestialBody], np.ndarray, np.ndarray]:
+        """Returns the positions and velocities of every body in the
+        acyclic graph of orbits at the given time, by summing each Keplerian
+        orbit up the graph. Each root sits at rest at the origin.
+
+        :param float time: time since epoch in days
+        :return: the bodies (in the order of flatten_orbital_graph), their
+        (n, 3) positions in kilometers and (n, 3) velocities in kilometers /
+        second
+        :rtype: Tuple[List[CelestialBody], np.ndarray, np.ndarray]
+        """
+        bodies, positions, velocities = self.propagate_state_vectors(time)
+        return bodies, positions[0], velocities[0]
+
+    def propagate_state_vectors(self, times, barycentric: bool = False) \
+            -> Tuple[List[CelestialBody], np.ndarray, np.ndarray]:
+        """Returns the positions and velocities of every body in the
+        acyclic graph of orbits at each of the given times, propagating each
+        orbit to every time at once.
+
+        Barycenters of binaries and multiples (which are not bodies, but the
+        points their members orbit) are included, so that each body's
+        position sums up the graph; leave them out of mass-weighted sums.
+
+        :param times: times since epoch in days (scalar or (t,) array)
+        :param bool barycentric: if True, positions and velocities are
+        relative to the center of mass of the bodies (excluding
+        barycenters) rather than to the roots at rest at the origin
+        :return: the bodies (in the order of flatten_orbital_graph), their
+        (t, n, 3) positions in kilometers and (t, n, 3) velocities in
+        kilometers / second
+        :rtype: Tuple[List[CelestialBody], np.ndarray, np.ndarray]
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        bodies, parents, orbits = self.flatten_orbital_graph()
+        positions = np.zeros((len(times), len(bodies), 3))
+        velocities = np.zeros((len(times), len(bodies), 3))
+        for idx, (parent, orbit) in enumerate(zip(parents, orbits)):
+            if parent < 0:
+                continue
+            positions[:, idx, :2] = orbit.position_at(times)
+            velocities[:, idx, :2] = orbit.velocity_at(times)
+            positions[:, idx] += positions[:, parent]
+            velocities[:, idx] += velocities[:, parent]
+        if barycentric:
+            masses = np.array([0.0 if isinstance(body, Barycenter)
+                               else body.mass for body in bodies])
+            weights = masses / masses.sum()
+            positions -= np.einsum("n,tnk->tk", weights,
+                                   positions)[:, np.newaxis]
+            velocities -= np.einsum("n,tnk->tk", weights,
+                                    velocities)[:, np.newaxis]
+        return bodies, positions, velocities
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Returns the bodies and their orbits as columns (in the order of
+        flatten_orbital_graph), e.g., to share them with worker processes
+        (see utilities.shared_arrays) instead of pickling the objects.
+
+        Columns: name, type, mass, radius, density, temperature (NaN if the
+        body has none), parent (the index of the primary body, -1 for
+        roots), and
+        the orbit's semimajor_axis, eccentricity, argument_of_periapsis,
+        mean_anomaly_at_epoch and gravitational_parameter (NaN for roots).
+
+        :return: the columns
+        :rtype: Dict[str, np.ndarray]
+        """
+        bodies, parents, orbits = self.flatten_orbital_graph()
+        columns = {
+            "name": np.array([body.name for body in bodies], dtype=str),
+            "type": np.array([body.__class__.__name__ for body in bodies],
+                             dtype=str),
+            "mass": np.array([body.mass for body in bodies], dtype=float),
+            "radius": np.array([body.radius for body in bodies], dtype=float),
+            "density": np.array([body.density for body in bodies],
+                                dtype=float),
+            "temperature": np.array(
+                [getattr(body, "temperature", np.nan) for body in bodies],
+                dtype=float),
+            "parent": np.array(parents, dtype=np.int64),
+        }
+        for field in ("semimajor_axis", "eccentricity",
+                      "argument_of_periapsis", "mean_anomaly_at_epoch",
+                      "gravitational_parameter"):
+            columns[field] = np.array(
+                [np.nan if orbit is None else getattr(orbit, field)
+                 for orbit in orbits], dtype=float)
+        return columns
+
     def alter_celestial_body_name(
             self, current_name: str, new_name: str) -> None:
         """Alters the name of a celestial body that is already part of a
@@ -123,6 +281,27 @@ class Universe:
                              f"this universe.")
         self.__celestial_bodies[celestial_body.name] = celestial_body
 
+    def add_celestial_bodies(
+            self, celestial_bodies: Iterable[CelestialBody]) -> None:
+        """Adds many celestial bodies to the universe at once (see
+        add_celestial_body). Either every body is added, or none is.
+
+        :param Iterable[CelestialBody] celestial_bodies: the bodies to add
+        :return: None
+        """
+        celestial_bodies = list(celestial_bodies)
+        names = set()
+        for celestial_body in celestial_bodies:
+            name = celestial_body.name
+            if name == "Unnamed Celestial Body":
+                continue
+            if name in self.__celestial_bodies or name in names:
+                raise ValueError(f"A celestial body with the name {name} "
+                                 f"already exist in this universe.")
+            names.add(name)
+        for celestial_body in celestial_bodies:
+            self.add_celestial_body(celestial_body)
+
     def __recursive_orbit_get_name(self, edges, return_list, level):
         """Recursively walks through a nested dictionary of orbits, returning
         the name of each celestial body offset by its relative ranking
@@ -227,8 +406,33 @@ class Universe:
             self.__orbits.append(orbit)
             self._build_acyclic_graph_of_orbits()
 
+    def add_orbits(self, orbits: Iterable[Orbit]) -> None:
+        """Adds many orbits to the universe at once, rebuilding the acyclic
+        graph of orbits only once (see add_orbit). Either every orbit is
+        added, or none is.
+
+        :param Iterable[Orbit] orbits: the orbits to add
+        :return: None
+        """
+        orbits = list(orbits)
+        in_orbit = {x.orbiting_body: x.primary_body for x in self.__orbits}
+        for orbit in orbits:
+            self._ensure_celestial_body_exists_in_universe(orbit.primary_body)
+            self._ensure_celestial_body_exists_in_universe(
+                orbit.orbiting_body)
+            if orbit.orbiting_body in in_orbit:
+                raise AttributeError(
+                    f"{orbit.orbiting_body.name} already orbits "
+                    f"{in_orbit[orbit.orbiting_body].name}")
+            in_orbit[orbit.orbiting_body] = orbit.primary_body
+        self.__orbits.extend(orbits)
+        self._build_acyclic_graph_of_orbits()
+
     def plot_orbits(self, primary_body: str,
-                    simulate_three_dimensions: float = True):
+                    simulate_three_dimensions: float = True,
+                    output: Union[str, BinaryIO] = None,
+                    image_format: str = "png", dpi: int = 180,
+                    min_band_separation: float = 1.0) -> "OrbitRenderer":
         """Plots the orbits around a chosen primary body.
 
         Scaling Notes:
@@ -246,6 +450,9 @@ class Universe:
         the orbiting bodies is always to scale, with an absolute minimum
         defined so as to be greater than the size of the primary body.
 
+        Orbits which would be drawn less than min_band_separation pixels
+        apart are merged into density bands (see OrbitRenderer).
+
         To Do List:
         [ ] color of sun based on chromaticity
         [ ] temperature of planet indicated on a secondary subplot
@@ -255,117 +462,65 @@ class Universe:
         celestial body that has been added to the universe)
         :param bool simulate_three_dimensions: whether or not to simulate a 3D
         effect by squashing the semi-minor axis
-        :return: None
+        :param output: a file name or writable binary buffer to rasterize the
+        plot into without a GUI; if None, the plot is shown with pyplot
+        :param str image_format: image format used when output is supplied
+        :param int dpi: resolution of the plot
+        :param float min_band_separation: the minimum separation (in pixels)
+        for two orbits to be drawn individually
+        :return: the renderer, which can be reused to redraw the orbiting
+        bodies over the cached orbits
+        :rtype: OrbitRenderer
         """
         if primary_body not in self.__celestial_bodies:
             raise KeyError(f"{primary_body} is not recognized as the name of "
                            f"a celestial body that has been added to this "
                            f"universe.")
-        if simulate_three_dimensions is True:
-            three_dim_val = 0.1
-        else:
-            three_dim_val = 1.0
-        background_orbits = []
-        foreground_orbits = []
-        celestial_bodies = []
+        from universe.rendering import OrbitRenderer
         # Gather orbits around primary body
         orbits = [o for o in self.__orbits
                   if o.primary_body == self.__celestial_bodies[primary_body]]
-        # Set origin and scaling values
-        origin = (0, 0)
-        figure_width = 16
-        figure_height = 9
-        min_orbit = orbits[0].semimajor_axis
-        max_orbit = orbits[-1].semimajor_axis
-        planet_radii = [o.orbiting_body.radius for o in orbits]
-        planet_radii = planet_radii + [orbits[0].primary_body.radius]
-        min_radius = min(planet_radii)
-        max_radius = max(planet_radii)
-
-        def scale_orbit(value, max_val=figure_width,
-                        min_val=figure_width * 0.15):
-            scaled = (value - min_orbit) / (max_orbit - min_orbit)
-            return scaled * (max_val - min_val) + min_val
-
-        def scale_planet(value, max_val=figure_width * 0.08,
-                         min_val=figure_width * 0.005):
-            scaled = (value - min_radius) / (max_radius - min_radius)
-            return scaled * (max_val - min_val) + min_val
-
-        # Add primary body
-        celestial_bodies.append(Circle(
-            origin,
-            scale_planet(self.__celestial_bodies[primary_body].radius),
-            facecolor="yellow",
-            edgecolor="black",
-            label=primary_body
-        ))
-        # Add orbiting bodies and their orbital paths
-        for orbit in orbits:
-            color = "blue"
-            name = orbit.orbiting_body.name
-            legend_name = f"{name}: p = {orbit.period:0,.0f} days"
-            radius = scale_planet(orbit.orbiting_body.radius)
-            width = scale_orbit(orbit.semimajor_axis) * 2
-            height = scale_orbit(orbit.semiminor_axis) * 2 * \
-                three_dim_val
-            background_orbits.append(Arc(
-                origin,
-                width,
-                height,
-                theta1=0.0,
-                theta2=180.0,
-                facecolor=color,
-                edgecolor="black",
-                fill=False,
-                label=legend_name
-            ))
-            foreground_orbits.append(Arc(
-                origin,
-                width,
-                height,
-                theta1=180.0,
-                theta2=0.0,
-                facecolor=color,
-                edgecolor="black",
-                fill=False,
-                label=legend_name
-            ))
-            celestial_bodies.append(Circle(
-                ((width / 2), 0),
-                radius,
-                facecolor=color,
-                edgecolor="black",
-                label=legend_name
-            ))
-        # Plot
-        fig, ax = plt.subplots(
-            subplot_kw={"aspect": "equal"},
-            figsize=(figure_width, figure_height),
-            dpi=180
-        )
-        for arc in background_orbits:
-            ax.add_artist(arc)
-            arc.set_clip_box(ax.bbox)
-        for circle in celestial_bodies:
-            ax.add_artist(circle)
-            circle.set_clip_box(ax.bbox)
-        for arc in foreground_orbits:
-            ax.add_artist(arc)
-            arc.set_clip_box(ax.bbox)
-        ax.set_xlim(-(figure_width + figure_width * 0.1),
-                    figure_width + figure_width * 0.1)
-        ax.set_ylim(-figure_height, figure_height)
-        # Set x_ticks to be scaled
-        x_ticks = [-figure_width, -(figure_width / 2), 0.0, figure_width / 2,
-                   figure_width]
-        ax.set_xticks(x_ticks)
-        x_tick_labels = [f"{item * max_orbit:.2E} km" for item in x_ticks]
-        ax.set_xticklabels(x_tick_labels)
-        # Remove y_axis
-        ax.get_yaxis().set_visible(False)
-        ax.set_title(f"Orbiting Bodies around {primary_body}")
-        plt.tick_params(axis='both', which='major', labelsize=10)
-        plt.legend(handles=celestial_bodies, loc=2, prop={'size': 10},
-                   title="Orbiting Bodies and Orbital Period")
-        plt.show()
+        figure = None
+        if output is None:
+            import matplotlib.pyplot as plt
+            figure = plt.figure(figsize=(OrbitRenderer.figure_width,
+                                         OrbitRenderer.figure_height),
+                                dpi=dpi)
+        renderer = OrbitRenderer(
+            self.__celestial_bodies[primary_body], orbits,
+            simulate_three_dimensions=simulate_three_dimensions, dpi=dpi,
+            figure=figure, min_band_separation=min_band_separation)
+        if output is None:
+            plt.show()
+        else:
+            renderer.render(output, image_format=image_format)
+        return renderer
+
+    def animate_orbits(self, primary_body: str, start: float, stop: float,
+                       frames: int, simulate_three_dimensions: bool = True,
+                       dpi: int = 100) -> "OrbitAnimation":
+        """Animates the orbiting bodies around a chosen primary body by
+        propagating their orbits from start to stop (see OrbitAnimation).
+
+        :param str primary_body: the name of the primary body (must be a
+        celestial body that has been added to the universe)
+        :param float start: time (in days) of the first frame
+        :param float stop: time (in days) of the last frame
+        :param int frames: the number of frames
+        :param bool simulate_three_dimensions: whether or not to simulate a 3D
+        effect by squashing the semi-minor axis
+        :param int dpi: resolution of the frames
+        :return: the animation, ready to be exported
+        :rtype: OrbitAnimation
+        """
+        if primary_body not in self.__celestial_bodies:
+            raise KeyError(f"{primary_body} is not recognized as the name of "
+                           f"a celestial body that has been added to this "
+                           f"universe.")
+        from universe.animation import OrbitAnimation
+        orbits = [o for o in self.__orbits
+                  if o.primary_body == self.__celestial_bodies[primary_body]]
+        return OrbitAnimation(
+            self.__celestial_bodies[primary_body], orbits, start, stop,
+            frames, simulate_three_dimensions=simulate_three_dimensions,
+            dpi=dpi)
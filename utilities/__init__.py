@@ -0,0 +1,12 @@
+from utilities.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "ResultCache": "utilities.result_cache",
+    "content_hash": "utilities.result_cache",
+    "RandomStreams": "utilities.random_streams",
+    "SharedArrays": "utilities.shared_arrays",
+    "map_ranges": "utilities.shared_arrays",
+    "convert": "utilities.units",
+    "tag": "utilities.units",
+    "evaluate": "utilities.units",
+})
@@ -0,0 +1,46 @@
+"""Lazily resolved package exports (PEP 562).
+
+A package re-exports the public names of its modules without importing the
+modules until a name is first used, so that importing a package (or one of
+its modules) costs only what is actually needed:
+
+    # universe/__init__.py
+    __getattr__, __dir__ = lazy_exports(__name__, {
+        "Universe": "universe.universe",
+        "OrbitRenderer": "universe.rendering",  # imports matplotlib
+    })
+
+    import universe
+    universe.Universe  # imports universe.universe now
+"""
+import importlib
+from typing import Callable, Dict, List, Tuple
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) \
+        -> Tuple[Callable[[str], object], Callable[[], List[str]]]:
+    """Returns the module __getattr__ and __dir__ of a package whose names
+    are imported from their modules on first use (and then cached in the
+    package).
+
+    :param str package: the name of the package (__name__)
+    :param Dict[str, str] exports: the module of each exported name
+    :return: __getattr__ and __dir__ for the package
+    :rtype: Tuple[Callable[[str], object], Callable[[], List[str]]]
+    """
+    namespace = importlib.import_module(package).__dict__
+
+    def __getattr__(name: str) -> object:
+        try:
+            module = exports[name]
+        except KeyError:
+            raise AttributeError(f"module {package!r} has no attribute "
+                                 f"{name!r}") from None
+        value = getattr(importlib.import_module(module), name)
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace) | set(exports))
+
+    return __getattr__, __dir__
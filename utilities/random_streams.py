@@ -0,0 +1,128 @@
+"""Reproducible random streams for parallel and chunked work.
+
+Every stochastic routine of the package draws from a stream that is
+addressed by a key (e.g., ("generator", chunk) or ("sweep", task, body))
+under a single root seed, rather than from a stream handed out in the order
+work happens to be scheduled. A stream therefore depends only on the root
+seed and its key: results are bit-identical whatever the number of worker
+processes or the order chunks finish in, and any one chunk (for instance,
+one that failed) can be regenerated alone.
+
+Keys are numpy SeedSequence spawn keys, so the streams are statistically
+independent, and the stream with key (i,) is the i-th child of
+SeedSequence(seed).spawn. Generators are built on Philox, a counter-based
+bit generator, so the state of a stream is just its key and a counter.
+
+Example:
+    streams = RandomStreams(42)
+    rng = streams.generator("perturbation", task, body)
+    streams.entropy  # record this to replay a run with seed=None
+"""
+import hashlib
+from typing import Tuple, Union
+import numpy as np
+
+Key = Union[int, str]
+SeedLike = Union[None, int, np.random.SeedSequence, "RandomStreams"]
+
+
+def _key_word(key: Key) -> int:
+    """Converts a key (a non-negative integer or a name) to a spawn key
+    word. Names are hashed, so that they do not depend on Python's
+    per-process hash randomization."""
+    if isinstance(key, str):
+        return int.from_bytes(hashlib.sha256(key.encode()).digest()[:4],
+                              "little")
+    key = int(key)
+    if key < 0:
+        raise ValueError(f"Stream keys ({key}) must be non-negative.")
+    return key
+
+
+class RandomStreams:
+    """A root seed and a namespace from which keyed random streams are
+    derived.
+    """
+
+    def __init__(self, seed: Union[None, int, np.random.SeedSequence] = None,
+                 namespace: Tuple[Key, ...] = ()) -> None:
+        """
+        :param seed: the root seed; if None, fresh entropy is drawn (see
+        entropy to replay it)
+        :param Tuple[Key, ...] namespace: a key prefix of every stream
+        """
+        if isinstance(seed, np.random.SeedSequence):
+            self.entropy = seed.entropy
+            prefix = tuple(seed.spawn_key)
+        else:
+            self.entropy = np.random.SeedSequence(seed).entropy
+            prefix = ()
+        self.spawn_key = prefix + tuple(_key_word(key) for key in namespace)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.entropy}, " \
+            f"namespace={self.spawn_key})"
+
+    def child(self, *key: Key) -> "RandomStreams":
+        """Returns the streams under a longer key prefix (e.g., one task's
+        streams, to be handed to a worker).
+
+        :param Key key: the key words appended to the namespace
+        :return: the streams of the child namespace
+        :rtype: RandomStreams
+        """
+        streams = RandomStreams.__new__(RandomStreams)
+        streams.entropy = self.entropy
+        streams.spawn_key = self.spawn_key + tuple(map(_key_word, key))
+        return streams
+
+    def seed_sequence(self, *key: Key) -> np.random.SeedSequence:
+        """Returns the seed sequence of the stream with the given key.
+
+        :param Key key: the key of the stream (e.g., a task, chunk and body
+        index)
+        :return: the seed sequence
+        :rtype: np.random.SeedSequence
+        """
+        return np.random.SeedSequence(
+            self.entropy,
+            spawn_key=self.spawn_key + tuple(map(_key_word, key)))
+
+    def generator(self, *key: Key) -> np.random.Generator:
+        """Returns a new generator of the stream with the given key; every
+        call with the same key starts the stream over.
+
+        :param Key key: the key of the stream
+        :return: the random number generator
+        :rtype: np.random.Generator
+        """
+        return np.random.Generator(np.random.Philox(self.seed_sequence(*key)))
+
+
+def as_streams(seed: SeedLike) -> RandomStreams:
+    """Returns the streams of a seed given as None, an integer, a seed
+    sequence, or streams.
+
+    :param SeedLike seed: the seed
+    :return: the streams
+    :rtype: RandomStreams
+    """
+    if isinstance(seed, RandomStreams):
+        return seed
+    return RandomStreams(seed)
+
+
+def as_generator(seed: Union[SeedLike, np.random.Generator]) \
+        -> np.random.Generator:
+    """Returns a generator for a seed given as None, an integer, a seed
+    sequence, streams (their root stream), or a generator (returned as is).
+
+    :param seed: the seed
+    :return: the random number generator
+    :rtype: np.random.Generator
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if isinstance(seed, np.random.SeedSequence):
+        return np.random.Generator(np.random.Philox(seed))
+    return as_streams(seed).generator()
@@ -0,0 +1,411 @@
+"""Content-addressed cache for expensive derived results.
+
+Results are keyed by a stable hash of the parameters they depend on (the
+physical parameters of bodies and orbits, not object identity) together
+with the version of the code that computed them, so that a cached result
+is reused across runs and processes for as long as neither changes.
+
+The cache has two tiers:
+    memory: a least-recently-used dictionary of at most max_memory_items
+    disk: pickled files under a directory, evicted least-recently-used
+    first once they exceed max_disk_bytes
+"""
+import ast
+import functools
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from numbers import Real
+from typing import Any, Callable, Tuple
+import numpy as np
+from celestial_bodies.celestial_bodies import CelestialBody
+
+_missing = object()
+
+
+def _canonical(obj: Any) -> Any:
+    """Converts an object into a JSON-compatible structure that depends
+    only on its content.
+
+    :param Any obj: the object to convert
+    :return: JSON-compatible structure
+    :rtype: Any
+    :raises: TypeError for objects with no canonical form
+    """
+    # Imported here to avoid a circular import with the universe package
+    from orbital_dynamics.orbit import Orbit
+    from universe.universe import Universe
+    from universe.specification import body_to_specification, \
+        universe_to_specification
+    if obj is None or isinstance(obj, (bool, str)):
+        return obj
+    if isinstance(obj, (int, np.integer)):
+        return int(obj)
+    if isinstance(obj, Real):
+        # 695700 and 695700.0 are the same parameter
+        value = float(obj)
+        return int(value) if value.is_integer() else value
+    if isinstance(obj, np.ndarray):
+        return {"ndarray": hashlib.sha256(
+            np.ascontiguousarray(obj).tobytes()).hexdigest(),
+            "dtype": str(obj.dtype), "shape": list(obj.shape)}
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(item) for item in obj]
+    if isinstance(obj, dict):
+        return {str(k): _canonical(v) for k, v in sorted(
+            obj.items(), key=lambda item: str(item[0]))}
+    if isinstance(obj, CelestialBody):
+        return body_to_specification(obj)
+    if isinstance(obj, Orbit):
+        return {"primary": _canonical(obj.primary_body),
+                "orbiting": _canonical(obj.orbiting_body),
+                "semimajor_axis": obj.semimajor_axis,
+                "eccentricity": obj.eccentricity,
+                "argument_of_periapsis": obj.argument_of_periapsis,
+                "mean_anomaly_at_epoch": obj.mean_anomaly_at_epoch}
+    if isinstance(obj, Universe):
+        spec = universe_to_specification(obj)
+        # The universe's own name and insertion order are not content
+        return {"bodies": sorted(spec["bodies"], key=lambda b: b["name"]),
+                "orbits": sorted(spec["orbits"],
+                                 key=lambda o: o["orbiting"])}
+    raise TypeError(f"Cannot compute a content hash of {type(obj).__name__}")
+
+
+def content_hash(*objects: Any) -> str:
+    """Returns a stable hash of the content of the given objects (numbers,
+    strings, sequences, dictionaries, numpy arrays, celestial bodies,
+    orbits and universes).
+
+    :return: hexadecimal SHA-256 digest
+    :rtype: str
+    """
+    canonical = json.dumps(_canonical(list(objects)), sort_keys=True,
+                           separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _source_file_hash(file_name: str) -> str:
+    with open(file_name, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _project_root(module: str) -> str:
+    """Returns the directory holding the top-level package (or module) of
+    a module, or None if it is not a source file (e.g., a built-in)."""
+    try:
+        spec = importlib.util.find_spec(module.partition(".")[0])
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.origin is None or \
+            not spec.origin.endswith(".py"):
+        return None
+    root = os.path.dirname(spec.origin)
+    if spec.submodule_search_locations is not None:
+        root = os.path.dirname(root)
+    return root
+
+
+def _module_file(name: str, root: str) -> str:
+    """Returns the source file of a module of the project in root, or None
+    if there is none (e.g., the name is a class, or another project's)."""
+    if _project_root(name) != root:
+        return None
+    path = os.path.join(root, *name.split("."))
+    for file_name in (path + ".py", os.path.join(path, "__init__.py")):
+        if os.path.isfile(file_name):
+            return file_name
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _imported_names(file_name: str, package: str) -> Tuple[str, ...]:
+    """Returns the names of the modules a source file may import: its
+    import statements (at any depth, so that imports deferred into
+    functions count), every imported name as a possible submodule, and, in
+    a package's __init__, the modules named by its lazy exports."""
+    with open(file_name, "rb") as f:
+        tree = ast.parse(f.read(), file_name)
+    is_package = os.path.basename(file_name) == "__init__.py"
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level > 0:
+                parts = package.split(".")
+                parts = parts[:len(parts) - node.level + 1]
+                base = ".".join(parts + ([base] if base else []))
+            names.add(base)
+            names.update(f"{base}.{alias.name}" for alias in node.names)
+        elif is_package and isinstance(node, ast.Constant) and \
+                isinstance(node.value, str) and \
+                node.value.startswith(package + "."):
+            names.add(node.value)
+    return tuple(sorted(name for name in names if name))
+
+
+@functools.lru_cache(maxsize=None)
+def _module_version(module: str) -> str:
+    """Returns a hash of the source files of a module and of every module
+    of the same project it depends on, directly or not."""
+    # Modules outside the project (the standard library, installed
+    # packages) are not followed
+    root = _project_root(module)
+    if root is None:
+        return ""
+    files = {}
+    pending = [module]
+    while len(pending) > 0:
+        name = pending.pop()
+        file_name = _module_file(name, root)
+        if file_name is None or file_name in files:
+            continue
+        files[file_name] = _source_file_hash(file_name)
+        package = name if os.path.basename(file_name) == "__init__.py" \
+            else name.rpartition(".")[0]
+        pending.extend(_imported_names(file_name, package))
+    digest = hashlib.sha256()
+    for file_name in sorted(files):
+        digest.update(f"{os.path.relpath(file_name, root)}:"
+                      f"{files[file_name]}\n".encode())
+    return digest.hexdigest()
+
+
+def code_version(function: Callable, version: str = None) -> str:
+    """Returns the version of the code behind a function: a hash of its
+    qualified name and of the source files of its module and of every
+    module of the project that module imports, directly or not (e.g., the
+    kernels a sweep calls). Any edit to one of them invalidates results
+    cached for the function. An explicit version replaces the source files,
+    for functions whose dependencies cannot be followed through imports.
+
+    :param Callable function: the function
+    :param str version: an explicit version of the function's code
+    :return: hexadecimal digest
+    :rtype: str
+    """
+    function = inspect.unwrap(function)
+    name = f"{function.__module__}.{function.__qualname__}"
+    if version is None:
+        version = _module_version(function.__module__)
+    return hashlib.sha256(f"{name}:{version}".encode()).hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory and disk) cache of results keyed by content hash.
+
+    Example:
+        cache = ResultCache("~/.cache/celestial_simulation")
+
+        @cache.cached
+        def equilibrium_temperatures(universe):
+            ...
+    """
+
+    def __init__(self, directory: str = None, max_memory_items: int = 1024,
+                 max_disk_bytes: int = 256 * 1024 ** 2) -> None:
+        """
+        :param str directory: the directory of the disk tier; if None, only
+        the memory tier is used
+        :param int max_memory_items: the number of results kept in memory
+        :param int max_disk_bytes: the total size of the disk tier
+        """
+        if max_memory_items < 0:
+            raise ValueError(f"max_memory_items ({max_memory_items}) must be "
+                             f">= 0.")
+        if max_disk_bytes < 0:
+            raise ValueError(f"max_disk_bytes ({max_disk_bytes}) must be "
+                             f">= 0.")
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = None
+        self.disk_bytes = 0
+        self._memory = OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if directory is not None:
+            self.directory = os.path.expanduser(directory)
+            os.makedirs(self.directory, exist_ok=True)
+            self.disk_bytes = sum(os.path.getsize(path)
+                                  for path in self._disk_files())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.directory})"
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pkl")
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                if file_name.endswith(".pkl"):
+                    yield os.path.join(root, file_name)
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns the cached result for a key, or default.
+
+        :param str key: the content hash
+        :param Any default: returned if the key is not cached
+        :return: the cached result
+        :rtype: Any
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self._memory[key]
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                # Reading refreshes the file's place in the eviction order
+                os.utime(path)
+                self.stats["disk_hits"] += 1
+                self._remember(key, value)
+                return value
+        self.stats["misses"] += 1
+        return default
+
+    def put(self, key: str, value: Any) -> None:
+        """Caches a result under a key, in memory and (if configured) on
+        disk.
+
+        :param str key: the content hash
+        :param Any value: the (picklable) result
+        :return: None
+        """
+        self._remember(key, value)
+        if self.directory is None:
+            return
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        # Write atomically, so that concurrent processes never read a
+        # partial file
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        self.disk_bytes += len(data) - previous
+        if self.disk_bytes > self.max_disk_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Removes least recently used files until the disk tier fits."""
+        files = []
+        for path in self._disk_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self.disk_bytes = total
+
+    def clear(self) -> None:
+        """Removes every cached result from both tiers.
+
+        :return: None
+        """
+        self._memory.clear()
+        if self.directory is not None:
+            for path in list(self._disk_files()):
+                os.remove(path)
+            self.disk_bytes = 0
+
+    def key(self, function: Callable, *args: Any, version: str = None,
+            **kwargs: Any) -> str:
+        """Returns the cache key of a function call: the content hash of the
+        function's code version and of its arguments.
+
+        :param Callable function: the function
+        :param str version: an explicit code version (see code_version)
+        :return: the content hash
+        :rtype: str
+        """
+        return content_hash(code_version(function, version), list(args),
+                            kwargs)
+
+    def cached(self, function: Callable = None,
+               version: str = None) -> Callable:
+        """Decorates a function so that its results are cached by the
+        content of its arguments (used as @cache.cached, or as
+        @cache.cached(version="2") to give the code version explicitly).
+
+        :param Callable function: the function to decorate
+        :param str version: an explicit code version (see code_version)
+        :return: the decorated function
+        :rtype: Callable
+        """
+        if function is None:
+            return functools.partial(self.cached, version=version)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = self.key(function, *args, version=version, **kwargs)
+            result = self.get(key, _missing)
+            if result is _missing:
+                result = function(*args, **kwargs)
+                self.put(key, result)
+            return result
+        wrapper.cache = self
+        return wrapper
+
+    @property
+    def hit_rate(self) -> float:
+        """Returns the fraction of lookups served from either tier.
+
+        :return: hit rate between 0 and 1
+        :rtype: float
+        """
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return hits / lookups if lookups > 0 else 0.0
+
+
+def default_cache() -> ResultCache:
+    """Returns the process-wide cache, stored under the directory named by
+    the CELESTIAL_CACHE_DIR environment variable (memory only if unset).
+
+    :return: the default cache
+    :rtype: ResultCache
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache(os.environ.get("CELESTIAL_CACHE_DIR"))
+    return _default_cache
+
+
+_default_cache = None
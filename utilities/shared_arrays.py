@@ -0,0 +1,232 @@
+"""Zero-copy transport of columnar arrays to worker processes.
+
+Submitting work over bodies to a process pool pickles its arguments for
+every task; for a Universe that means the CelestialBody and Orbit object
+graph (back-references included), and even plain arrays are copied once per
+task. SharedArrays instead copies the columns once into a single
+multiprocessing.shared_memory block, and hands workers a small handle (the
+block's name and the layout of the columns). Workers attach to the block
+and map the columns as numpy views without copying: inputs read-only, and
+preallocated outputs writable, so that results are written in place rather
+than pickled back.
+
+Example:
+    def scale(arrays, start, stop, factor):
+        arrays["scaled"][start:stop] = arrays["mass"][start:stop] * factor
+
+    outputs = map_ranges(scale, {"mass": masses},
+                         {"scaled": (masses.shape, float)}, len(masses),
+                         workers=8, args=(2.0,))
+
+Functions run by workers must be importable (defined at module level).
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, NamedTuple, Sequence, Tuple
+import numpy as np
+
+# Columns start on cache-line boundaries
+_alignment = 64
+
+
+class SharedColumn(NamedTuple):
+    """The location of a column in a shared memory block."""
+    offset: int
+    shape: Tuple[int, ...]
+    dtype: str
+    writable: bool
+
+
+class SharedArraysHandle(NamedTuple):
+    """What a worker needs to attach to SharedArrays: the name of the
+    shared memory block and the layout of its columns (cheap to pickle)."""
+    name: str
+    columns: Dict[str, SharedColumn]
+
+
+def _layout(specifications: Dict[str, Tuple[Tuple[int, ...], np.dtype,
+                                            bool]]) \
+        -> Tuple[Dict[str, SharedColumn], int]:
+    """Lays out columns (shape, dtype, writable) one after another, each
+    aligned, returning their locations and the total size in bytes."""
+    columns, size = {}, 0
+    for key, (shape, dtype, writable) in specifications.items():
+        dtype = np.dtype(dtype)
+        if dtype.hasobject:
+            raise TypeError(f"Column {key} holds Python objects, which "
+                            f"cannot be shared.")
+        size = -(-size // _alignment) * _alignment
+        columns[key] = SharedColumn(size, tuple(shape), dtype.str, writable)
+        size += int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+    return columns, size
+
+
+def _views(buffer, columns: Dict[str, SharedColumn],
+           read_only: bool) -> Dict[str, np.ndarray]:
+    """Maps columns of a buffer as arrays (inputs read-only if asked)."""
+    views = {}
+    for key, column in columns.items():
+        view = np.ndarray(column.shape, dtype=column.dtype, buffer=buffer,
+                          offset=column.offset)
+        if read_only and not column.writable:
+            view.flags.writeable = False
+        views[key] = view
+    return views
+
+
+class SharedArrays:
+    """Input columns and preallocated output columns in one shared memory
+    block, owned by the creating process (which unlinks the block on close).
+
+    Example:
+        with SharedArrays({"positions": positions},
+                          {"forces": (positions.shape, float)}) as shared:
+            with ProcessPoolExecutor() as pool:
+                pool.submit(call_attached, shared.handle, work, 0).result()
+            forces = shared["forces"].copy()
+    """
+
+    def __init__(self, inputs: Dict[str, np.ndarray],
+                 outputs: Dict[str, Tuple[Tuple[int, ...], Any]] = None) \
+            -> None:
+        """Copies the inputs into a new shared memory block and zeroes the
+        outputs.
+
+        :param Dict[str, np.ndarray] inputs: the input columns
+        :param outputs: the (shape, dtype) of each output column
+        """
+        outputs = outputs or {}
+        duplicates = set(inputs) & set(outputs)
+        if len(duplicates) > 0:
+            raise ValueError(f"Columns {', '.join(sorted(duplicates))} are "
+                             f"both inputs and outputs.")
+        inputs = {key: np.ascontiguousarray(values)
+                  for key, values in inputs.items()}
+        specifications = {key: (values.shape, values.dtype, False)
+                          for key, values in inputs.items()}
+        specifications.update({key: (shape, dtype, True)
+                               for key, (shape, dtype) in outputs.items()})
+        columns, size = _layout(specifications)
+        self._memory = shared_memory.SharedMemory(create=True,
+                                                  size=max(size, 1))
+        self.handle = SharedArraysHandle(self._memory.name, columns)
+        self.arrays = _views(self._memory.buf, columns, read_only=False)
+        for key, values in inputs.items():
+            self.arrays[key][...] = values
+        for key in outputs:
+            self.arrays[key][...] = 0
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.handle.name}, " \
+            f"{', '.join(self.handle.columns)})"
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.arrays[key]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Releases and unlinks the shared memory block; copy any output
+        that is still needed first.
+
+        :return: None
+        """
+        if self._memory is None:
+            return
+        self.arrays = {}
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+
+
+class AttachedArrays:
+    """A worker's views of SharedArrays: inputs read-only, outputs
+    writable."""
+
+    def __init__(self, handle: SharedArraysHandle) -> None:
+        """
+        :param SharedArraysHandle handle: the handle of the SharedArrays
+        """
+        self._memory = shared_memory.SharedMemory(name=handle.name)
+        self.arrays = _views(self._memory.buf, handle.columns,
+                             read_only=True)
+
+    def __enter__(self):
+        return self.arrays
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Detaches from the shared memory block (views must no longer be
+        referenced).
+
+        :return: None
+        """
+        if self._memory is None:
+            return
+        self.arrays = {}
+        self._memory.close()
+        self._memory = None
+
+
+def call_attached(handle: SharedArraysHandle, function: Callable, *args):
+    """Attaches to SharedArrays and calls function(arrays, *args), where
+    arrays maps column names to views. This is the task submitted to a
+    worker process.
+
+    :param SharedArraysHandle handle: the handle of the SharedArrays
+    :param Callable function: a module-level function
+    :param args: further arguments of the function
+    :return: the function's return value
+    """
+    with AttachedArrays(handle) as arrays:
+        result = function(arrays, *args)
+        del arrays
+    return result
+
+
+def map_ranges(function: Callable, inputs: Dict[str, np.ndarray],
+               outputs: Dict[str, Tuple[Tuple[int, ...], Any]],
+               n_items: int, workers: int = None, chunk_size: int = None,
+               args: Sequence = ()) -> Dict[str, np.ndarray]:
+    """Calls function(arrays, start, stop, *args) on consecutive ranges of
+    n_items items in worker processes, with the inputs and outputs shared,
+    and returns the outputs.
+
+    :param Callable function: a module-level function that reads inputs and
+    writes outputs of its range of items
+    :param Dict[str, np.ndarray] inputs: the input columns
+    :param outputs: the (shape, dtype) of each output column
+    :param int n_items: the number of items (e.g., bodies)
+    :param int workers: the number of worker processes; None uses every CPU
+    :param int chunk_size: the number of items per task; defaults to an
+    even split between the workers
+    :param Sequence args: further arguments of the function
+    :return: the output columns
+    :rtype: Dict[str, np.ndarray]
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"workers ({workers}) must be >= 1.")
+    if chunk_size is None:
+        chunk_size = max(math.ceil(n_items / workers), 1)
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size ({chunk_size}) must be >= 1.")
+    ranges = [(start, min(start + chunk_size, n_items))
+              for start in range(0, n_items, chunk_size)]
+    with SharedArrays(inputs, outputs) as shared:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(call_attached, shared.handle, function,
+                                   start, stop, *args)
+                       for start, stop in ranges]
+            for future in futures:
+                future.result()
+        return {key: shared[key].copy() for key in outputs}
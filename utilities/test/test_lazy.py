@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+# Modules that only plotting, Parquet ingestion or JIT backends may import
+heavy_modules = ("matplotlib", "PIL", "pyarrow", "numba", "pandas", "scipy")
+
+
+def import_in_subprocess(statement):
+    script = f"""import json, sys
+{statement}
+print(json.dumps(sorted(sys.modules)))
+"""
+    result = subprocess.run([sys.executable, "-c", script], cwd=root,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("statement", [
+    "from universe.universe import *",
+    "import universe.generator, universe.ingestion, universe.specification",
+    "import orbital_dynamics.hierarchical, orbital_dynamics.diagnostics",
+    "import service.service",
+    "import celestial_bodies, gravity, kernels, orbital_dynamics, universe, "
+    "utilities",
+])
+def test_core_imports_do_not_load_heavy_modules(statement):
+    loaded = import_in_subprocess(statement)
+    assert [module for module in heavy_modules if module in loaded] == []
+
+
+def test_exports_are_resolved_lazily():
+    loaded = import_in_subprocess(
+        "import universe\nassert universe.Universe.__name__ == 'Universe'")
+    assert "universe.universe" in loaded
+    assert "universe.ingestion" not in loaded
+    import universe
+    assert "generate_star_systems" in dir(universe)
+    with pytest.raises(AttributeError):
+        universe.no_such_name
+
+
+def test_universe_star_import_keeps_its_names():
+    namespace = {}
+    exec("from universe.universe import *", namespace)
+    assert {"Universe", "Orbit", "CollisionError", "UnstableOrbit",
+            "calculate_orbital_period", "calculate_aphelion_of_ellipse",
+            "calculate_perihelion_of_ellipse",
+            "calculate_semiminor_axis_of_ellipse",
+            "calculate_planetary_surface_temperature"} <= set(namespace)
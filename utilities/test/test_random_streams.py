@@ -0,0 +1,33 @@
+import pickle
+import numpy as np
+import pytest
+from utilities.random_streams import *
+
+
+def test_streams_are_addressed_by_key():
+    streams = RandomStreams(42)
+    first = streams.generator("sweep", 3, 7).random(5)
+    assert np.array_equal(first, streams.generator("sweep", 3, 7).random(5))
+    assert np.array_equal(first, streams.child("sweep", 3).generator(7)
+                          .random(5))
+    assert np.array_equal(first, pickle.loads(pickle.dumps(streams))
+                          .generator("sweep", 3, 7).random(5))
+    assert not np.array_equal(first,
+                              streams.generator("sweep", 3, 8).random(5))
+    assert not np.array_equal(first, RandomStreams(43)
+                              .generator("sweep", 3, 7).random(5))
+    # Stream (i,) is the i-th spawned child of the root seed
+    assert streams.seed_sequence(2).generate_state(4).tolist() == \
+        np.random.SeedSequence(42).spawn(3)[2].generate_state(4).tolist()
+    with pytest.raises(ValueError):
+        streams.generator(-1)
+
+
+def test_fresh_entropy_can_be_replayed():
+    streams = as_streams(None)
+    replayed = RandomStreams(streams.entropy)
+    assert np.array_equal(streams.generator(1).random(3),
+                          replayed.generator(1).random(3))
+    rng = np.random.default_rng(0)
+    assert as_generator(rng) is rng
+    assert isinstance(as_generator(5).bit_generator, np.random.Philox)
@@ -0,0 +1,122 @@
+import importlib
+import os
+import pytest
+import numpy as np
+from utilities import result_cache
+from utilities.result_cache import *
+from universe.specification import universe_from_specification
+
+
+def test_content_hash_depends_only_on_content(specification):
+    universe = universe_from_specification(specification)
+    renamed = universe_from_specification(dict(specification,
+                                               name="Other"))
+    assert universe.content_hash() == renamed.content_hash()
+    changed = dict(specification, orbits=[
+        dict(specification["orbits"][0], eccentricity=0.02)])
+    assert universe.content_hash() != \
+        universe_from_specification(changed).content_hash()
+    assert content_hash(np.arange(3)) == content_hash(np.arange(3))
+    assert content_hash(1, "a") != content_hash("a", 1)
+
+
+def test_content_hash_of_numbers():
+    assert content_hash(695700) == content_hash(695700.0) == \
+        content_hash(np.int64(695700)) == content_hash(np.float32(695700))
+    assert content_hash(0.5) == content_hash(np.float64(0.5))
+    assert content_hash(2 ** 63 + 1) != content_hash(2 ** 63)
+    assert content_hash(1.5) != content_hash(1)
+
+
+def test_type_error_content_hash():
+    with pytest.raises(TypeError):
+        content_hash(object())
+
+
+def test_memory_tier_is_lru():
+    cache = ResultCache(max_memory_items=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_disk_tier_survives_new_cache_and_evicts(tmp_path):
+    cache = ResultCache(str(tmp_path), max_memory_items=0,
+                        max_disk_bytes=2000)
+    cache.put("a" * 64, np.zeros(100))
+    reopened = ResultCache(str(tmp_path), max_memory_items=0,
+                           max_disk_bytes=2000)
+    assert np.array_equal(reopened.get("a" * 64), np.zeros(100))
+    assert reopened.stats["disk_hits"] == 1
+    for key in "bcd":
+        reopened.put(key * 64, np.zeros(100))
+    assert reopened.disk_bytes <= 2000
+    sizes = sum(os.path.getsize(os.path.join(root, f))
+                for root, _, files in os.walk(tmp_path) for f in files)
+    assert sizes == reopened.disk_bytes
+    assert reopened.get("d" * 64) is not None
+
+
+def test_cached_decorator(specification):
+    cache = ResultCache()
+    calls = []
+
+    @cache.cached
+    def periods(universe):
+        calls.append(1)
+        return [o.period for o in universe.orbits]
+
+    first = periods(universe_from_specification(specification))
+    second = periods(universe_from_specification(specification))
+    assert first == second and len(calls) == 1
+    assert cache.hit_rate == 0.5
+
+
+def test_code_version_follows_dependencies(tmp_path, monkeypatch):
+    package = tmp_path / "sweeps"
+    (package / "kernels").mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "kernels" / "__init__.py").write_text(
+        'exports = {"period": "sweeps.kernels.period"}\n')
+    (package / "kernels" / "period.py").write_text(
+        "def period(a):\n    return a ** 1.5\n")
+    (package / "sweep.py").write_text(
+        "import numpy\n"
+        "from . import kernels\n\n\n"
+        "def sweep(a):\n    return kernels.period.period(a)\n")
+    (package / "unrelated.py").write_text("x = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sweep = importlib.import_module("sweeps.sweep").sweep
+
+    def version(**kwargs):
+        for function in (result_cache._source_file_hash,
+                         result_cache._imported_names,
+                         result_cache._module_version):
+            function.cache_clear()
+        return code_version(sweep, **kwargs)
+
+    original = version()
+    (package / "unrelated.py").write_text("x = 2\n")
+    assert version() == original
+    (package / "kernels" / "period.py").write_text(
+        "def period(a):\n    return 2 * a ** 1.5\n")
+    changed = version()
+    assert changed != original
+    assert version(version="2") == version(version="2") != changed
+    assert version(version="2") != version(version="3")
+
+
+def test_cached_decorator_with_explicit_version():
+    cache = ResultCache()
+
+    def double(x):
+        return 2 * x
+
+    first = cache.cached(version="1")(double)
+    second = cache.cached(version="2")(double)
+    assert first(3) == second(3) == 6
+    assert cache.stats["memory_hits"] == 0
+    assert first(3.0) == 6 and cache.stats["memory_hits"] == 1
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from utilities.shared_arrays import *
+
+
+def scale_masses(arrays, start, stop, factor):
+    arrays["scaled"][start:stop] = arrays["mass"][start:stop] * factor
+
+
+def try_to_write_input(arrays):
+    arrays["mass"][0] = 0
+
+
+def test_map_ranges():
+    masses = np.arange(1001, dtype=float)
+    outputs = map_ranges(scale_masses, {"mass": masses},
+                         {"scaled": (masses.shape, float)}, len(masses),
+                         workers=2, chunk_size=100, args=(2.0,))
+    assert np.array_equal(outputs["scaled"], masses * 2)
+
+
+def test_workers_cannot_write_inputs():
+    names = np.array(["Sun", "Earth"])
+    with SharedArrays({"mass": np.ones(3), "name": names},
+                      {"out": ((2, 3), np.int32)}) as shared:
+        assert shared["name"].tolist() == ["Sun", "Earth"]
+        assert shared["out"].dtype == np.int32 and not shared["out"].any()
+        assert all(column.offset % 64 == 0
+                   for column in shared.handle.columns.values())
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            with pytest.raises(ValueError):
+                pool.submit(call_attached, shared.handle,
+                            try_to_write_input).result()
+    with pytest.raises(TypeError):
+        SharedArrays({"bodies": np.array([object()])})
+    with pytest.raises(ValueError):
+        SharedArrays({"mass": np.ones(3)}, {"mass": ((3,), float)})
+
+
+def periapsis_distances(arrays, start, stop):
+    arrays["periapsis"][start:stop] = \
+        arrays["semimajor_axis"][start:stop] * \
+        (1 - arrays["eccentricity"][start:stop])
+
+
+def test_share_universe_columns(build_universe):
+    universe = build_universe(["Earth", "Mars"], moon=True)
+    columns = universe.columns()
+    assert columns["name"].tolist() == ["Sun", "Earth", "Mars", "Moon"]
+    assert columns["parent"].tolist() == [-1, 0, 0, 1]
+    assert np.isnan(columns["semimajor_axis"][0])
+    assert not np.isnan(columns["temperature"][0])
+    n = len(columns["mass"])
+    outputs = map_ranges(periapsis_distances, columns,
+                         {"periapsis": ((n,), float)}, n, workers=2)
+    bodies, _, orbits = universe.flatten_orbital_graph()
+    assert np.allclose(outputs["periapsis"][1:],
+                       [orbit.perihelion for orbit in orbits[1:]])
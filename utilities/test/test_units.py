@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from facts.fact_sheets import sun_facts, planetary_facts
+from kernels import kernels
+from orbital_dynamics.orbital_calculations import calculate_orbital_period
+from utilities.units import *
+
+earth = planetary_facts["Earth"]
+
+
+def test_convert():
+    assert convert(1, "au", "km") == pytest.approx(1.496e+08)
+    assert np.allclose(convert([1, 2], "year", "day"), [365.25, 730.5])
+    assert convert(180, "deg", "rad") == pytest.approx(np.pi)
+    quantity = tag([1.0, 2.0], "km")
+    assert quantity.to("km") is quantity.values
+    with pytest.raises(IncompatibleUnits):
+        convert(1, "km", "kg")
+    with pytest.raises(IncompatibleUnits):
+        convert(1, "deg", "1")
+    with pytest.raises(KeyError):
+        get_unit("furlong")
+
+
+def test_bound_kernel_in_package_units_is_the_kernel():
+    kernel = bind_kernel("gravitational_acceleration", ("kg", "km"),
+                         backend="numpy")
+    assert kernel is kernels.get_backend("numpy").gravitational_acceleration
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_bound_kernel_folds_conversions(backend):
+    acceleration = bind_kernel("gravitational_acceleration",
+                               ("earth_mass", "earth_radius"),
+                               backend=backend)
+    assert acceleration([1.0], [1.0])[0] == pytest.approx(
+        kernels.get_backend("numpy").gravitational_acceleration(
+            earth["mass"], 6378.0))
+    period = bind_kernel("orbital_period", ("au", "solar_mass", "solar_mass"),
+                         "year", backend=backend)
+    assert period([1.0], [1.0], [1.0])[0] == pytest.approx(
+        calculate_orbital_period(1.496e+08, 1.989e+30, 1.989e+30) / 365.25)
+
+
+def test_evaluate_with_mixed_units():
+    # The masses of orbital_period are summed, so they cannot be folded
+    # into the result when they are in different units
+    a = tag([1.0, 1.524], "au")
+    period = evaluate("orbital_period", a, tag(1.0, "solar_mass"),
+                      tag([1.0, 0.107], "earth_mass"), result_unit="day")
+    expected = [calculate_orbital_period(x, 1.989e+30, m * earth["mass"])
+                for x, m in zip(a.to("km"), [1.0, 0.107])]
+    assert period.unit.name == "day"
+    assert np.allclose(period.values, expected)
+    temperature = evaluate(
+        "planetary_surface_temperature", tag(1.0, "au"),
+        tag(1.0, "solar_radius"), tag(sun_facts["mean temperature"], "K"))
+    assert temperature.values == pytest.approx(
+        kernels.planetary_surface_temperature(
+            1.496e+08, sun_facts["radius"], sun_facts["mean temperature"]))
+    perihelion = evaluate("perihelion", tag(1.0, "au"), tag(0.1, "1"))
+    assert perihelion.values == pytest.approx(0.9 * 1.496e+08, rel=1e-3)
+    with pytest.raises(IncompatibleUnits):
+        evaluate("perihelion", tag(1.0, "au"), tag(0.1, "kg"))
+    # Angles are not dimensionless: an eccentricity is never in degrees
+    with pytest.raises(IncompatibleUnits):
+        evaluate("perihelion", tag(1000.0, "km"), tag(18.0, "deg"))
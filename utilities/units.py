@@ -0,0 +1,278 @@
+"""Units of measure for arrays, at no cost per element.
+
+The package works in fixed units (see CelestialBody.default_unit):
+kilometers, kilograms, seconds or days, and Kelvin. Rather than wrapping
+every value in a unit-carrying object, an array is tagged with its unit once
+(a Quantity holds a plain float array and a Unit), and conversions happen
+once per array or once per kernel:
+
+    convert: a single multiplication of the whole array
+    bind_kernel: folds every conversion a kernel needs (from the caller's
+    units to the kernel's, and from the kernel's result to the caller's)
+    into a single scale factor on the result, computed when the kernel is
+    bound rather than when it is called
+
+Kernels are homogeneous in their arguments (e.g., the gravitational
+acceleration is proportional to mass / radius^2), which is what allows
+their conversions to be folded into the result.
+
+Example:
+    acceleration = bind_kernel("gravitational_acceleration",
+                               ("earth_mass", "earth_radius"))
+    acceleration(masses, radii)  # masses in Earth masses, radii in Earth
+                                 # radii; result in meters / second squared
+"""
+import functools
+import math
+from typing import Callable, Dict, NamedTuple, Sequence, Tuple, Union
+import numpy as np
+from facts.numerical_constants import meters_in_a_kilometer, \
+    seconds_in_a_day, astronomical_unit, solar_mass, solar_radius, \
+    earth_mass, earth_radius
+
+# Dimensions are exponents of (length, mass, time, temperature, angle);
+# angles have their own dimension so that, e.g., degrees are never taken
+# for an eccentricity
+Dimension = Tuple[int, int, int, int, int]
+dimensionless = (0, 0, 0, 0, 0)
+
+
+class IncompatibleUnits(ValueError):
+    """Exception raised when converting between units of different
+    dimensions (e.g., kilometers to kilograms)."""
+    pass
+
+
+class Unit(NamedTuple):
+    """A unit of measure: its name, its dimension, and the size of one
+    unit in SI base units (meters, kilograms, seconds and Kelvin)."""
+    name: str
+    dimension: Dimension
+    factor: float
+
+
+_days_in_a_year = 365.25
+_length, _mass, _time, _temperature, _angle = (1, 0, 0, 0, 0), \
+    (0, 1, 0, 0, 0), (0, 0, 1, 0, 0), (0, 0, 0, 1, 0), (0, 0, 0, 0, 1)
+
+units = {unit.name: unit for unit in (
+    Unit("1", dimensionless, 1.0),
+    Unit("rad", _angle, 1.0),
+    Unit("deg", _angle, math.pi / 180),
+    Unit("m", _length, 1.0),
+    Unit("km", _length, meters_in_a_kilometer),
+    Unit("au", _length, astronomical_unit * meters_in_a_kilometer),
+    Unit("earth_radius", _length, earth_radius * meters_in_a_kilometer),
+    Unit("solar_radius", _length, solar_radius * meters_in_a_kilometer),
+    Unit("kg", _mass, 1.0),
+    Unit("earth_mass", _mass, earth_mass),
+    Unit("solar_mass", _mass, solar_mass),
+    Unit("s", _time, 1.0),
+    Unit("day", _time, seconds_in_a_day),
+    Unit("year", _time, _days_in_a_year * seconds_in_a_day),
+    Unit("K", _temperature, 1.0),
+    Unit("km/s", (1, 0, -1, 0, 0), meters_in_a_kilometer),
+    Unit("m/s^2", (1, 0, -2, 0, 0), 1.0),
+    Unit("N", (1, 1, -2, 0, 0), 1.0),
+    Unit("W", (2, 1, -3, 0, 0), 1.0),
+    Unit("km^3", (3, 0, 0, 0, 0), meters_in_a_kilometer ** 3),
+    Unit("kg/m^3", (-3, 1, 0, 0, 0), 1.0),
+)}
+
+# Units of each kernel: the unit of each argument, the unit of the result,
+# and the groups of arguments (with the power of their sum) that the
+# result is proportional to
+kernel_units = {
+    "gravitational_force": (("kg", "kg", "km"), "N",
+                            (((0,), 1), ((1,), 1), ((2,), -2))),
+    "gravitational_acceleration": (("kg", "km"), "m/s^2",
+                                   (((0,), 1), ((1,), -2))),
+    "schwarzschild_radius": (("kg",), "m", (((0,), 1),)),
+    "stefan_boltzmann_luminosity": (("km", "K"), "W",
+                                    (((0,), 2), ((1,), 4))),
+    "orbital_period": (("km", "kg", "kg"), "day",
+                       (((0,), 1.5), ((1, 2), -0.5))),
+    "perihelion": (("km", "1"), "km", (((0,), 1),)),
+    "aphelion": (("km", "1"), "km", (((0,), 1),)),
+    "planetary_surface_temperature": (("km", "km", "K"), "K",
+                                      (((0,), -0.5), ((1,), 0.5),
+                                       ((2,), 1))),
+}
+
+# The package's units of the fields of bodies and orbits
+field_units: Dict[str, str] = {
+    "mass": "kg",
+    "radius": "km",
+    "temperature": "K",
+    "semimajor_axis": "km",
+    "eccentricity": "1",
+    "argument_of_periapsis": "rad",
+    "mean_anomaly_at_epoch": "rad",
+}
+
+UnitLike = Union[str, Unit]
+
+
+def get_unit(unit: UnitLike) -> Unit:
+    """Returns a unit by name (or the unit itself).
+
+    :param UnitLike unit: the unit or its name
+    :return: the unit
+    :rtype: Unit
+    """
+    if isinstance(unit, Unit):
+        return unit
+    try:
+        return units[unit]
+    except KeyError:
+        raise KeyError(f"Unknown unit {unit}; choose from "
+                       f"{', '.join(units)}") from None
+
+
+def conversion_factor(from_unit: UnitLike, to_unit: UnitLike) -> float:
+    """Returns the factor that converts values from one unit to another.
+
+    :param UnitLike from_unit: the unit of the values
+    :param UnitLike to_unit: the desired unit
+    :return: the conversion factor
+    :rtype: float
+    :raises: IncompatibleUnits if the units have different dimensions
+    """
+    from_unit, to_unit = get_unit(from_unit), get_unit(to_unit)
+    if from_unit.dimension != to_unit.dimension:
+        raise IncompatibleUnits(f"Cannot convert {from_unit.name} to "
+                                f"{to_unit.name}.")
+    return from_unit.factor / to_unit.factor
+
+
+class Quantity(NamedTuple):
+    """An array of values tagged with their unit."""
+    values: np.ndarray
+    unit: Unit
+
+    def to(self, unit: UnitLike) -> np.ndarray:
+        """Returns the values converted to another unit.
+
+        :param UnitLike unit: the desired unit
+        :return: the converted values
+        :rtype: np.ndarray
+        """
+        factor = conversion_factor(self.unit, unit)
+        return self.values if factor == 1 else self.values * factor
+
+
+def tag(values, unit: UnitLike) -> Quantity:
+    """Tags values with their unit.
+
+    :param values: a scalar or array-like of values
+    :param UnitLike unit: the unit of the values
+    :return: the tagged values
+    :rtype: Quantity
+    """
+    return Quantity(np.asarray(values, dtype=float), get_unit(unit))
+
+
+def convert(values, from_unit: UnitLike, to_unit: UnitLike) -> np.ndarray:
+    """Converts values from one unit to another.
+
+    :param values: a scalar or array-like of values
+    :param UnitLike from_unit: the unit of the values
+    :param UnitLike to_unit: the desired unit
+    :return: the converted values
+    :rtype: np.ndarray
+    """
+    return tag(values, from_unit).to(to_unit)
+
+
+@functools.lru_cache(maxsize=None)
+def _kernel_scale(name: str, argument_units: Tuple[UnitLike, ...],
+                  result_unit: UnitLike):
+    """Returns the scale folded into a kernel's result, and the factors of
+    the arguments that cannot be folded (arguments summed with an argument
+    in another unit, and arguments the result does not scale with, e.g.,
+    the eccentricity of perihelion)."""
+    if name not in kernel_units:
+        raise KeyError(f"Unknown kernel {name}; choose from "
+                       f"{', '.join(kernel_units)}")
+    expected, result, groups = kernel_units[name]
+    if len(argument_units) != len(expected):
+        raise ValueError(f"{name} takes {len(expected)} arguments, not "
+                         f"{len(argument_units)}.")
+    factors = [conversion_factor(given, wanted)
+               for given, wanted in zip(argument_units, expected)]
+    if result_unit is None:
+        result_unit = result
+    scale = conversion_factor(result, result_unit)
+    unfolded = list(factors)
+    for arguments, power in groups:
+        group_factors = {factors[idx] for idx in arguments}
+        if len(group_factors) == 1:
+            scale *= group_factors.pop() ** power
+            for idx in arguments:
+                unfolded[idx] = 1.0
+    return scale, tuple(unfolded)
+
+
+def bind_kernel(name: str, argument_units: Sequence[UnitLike],
+                result_unit: UnitLike = None, backend: str = None) \
+        -> Callable:
+    """Returns a kernel (see kernels) that takes its arguments in the given
+    units and returns its result in result_unit. Every conversion is folded
+    into a single scale of the result; the arguments are passed to the
+    kernel untouched (unless two arguments that are summed, e.g., the
+    masses of orbital_period, are in different units, or the result does
+    not scale with the argument, e.g., the eccentricity of perihelion).
+
+    :param str name: the name of the kernel
+    :param Sequence[UnitLike] argument_units: the unit of each argument
+    :param UnitLike result_unit: the unit of the result; defaults to the
+    kernel's own
+    :param str backend: the backend of the kernel; defaults to the active
+    backend
+    :return: the bound kernel
+    :rtype: Callable
+    """
+    # Imported here so that units can be used without loading any backend
+    from kernels import kernels
+    scale, unfolded = _kernel_scale(name, tuple(argument_units), result_unit)
+    kernel = getattr(kernels.get_backend(backend), name)
+    if scale == 1 and all(factor == 1 for factor in unfolded):
+        return kernel
+
+    def bound(*args):
+        if any(factor != 1 for factor in unfolded):
+            args = [np.multiply(arg, factor) if factor != 1 else arg
+                    for arg, factor in zip(args, unfolded)]
+        result = kernel(*args)
+        if isinstance(result, list):
+            return [scale * value for value in result]
+        return scale * result
+    bound.__name__ = name
+    bound.__doc__ = kernel.__doc__
+    return bound
+
+
+def evaluate(name: str, *arguments: Quantity,
+             result_unit: UnitLike = None, backend: str = None) -> Quantity:
+    """Evaluates a kernel on tagged arguments.
+
+    Example:
+        evaluate("orbital_period", tag(a, "au"), tag(m1, "solar_mass"),
+                 tag(m2, "earth_mass"), result_unit="year")
+
+    :param str name: the name of the kernel
+    :param Quantity arguments: the tagged arguments
+    :param UnitLike result_unit: the unit of the result; defaults to the
+    kernel's own
+    :param str backend: the backend of the kernel; defaults to the active
+    backend
+    :return: the tagged result
+    :rtype: Quantity
+    """
+    if result_unit is None:
+        result_unit = kernel_units[name][1]
+    kernel = bind_kernel(name, tuple(argument.unit for argument in arguments),
+                         result_unit, backend)
+    return Quantity(np.asarray(kernel(*[argument.values
+                                        for argument in arguments]),
+                               dtype=float), get_unit(result_unit))